@@ -106,6 +106,243 @@ CREATE INDEX idx_edges_workspace ON graph_edges(workspace_id);
 CREATE INDEX idx_edges_source ON graph_edges(source_node_id);
 CREATE INDEX idx_edges_target ON graph_edges(target_node_id);
 
+-- =====================================================
+-- 7. CONCEPT GRAPH PIPELINE
+-- Assistant messages already counted into the graph, and the batched
+-- upsert the backend pipeline calls (backend/graph_store.py). Node and
+-- edge ids are derived from the workspace and concept, so a concept seen
+-- again adds to its existing row. The function bypasses row-level
+-- security, so only the service role may call it.
+-- =====================================================
+CREATE TABLE graph_processed_messages (
+  message_id TEXT PRIMARY KEY,
+  workspace_id UUID NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+  processed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION apply_concept_graph(batch JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  message JSONB;
+  ws UUID;
+  applied INT := 0;
+  skipped INT := 0;
+BEGIN
+  FOR message IN SELECT * FROM jsonb_array_elements(batch) LOOP
+    ws := (message->>'workspace_id')::UUID;
+    INSERT INTO graph_processed_messages (message_id, workspace_id)
+    VALUES (message->>'message_id', ws)
+    ON CONFLICT DO NOTHING;
+    -- Already applied: re-processing a message changes nothing
+    IF NOT FOUND THEN
+      skipped := skipped + 1;
+      CONTINUE;
+    END IF;
+    applied := applied + 1;
+
+    INSERT INTO graph_nodes (id, workspace_id, label, type, mentions_count, importance)
+    SELECT (n->>'id')::UUID, ws, n->>'label', n->>'type', (n->>'mentions')::INT,
+           (n->>'mentions')::FLOAT / ((n->>'mentions')::INT + 1)
+    FROM jsonb_array_elements(message->'nodes') AS n
+    ON CONFLICT (id) DO UPDATE SET
+      mentions_count = graph_nodes.mentions_count + EXCLUDED.mentions_count,
+      importance = (graph_nodes.mentions_count + EXCLUDED.mentions_count)::FLOAT
+                   / (graph_nodes.mentions_count + EXCLUDED.mentions_count + 1);
+
+    INSERT INTO graph_edges (id, workspace_id, source_node_id, target_node_id, type, weight)
+    SELECT (e->>'id')::UUID, ws, (e->>'source')::UUID, (e->>'target')::UUID, e->>'type', (e->>'weight')::FLOAT
+    FROM jsonb_array_elements(message->'edges') AS e
+    ON CONFLICT (id) DO UPDATE SET weight = graph_edges.weight + EXCLUDED.weight;
+  END LOOP;
+  RETURN jsonb_build_object('applied', applied, 'skipped', skipped);
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION apply_concept_graph(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_concept_graph(JSONB) TO service_role;
+
+-- Layout positions computed by the backend (backend/graph_layout.py),
+-- written for many nodes in one statement. Service role only, like
+-- apply_concept_graph.
+CREATE OR REPLACE FUNCTION set_graph_positions(positions JSONB)
+RETURNS INT
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH updated AS (
+    UPDATE graph_nodes AS n
+    SET position_x = p.x, position_y = p.y, position_z = p.z
+    FROM jsonb_to_recordset(positions) AS p(id UUID, x FLOAT, y FLOAT, z FLOAT)
+    WHERE n.id = p.id
+    RETURNING 1
+  )
+  SELECT COUNT(*)::INT FROM updated;
+$$;
+
+REVOKE EXECUTE ON FUNCTION set_graph_positions(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION set_graph_positions(JSONB) TO service_role;
+
+-- =====================================================
+-- 8. GRAPH VERSIONS (DELTA SYNC)
+-- Each workspace graph has a version that goes up with every write
+-- transaction. Rows keep the version that last changed them and the one
+-- that inserted them; deleted rows leave a tombstone. The backend's
+-- GET /workspaces/{id}/graph?since= (graph_changes) sends clients only
+-- the rows changed after the version they hold. graph_changes reads any
+-- workspace, so like the pipeline functions only the service role may
+-- call it; the version functions only run from the triggers.
+-- =====================================================
+ALTER TABLE graph_nodes ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE graph_nodes ADD COLUMN IF NOT EXISTS created_version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE graph_edges ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE graph_edges ADD COLUMN IF NOT EXISTS created_version BIGINT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_nodes_version ON graph_nodes(workspace_id, version);
+CREATE INDEX IF NOT EXISTS idx_edges_version ON graph_edges(workspace_id, version);
+
+CREATE TABLE graph_versions (
+  workspace_id UUID PRIMARY KEY REFERENCES workspaces(id) ON DELETE CASCADE,
+  version BIGINT NOT NULL DEFAULT 0,
+  -- Tombstones up to this version were dropped
+  pruned_version BIGINT NOT NULL DEFAULT 0,
+  -- Transaction that took the current version
+  txid BIGINT
+);
+
+CREATE TABLE graph_tombstones (
+  kind TEXT NOT NULL CHECK (kind IN ('node', 'edge')),
+  id UUID NOT NULL,
+  workspace_id UUID NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+  version BIGINT NOT NULL,
+  deleted_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (kind, id)
+);
+
+CREATE INDEX idx_tombstones_workspace ON graph_tombstones(workspace_id, version);
+
+-- One new version per transaction and workspace. The version row stays
+-- locked until commit, so versions are visible in the order they were taken.
+CREATE OR REPLACE FUNCTION next_graph_version(ws UUID)
+RETURNS BIGINT
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  current_version BIGINT;
+  holder BIGINT;
+BEGIN
+  SELECT version, txid INTO current_version, holder FROM graph_versions WHERE workspace_id = ws;
+  IF holder = txid_current() THEN
+    RETURN current_version;
+  END IF;
+  INSERT INTO graph_versions (workspace_id, version, txid)
+  VALUES (ws, 1, txid_current())
+  ON CONFLICT (workspace_id) DO UPDATE SET
+    version = graph_versions.version + 1,
+    txid = txid_current()
+  RETURNING version INTO current_version;
+  RETURN current_version;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION next_graph_version(UUID) FROM PUBLIC, anon, authenticated;
+
+-- Stamps inserted and updated rows, records deleted ones (TG_ARGV[0]: node or edge)
+CREATE OR REPLACE FUNCTION track_graph_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    -- Nothing to sync when the whole workspace is being deleted
+    IF EXISTS (SELECT 1 FROM workspaces WHERE id = OLD.workspace_id) THEN
+      INSERT INTO graph_tombstones (kind, id, workspace_id, version)
+      VALUES (TG_ARGV[0], OLD.id, OLD.workspace_id, next_graph_version(OLD.workspace_id))
+      ON CONFLICT (kind, id) DO UPDATE SET version = EXCLUDED.version, deleted_at = NOW();
+    END IF;
+    RETURN OLD;
+  END IF;
+  NEW.version := next_graph_version(NEW.workspace_id);
+  IF TG_OP = 'INSERT' THEN
+    NEW.created_version := NEW.version;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+-- Triggers fire without EXECUTE, so frontend writes are still versioned
+REVOKE EXECUTE ON FUNCTION track_graph_version() FROM PUBLIC, anon, authenticated;
+
+CREATE TRIGGER graph_nodes_version BEFORE INSERT OR UPDATE ON graph_nodes
+  FOR EACH ROW EXECUTE FUNCTION track_graph_version('node');
+CREATE TRIGGER graph_nodes_tombstone AFTER DELETE ON graph_nodes
+  FOR EACH ROW EXECUTE FUNCTION track_graph_version('node');
+CREATE TRIGGER graph_edges_version BEFORE INSERT OR UPDATE ON graph_edges
+  FOR EACH ROW EXECUTE FUNCTION track_graph_version('edge');
+CREATE TRIGGER graph_edges_tombstone AFTER DELETE ON graph_edges
+  FOR EACH ROW EXECUTE FUNCTION track_graph_version('edge');
+
+-- Rows changed cutoff version `since`, or everything (is_full = true) when
+-- `since` is NULL, unknown, or older than the tombstones still kept
+CREATE OR REPLACE FUNCTION graph_changes(ws UUID, since BIGINT, tombstone_seconds FLOAT DEFAULT 2592000)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  current_version BIGINT := 0;
+  pruned BIGINT := 0;
+  is_full BOOLEAN;
+  cutoff BIGINT;
+BEGIN
+  WITH dropped AS (
+    DELETE FROM graph_tombstones
+    WHERE workspace_id = ws AND deleted_at < NOW() - make_interval(secs => tombstone_seconds)
+    RETURNING version
+  )
+  UPDATE graph_versions
+  SET pruned_version = GREATEST(pruned_version, (SELECT MAX(version) FROM dropped))
+  WHERE workspace_id = ws AND EXISTS (SELECT 1 FROM dropped);
+
+  SELECT version, pruned_version INTO current_version, pruned FROM graph_versions WHERE workspace_id = ws;
+  current_version := COALESCE(current_version, 0);
+  pruned := COALESCE(pruned, 0);
+  is_full := since IS NULL OR since > current_version OR since < pruned;
+  cutoff := CASE WHEN is_full THEN -1 ELSE since END;
+
+  RETURN jsonb_build_object(
+    'version', current_version,
+    'full', is_full,
+    'nodes', jsonb_build_object(
+      'inserted', COALESCE((SELECT jsonb_agg(to_jsonb(n) ORDER BY n.created_at, n.id) FROM graph_nodes n
+                            WHERE n.workspace_id = ws AND n.version > cutoff AND n.created_version > cutoff), '[]'),
+      'updated', COALESCE((SELECT jsonb_agg(to_jsonb(n) ORDER BY n.created_at, n.id) FROM graph_nodes n
+                           WHERE n.workspace_id = ws AND n.version > cutoff AND n.created_version <= cutoff), '[]'),
+      'deleted', COALESCE((SELECT jsonb_agg(t.id) FROM graph_tombstones t
+                           WHERE NOT is_full AND t.workspace_id = ws AND t.kind = 'node' AND t.version > since), '[]')
+    ),
+    'edges', jsonb_build_object(
+      'inserted', COALESCE((SELECT jsonb_agg(to_jsonb(e) ORDER BY e.created_at, e.id) FROM graph_edges e
+                            WHERE e.workspace_id = ws AND e.version > cutoff AND e.created_version > cutoff), '[]'),
+      'updated', COALESCE((SELECT jsonb_agg(to_jsonb(e) ORDER BY e.created_at, e.id) FROM graph_edges e
+                           WHERE e.workspace_id = ws AND e.version > cutoff AND e.created_version <= cutoff), '[]'),
+      'deleted', COALESCE((SELECT jsonb_agg(t.id) FROM graph_tombstones t
+                           WHERE NOT is_full AND t.workspace_id = ws AND t.kind = 'edge' AND t.version > since), '[]')
+    )
+  );
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION graph_changes(UUID, BIGINT, FLOAT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION graph_changes(UUID, BIGINT, FLOAT) TO service_role;
+
 -- =====================================================
 -- ENABLE ROW LEVEL SECURITY (RLS)
 -- =====================================================
@@ -115,6 +352,9 @@ ALTER TABLE conversations ENABLE ROW LEVEL SECURITY;
 ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
 ALTER TABLE graph_nodes ENABLE ROW LEVEL SECURITY;
 ALTER TABLE graph_edges ENABLE ROW LEVEL SECURITY;
+ALTER TABLE graph_processed_messages ENABLE ROW LEVEL SECURITY;
+ALTER TABLE graph_versions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE graph_tombstones ENABLE ROW LEVEL SECURITY;
 
 -- =====================================================
 -- RLS POLICIES
@@ -0,0 +1,348 @@
+"""
+Zyron AI - Admission control for /chat streams
+
+Caps concurrent streams globally and per client, parks overflow in a
+bounded wait queue with a timeout, and hands freed slots to waiting
+clients round-robin so one noisy client cannot starve the others.
+When saturated, requests are rejected fast with a Retry-After estimate.
+Items of a /chat/batch job take a slot each, waiting for one rather than
+failing once the job has been accepted.
+
+With `shared` counters (shared_state.SharedCounters, set up when serve.py
+forks several workers) the caps hold for the whole instance: active
+slots are counted in shared memory, per client in one of CLIENT_BUCKETS
+hashed buckets (clients sharing a bucket share its cap). The wait queue
+stays per worker, and queued requests poll for slots freed by other
+workers every `poll_interval`.
+"""
+
+import asyncio
+import math
+import time
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from shared_state import SharedCounters
+from telemetry import percentile
+
+# Per-client counters in shared memory, addressed by a hash of the client id
+CLIENT_BUCKETS = 4096
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+    client_id: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class Permit:
+    """A granted slot; releasing it more than once is a no-op"""
+
+    def __init__(self, controller: "AdmissionController", client_id: str):
+        self.controller = controller
+        self.client_id = client_id
+        self.granted_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """Global and per-client concurrency limits with a fair wait queue"""
+
+    def __init__(
+        self,
+        max_concurrent: int = 64,
+        max_per_client: int = 4,
+        max_queue: int = 128,
+        max_queue_per_client: int = 8,
+        queue_timeout: float = 10.0,
+        window: int = 1000,
+        shared: Optional[SharedCounters] = None,
+        poll_interval: float = 0.05,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.queue_timeout = queue_timeout
+        # Column 0: active slots of the instance; 1 + bucket: active slots of the clients in a bucket
+        self.shared = shared
+        self.poll_interval = poll_interval
+
+        self.active = 0
+        self.queued = 0
+        self.admitted_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._active_by_client: Dict[str, int] = {}
+        # Insertion order doubles as the round-robin order across clients
+        self._waiting: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._wait_times: Deque[float] = deque(maxlen=window)
+        self._hold_ewma = 1.0
+
+    @staticmethod
+    def shared_counters() -> SharedCounters:
+        """Counters sized for `shared`"""
+        return SharedCounters(1 + CLIENT_BUCKETS)
+
+    def _bucket(self, client_id: str) -> int:
+        return 1 + zlib.crc32(client_id.encode()) % CLIENT_BUCKETS
+
+    def _has_capacity(self, client_id: str) -> bool:
+        if self.shared is not None:
+            return (
+                self.shared.total(0) < self.max_concurrent
+                and self.shared.total(self._bucket(client_id)) < self.max_per_client
+            )
+        return (
+            self.active < self.max_concurrent
+            and self._active_by_client.get(client_id, 0) < self.max_per_client
+        )
+
+    def _grant(self, client_id: str) -> Permit:
+        self.active += 1
+        self._active_by_client[client_id] = self._active_by_client.get(client_id, 0) + 1
+        self.admitted_total += 1
+        if self.shared is not None:
+            self.shared.add(0)
+            self.shared.add(self._bucket(client_id))
+        return Permit(self, client_id)
+
+    def _try_grant(self, client_id: str) -> Optional[Permit]:
+        if self.shared is None:
+            return self._grant(client_id) if self._has_capacity(client_id) else None
+        # Checked and taken in one step, so two workers cannot both take the last slot
+        with self.shared.locked():
+            return self._grant(client_id) if self._has_capacity(client_id) else None
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, from average hold time"""
+        backlog = self.queued + 1
+        return max(1, math.ceil(self._hold_ewma * backlog / self.max_concurrent))
+
+    async def acquire(self, client_id: str) -> Permit:
+        """Wait for a slot for `client_id`
+
+        Raises AdmissionRejected when the queue is full or the wait times out.
+        """
+        # Jumping the queue is only allowed when nobody else is waiting
+        if not self._waiting:
+            permit = self._try_grant(client_id)
+            if permit is not None:
+                self._wait_times.append(0.0)
+                return permit
+
+        client_queue = self._waiting.get(client_id)
+        if self.queued >= self.max_queue or (
+            client_queue is not None and len(client_queue) >= self.max_queue_per_client
+        ):
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("queue full", self.retry_after())
+
+        waiter = _Waiter(client_id, asyncio.get_running_loop().create_future())
+        if client_queue is None:
+            client_queue = self._waiting[client_id] = deque()
+        client_queue.append(waiter)
+        self.queued += 1
+        self._dispatch()
+
+        try:
+            if self.shared is None:
+                await asyncio.wait((waiter.future,), timeout=self.queue_timeout)
+            else:
+                # Slots freed by other workers are not announced here
+                deadline = waiter.enqueued_at + self.queue_timeout
+                while not waiter.future.done() and time.monotonic() < deadline:
+                    await asyncio.wait(
+                        (waiter.future,), timeout=min(self.poll_interval, deadline - time.monotonic())
+                    )
+                    self._dispatch()
+        except BaseException:
+            # Caller went away: give back a slot granted in the meantime
+            if waiter.future.done():
+                waiter.future.result().release()
+            else:
+                waiter.future.cancel()
+                self._forget(waiter)
+            raise
+        if not waiter.future.done():
+            waiter.future.cancel()
+            self._forget(waiter)
+            self.rejected_timeout += 1
+            raise AdmissionRejected("queue timeout", self.retry_after())
+        self._wait_times.append(time.monotonic() - waiter.enqueued_at)
+        return waiter.future.result()
+
+    async def acquire_when_free(self, client_id: str) -> Permit:
+        """acquire, trying again after each rejection
+
+        For work that was already accepted (the items of a batch job) and
+        should wait for its turn rather than fail.
+        """
+        while True:
+            try:
+                return await self.acquire(client_id)
+            except AdmissionRejected as e:
+                await asyncio.sleep(e.retry_after)
+
+    def _forget(self, waiter: _Waiter):
+        """Drop a waiter that gave up before being served"""
+        client_queue = self._waiting.get(waiter.client_id)
+        if client_queue is None:
+            return
+        try:
+            client_queue.remove(waiter)
+        except ValueError:
+            return
+        self.queued -= 1
+        if not client_queue:
+            del self._waiting[waiter.client_id]
+
+    def _dispatch(self):
+        """Hand free slots to waiting clients, one client at a time"""
+        if self.shared is None:
+            self._dispatch_free()
+        elif self._waiting:
+            with self.shared.locked():
+                self._dispatch_free()
+
+    def _dispatch_free(self):
+        while self._waiting and self.active < self.max_concurrent:
+            for client_id in self._waiting:
+                if self._has_capacity(client_id):
+                    break
+            else:
+                return
+            client_queue = self._waiting[client_id]
+            waiter = client_queue.popleft()
+            self.queued -= 1
+            if client_queue:
+                self._waiting.move_to_end(client_id)
+            else:
+                del self._waiting[client_id]
+            waiter.future.set_result(self._grant(client_id))
+
+    def _release(self, permit: Permit):
+        self.active -= 1
+        remaining = self._active_by_client[permit.client_id] - 1
+        if remaining:
+            self._active_by_client[permit.client_id] = remaining
+        else:
+            del self._active_by_client[permit.client_id]
+        if self.shared is not None:
+            with self.shared.locked():
+                self.shared.add(0, -1)
+                self.shared.add(self._bucket(permit.client_id), -1)
+        held = time.monotonic() - permit.granted_at
+        self._hold_ewma = 0.9 * self._hold_ewma + 0.1 * held
+        self._dispatch()
+
+    def snapshot(self) -> Dict[str, object]:
+        """Counters for /metrics"""
+        waits = [w * 1000 for w in self._wait_times]
+        return {
+            "active": self.active,
+            # Active across all workers of the instance (this worker's alone when not shared)
+            "instance_active": self.shared.total(0) if self.shared is not None else self.active,
+            "active_clients": len(self._active_by_client),
+            "queue_depth": self.queued,
+            "admitted_total": self.admitted_total,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_ms": {
+                "p50": percentile(waits, 50),
+                "p95": percentile(waits, 95),
+                "p99": percentile(waits, 99),
+            },
+            "limits": {
+                "max_concurrent": self.max_concurrent,
+                "max_per_client": self.max_per_client,
+                "max_queue": self.max_queue,
+                "queue_timeout_s": self.queue_timeout,
+            },
+        }
+
+
+async def _wait_for_disconnect(receive: Receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """StreamingResponse that releases its admission permit when it ends
+
+    Releasing here rather than inside the body generator also covers a
+    client that disconnects before the generator is first iterated.
+
+    On ASGI 2.4 servers Starlette only notices a disconnect when the next
+    write fails, which can be a long time while upstream is thinking; the
+    body is cancelled as soon as the server reports `http.disconnect`.
+    Bodies that still read the request themselves must pass
+    `watch_disconnect=False` so nothing else consumes `receive`; a
+    disconnect then surfaces in the body as ClientDisconnect.
+    """
+
+    def __init__(self, *args, permit: Permit, watch_disconnect: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.permit = permit
+        self.watch_disconnect = watch_disconnect
+        self.disconnected = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            spec_version = tuple(map(int, scope.get("asgi", {}).get("spec_version", "2.0").split(".")))
+            if not self.watch_disconnect:
+                # Starlette's own disconnect listener would swallow request body messages
+                await self.stream_response(send)
+                return
+            if spec_version < (2, 4):
+                # Starlette already races the body against http.disconnect here
+                await super().__call__(scope, receive, send)
+                return
+            streaming = asyncio.ensure_future(super().__call__(scope, receive, send))
+            watcher = asyncio.ensure_future(_wait_for_disconnect(receive))
+            try:
+                await asyncio.wait((streaming, watcher), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                watcher.cancel()
+                if not streaming.done():
+                    self.disconnected = True
+                    streaming.cancel()
+                await asyncio.wait((streaming,))
+            if not streaming.cancelled():
+                streaming.result()
+        finally:
+            self.permit.release()
+
+
+def client_id_for(scope_client: Optional[tuple], forwarded_for: Optional[str], proxy_hops: int) -> str:
+    """Identify the caller for per-client limits
+
+    Behind `proxy_hops` trusted proxies, each appending the address it saw
+    to X-Forwarded-For, the client is that many entries from the right.
+    Entries further left are whatever the client sent and are ignored.
+    """
+    if proxy_hops > 0 and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(",") if address.strip()]
+        if addresses:
+            return addresses[-min(proxy_hops, len(addresses))]
+    return scope_client[0] if scope_client else "unknown"
@@ -0,0 +1,268 @@
+"""
+Zyron AI - Caller authentication
+
+Requests that depend on who is asking carry the user's Supabase access
+token, the one the frontend gets from Clerk's "supabase" JWT template:
+
+    Authorization: Bearer <token>
+
+That template signs with the Supabase project's JWT secret (HS256), so
+the backend checks tokens itself with SUPABASE_JWT_SECRET: signature,
+expiry and a subject. Requests without a valid token are anonymous, and
+all of them are when no secret is configured.
+
+Model tiers are an entitlement. An authenticated caller may ask for the
+tiers in AUTH_USER_TIERS plus the ones listed in the token's `tiers`
+claim (filled in by the JWT template, e.g. from the user's public
+metadata); any other tier request is ignored and the request is routed
+by the rules alone.
+
+Workspaces are private to the user who owns them (`workspaces.user_id`,
+the token's `sub`). Endpoints that read or write a workspace's data
+with the service role key check ownership first with WorkspaceAccess:
+the owner is looked up in the `workspaces` table and cached for a
+short while. Without Supabase there are no owners to check against, so
+those endpoints only serve localhost (local development).
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+import httpx
+
+LOCALHOST = ("127.0.0.1", "::1")
+
+
+@dataclass(frozen=True)
+class Caller:
+    """An authenticated user"""
+    user_id: str
+    tiers: FrozenSet[str]
+    # The bearer token, for calls made on the user's behalf
+    token: str
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """The token of an `Authorization: Bearer` header"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    token = token.strip()
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class Authenticator:
+    """Verifies Supabase access tokens and decides which tiers a caller may use"""
+
+    def __init__(self, jwt_secret: Optional[str], user_tiers: Iterable[str] = (), leeway: float = 30.0):
+        self._secret = jwt_secret.encode() if jwt_secret else None
+        self.user_tiers = frozenset(user_tiers)
+        self.leeway = leeway
+        self.authenticated = 0
+        self.invalid_tokens = 0
+        self.tiers_denied = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._secret is not None
+
+    def claims(self, token: str) -> Optional[dict]:
+        """The claims of a valid token, None if it is malformed, forged or expired"""
+        if self._secret is None:
+            return None
+        try:
+            header, payload, signature = token.split(".")
+            if json.loads(_b64decode(header)).get("alg") != "HS256":
+                return None
+            expected = hmac.new(self._secret, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                return None
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, binascii.Error, AttributeError):
+            return None
+        if not isinstance(claims, dict) or not isinstance(claims.get("sub"), str) or not claims["sub"]:
+            return None
+        now = time.time()
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or exp < now - self.leeway:
+            return None
+        nbf = claims.get("nbf")
+        if isinstance(nbf, (int, float)) and nbf > now + self.leeway:
+            return None
+        return claims
+
+    def caller(self, authorization: Optional[str]) -> Optional[Caller]:
+        """The caller an `Authorization` header belongs to, None if anonymous"""
+        token = bearer_token(authorization)
+        if token is None or self._secret is None:
+            return None
+        claims = self.claims(token)
+        if claims is None:
+            self.invalid_tokens += 1
+            return None
+        self.authenticated += 1
+        tiers = claims.get("tiers")
+        granted = {tier for tier in tiers if isinstance(tier, str)} if isinstance(tiers, list) else set()
+        return Caller(claims["sub"], self.user_tiers | granted, token)
+
+    def tier(self, caller: Optional[Caller], requested) -> Optional[str]:
+        """`requested` if `caller` is entitled to it, else None (route by the rules)"""
+        if not isinstance(requested, str):
+            return None
+        if caller is None or requested not in caller.tiers:
+            self.tiers_denied += 1
+            return None
+        return requested
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        return {
+            "enabled": self.enabled,
+            "authenticated": self.authenticated,
+            "invalid_tokens": self.invalid_tokens,
+            "tiers_denied": self.tiers_denied,
+        }
+
+
+class AccessDenied(Exception):
+    """A workspace request the caller may not make, with the HTTP status to answer"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def canonical_uuid(value) -> Optional[str]:
+    """The canonical (lowercase, hyphenated) form of a UUID string, None if it is not one"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        return None
+
+
+class SupabaseWorkspaceOwners:
+    """Workspace owners from the `workspaces` table, read with the service role key"""
+
+    def __init__(self, url: str, service_key: str, timeout: float = 10.0):
+        self.url = url.rstrip("/") + "/rest/v1"
+        self.headers = {"apikey": service_key, "Authorization": f"Bearer {service_key}"}
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(headers=self.headers, timeout=self.timeout)
+        return self._client
+
+    async def owner(self, workspace_id: str) -> Optional[str]:
+        """The user id owning `workspace_id`, None if there is no such workspace"""
+        response = await self.client.get(
+            f"{self.url}/workspaces", params={"select": "user_id", "id": f"eq.{workspace_id}"}
+        )
+        response.raise_for_status()
+        rows = response.json()
+        return rows[0]["user_id"] if rows else None
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class WorkspaceAccess:
+    """Checks that a caller owns the workspace a request is about
+
+    `owners` is anything with an async `owner(workspace_id)`; None means
+    workspaces have no owners to check (no Supabase), and only localhost
+    is served. Owners are cached for `cache_seconds`, the most recently
+    used `max_entries` of them.
+    """
+
+    def __init__(self, owners=None, cache_seconds: float = 60.0, max_entries: int = 10000):
+        self.owners = owners
+        self.cache_seconds = cache_seconds
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.allowed = 0
+        self.unauthenticated = 0
+        self.forbidden = 0
+        self.lookups = 0
+        self.lookup_errors = 0
+
+    async def check(self, caller: Optional[Caller], workspace_id, host: Optional[str]) -> str:
+        """The canonical workspace id if `caller` may use it, else raises AccessDenied
+
+        400 for an id that is not a UUID, 401 without a caller, 403 for
+        someone else's (or a missing) workspace, 503 when the owner
+        cannot be looked up.
+        """
+        canonical = canonical_uuid(workspace_id)
+        if canonical is None:
+            raise AccessDenied(400, "workspace_id must be a UUID")
+        if self.owners is None:
+            if host not in LOCALHOST:
+                self.forbidden += 1
+                raise AccessDenied(403, "Workspaces are only served to localhost without Supabase")
+            self.allowed += 1
+            return canonical
+        if caller is None:
+            self.unauthenticated += 1
+            raise AccessDenied(401, "Sign in to use this workspace")
+        if await self._owner(canonical) != caller.user_id:
+            self.forbidden += 1
+            raise AccessDenied(403, "Not your workspace")
+        self.allowed += 1
+        return canonical
+
+    async def _owner(self, workspace_id: str) -> Optional[str]:
+        cached = self._cache.get(workspace_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._cache.move_to_end(workspace_id)
+            return cached[0]
+        self.lookups += 1
+        try:
+            owner = await self.owners.owner(workspace_id)
+        except Exception as e:
+            self.lookup_errors += 1
+            raise AccessDenied(503, f"Workspace owner lookup failed: {e}")
+        # Only owners are cached: a workspace created a moment ago is found on the next request
+        if owner is not None:
+            self._cache[workspace_id] = (owner, time.monotonic() + self.cache_seconds)
+            self._cache.move_to_end(workspace_id)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return owner
+
+    async def close(self):
+        if self.owners is not None and hasattr(self.owners, "close"):
+            await self.owners.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        return {
+            "enabled": self.owners is not None,
+            "allowed": self.allowed,
+            "unauthenticated": self.unauthenticated,
+            "forbidden": self.forbidden,
+            "lookups": self.lookups,
+            "lookup_errors": self.lookup_errors,
+            "cached_owners": len(self._cache),
+        }
@@ -0,0 +1,359 @@
+"""
+Zyron AI - Bulk /chat/batch jobs
+
+Reads an NDJSON body of chat requests and answers them with at most
+`concurrency` upstream calls in flight, streaming NDJSON results back in
+completion order. Input lines are only read as slots free up and results
+are written out as soon as they finish, so memory stays bounded by the
+concurrency cap however large the body is.
+
+With mode=batches the items are submitted in chunks to the Message
+Batches API instead (half price, no latency guarantee). The job answers
+as soon as everything is submitted, with one line per batch id; results
+are fetched later by batch id, once the batch has ended. Each submitted
+batch id is recorded with the user who submitted it, and only that user
+can fetch its results. The record is kept in this process and, with a
+`shared` store (shared_state.SQLiteState, when serve.py runs several
+workers), in that store too, so any worker can serve the results.
+"""
+
+import asyncio
+import json
+import re
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from stream_encoding import dumps
+
+# custom_id format accepted by the Message Batches API
+CUSTOM_ID = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+# Message Batches API batch ids ("msgbatch_...")
+BATCH_ID = re.compile(r"^[a-zA-Z0-9_-]{1,128}$")
+
+# Batch ids remembered for result counting and ownership
+MAX_TRACKED_BATCHES = 10000
+# Results stay available for 29 days after a batch is created
+BATCH_OWNER_TTL_SECONDS = 30 * 86400
+
+_DONE = object()
+
+
+@dataclass
+class BatchItem:
+    """One request line of a batch body"""
+    id: str
+    message: str = ""
+    system: Optional[str] = None
+    max_tokens: Optional[int] = None
+    # Model route tier ("fast", "deep", ...), see routing.py
+    tier: Optional[str] = None
+    error: Optional[str] = None
+
+
+def ndjson_line(payload: Dict[str, Any]) -> bytes:
+    return dumps(payload) + b"\n"
+
+
+def error_result(item: BatchItem, error: Any) -> Dict[str, Any]:
+    return {"id": item.id, "status": "error", "error": str(error)}
+
+
+def parse_item(line: bytes, index: int) -> BatchItem:
+    """Parse one NDJSON line; malformed lines become items carrying an error"""
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        return BatchItem(id=str(index), error=f"invalid JSON: {e}")
+    if not isinstance(data, dict):
+        return BatchItem(id=str(index), error="each line must be a JSON object")
+    item = BatchItem(
+        id=str(data.get("id", index)),
+        message=data.get("message", ""),
+        system=data.get("system"),
+        max_tokens=data.get("max_tokens"),
+        tier=data.get("tier"),
+    )
+    if not isinstance(item.message, str) or not item.message.strip():
+        item.error = "message must be a non-empty string"
+    elif item.system is not None and not isinstance(item.system, str):
+        item.error = "system must be a string"
+    elif item.max_tokens is not None and (not isinstance(item.max_tokens, int) or item.max_tokens < 1):
+        item.error = "max_tokens must be a positive integer"
+    elif item.tier is not None and not isinstance(item.tier, str):
+        item.error = "tier must be a string"
+    return item
+
+
+async def read_lines(body: AsyncIterable[bytes], max_line_bytes: int = 1 << 20) -> AsyncIterator[Optional[bytes]]:
+    """Yield the non-blank lines of an NDJSON byte stream as they complete
+
+    A line longer than `max_line_bytes` is yielded as None and skipped,
+    whether it arrived in one chunk or several.
+    """
+    buffer = b""
+    skipping = False
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                # Tail of an oversized line that was already reported
+                skipping = False
+                continue
+            if len(line) > max_line_bytes:
+                yield None
+            elif line.strip():
+                yield line
+        if len(buffer) > max_line_bytes and not skipping:
+            yield None
+            skipping = True
+        if skipping:
+            buffer = b""
+    if buffer.strip() and not skipping:
+        yield buffer if len(buffer) <= max_line_bytes else None
+
+
+async def read_items(body: AsyncIterable[bytes], max_line_bytes: int = 1 << 20) -> AsyncIterator[BatchItem]:
+    """Yield items from an NDJSON byte stream as lines complete
+
+    Lines are numbered from 0; the number is the default item id.
+    """
+    index = 0
+    async for line in read_lines(body, max_line_bytes):
+        if line is None:
+            yield BatchItem(id=str(index), error=f"line longer than {max_line_bytes} bytes")
+        else:
+            yield parse_item(line, index)
+        index += 1
+
+
+Answer = Callable[[BatchItem], Awaitable[Dict[str, Any]]]
+# Waits for an admission slot for one item; the slot has a release() method
+Admit = Callable[[], Awaitable[Any]]
+
+
+class BatchRunner:
+    """Runs batch jobs directly or through the Message Batches API"""
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        max_concurrency: int = 32,
+        chunk_size: int = 1000,
+        shared: Any = None,
+    ):
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self.shared = shared
+
+        self.jobs_total = 0
+        self.items_total = 0
+        self.errors_total = 0
+        self.batches_submitted = 0
+        self.active_items = 0
+        # Batch ids whose results were already handed out, to count their items once
+        self._collected: "OrderedDict[str, None]" = OrderedDict()
+        # Batch id -> user id of the submitter
+        self._owners: "OrderedDict[str, str]" = OrderedDict()
+
+    def _count(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        self.items_total += 1
+        if result.get("status") == "error":
+            self.errors_total += 1
+        return result
+
+    async def direct(
+        self,
+        items: AsyncIterable[BatchItem],
+        answer: Answer,
+        concurrency: Optional[int] = None,
+        admit: Optional[Admit] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Answer items with bounded concurrency, yielding results as they finish
+
+        A slot is only given back once its result has been handed to the
+        caller, so a slow reader also slows down input consumption. With
+        `admit`, every item also holds an admission slot while it is
+        answered, so batch items count against the same limits as chats.
+        """
+        self.jobs_total += 1
+        limit = max(1, min(concurrency or self.concurrency, self.max_concurrency))
+        slots = asyncio.Semaphore(limit)
+        results: asyncio.Queue = asyncio.Queue()
+        tasks: Set[asyncio.Task] = set()
+        started = 0
+
+        async def work(item: BatchItem, permit: Any):
+            self.active_items += 1
+            try:
+                result = error_result(item, item.error) if item.error else await answer(item)
+            except Exception as e:
+                result = error_result(item, e)
+            finally:
+                self.active_items -= 1
+                if permit is not None:
+                    permit.release()
+            results.put_nowait(result)
+
+        async def feed():
+            nonlocal started
+            try:
+                async for item in items:
+                    await slots.acquire()
+                    try:
+                        permit = await admit() if admit is not None and not item.error else None
+                    except BaseException:
+                        slots.release()
+                        raise
+                    started += 1
+                    task = asyncio.ensure_future(work(item, permit))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            finally:
+                results.put_nowait(_DONE)
+
+        feeder = asyncio.ensure_future(feed())
+        finished = 0
+        fed = False
+        try:
+            while not fed or finished < started:
+                result = await results.get()
+                if result is _DONE:
+                    fed = True
+                    continue
+                finished += 1
+                yield self._count(result)
+                slots.release()
+            feeder.result()
+        finally:
+            feeder.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def message_batches(
+        self,
+        client: Any,
+        items: AsyncIterable[BatchItem],
+        params: Callable[[BatchItem], Dict[str, Any]],
+        owner: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Submit items to the Message Batches API, yielding a line per batch
+
+        Items are submitted in chunks of `chunk_size` while the body is
+        read. Invalid items get an error line right away; every submitted
+        batch gets a `{"batch_id", "status": "submitted", "items"}` line,
+        and its results are fetched with `results` once it has ended.
+        Batch ids are recorded as belonging to `owner` (see `owner`).
+        """
+        self.jobs_total += 1
+        chunk: List[BatchItem] = []
+
+        async def submit() -> Dict[str, Any]:
+            batch = await client.messages.batches.create(requests=[
+                {"custom_id": item.id, "params": params(item)} for item in chunk
+            ])
+            self.batches_submitted += 1
+            if owner is not None:
+                self._owners[batch.id] = owner
+                while len(self._owners) > MAX_TRACKED_BATCHES:
+                    self._owners.popitem(last=False)
+                if self.shared is not None:
+                    await asyncio.to_thread(self.shared.put, "batch_owner", batch.id, owner, BATCH_OWNER_TTL_SECONDS)
+            return {"batch_id": batch.id, "status": "submitted", "items": len(chunk)}
+
+        seen: Set[str] = set()
+        async for item in items:
+            if not item.error and not CUSTOM_ID.match(item.id):
+                item.error = "id must match [a-zA-Z0-9_-]{1,64} for the Message Batches API"
+            elif not item.error and item.id in seen:
+                item.error = "duplicate id within a submitted batch"
+            if item.error:
+                yield self._count(error_result(item, item.error))
+                continue
+            seen.add(item.id)
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield await submit()
+                chunk, seen = [], set()
+        if chunk:
+            yield await submit()
+
+    async def status(self, client: Any, batch_id: str) -> Dict[str, Any]:
+        """Processing status and request counts of a submitted batch"""
+        batch = await client.messages.batches.retrieve(batch_id)
+        return {
+            "batch_id": batch.id,
+            "status": batch.processing_status,
+            "request_counts": batch.request_counts.model_dump(),
+        }
+
+    async def owner(self, batch_id: str) -> Optional[str]:
+        """User id that submitted `batch_id`, if known here or in the shared store"""
+        if batch_id in self._owners or self.shared is None:
+            return self._owners.get(batch_id)
+        return await asyncio.to_thread(self.shared.get, "batch_owner", batch_id)
+
+    def first_collection(self, batch_id: str) -> bool:
+        """True the first time results of `batch_id` are fetched from this process"""
+        if batch_id in self._collected:
+            return False
+        self._collected[batch_id] = None
+        while len(self._collected) > MAX_TRACKED_BATCHES:
+            self._collected.popitem(last=False)
+        return True
+
+    async def results(self, client: Any, batch_id: str, count: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """Result lines of an ended batch; `count` adds them to the item totals"""
+        async for entry in await client.messages.batches.results(batch_id):
+            result = batch_entry_result(entry)
+            yield self._count(result) if count else result
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters for /metrics"""
+        return {
+            "jobs_total": self.jobs_total,
+            "items_total": self.items_total,
+            "errors_total": self.errors_total,
+            "active_items": self.active_items,
+            "message_batches_submitted": self.batches_submitted,
+        }
+
+
+def message_result(item_id: str, message: Any, cached: bool = False) -> Dict[str, Any]:
+    """Result line for a completed upstream message"""
+    return {
+        "id": item_id,
+        "status": "ok",
+        "text": "".join(block.text for block in message.content if block.type == "text"),
+        "stop_reason": message.stop_reason,
+        "model": message.model,
+        "usage": {
+            "input_tokens": message.usage.input_tokens,
+            "output_tokens": message.usage.output_tokens,
+        },
+        "cached": cached,
+    }
+
+
+def cached_result(item_id: str, text: str, output_tokens: Optional[int]) -> Dict[str, Any]:
+    """Result line for an answer served from the response cache"""
+    return {
+        "id": item_id,
+        "status": "ok",
+        "text": text,
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": 0, "output_tokens": output_tokens},
+        "cached": True,
+    }
+
+
+def batch_entry_result(entry: Any) -> Dict[str, Any]:
+    """Result line for one Message Batches API result entry"""
+    result = entry.result
+    if result.type == "succeeded":
+        return message_result(entry.custom_id, result.message)
+    if result.type == "errored":
+        return {"id": entry.custom_id, "status": "error", "error": result.error.error.message}
+    return {"id": entry.custom_id, "status": "error", "error": result.type}
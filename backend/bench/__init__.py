@@ -0,0 +1,8 @@
+"""
+Zyron AI backend benchmarks
+
+Offline tools for measuring the /chat streaming path against a local
+mock of the Anthropic Messages API. Run from the backend directory:
+
+    python -m bench.concurrency --streams 200
+"""
@@ -0,0 +1,149 @@
+"""
+/chat/batch benchmark: items per second at different concurrency caps
+
+Streams a generated NDJSON body of distinct prompts to /chat/batch
+against the mock upstream and times the NDJSON results, once per
+concurrency cap (and once through the mocked Message Batches API with
+--message-batches).
+
+    python -m bench.batch_jobs --items 500 --concurrency 4 16 32
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator
+
+import httpx
+
+from .concurrency import BENCH_ADMISSION, free_port, start_server, stop_server
+
+# Status poll interval for mode=batches jobs
+POLL_SECONDS = 0.5
+
+# Batch jobs need a signed-in caller: the server verifies tokens with this secret
+JWT_SECRET = "bench-jwt-secret"
+
+
+def bench_token(sub: str = "bench") -> str:
+    """An HS256 access token for JWT_SECRET"""
+    def encode(data: Dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    signing_input = f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode({'sub': sub, 'exp': time.time() + 3600})}"
+    signature = hmac.new(JWT_SECRET.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+HEADERS = {"Authorization": f"Bearer {bench_token()}"}
+
+
+def ndjson_body(items: int, run: str) -> Iterator[bytes]:
+    """Request lines produced lazily, like a large file upload"""
+    for i in range(items):
+        yield (json.dumps({"id": f"{run}-{i}", "message": f"batch {run} {i}"}) + "\n").encode()
+
+
+def result_lines(response: httpx.Response) -> Iterator[Dict]:
+    for line in response.iter_lines():
+        if line:
+            yield json.loads(line)
+
+
+def batch_results(base_url: str, batch_id: str) -> Iterator[Dict]:
+    """Poll GET /chat/batch/{batch_id} until the batch ends, then read its results"""
+    while True:
+        with httpx.stream("GET", f"{base_url}/chat/batch/{batch_id}", headers=HEADERS, timeout=None) as response:
+            if response.headers["content-type"].startswith("application/x-ndjson"):
+                yield from result_lines(response)
+                return
+        time.sleep(POLL_SECONDS)
+
+
+def run_job(base_url: str, items: int, run: str, params: Dict[str, str]) -> Dict[str, float]:
+    """Send one batch job and time its results (collected by batch id for mode=batches)"""
+    started = time.perf_counter()
+    first = None
+    ok = errors = 0
+    batch_ids = []
+
+    def count(result: Dict):
+        nonlocal first, ok, errors
+        if first is None:
+            first = time.perf_counter()
+        if result["status"] == "ok":
+            ok += 1
+        else:
+            errors += 1
+
+    with httpx.stream("POST", f"{base_url}/chat/batch", params=params, headers=HEADERS,
+                      content=ndjson_body(items, run), timeout=None) as response:
+        for result in result_lines(response):
+            if "batch_id" in result:
+                batch_ids.append(result["batch_id"])
+            else:
+                count(result)
+    for batch_id in batch_ids:
+        for result in batch_results(base_url, batch_id):
+            count(result)
+    wall = time.perf_counter() - started
+    return {
+        "ok": ok,
+        "errors": errors,
+        "first_result_ms": (first - started) * 1000 if first else 0.0,
+        "wall_s": wall,
+        "items_per_s": ok / wall if wall else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="/chat/batch throughput benchmark")
+    parser.add_argument("--items", type=int, default=500, help="Requests per batch job")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 32], help="Caps to compare")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens per mock response")
+    parser.add_argument("--token-latency-ms", type=float, default=10.0, help="Mock inter-token latency")
+    parser.add_argument("--message-batches", action="store_true", help="Also run mode=batches")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.update(BENCH_ADMISSION)
+    env.update({
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+        "BATCH_MAX_CONCURRENCY": str(max(args.concurrency)),
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+    })
+
+    mock = start_server("bench.mock_upstream:app", mock_port, env)
+    server = start_server("main:app", port, env)
+    rows = []
+    try:
+        for cap in args.concurrency:
+            rows.append((f"direct x{cap}", run_job(base_url, args.items, f"c{cap}", {"concurrency": str(cap)})))
+        if args.message_batches:
+            rows.append(("message batches", run_job(base_url, args.items, "mb", {"mode": "batches"})))
+    finally:
+        stop_server(server)
+        stop_server(mock)
+
+    columns = ["ok", "errors", "first_result_ms", "wall_s", "items_per_s"]
+    print(f"{'run':>16}  " + "  ".join(f"{c:>16}" for c in columns))
+    for name, row in rows:
+        print(f"{name:>16}  " + "  ".join(
+            f"{row[c]:>16.2f}" if isinstance(row[c], float) else f"{row[c]:>16}" for c in columns
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
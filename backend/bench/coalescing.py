@@ -0,0 +1,96 @@
+"""
+SSE coalescing benchmark: frames per response and CPU per stream
+
+Runs the async /chat app once per coalescing window against the mock
+upstream and reads the worker's /metrics before and after each run.
+
+    python -m bench.coalescing --streams 100 --windows 0 16 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from .concurrency import BENCH_ADMISSION, free_port, run_streams, start_server, stop_server
+
+
+def fetch_metrics(base_url: str) -> Dict:
+    """Read the worker's /metrics document"""
+    return httpx.get(f"{base_url}/metrics", timeout=5).json()
+
+
+def run_window(window_ms: float, streams: int, env: Dict[str, str]) -> Dict[str, float]:
+    """Benchmark one coalescing window and return a report row"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server("main:app", port, dict(env, SSE_COALESCE_WINDOW_MS=str(window_ms)))
+    try:
+        before = fetch_metrics(base_url)
+        started = time.perf_counter()
+        timings = asyncio.run(run_streams(base_url, streams))
+        wall = time.perf_counter() - started
+        after = fetch_metrics(base_url)
+    finally:
+        stop_server(server)
+
+    served = after["streams"]["streams_total"] - before["streams"]["streams_total"]
+    frames = after["streams"]["chunks_total"] - before["streams"]["chunks_total"]
+    cpu = after["process"]["cpu_seconds"] - before["process"]["cpu_seconds"]
+    ttfts = [t.ttft for t in timings if t.ttft is not None] or [0.0]
+    return {
+        "window_ms": window_ms,
+        "streams": served,
+        "frames_per_response": frames / served if served else 0.0,
+        "cpu_ms_per_stream": cpu * 1000 / served if served else 0.0,
+        "ttft_p50_ms": statistics.median(ttfts) * 1000,
+        "wall_s": wall,
+    }
+
+
+def print_report(rows: List[Dict[str, float]]):
+    """Print one row per coalescing window"""
+    columns = ["window_ms", "streams", "frames_per_response", "cpu_ms_per_stream", "ttft_p50_ms", "wall_s"]
+    print("  ".join(f"{c:>20}" for c in columns))
+    for row in rows:
+        print("  ".join(
+            f"{row[c]:>20.2f}" if isinstance(row[c], float) else f"{row[c]:>20}" for c in columns
+        ))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="SSE coalescing on/off benchmark")
+    parser.add_argument("--streams", type=int, default=100, help="Concurrent streams per window")
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens per mock response")
+    parser.add_argument("--token-latency-ms", type=float, default=5.0, help="Mock inter-token latency")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 16, 50],
+                        help="Coalescing windows in ms (0 disables coalescing)")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    env = dict(os.environ)
+    env.update(BENCH_ADMISSION)
+    env.update({
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+    })
+
+    mock = start_server("bench.mock_upstream:app", mock_port, env)
+    try:
+        rows = [run_window(window, args.streams, env) for window in args.windows]
+    finally:
+        stop_server(mock)
+
+    print_report(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Concurrency benchmark: streams per worker, sync vs async /chat
+
+Starts the mock upstream plus one single-worker uvicorn process per target,
+opens N simultaneous /chat streams against each and reports how many
+streams the worker actually served at once.
+
+    python -m bench.concurrency --streams 200 --tokens 100 --token-latency-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+TARGETS = {
+    "sync": "bench.legacy_app:app",
+    "async": "main:app",
+}
+
+
+# Every benchmark stream comes from one client address; lift the per-client caps
+BENCH_ADMISSION = {
+    "ADMISSION_MAX_CONCURRENT": "100000",
+    "ADMISSION_MAX_PER_CLIENT": "100000",
+}
+
+
+@dataclass
+class StreamTiming:
+    """Client-side timing of one /chat stream"""
+    started: float
+    first_byte: Optional[float] = None
+    finished: Optional[float] = None
+    chunks: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return None if self.first_byte is None else self.first_byte - self.started
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.finished is None else self.finished - self.started
+
+
+def free_port() -> int:
+    """Ask the OS for an unused TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(
+    app_path: str, port: int, env: Dict[str, str], workers: int = 1, extra_args: Sequence[str] = ()
+) -> subprocess.Popen:
+    """Start a uvicorn process and wait until /health answers"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path,
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning", *extra_args],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{app_path} exited with code {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{app_path} did not become healthy on port {port}")
+
+
+def stop_server(process: subprocess.Popen):
+    """Terminate a benchmark server process"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def open_stream(client: httpx.AsyncClient, url: str, timing: StreamTiming, prompt: str = "benchmark"):
+    """Consume one /chat stream, recording first-byte and completion times"""
+    try:
+        async with client.stream("POST", url, json={"message": prompt}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                timing.error = f"HTTP {response.status_code}"
+            else:
+                async for chunk in response.aiter_bytes():
+                    if timing.first_byte is None:
+                        timing.first_byte = time.perf_counter()
+                        if b"event: error" in chunk or b"data: Error" in chunk:
+                            timing.error = "stream error"
+                    timing.chunks += 1
+    except httpx.HTTPError as e:
+        timing.error = str(e)
+    timing.finished = time.perf_counter()
+
+
+async def run_streams(base_url: str, streams: int) -> List[StreamTiming]:
+    """Open `streams` concurrent /chat streams and wait for all of them"""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        timings = [StreamTiming(started=time.perf_counter()) for _ in range(streams)]
+        # Distinct prompts so single-flight and the response cache don't merge streams
+        await asyncio.gather(*(
+            open_stream(client, f"{base_url}/chat", t, f"benchmark {i}") for i, t in enumerate(timings)
+        ))
+    return timings
+
+
+def peak_concurrency(timings: List[StreamTiming]) -> int:
+    """Largest number of streams that were delivering bytes at the same time"""
+    events = []
+    for t in timings:
+        if t.first_byte is not None and t.finished is not None:
+            events.append((t.first_byte, 1))
+            events.append((t.finished, -1))
+    peak = active = 0
+    for _, delta in sorted(events):
+        active += delta
+        peak = max(peak, active)
+    return peak
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, timings: List[StreamTiming], wall: float, ideal: float) -> Dict[str, float]:
+    """Aggregate client timings into a report row
+
+    `ideal` is the stream duration the mock upstream alone would produce;
+    `stretch` shows how much the worker slowed streams down beyond that.
+    """
+    ok = [t for t in timings if t.error is None and t.ttft is not None]
+    ttfts = [t.ttft for t in ok] or [0.0]
+    durations = [t.duration for t in ok] or [0.0]
+    return {
+        "target": name,
+        "streams": len(timings),
+        "errors": len(timings) - len(ok),
+        "peak_concurrent": peak_concurrency(ok),
+        "wall_s": wall,
+        "streams_per_s": len(ok) / wall if wall else 0.0,
+        "ttft_p50_ms": statistics.median(ttfts) * 1000,
+        "ttft_p95_ms": percentile(ttfts, 95) * 1000,
+        "duration_p50_s": statistics.median(durations),
+        "stretch_p50": statistics.median(durations) / ideal if ideal else 0.0,
+    }
+
+
+def print_report(rows: List[Dict[str, float]]):
+    """Print a side-by-side table of benchmark results"""
+    columns = ["target", "streams", "errors", "peak_concurrent", "wall_s",
+               "streams_per_s", "ttft_p50_ms", "ttft_p95_ms", "duration_p50_s", "stretch_p50"]
+    print("  ".join(f"{c:>15}" for c in columns))
+    for row in rows:
+        cells = []
+        for c in columns:
+            value = row[c]
+            cells.append(f"{value:>15.2f}" if isinstance(value, float) else f"{value:>15}")
+        print("  ".join(cells))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sync vs async /chat concurrency benchmark")
+    parser.add_argument("--streams", type=int, default=200, help="Concurrent streams per target")
+    parser.add_argument("--tokens", type=int, default=100, help="Tokens per mock response")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="Mock time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=20.0, help="Mock inter-token latency")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    env = dict(os.environ)
+    env.update(BENCH_ADMISSION)
+    env.update({
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_TTFT_MS": str(args.ttft_ms),
+        "MOCK_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+    })
+
+    ideal = (args.ttft_ms + args.token_latency_ms * max(args.tokens - 1, 0)) / 1000
+    mock = start_server("bench.mock_upstream:app", mock_port, env)
+    rows = []
+    try:
+        for name in args.targets:
+            port = free_port()
+            server = start_server(TARGETS[name], port, env)
+            try:
+                started = time.perf_counter()
+                timings = asyncio.run(run_streams(f"http://127.0.0.1:{port}", args.streams))
+                rows.append(summarize(name, timings, time.perf_counter() - started, ideal))
+            finally:
+                stop_server(server)
+    finally:
+        stop_server(mock)
+
+    print_report(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
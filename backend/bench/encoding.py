@@ -0,0 +1,121 @@
+"""
+Stream encoding benchmark: serialization CPU per token
+
+Encodes the same sequence of text deltas through the previous /chat
+path (json.dumps + f-strings per frame, then str.encode as Starlette
+does) and through stream_encoding with the stdlib JSON encoder, with
+orjson, as NDJSON, and with a reader that is a few events behind so
+frames are batched into one chunk. Runs in-process, no server needed.
+
+    python -m bench.encoding --tokens 200000 --batch 8
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+import stream_encoding
+from stream_encoding import NDJSONEncoder, SSEEncoder, delta_event
+
+STREAM_ID = "0123456789abcdef0123456789abcdef"
+WORDS = [
+    "the", "model", "streams", "tokens", "to", "a", "client", "##", "**bold**", "-", "é", "naïve",
+    "日本語", "\"quoted\"", "back\\slash", "\n", "\n\n", "code:", "`x = 1`", "🙂", "and", "of",
+]
+
+
+def make_deltas(count: int, seed: int = 1) -> List[str]:
+    """Deltas shaped like upstream text chunks: 1-3 words with spacing"""
+    rng = random.Random(seed)
+    return ["".join(rng.choice(WORDS) + " " for _ in range(rng.randint(1, 3))) for _ in range(count)]
+
+
+def legacy(deltas: List[str], batch: int) -> int:
+    """Previous path: one str frame per delta, id prefixed at read time, encoded per chunk"""
+    size = 0
+    for seq, text in enumerate(deltas, 1):
+        frame = f"data: {json.dumps(text)}\n\n"
+        chunk = f"id: {STREAM_ID}:{seq}\n{frame}".encode("utf-8")
+        size += len(chunk)
+    return size
+
+
+def encoder_path(encoder_class: type, use_orjson: bool) -> Callable[[List[str], int], int]:
+    """stream_encoding: payload encoded at publish, framed at read, `batch` events per chunk"""
+    def run(deltas: List[str], batch: int) -> int:
+        saved = stream_encoding.orjson
+        if not use_orjson:
+            stream_encoding.orjson = None
+        try:
+            encoder = encoder_class()
+            prefix = f"{STREAM_ID}:".encode()
+            pending = []
+            size = 0
+            for seq, text in enumerate(deltas, 1):
+                event = delta_event(text)
+                if batch == 1:
+                    size += len(encoder.frame(b"%s%d" % (prefix, seq), event))
+                    continue
+                pending.append((b"%s%d" % (prefix, seq), event))
+                if len(pending) == batch:
+                    size += len(encoder.frames(pending))
+                    pending.clear()
+            return size + (len(encoder.frames(pending)) if pending else 0)
+        finally:
+            stream_encoding.orjson = saved
+    return run
+
+
+def measure(run: Callable[[List[str], int], int], deltas: List[str], batch: int, repeats: int) -> Dict[str, float]:
+    """Best-of-`repeats` CPU time per token"""
+    best = float("inf")
+    size = 0
+    for _ in range(repeats):
+        # As timeit does: keep collections of the retained events out of the numbers
+        gc.disable()
+        try:
+            started = time.process_time_ns()
+            size = run(deltas, batch)
+            best = min(best, time.process_time_ns() - started)
+        finally:
+            gc.enable()
+    return {"ns_per_token": best / len(deltas), "bytes_per_token": size / len(deltas)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serialization CPU per token, previous vs new stream encoding")
+    parser.add_argument("--tokens", type=int, default=200_000, help="Deltas to encode per run")
+    parser.add_argument("--batch", type=int, default=8, help="Events per chunk for the batched reader rows")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per path; the fastest is reported")
+    args = parser.parse_args()
+
+    deltas = make_deltas(args.tokens)
+    paths = [
+        ("legacy sse (json + f-strings)", legacy, 1),
+        ("sse, stdlib json", encoder_path(SSEEncoder, use_orjson=False), 1),
+    ]
+    if stream_encoding.orjson is not None:
+        paths += [
+            ("sse, orjson", encoder_path(SSEEncoder, use_orjson=True), 1),
+            ("ndjson, orjson", encoder_path(NDJSONEncoder, use_orjson=True), 1),
+            (f"sse, orjson, {args.batch}/chunk", encoder_path(SSEEncoder, use_orjson=True), args.batch),
+        ]
+    else:
+        print("orjson is not installed; showing the stdlib encoder only")
+        paths.append((f"sse, stdlib json, {args.batch}/chunk", encoder_path(SSEEncoder, use_orjson=False), args.batch))
+
+    baseline = None
+    print(f"{'path':<34}{'ns/token':>10}{'bytes/token':>13}{'vs legacy':>11}")
+    for name, run, batch in paths:
+        row = measure(run, deltas, batch, args.repeats)
+        baseline = baseline or row["ns_per_token"]
+        print(f"{name:<34}{row['ns_per_token']:>10.0f}{row['bytes_per_token']:>13.1f}{baseline / row['ns_per_token']:>10.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
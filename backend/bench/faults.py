@@ -0,0 +1,102 @@
+"""
+Upstream fault benchmark: success rate and TTFT under injected failures
+
+Runs the async /chat app against the mock upstream with overload errors,
+in-stream errors and slow first tokens injected, and reports how many
+streams completed, the client-side TTFT percentiles and the worker's
+retry/hedge/circuit counters per model from /metrics.
+
+    python -m bench.faults --streams 50 --error-rate 0.2 --slow-rate 0.05 --hedge
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import Dict
+
+import httpx
+
+from .concurrency import BENCH_ADMISSION, free_port, percentile, run_streams, start_server, stop_server
+
+
+def run_scenario(args: argparse.Namespace, env: Dict[str, str]) -> Dict:
+    """Drive the waves of streams and collect client and worker numbers"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server("main:app", port, env)
+    try:
+        timings = []
+        # Later waves run with the TTFT history that hedging needs
+        for _ in range(args.waves):
+            timings.extend(asyncio.run(run_streams(base_url, args.streams)))
+        metrics = httpx.get(f"{base_url}/metrics", timeout=5).json()
+    finally:
+        stop_server(server)
+
+    completed = [t for t in timings if t.error is None and t.ttft is not None]
+    ttfts = [t.ttft * 1000 for t in completed]
+    return {
+        "streams": len(timings),
+        "completed": len(completed),
+        "ttft_ms": {p: percentile(ttfts, p) for p in (50, 95, 99)},
+        "upstream": metrics["upstream"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Retry/hedge/circuit benchmark under injected faults")
+    parser.add_argument("--streams", type=int, default=50, help="Concurrent streams per wave")
+    parser.add_argument("--waves", type=int, default=3, help="Sequential batches of streams")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens per mock response")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Share of 529 responses")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0,
+                        help="Share of in-stream overloaded errors before the first token")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of slow first tokens")
+    parser.add_argument("--slow-ttft-ms", type=float, default=3000.0, help="TTFT of slow responses")
+    parser.add_argument("--hedge", action="store_true", help="Enable TTFT hedging")
+    parser.add_argument("--max-attempts", type=int, default=3, help="UPSTREAM_MAX_ATTEMPTS")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    env = dict(os.environ)
+    env.update(BENCH_ADMISSION)
+    env.update({
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_ERROR_RATE": str(args.error_rate),
+        "MOCK_STREAM_ERROR_RATE": str(args.stream_error_rate),
+        "MOCK_SLOW_RATE": str(args.slow_rate),
+        "MOCK_SLOW_TTFT_MS": str(args.slow_ttft_ms),
+        "UPSTREAM_MAX_ATTEMPTS": str(args.max_attempts),
+        "UPSTREAM_HEDGE": "true" if args.hedge else "false",
+        # Waves repeat the same prompts; every stream should reach upstream
+        "RESPONSE_CACHE": "false",
+    })
+
+    mock = start_server("bench.mock_upstream:app", mock_port, env)
+    try:
+        result = run_scenario(args, env)
+        upstream_stats = httpx.get(f"http://127.0.0.1:{mock_port}/stats", timeout=5).json()
+    finally:
+        stop_server(mock)
+
+    print(f"completed {result['completed']}/{result['streams']} streams")
+    print("ttft_ms " + "  ".join(
+        f"p{p}={v:.1f}" if v is not None else f"p{p}=n/a" for p, v in result["ttft_ms"].items()
+    ))
+    print(f"mock upstream: {upstream_stats['requests']} requests, {upstream_stats['errors']} injected errors")
+    for model, upstream in result["upstream"].items():
+        if not upstream["attempts"]:
+            continue
+        print(
+            f"worker ({model}): attempts={upstream['attempts']} retries={upstream['retries']} "
+            f"hedges={upstream['hedges']} hedge_wins={upstream['hedge_wins']} "
+            f"circuit={upstream['circuit']['state']} opened={upstream['circuit']['opened_total']}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
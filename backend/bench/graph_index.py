@@ -0,0 +1,165 @@
+"""
+Graph index benchmark: in-memory CSR queries vs per-hop store lookups
+
+Writes clustered workspace graphs (bench.graph_layout.clustered_graph) to
+a SQLite graph store, loads them into a graph_index.WorkspaceIndex, and
+times the same questions both ways over random nodes:
+
+- top 10 neighbors by relation weight;
+- 2-hop neighborhood;
+- shortest path between two random nodes (breadth-first).
+
+The store side asks `graph_edges` one hop at a time through its source and
+target indexes, like a client walking the graph would. Also reports the
+index load time and size, and the time to apply 1% new edges
+incrementally. Runs in-process, no server needed.
+
+    python -m bench.graph_index --sizes 1000 10000 50000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from bench.graph_layout import clustered_graph
+from graph_index import WorkspaceIndex
+from graph_store import GraphEdge, GraphNode, MessageGraph, SQLiteGraphStore
+
+WORKSPACE = "bench"
+
+
+def hop(store: SQLiteGraphStore, frontier: List[str]) -> Dict[str, float]:
+    """Neighbors of a set of nodes with summed weights, from graph_edges"""
+    found: Dict[str, float] = {}
+    for start in range(0, len(frontier), 400):
+        chunk = frontier[start:start + 400]
+        marks = ", ".join("?" * len(chunk))
+        rows = store.conn.execute(
+            f"""
+            SELECT target_node_id, weight FROM graph_edges WHERE source_node_id IN ({marks})
+            UNION ALL
+            SELECT source_node_id, weight FROM graph_edges WHERE target_node_id IN ({marks})
+            """,
+            chunk + chunk,
+        )
+        for node, weight in rows:
+            found[node] = found.get(node, 0.0) + weight
+    return found
+
+
+def store_top(store, node: str, k: int = 10):
+    found = hop(store, [node])
+    found.pop(node, None)
+    return sorted(found.items(), key=lambda item: -item[1])[:k]
+
+
+def store_neighborhood(store, node: str, hops: int = 2):
+    seen, frontier = {node}, [node]
+    for _ in range(hops):
+        frontier = [n for n in hop(store, frontier) if n not in seen]
+        seen.update(frontier)
+    return seen
+
+
+def store_path(store, source: str, target: str):
+    parent, frontier = {source: source}, [source]
+    while frontier and target not in parent:
+        following = []
+        for start in range(0, len(frontier), 400):
+            chunk = frontier[start:start + 400]
+            marks = ", ".join("?" * len(chunk))
+            rows = store.conn.execute(
+                f"""
+                SELECT source_node_id, target_node_id FROM graph_edges WHERE source_node_id IN ({marks})
+                UNION ALL
+                SELECT target_node_id, source_node_id FROM graph_edges WHERE target_node_id IN ({marks})
+                """,
+                chunk + chunk,
+            )
+            for here, there in rows:
+                if there not in parent:
+                    parent[there] = here
+                    following.append(there)
+        frontier = following
+    return target in parent
+
+
+def median_us(function, arguments) -> float:
+    times = []
+    for args in arguments:
+        started = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Graph neighborhood queries: in-memory index vs store lookups")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000], help="Nodes per graph")
+    parser.add_argument("--queries", type=int, default=200, help="Random queries of each kind")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7}{'load s':>8}{'MB':>6}{'+1% ms':>8}  {'query':<10}{'index us':>10}{'store us':>11}")
+    for n in args.sizes:
+        rng = np.random.default_rng(n)
+        pairs = clustered_graph(n, rng)
+        ids = [f"node-{i}" for i in range(n)]
+        weights = rng.integers(1, 5, len(pairs)).astype(float)
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteGraphStore(os.path.join(directory, "graph.sqlite3"))
+            store.apply([MessageGraph(
+                "m", WORKSPACE,
+                [GraphNode(i, i, "concept", 1) for i in ids],
+                [GraphEdge(f"edge-{k}", ids[a], ids[b], "relates_to", w) for k, ((a, b), w) in enumerate(zip(pairs, weights))],
+            )])
+
+            started = time.perf_counter()
+            index = WorkspaceIndex(WORKSPACE, store.changes(WORKSPACE, None, 3600))
+            load = time.perf_counter() - started
+
+            added = max(1, len(pairs) // 100)
+            new = rng.integers(0, n, (added, 2))
+            delta = {
+                "version": index.version + 1, "full": False,
+                "nodes": {"inserted": [], "updated": [], "deleted": []},
+                "edges": {
+                    "inserted": [
+                        {"id": f"new-{k}", "source_node_id": ids[a], "target_node_id": ids[b], "weight": 1.0}
+                        for k, (a, b) in enumerate(new)
+                    ],
+                    "updated": [], "deleted": [],
+                },
+            }
+            started = time.perf_counter()
+            index.apply(delta)
+            incremental = time.perf_counter() - started
+            store.apply([MessageGraph("m2", WORKSPACE, [], [
+                GraphEdge(row["id"], row["source_node_id"], row["target_node_id"], "relates_to", 1.0)
+                for row in delta["edges"]["inserted"]
+            ])])
+
+            nodes = [(ids[i],) for i in rng.integers(0, n, args.queries)]
+            routes = [(ids[a], ids[b]) for a, b in rng.integers(0, n, (args.queries, 2))]
+            rows = [
+                ("top 10", median_us(lambda x: index.top_neighbors(x, 10), nodes),
+                 median_us(lambda x: store_top(store, x), nodes)),
+                ("2-hop", median_us(lambda x: index.neighborhood(x, 2, n), nodes),
+                 median_us(lambda x: store_neighborhood(store, x), nodes)),
+                ("path", median_us(index.shortest_path, routes),
+                 median_us(lambda a, b: store_path(store, a, b), routes)),
+            ]
+            store.close()
+        for i, (name, fast, slow) in enumerate(rows):
+            prefix = f"{n:>7}{load:>8.2f}{index.memory / 1e6:>6.1f}{incremental * 1000:>8.1f}" if i == 0 else " " * 29
+            print(f"{prefix}  {name:<10}{fast:>10.0f}{slow:>11.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Graph layout benchmark: full and incremental layouts by graph size
+
+Builds clustered graphs shaped like workspace concept graphs (groups of
+related concepts, about two edges per node, a few links across groups),
+lays each out from scratch, then adds 1% new nodes and runs the
+warm-started incremental layout. Also times the bulk position write to a
+SQLite graph store. Runs in-process, no server needed.
+
+    python -m bench.graph_layout --sizes 1000 10000 50000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from graph_layout import force_layout
+from graph_store import GraphNode, MessageGraph, SQLiteGraphStore
+
+
+def clustered_graph(n: int, rng: np.random.Generator, group_size: int = 50, local: float = 0.9) -> np.ndarray:
+    """About 2n edges, `local` of them inside a node's group"""
+    groups = max(1, n // group_size)
+    group = rng.integers(0, groups, n)
+    order = np.argsort(group, kind="stable")
+    starts = np.searchsorted(group[order], np.arange(groups))
+    sizes = np.bincount(group, minlength=groups)
+    source = rng.integers(0, n, 2 * n)
+    target = rng.integers(0, n, 2 * n)
+    inside = (rng.random(2 * n) < local) & (sizes[group[source]] > 1)
+    pick = (rng.random(inside.sum()) * sizes[group[source[inside]]]).astype(np.int64)
+    target[inside] = order[starts[group[source[inside]]] + pick]
+    edges = np.stack([source, target], axis=1)
+    return edges[edges[:, 0] != edges[:, 1]]
+
+
+def edge_stretch(positions: np.ndarray, edges: np.ndarray, rng: np.random.Generator) -> float:
+    """Mean edge length over mean distance between random pairs (lower is tighter)"""
+    lengths = np.linalg.norm(positions[edges[:, 0]] - positions[edges[:, 1]], axis=1)
+    pairs = rng.integers(0, len(positions), (20000, 2))
+    spread = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    return float(lengths.mean() / spread.mean())
+
+
+def write_seconds(positions: np.ndarray) -> float:
+    """Time of one bulk update_positions for every node of a SQLite store"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteGraphStore(os.path.join(directory, "graph.sqlite3"))
+        ids = [f"node-{i}" for i in range(len(positions))]
+        store.apply([MessageGraph("m", "ws", [GraphNode(i, i, "concept", 1) for i in ids], [])])
+        started = time.perf_counter()
+        store.update_positions("ws", ids, positions)
+        seconds = time.perf_counter() - started
+        store.close()
+    return seconds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Force-directed 3D layout time by graph size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000], help="Nodes per graph")
+    parser.add_argument("--iterations", type=int, default=50, help="Iterations of a full layout")
+    parser.add_argument("--incremental-iterations", type=int, default=20, help="Iterations of an incremental layout")
+    parser.add_argument("--theta", type=float, default=1.5, help="Barnes-Hut opening threshold")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7}{'edges':>8}{'full s':>9}{'stretch':>9}{'+1% s':>8}{'stretch':>9}{'moved':>8}{'write s':>9}")
+    for n in args.sizes:
+        rng = np.random.default_rng(n)
+        edges = clustered_graph(n, rng)
+        full = force_layout(np.zeros((n, 3)), edges, iterations=args.iterations, theta=args.theta)
+
+        # 1% new nodes, each related to two existing concepts of one group
+        added = max(1, n // 100)
+        anchors = rng.integers(0, len(edges), added)
+        new_edges = np.concatenate([
+            np.stack([np.arange(n, n + added), edges[anchors, 0]], axis=1),
+            np.stack([np.arange(n, n + added), edges[anchors, 1]], axis=1),
+        ])
+        all_edges = np.concatenate([edges, new_edges])
+        placed = np.concatenate([np.ones(n, dtype=bool), np.zeros(added, dtype=bool)])
+        warm = force_layout(
+            np.concatenate([full.positions, np.zeros((added, 3))]), all_edges, placed=placed,
+            incremental_iterations=args.incremental_iterations, theta=args.theta,
+        )
+        # How far the existing nodes moved, in edge lengths
+        moved = np.median(np.linalg.norm(warm.positions[:n] - full.positions, axis=1))
+        print(
+            f"{n:>7}{len(edges):>8}{full.seconds:>9.2f}{edge_stretch(full.positions, edges, rng):>9.3f}"
+            f"{warm.seconds:>8.2f}{edge_stretch(warm.positions, all_edges, rng):>9.3f}{moved:>8.2f}"
+            f"{write_seconds(warm.positions):>9.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Graph payload benchmark: JSON rows vs the columnar binary format
+
+Builds workspace graphs of increasing size (rows shaped like the
+graph_nodes / graph_edges answer of GET /workspaces/{id}/graph) and
+compares, for the JSON snapshot and for graph_binary:
+
+- bytes on the wire, raw and gzip-compressed;
+- encode time on the server;
+- decode time into render-ready arrays: JSON is parsed and then copied
+  node by node into float32 xyz / uint32 edge arrays (what the client did
+  to feed Three.js), the binary format is only viewed in place.
+
+Runs in-process, no server needed.
+
+    python -m bench.graph_payload --sizes 1000 10000 50000
+"""
+
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from graph_binary import decode_graph, encode_graph
+from stream_encoding import dumps
+
+
+def make_graph(n: int, seed: int = 1) -> Tuple[List[Dict], List[Dict]]:
+    """n nodes with stored positions and about 2n edges, as store rows"""
+    rng = random.Random(seed)
+    nodes = [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "workspace_id": "3f1c2a9e-6b1d-4c3e-9a7f-2d8e5b4c1a07",
+            "label": f"Concept {i}",
+            "type": "topic" if i % 20 == 0 else "concept",
+            "position_x": rng.uniform(-30, 30),
+            "position_y": rng.uniform(-30, 30),
+            "position_z": rng.uniform(-30, 30),
+            "color": "#3B82F6",
+            "size": 1.0,
+            "mentions_count": rng.randint(1, 40),
+            "importance": rng.random(),
+            "metadata": {},
+            "created_at": 1790000000.0 + i,
+            "version": 1,
+            "created_version": 1,
+        }
+        for i in range(n)
+    ]
+    edges = []
+    for i in range(2 * n):
+        source, target = rng.randrange(n), rng.randrange(n)
+        edges.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "workspace_id": nodes[0]["workspace_id"],
+            "source_node_id": nodes[source]["id"],
+            "target_node_id": nodes[target]["id"],
+            "weight": float(rng.randint(1, 5)),
+            "type": "relates_to",
+            "created_at": 1790000000.0 + i,
+            "version": 1,
+            "created_version": 1,
+        })
+    return nodes, edges
+
+
+def json_to_arrays(payload: bytes):
+    """Parse a JSON snapshot and fill render arrays from the rows"""
+    graph = json.loads(payload)
+    nodes, edges = graph["nodes"]["inserted"], graph["edges"]["inserted"]
+    positions = np.empty((len(nodes), 3), dtype=np.float32)
+    index = {}
+    for i, node in enumerate(nodes):
+        positions[i] = (node["position_x"], node["position_y"], node["position_z"])
+        index[node["id"]] = i
+    pairs = np.array([(index[e["source_node_id"]], index[e["target_node_id"]]) for e in edges], dtype=np.uint32)
+    return positions, pairs
+
+
+def best_ms(function: Callable, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Graph payload size and decode time: JSON vs binary")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000], help="Nodes per graph")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement; the fastest is reported")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7}{'format':>8}{'KB':>10}{'gzip KB':>10}{'encode ms':>11}{'decode ms':>11}")
+    for n in args.sizes:
+        nodes, edges = make_graph(n)
+        snapshot = {
+            "version": 1, "full": True,
+            "nodes": {"inserted": nodes, "updated": [], "deleted": []},
+            "edges": {"inserted": edges, "updated": [], "deleted": []},
+        }
+        as_json = dumps(snapshot)
+        as_binary = encode_graph(nodes, edges, 1)
+        rows = [
+            ("json", as_json, lambda: dumps(snapshot), lambda: json_to_arrays(as_json)),
+            ("binary", as_binary, lambda: encode_graph(nodes, edges, 1), lambda: decode_graph(as_binary)),
+        ]
+        for name, payload, encode, decode in rows:
+            print(
+                f"{n:>7}{name:>8}{len(payload) / 1024:>10.0f}{len(gzip.compress(payload, 6)) / 1024:>10.0f}"
+                f"{best_ms(encode, args.repeats):>11.1f}{best_ms(decode, args.repeats):>11.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Baseline /chat app using the synchronous Anthropic client
+
+Mirrors the pre-async streaming path (sync client, sync generator run by
+Starlette's threadpool) so the concurrency benchmark can compare both
+threading models against the same mock upstream.
+"""
+
+import json
+import os
+
+from anthropic import Anthropic
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+
+app = FastAPI(title="Zyron AI (legacy sync path)")
+client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY", "bench"))
+
+
+@app.get("/health")
+def health():
+    return {"status": "healthy"}
+
+
+@app.post("/chat")
+async def chat(message: dict):
+    user_message = message.get("message", "")
+
+    def generate():
+        try:
+            with client.messages.stream(
+                model="claude-sonnet-4-20250514",
+                max_tokens=1024,
+                messages=[{"role": "user", "content": user_message}],
+            ) as stream:
+                for text in stream.text_stream:
+                    yield f"data: {json.dumps(text)}\n\n"
+        except Exception as e:
+            yield f"data: Error: {str(e)}\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
@@ -0,0 +1,308 @@
+"""
+/chat load test: latency percentiles, throughput and server CPU/RSS
+
+Starts the mock upstream once, then the backend once per configuration,
+opens N concurrent SSE streams for each of R rounds and prints one row
+per configuration. Everything runs on localhost, so configurations can be
+compared side by side offline.
+
+A configuration is `name:key=value,...`. The keys `workers`, `loop` and
+`http` are passed to uvicorn; anything else is set as an environment
+variable of the backend process.
+
+    python -m bench.load --streams 100 --rounds 3 \\
+        --config baseline: \\
+        --config no-coalesce:SSE_COALESCE_WINDOW_MS=0 \\
+        --config 2-workers:workers=2 \\
+        --config uvloop:loop=uvloop,http=httptools
+
+Inter-token latency is measured between SSE frames as they reach the
+client, so with coalescing on one gap can span several tokens.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .concurrency import BENCH_ADMISSION, free_port, percentile, start_server, stop_server
+
+SERVER_OPTIONS = ("workers", "loop", "http")
+
+
+@dataclass
+class StreamTrace:
+    """Arrival time of every SSE frame of one /chat stream"""
+    started: float
+    frames: List[float] = field(default_factory=list)
+    finished: Optional[float] = None
+    bytes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.frames[0] - self.started if self.frames else None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.finished is None else self.finished - self.started
+
+    @property
+    def gaps(self) -> List[float]:
+        return [b - a for a, b in zip(self.frames, self.frames[1:])]
+
+
+@dataclass
+class Config:
+    """One backend configuration under test"""
+    name: str
+    env: Dict[str, str] = field(default_factory=dict)
+    workers: int = 1
+    uvicorn_args: List[str] = field(default_factory=list)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Config":
+        name, _, settings = spec.partition(":")
+        config = cls(name=name or "default")
+        for item in filter(None, settings.split(",")):
+            key, _, value = item.partition("=")
+            if key == "workers":
+                config.workers = int(value)
+            elif key in SERVER_OPTIONS:
+                config.uvicorn_args += [f"--{key}", value]
+            else:
+                config.env[key] = value
+        return config
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a process and its children from /proc
+
+    Linux only; on other platforms the CPU and RSS columns stay empty.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._cpu_start: Optional[float] = None
+        self.cpu_seconds: Optional[float] = None
+
+    @staticmethod
+    def _stat(pid: int) -> Optional[Tuple[int, float, int]]:
+        """(parent pid, cpu seconds, rss bytes) of one process"""
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # The command name may contain spaces; fields resume after ')'
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+        return int(fields[1]), cpu, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+    def _tree(self) -> Tuple[float, int]:
+        """Total CPU seconds and RSS of the process tree"""
+        stats = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                stat = self._stat(int(entry))
+                if stat is not None:
+                    stats[int(entry)] = stat
+        tree = {self.pid}
+        grew = True
+        while grew:
+            grew = False
+            for pid, (ppid, _, _) in stats.items():
+                if ppid in tree and pid not in tree:
+                    tree.add(pid)
+                    grew = True
+        cpu = sum(stats[pid][1] for pid in tree if pid in stats)
+        rss = sum(stats[pid][2] for pid in tree if pid in stats)
+        return cpu, rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._tree()[1])
+
+    def start(self):
+        if not os.path.isdir("/proc"):
+            return
+        self._cpu_start, self.peak_rss = self._tree()
+        self._thread.start()
+
+    def stop(self):
+        if self._cpu_start is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        cpu, rss = self._tree()
+        self.peak_rss = max(self.peak_rss, rss)
+        self.cpu_seconds = cpu - self._cpu_start
+
+
+async def trace_stream(client: httpx.AsyncClient, url: str, trace: StreamTrace, prompt: str):
+    """Consume one /chat stream, timestamping each SSE frame"""
+    try:
+        async with client.stream("POST", url, json={"message": prompt}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                trace.error = f"HTTP {response.status_code}"
+            else:
+                pending = b""
+                async for chunk in response.aiter_bytes():
+                    now = time.perf_counter()
+                    trace.bytes += len(chunk)
+                    pending += chunk
+                    *frames, pending = pending.split(b"\n\n")
+                    for frame in frames:
+                        if b"event: error" in frame:
+                            trace.error = "stream error"
+                        elif b"event: delta" in frame:
+                            trace.frames.append(now)
+    except httpx.HTTPError as e:
+        trace.error = str(e) or type(e).__name__
+    trace.finished = time.perf_counter()
+
+
+async def run_round(base_url: str, streams: int, round_index: int) -> List[StreamTrace]:
+    """Open `streams` concurrent /chat streams with distinct prompts"""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        traces = [StreamTrace(started=time.perf_counter()) for _ in range(streams)]
+        await asyncio.gather(*(
+            trace_stream(client, f"{base_url}/chat", trace, f"load {round_index}-{i}")
+            for i, trace in enumerate(traces)
+        ))
+    return traces
+
+
+def summarize(config: Config, traces: List[StreamTrace], wall: float, sampler: ProcessSampler) -> Dict:
+    """Aggregate traces of one configuration into a report row"""
+    ok = [t for t in traces if t.error is None and t.ttft is not None]
+
+    def pcts(values: List[float]) -> Dict[str, Optional[float]]:
+        return {f"p{p}": percentile(values, p) * 1000 if values else None for p in (50, 95, 99)}
+
+    return {
+        "config": config.name,
+        "streams": len(traces),
+        "errors": len(traces) - len(ok),
+        "streams_per_s": len(ok) / wall if wall else 0.0,
+        "ttft_ms": pcts([t.ttft for t in ok]),
+        "itl_ms": pcts([gap for t in ok for gap in t.gaps]),
+        "e2e_ms": pcts([t.duration for t in ok]),
+        "frames_per_stream": sum(len(t.frames) for t in ok) / len(ok) if ok else 0.0,
+        "server_cpu_s": sampler.cpu_seconds,
+        "server_rss_peak_mb": sampler.peak_rss / 2 ** 20 if sampler.peak_rss else None,
+    }
+
+
+def run_config(config: Config, base_env: Dict[str, str], streams: int, rounds: int) -> Dict:
+    """Benchmark one configuration and return its report row"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server("main:app", port, dict(base_env, **config.env), config.workers, config.uvicorn_args)
+    sampler = ProcessSampler(server.pid)
+    try:
+        sampler.start()
+        started = time.perf_counter()
+        traces = []
+        for round_index in range(rounds):
+            traces.extend(asyncio.run(run_round(base_url, streams, round_index)))
+        wall = time.perf_counter() - started
+        sampler.stop()
+    finally:
+        stop_server(server)
+    return summarize(config, traces, wall, sampler)
+
+
+def print_report(rows: List[Dict]):
+    """Print one row per configuration"""
+    columns = [
+        ("config", lambda r: r["config"]),
+        ("streams", lambda r: r["streams"]),
+        ("errors", lambda r: r["errors"]),
+        ("streams/s", lambda r: r["streams_per_s"]),
+        ("ttft p50", lambda r: r["ttft_ms"]["p50"]),
+        ("ttft p95", lambda r: r["ttft_ms"]["p95"]),
+        ("ttft p99", lambda r: r["ttft_ms"]["p99"]),
+        ("itl p50", lambda r: r["itl_ms"]["p50"]),
+        ("itl p99", lambda r: r["itl_ms"]["p99"]),
+        ("e2e p50", lambda r: r["e2e_ms"]["p50"]),
+        ("e2e p95", lambda r: r["e2e_ms"]["p95"]),
+        ("e2e p99", lambda r: r["e2e_ms"]["p99"]),
+        ("frames", lambda r: r["frames_per_stream"]),
+        ("cpu s", lambda r: r["server_cpu_s"]),
+        ("rss MB", lambda r: r["server_rss_peak_mb"]),
+    ]
+    print("  ".join(f"{name:>12}" for name, _ in columns))
+    for row in rows:
+        cells = []
+        for _, get in columns:
+            value = get(row)
+            if value is None:
+                cells.append(f"{'n/a':>12}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>12.1f}")
+            else:
+                cells.append(f"{value:>12}")
+        print("  ".join(cells))
+    print("latencies in ms; itl = gap between SSE frames at the client")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline /chat load test across configurations")
+    parser.add_argument("--streams", type=int, default=100, help="Concurrent streams per round")
+    parser.add_argument("--rounds", type=int, default=3, help="Rounds per configuration")
+    parser.add_argument("--tokens", type=int, default=100, help="Tokens per mock response")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="Mock time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=20.0, help="Mock inter-token latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Mock latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock share of 529 responses")
+    parser.add_argument("--config", dest="configs", action="append", type=Config.parse,
+                        help="name:key=value,... (repeatable); default is one 'default' run")
+    parser.add_argument("--json", help="Also write the report rows to this file")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    env = dict(os.environ)
+    env.update(BENCH_ADMISSION)
+    env.update({
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_TTFT_MS": str(args.ttft_ms),
+        "MOCK_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+        "MOCK_JITTER_MS": str(args.jitter_ms),
+        "MOCK_ERROR_RATE": str(args.error_rate),
+        # Measure the upstream path unless a configuration turns the cache back on
+        "RESPONSE_CACHE": "false",
+    })
+
+    mock = start_server("bench.mock_upstream:app", mock_port, env)
+    try:
+        rows = [run_config(config, env, args.streams, args.rounds) for config in args.configs or [Config("default")]]
+    finally:
+        stop_server(mock)
+
+    print_report(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Markdown block scanner benchmark: CPU per delta as answers grow
+
+Streams generated markdown answers of increasing length (paragraphs,
+lists, fenced code, headings) through BlockScanner in small deltas and
+reports the CPU time per delta and the block_end events produced. The
+time per delta should stay flat however long the answer gets. Runs
+in-process, no server needed.
+
+    python -m bench.markdown_blocks --lengths 1000 10000 100000
+"""
+
+import argparse
+import gc
+import random
+import sys
+import time
+from typing import List
+
+from markdown_blocks import BlockScanner
+
+WORDS = ["the", "model", "streams", "a", "**bold**", "`code`", "naïve", "日本語", "and", "of", "🙂"]
+
+
+def make_answer(blocks: int, seed: int = 1) -> str:
+    """Markdown shaped like a long assistant answer"""
+    rng = random.Random(seed)
+
+    def sentence() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20)))
+
+    parts = []
+    for i in range(blocks):
+        kind = rng.choice(["paragraph", "paragraph", "list", "code", "heading"])
+        if kind == "paragraph":
+            parts.append("\n".join(sentence() for _ in range(rng.randint(1, 4))) + "\n\n")
+        elif kind == "list":
+            parts.append("".join(f"- {sentence()}\n" for _ in range(rng.randint(2, 6))) + "\n")
+        elif kind == "code":
+            lines = "".join(f"    value_{j} = {j}\n" for j in range(rng.randint(2, 12)))
+            parts.append(f"```python\ndef f():\n{lines}```\n\n")
+        else:
+            parts.append(f"## Section {i}\n\n")
+    return "".join(parts)
+
+
+def split_deltas(text: str, seed: int = 1) -> List[str]:
+    """Deltas of 1-24 characters, like coalesced upstream text chunks"""
+    rng = random.Random(seed)
+    deltas, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, 24)
+        deltas.append(text[i:i + size])
+        i += size
+    return deltas
+
+
+def measure(deltas: List[str], repeats: int):
+    """Best-of-`repeats` (ns per delta, block_end events)"""
+    best, events = float("inf"), 0
+    for _ in range(repeats):
+        gc.disable()
+        try:
+            started = time.process_time_ns()
+            scanner = BlockScanner()
+            events = 0
+            for text in deltas:
+                events += len(scanner.feed(text))
+            events += len(scanner.finish())
+            best = min(best, time.process_time_ns() - started)
+        finally:
+            gc.enable()
+    return best / len(deltas), events
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="BlockScanner CPU per delta by answer length")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="Approximate answer lengths in characters")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per length; the fastest is reported")
+    args = parser.parse_args()
+
+    print(f"{'chars':>10}{'deltas':>9}{'blocks':>8}{'ns/delta':>10}")
+    for length in args.lengths:
+        answer = make_answer(max(1, length // 150))
+        deltas = split_deltas(answer)
+        ns_per_delta, events = measure(deltas, args.repeats)
+        print(f"{len(answer):>10}{len(deltas):>9}{events:>8}{ns_per_delta:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Mock Anthropic Messages API for offline benchmarks
+
+Implements just enough of `POST /v1/messages` (stream=true) for the SDK's
+`messages.stream()` helpers, with configurable time-to-first-token and
+per-token latency. Point the backend at it with ANTHROPIC_BASE_URL.
+
+Fault injection: MOCK_ERROR_RATE answers with MOCK_ERROR_STATUS (529
+overloaded by default) before streaming, MOCK_STREAM_ERROR_RATE sends an
+in-stream overloaded error before the first token, and MOCK_SLOW_RATE
+stretches time-to-first-token to MOCK_SLOW_TTFT_MS.
+
+The Message Batches endpoints are mocked too: a batch ends
+MOCK_BATCH_DELAY_MS after it was created and every request succeeds.
+
+    MOCK_TOKENS=100 MOCK_TOKEN_LATENCY_MS=20 \\
+        uvicorn bench.mock_upstream:app --port 9100
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+
+@dataclass
+class MockConfig:
+    """Shape of the simulated upstream stream"""
+    tokens: int = 100
+    ttft_ms: float = 200.0
+    token_latency_ms: float = 20.0
+    jitter_ms: float = 0.0
+    token_text: str = "lorem "
+    error_rate: float = 0.0
+    error_status: int = 529
+    stream_error_rate: float = 0.0
+    slow_rate: float = 0.0
+    slow_ttft_ms: float = 3000.0
+    batch_delay_ms: float = 500.0
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        """Build config from MOCK_* environment variables"""
+        return cls(
+            tokens=int(os.getenv("MOCK_TOKENS", cls.tokens)),
+            ttft_ms=float(os.getenv("MOCK_TTFT_MS", cls.ttft_ms)),
+            token_latency_ms=float(os.getenv("MOCK_TOKEN_LATENCY_MS", cls.token_latency_ms)),
+            jitter_ms=float(os.getenv("MOCK_JITTER_MS", cls.jitter_ms)),
+            token_text=os.getenv("MOCK_TOKEN_TEXT", cls.token_text),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", cls.error_rate)),
+            error_status=int(os.getenv("MOCK_ERROR_STATUS", cls.error_status)),
+            stream_error_rate=float(os.getenv("MOCK_STREAM_ERROR_RATE", cls.stream_error_rate)),
+            slow_rate=float(os.getenv("MOCK_SLOW_RATE", cls.slow_rate)),
+            slow_ttft_ms=float(os.getenv("MOCK_SLOW_TTFT_MS", cls.slow_ttft_ms)),
+            batch_delay_ms=float(os.getenv("MOCK_BATCH_DELAY_MS", cls.batch_delay_ms)),
+        )
+
+    def delay(self, base_ms: float) -> float:
+        """Delay in seconds with uniform jitter applied"""
+        if self.jitter_ms:
+            base_ms += random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(base_ms, 0.0) / 1000.0
+
+
+OVERLOADED = {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Anthropic-style SSE event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def iso(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    """Create a mock upstream app for the given config"""
+    mock = FastAPI(title="Mock Anthropic")
+
+    mock.state.requests = 0
+    mock.state.errors = 0
+    # Deltas actually written, to see generation stop when the backend hangs up
+    mock.state.tokens_sent = 0
+    mock.state.batches = {}
+
+    @mock.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    @mock.get("/stats")
+    def stats():
+        return {
+            "requests": mock.state.requests,
+            "errors": mock.state.errors,
+            "tokens_sent": mock.state.tokens_sent,
+        }
+
+    def batch_object(batch_id: str, base_url: str) -> dict:
+        batch = mock.state.batches[batch_id]
+        ended = time.time() >= batch["ends_at"]
+        count = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": iso(batch["created_at"]),
+            "expires_at": iso(batch["created_at"] + 86400),
+            "ended_at": iso(batch["ends_at"]) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    @mock.post("/v1/messages/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        now = time.time()
+        mock.state.batches[batch_id] = {
+            "requests": body["requests"],
+            "created_at": now,
+            "ends_at": now + config.batch_delay_ms / 1000.0,
+        }
+        return batch_object(batch_id, str(request.base_url))
+
+    @mock.get("/v1/messages/batches/{batch_id}")
+    def retrieve_batch(batch_id: str, request: Request):
+        if batch_id not in mock.state.batches:
+            raise HTTPException(status_code=404)
+        return batch_object(batch_id, str(request.base_url))
+
+    @mock.get("/v1/messages/batches/{batch_id}/results")
+    def batch_results(batch_id: str):
+        batch = mock.state.batches.get(batch_id)
+        if batch is None or time.time() < batch["ends_at"]:
+            raise HTTPException(status_code=404)
+        lines = []
+        for entry in batch["requests"]:
+            message = {
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "text", "text": config.token_text * config.tokens}],
+                "model": entry["params"].get("model", "mock-model"),
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": config.tokens},
+            }
+            lines.append(json.dumps({
+                "custom_id": entry["custom_id"],
+                "result": {"type": "succeeded", "message": message},
+            }))
+        return PlainTextResponse("\n".join(lines) + "\n", media_type="application/binary")
+
+    @mock.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock-model")
+        mock.state.requests += 1
+
+        if random.random() < config.error_rate:
+            mock.state.errors += 1
+            return JSONResponse(OVERLOADED, status_code=config.error_status)
+        stream_error = random.random() < config.stream_error_rate
+        ttft_ms = config.slow_ttft_ms if random.random() < config.slow_rate else config.ttft_ms
+
+        async def stream():
+            message = {
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "content": [],
+                "model": model,
+                "stop_reason": None,
+                "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": 1},
+            }
+            yield sse_event("message_start", {"type": "message_start", "message": message})
+            yield sse_event("content_block_start", {
+                "type": "content_block_start",
+                "index": 0,
+                "content_block": {"type": "text", "text": ""},
+            })
+            await asyncio.sleep(config.delay(ttft_ms))
+            if stream_error:
+                mock.state.errors += 1
+                yield sse_event("error", OVERLOADED)
+                return
+            for i in range(config.tokens):
+                if i:
+                    await asyncio.sleep(config.delay(config.token_latency_ms))
+                mock.state.tokens_sent += 1
+                yield sse_event("content_block_delta", {
+                    "type": "content_block_delta",
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": config.token_text},
+                })
+            yield sse_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield sse_event("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": config.tokens},
+            })
+            yield sse_event("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return mock
+
+
+app = create_app(MockConfig.from_env())
@@ -0,0 +1,191 @@
+"""
+WebSocket vs SSE benchmark: per-message latency and memory per idle client
+
+Starts the mock upstream and one async worker, then:
+
+- sends sequential chat turns as a new HTTP connection per message
+  (mobile clients and many proxies), as POSTs over one keep-alive
+  connection, and as messages on one /ws/chat connection, reporting
+  time to the first delta and to the end of each answer;
+- opens idle clients (keep-alive HTTP connections, then /ws/chat
+  connections) and reports the worker's RSS growth per client.
+
+Linux only for the memory numbers (read from /proc).
+
+    python -m bench.websocket --messages 200 --idle-clients 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from websockets.asyncio.client import connect
+
+from .concurrency import BENCH_ADMISSION, free_port, percentile, start_server, stop_server
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process, None off Linux"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+async def sse_turn(client: httpx.AsyncClient, url: str, prompt: str) -> Tuple[float, float]:
+    """(seconds to first delta, seconds to done) of one /chat request"""
+    started = time.perf_counter()
+    first = None
+    async with client.stream("POST", url, json={"message": prompt}) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if first is None and b"event: delta" in chunk:
+                first = time.perf_counter()
+    done = time.perf_counter()
+    return (first or done) - started, done - started
+
+
+async def sse_latency(base_url: str, messages: int, keep_alive: bool) -> List[Tuple[float, float]]:
+    url = f"{base_url}/chat"
+    results = []
+    if keep_alive:
+        async with httpx.AsyncClient(timeout=None) as client:
+            for i in range(messages):
+                results.append(await sse_turn(client, url, f"sse keep-alive {i}"))
+        return results
+    for i in range(messages):
+        # A fresh client per message: TCP connect and HTTP setup every time
+        async with httpx.AsyncClient(timeout=None) as client:
+            results.append(await sse_turn(client, url, f"sse new connection {i}"))
+    return results
+
+
+async def ws_latency(base_url: str, messages: int) -> List[Tuple[float, float]]:
+    results = []
+    async with connect(base_url.replace("http", "ws", 1) + "/ws/chat", max_size=None) as ws:
+        for i in range(messages):
+            started = time.perf_counter()
+            first = None
+            await ws.send(json.dumps({"type": "chat", "stream": str(i), "message": f"websocket {i}"}))
+            ended = False
+            while not ended:
+                for line in (await ws.recv()).splitlines():
+                    frame = json.loads(line)
+                    if first is None and frame.get("event") == "delta":
+                        first = time.perf_counter()
+                    if frame.get("type") in ("end", "error"):
+                        ended = True
+                    elif frame.get("type") == "ping":
+                        await ws.send('{"type":"pong"}')
+            done = time.perf_counter()
+            results.append(((first or done) - started, done - started))
+    return results
+
+
+async def hold_idle(base_url: str, clients: int, transport: str, pid: int, settle: float) -> Optional[float]:
+    """RSS growth of the worker per idle client, in KiB"""
+    host, port = base_url.rsplit("//", 1)[1].split(":")
+    before = rss_bytes(pid)
+    held = []
+    try:
+        for _ in range(clients):
+            if transport == "ws":
+                held.append(await connect(f"ws://{host}:{port}/ws/chat"))
+            else:
+                # One served request leaves an idle keep-alive connection behind
+                reader, writer = await asyncio.open_connection(host, int(port))
+                writer.write(f"GET /health HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+                await writer.drain()
+                await reader.readuntil(b"}")
+                held.append(writer)
+        await asyncio.sleep(settle)
+        after = rss_bytes(pid)
+    finally:
+        for conn in held:
+            if transport == "ws":
+                await conn.close()
+            else:
+                conn.close()
+    if before is None or after is None:
+        return None
+    return (after - before) / clients / 1024
+
+
+def summarize(name: str, results: List[Tuple[float, float]]) -> Dict:
+    firsts = [r[0] * 1000 for r in results]
+    totals = [r[1] * 1000 for r in results]
+    return {
+        "transport": name,
+        "messages": len(results),
+        "first_delta_p50_ms": statistics.median(firsts),
+        "first_delta_p95_ms": percentile(firsts, 95),
+        "answer_p50_ms": statistics.median(totals),
+        "answer_p95_ms": percentile(totals, 95),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="/ws/chat vs SSE latency and idle memory")
+    parser.add_argument("--messages", type=int, default=200, help="Sequential chat turns per transport")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per mock response")
+    parser.add_argument("--ttft-ms", type=float, default=0.0, help="Mock time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Mock inter-token latency")
+    parser.add_argument("--idle-clients", type=int, default=1000, help="Idle connections per transport")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait before sampling RSS")
+    parser.add_argument("--ws", default="websockets-sansio", help="uvicorn WebSocket implementation (--ws)")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    env = dict(os.environ)
+    env.update(BENCH_ADMISSION)
+    env.update({
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "MOCK_TOKENS": str(args.tokens),
+        "MOCK_TTFT_MS": str(args.ttft_ms),
+        "MOCK_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+        # Every turn is a new prompt; keep the numbers about the transport
+        "RESPONSE_CACHE": "false",
+        "USAGE_LEDGER": "false",
+    })
+    mock = start_server("bench.mock_upstream:app", mock_port, env)
+    port = free_port()
+    # Idle keep-alive connections must outlive the measurement
+    server = start_server("main:app", port, env, extra_args=["--timeout-keep-alive", "600", "--ws", args.ws])
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        rows = [
+            summarize("sse, new connection", asyncio.run(sse_latency(base_url, args.messages, keep_alive=False))),
+            summarize("sse, keep-alive", asyncio.run(sse_latency(base_url, args.messages, keep_alive=True))),
+            summarize("websocket", asyncio.run(ws_latency(base_url, args.messages))),
+        ]
+        idle = {}
+        for transport in ("http", "ws"):
+            # The first round mostly measures the allocator growing its arenas
+            for _ in range(2):
+                idle[transport] = asyncio.run(hold_idle(base_url, args.idle_clients, transport, server.pid, args.settle))
+    finally:
+        stop_server(server)
+        stop_server(mock)
+
+    print(f"{'transport':<22}{'first delta p50':>16}{'p95':>8}{'answer p50':>12}{'p95':>8}  (ms)")
+    for row in rows:
+        print(f"{row['transport']:<22}{row['first_delta_p50_ms']:>16.2f}{row['first_delta_p95_ms']:>8.2f}"
+              f"{row['answer_p50_ms']:>12.2f}{row['answer_p95_ms']:>8.2f}")
+    print()
+    for transport, label in (("http", "idle keep-alive HTTP connection"), ("ws", "idle /ws/chat connection")):
+        per_client = idle[transport]
+        value = "n/a" if per_client is None else f"{per_client:.1f} KiB"
+        print(f"server RSS per {label}: {value} ({args.idle_clients} clients, --ws {args.ws})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
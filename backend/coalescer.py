@@ -0,0 +1,103 @@
+"""
+Zyron AI - SSE frame coalescing
+
+Merges upstream text deltas into fewer, larger SSE frames. The first delta
+is flushed immediately so time-to-first-token is unchanged; later deltas
+are buffered until the time window elapses or the size threshold is hit.
+"""
+
+import asyncio
+from typing import AsyncIterable, AsyncIterator, List, Optional
+
+
+class _Pump:
+    """Reads upstream deltas into a buffer from a background task
+
+    The consumer only wakes up when it has something to do (data after an
+    idle period, size threshold, end of stream), so buffering a delta costs
+    a list append rather than a task or timer per token.
+    """
+
+    def __init__(self, deltas: AsyncIterable[str], max_chars: int):
+        self.deltas = deltas
+        self.max_chars = max_chars
+        self.buffer: List[str] = []
+        self.size = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.waiter: Optional[asyncio.Future] = None
+        self.wake_on_any = True
+
+    async def run(self):
+        try:
+            async for text in self.deltas:
+                self.buffer.append(text)
+                self.size += len(text)
+                if self.wake_on_any or self.size >= self.max_chars:
+                    self._wake()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._wake()
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self, wake_on_any: bool, timeout: Optional[float] = None):
+        """Sleep until the pump has news for the consumer or `timeout` passes"""
+        self.wake_on_any = wake_on_any
+        self.waiter = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait((self.waiter,), timeout=timeout)
+        finally:
+            self.waiter = None
+
+    def drain(self) -> str:
+        text = "".join(self.buffer)
+        self.buffer, self.size = [], 0
+        return text
+
+
+async def coalesce(
+    deltas: AsyncIterable[str],
+    window_ms: float = 16.0,
+    max_chars: int = 1024,
+) -> AsyncIterator[str]:
+    """Yield merged text from `deltas`
+
+    A window of 0 disables coalescing and passes every delta through.
+    The buffer is flushed on a timer even when upstream stalls, so a
+    buffered delta never waits longer than `window_ms`.
+    """
+    if window_ms <= 0:
+        async for text in deltas:
+            yield text
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000.0
+    pump = _Pump(deltas, max_chars)
+    task = asyncio.ensure_future(pump.run())
+    last_flush = float("-inf")
+
+    try:
+        while True:
+            if not pump.buffer and not pump.done:
+                await pump.wait(wake_on_any=True)
+            if pump.buffer:
+                # Hold the frame open until the window since the last flush
+                # closes, unless this is the first delta or the buffer is full
+                remaining = last_flush + window - loop.time()
+                if remaining > 0 and pump.size < max_chars and not pump.done:
+                    await pump.wait(wake_on_any=False, timeout=remaining)
+                yield pump.drain()
+                last_flush = loop.time()
+            elif pump.done:
+                break
+        if pump.error is not None:
+            raise pump.error
+    finally:
+        if not task.done():
+            task.cancel()
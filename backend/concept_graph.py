@@ -0,0 +1,366 @@
+"""
+Zyron AI - Concept graph extraction pipeline
+
+Completed assistant messages are queued for the workspace concept graph
+off the request path. Extraction is a cheap deterministic pass over the
+markdown:
+
+- headings become `topic` nodes;
+- bold terms, capitalized phrases and acronyms become `concept` nodes;
+- concepts in the same paragraph are linked with `relates_to` edges, and
+  concepts under a heading with `part_of` edges to its topic.
+
+A fixed number of workers extract messages concurrently (in threads, so
+the event loop keeps serving streams). Their results are written to the
+graph store in batched upserts that add to `mentions_count` and edge
+weights and update `importance`. Messages the store has already applied
+are skipped, so a backlog can be re-submitted safely.
+
+Jobs are checked when they are queued (a message id, a UUID workspace
+id). When the store rejects a batch, it is halved until the messages it
+refuses are isolated and dropped, and the rest is written; when the
+store is unavailable, the batch is kept and written on a later flush.
+"""
+
+import asyncio
+import logging
+import re
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from graph_store import GraphEdge, GraphNode, GraphWriteRejected, MessageGraph, edge_id, node_id
+
+logger = logging.getLogger(__name__)
+
+# Concepts kept per message, the most mentioned first
+MAX_CONCEPTS = 40
+# Concepts per paragraph linked pairwise (keeps edges per paragraph bounded)
+MAX_PARAGRAPH_LINKS = 8
+MAX_LABEL_WORDS = 6
+MAX_MESSAGE_ID_LENGTH = 200
+
+FENCED_CODE = re.compile(r"^ {0,3}(`{3,}|~{3,})[^\n]*\n.*?^ {0,3}\1[ \t]*$", re.M | re.S)
+INLINE_CODE = re.compile(r"`[^`\n]*`")
+HEADING = re.compile(r"^ {0,3}#{1,6}[ \t]+(.+?)[ \t#]*$", re.M)
+BOLD = re.compile(r"\*\*([^*\n]{2,80})\*\*|__([^_\n]{2,80})__")
+CAPITALIZED = re.compile(
+    r"\b(?:[A-Z][\w'’+#.-]*[\w+#]|[A-Z])(?:[ \t]+(?:(?:of|for|de|du|des)[ \t]+)?[A-Z][\w'’+#.-]*[\w+#])*"
+)
+LINK = re.compile(r"\[([^\]\n]+)\]\([^)\n]*\)")
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+
+# Capitalized only because they start a sentence (English and French answers)
+STOPWORDS = frozenset("""
+a an the this that these those it its i you we they he she there here if when while for in on at to of and or
+but so as by with from into about after before because however also then than yes no not note example
+what which who why how each every some any all both many most more other such first second third next last
+finally one two three step steps ok okay let here's it's i'm you're don't
+le la les un une des du de ce cet cette ces il elle ils elles je tu nous vous on en et ou mais donc pour dans
+par sur avec sans si quand comme voici voilà oui non c'est il's
+""".split())
+
+
+@dataclass
+class ExtractedConcept:
+    label: str
+    type: str
+    mentions: int = 0
+
+
+def concept_key(label: str) -> str:
+    """Normalized concept identity: case, spacing and edge punctuation ignored"""
+    return " ".join(label.lower().split()).strip(" .,:;!?()[]\"'’*_")
+
+
+def _clean(label: str) -> str:
+    return " ".join(LINK.sub(r"\1", label).replace("*", "").replace("_", " ").split()).strip(" .,:;!?()[]\"'’")
+
+
+def extract_concepts(text: str) -> Tuple[Dict[str, ExtractedConcept], Counter]:
+    """(concepts by key, relation weights by (source key, target key, type))"""
+    text = INLINE_CODE.sub(" ", FENCED_CODE.sub("\n\n", text))
+    concepts: Dict[str, ExtractedConcept] = {}
+    relations: Counter = Counter()
+
+    def mention(label: str, kind: str) -> Optional[str]:
+        label = _clean(label)
+        key = concept_key(label)
+        words = key.split()
+        if not key or len(words) > MAX_LABEL_WORDS or len(key) < 2 or (len(words) == 1 and key in STOPWORDS):
+            return None
+        concept = concepts.get(key)
+        if concept is None:
+            concept = concepts[key] = ExtractedConcept(label, kind)
+        elif kind == "topic":
+            concept.type = "topic"
+        concept.mentions += 1
+        return key
+
+    topic = None
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        keys: List[str] = []
+        for line in paragraph.splitlines():
+            heading = HEADING.match(line)
+            if heading:
+                topic = mention(heading.group(1), "topic")
+                continue
+            for match in BOLD.finditer(line):
+                key = mention(match.group(1) or match.group(2), "concept")
+                if key:
+                    keys.append(key)
+            plain = BOLD.sub(" ", line)
+            for match in CAPITALIZED.finditer(plain):
+                words = match.group(0).split()
+                before = plain[:match.start()].rstrip()
+                # "The HNSW index": drop words capitalized only by the sentence
+                while len(words) > 1 and words[0].lower() in STOPWORDS:
+                    words.pop(0)
+                    before = "."
+                phrase = " ".join(words)
+                # Lone capitalized words at the start of a sentence are usually just grammar
+                if len(words) == 1 and (not before or before[-1] in ".!?:-*>|0123456789") and not phrase.isupper():
+                    continue
+                key = mention(phrase, "concept")
+                if key:
+                    keys.append(key)
+        unique = list(dict.fromkeys(keys))
+        if topic:
+            for key in unique:
+                if key != topic:
+                    relations[(key, topic, "part_of")] += 1
+        linked = unique[:MAX_PARAGRAPH_LINKS]
+        for i, a in enumerate(linked):
+            for b in linked[i + 1:]:
+                source, target = sorted((a, b))
+                relations[(source, target, "relates_to")] += 1
+
+    if len(concepts) > MAX_CONCEPTS:
+        keep = {k for k, _ in Counter({k: c.mentions for k, c in concepts.items()}).most_common(MAX_CONCEPTS)}
+        concepts = {k: c for k, c in concepts.items() if k in keep}
+        relations = Counter({r: w for r, w in relations.items() if r[0] in keep and r[1] in keep})
+    return concepts, relations
+
+
+def message_graph(message_id: str, workspace_id: str, text: str) -> MessageGraph:
+    """Graph rows for one message, with ids stable across messages of a workspace"""
+    concepts, relations = extract_concepts(text)
+    ids = {key: node_id(workspace_id, key) for key in concepts}
+    nodes = [GraphNode(ids[key], c.label, c.type, c.mentions) for key, c in concepts.items()]
+    edges = [
+        GraphEdge(edge_id(workspace_id, ids[a], ids[b], kind), ids[a], ids[b], kind, float(weight))
+        for (a, b, kind), weight in relations.items()
+    ]
+    return MessageGraph(message_id, workspace_id, nodes, edges)
+
+
+@dataclass
+class GraphJob:
+    """A completed assistant message to add to its workspace graph"""
+    message_id: str
+    workspace_id: str
+    text: str
+
+
+def validate_job(job: GraphJob) -> GraphJob:
+    """The job with its workspace id in canonical form; ValueError if it cannot be written"""
+    if not isinstance(job.message_id, str) or not job.message_id or len(job.message_id) > MAX_MESSAGE_ID_LENGTH:
+        raise ValueError("message_id must be a non-empty string")
+    if not isinstance(job.text, str):
+        raise ValueError("text must be a string")
+    try:
+        # Node ids derive from the workspace id string, so one workspace has one spelling
+        workspace_id = str(uuid.UUID(job.workspace_id))
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError("workspace_id must be a UUID")
+    return GraphJob(job.message_id, workspace_id, job.text)
+
+
+class ConceptGraphPipeline:
+    """Bounded-concurrency extraction with batched, idempotent store writes"""
+
+    def __init__(
+        self,
+        store,
+        concurrency: int = 4,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+        on_applied: Optional[Callable[[Set[str]], None]] = None,
+    ):
+        self.store = store
+        # Called with the workspaces a written batch changed (e.g. to schedule a layout)
+        self.on_applied = on_applied
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.queue: asyncio.Queue = asyncio.Queue(max_pending)
+        # Extracted, not written yet (at most max_pending, the oldest dropped first)
+        self._batch: List[MessageGraph] = []
+        # No flush before this while the store is failing, except join() and close()
+        self._retry_at = 0.0
+        self._workers: List[asyncio.Task] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._lock = asyncio.Lock()
+        self.submitted = 0
+        self.invalid = 0
+        self.dropped = 0
+        self.extracted = 0
+        self.applied = 0
+        self.already_processed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def _validate(self, job: GraphJob) -> Optional[GraphJob]:
+        try:
+            return validate_job(job)
+        except ValueError as e:
+            self.invalid += 1
+            logger.warning(f"⚠️  Concept graph job for message {job.message_id!r} refused: {e}")
+            return None
+
+    def submit(self, job: GraphJob) -> bool:
+        """Queue a message from the request path; never waits, drops when the queue is full"""
+        job = self._validate(job)
+        if job is None:
+            return False
+        self._start()
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    async def put(self, job: GraphJob) -> bool:
+        """Queue a backlog message, waiting while the queue is full"""
+        job = self._validate(job)
+        if job is None:
+            return False
+        self._start()
+        await self.queue.put(job)
+        self.submitted += 1
+        return True
+
+    async def backfill(self, jobs: Iterable[GraphJob]) -> Tuple[int, int]:
+        """Queue the valid jobs the store has not applied yet: (queued, already processed)"""
+        jobs = [job for job in map(self._validate, jobs) if job is not None]
+        done: Set[str] = await asyncio.to_thread(self.store.processed, [j.message_id for j in jobs]) if jobs else set()
+        for job in jobs:
+            if job.message_id not in done:
+                await self.put(job)
+        self.already_processed += len(done)
+        return len(jobs) - len(done), len(done)
+
+    def _start(self):
+        if self._workers:
+            return
+        self._wake = asyncio.Event()
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.concurrency)]
+        self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def _work(self):
+        while True:
+            job: GraphJob = await self.queue.get()
+            try:
+                graph = await asyncio.to_thread(message_graph, job.message_id, job.workspace_id, job.text)
+                self.extracted += 1
+                # Recorded even without concepts, so a re-submitted backlog skips it
+                self._batch.append(graph)
+                self._trim()
+                if len(self._batch) >= self.batch_size:
+                    self._wake.set()
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"⚠️  Concept extraction failed for message {job.message_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+                full_only = True
+            except asyncio.TimeoutError:
+                full_only = False
+            self._wake.clear()
+            await self.flush(full_only)
+
+    def _trim(self):
+        """Drop the oldest unwritten messages beyond max_pending (they can be backfilled)"""
+        excess = len(self._batch) - self.max_pending
+        if excess > 0:
+            del self._batch[:excess]
+            self.dropped += excess
+            logger.warning(f"⚠️  Concept graph store behind, dropped {excess} unwritten messages")
+
+    async def flush(self, full_only: bool = False):
+        """Write extracted messages not yet in the store (only whole batches if `full_only`)"""
+        async with self._lock:
+            if full_only and time.monotonic() < self._retry_at:
+                return
+            while self._batch and (not full_only or len(self._batch) >= self.batch_size):
+                batch, self._batch = self._batch[:self.batch_size], self._batch[self.batch_size:]
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    # Messages a part of it already wrote are skipped when it is sent again
+                    self.errors += 1
+                    self._batch[:0] = batch
+                    self._trim()
+                    self._retry_at = time.monotonic() + self.flush_interval
+                    logger.warning(f"⚠️  Concept graph write failed, {len(batch)} messages kept for retry: {e}")
+                    return
+
+    async def _write(self, batch: List[MessageGraph]):
+        """Apply `batch`, halving it until the messages the store rejects are isolated"""
+        try:
+            applied, skipped = await asyncio.to_thread(self.store.apply, batch)
+        except GraphWriteRejected as e:
+            if len(batch) == 1:
+                self.rejected += 1
+                logger.warning(f"⚠️  Concept graph rejected message {batch[0].message_id}: {e}")
+                return
+            middle = len(batch) // 2
+            await self._write(batch[:middle])
+            await self._write(batch[middle:])
+            return
+        self.batches += 1
+        self.applied += applied
+        self.already_processed += skipped
+        if applied and self.on_applied is not None:
+            self.on_applied({m.workspace_id for m in batch})
+
+    async def join(self):
+        """Wait until everything queued so far is extracted and written"""
+        await self.queue.join()
+        await self.flush()
+
+    async def close(self):
+        for task in self._workers + ([self._flusher] if self._flusher else []):
+            task.cancel()
+        self._workers, self._flusher = [], None
+        await self.flush()
+        self.store.close()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters for /metrics"""
+        return {
+            "submitted": self.submitted,
+            "invalid": self.invalid,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+            "extracted": self.extracted,
+            "unwritten": len(self._batch),
+            "applied": self.applied,
+            "already_processed": self.already_processed,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
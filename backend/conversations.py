@@ -0,0 +1,225 @@
+"""
+Zyron AI - Server-side conversation history
+
+Keeps chat turns per conversation_id with running token counts, and
+builds the upstream message list from a per-model token budget by
+dropping the oldest turns first, in steps that keep the prefix stable
+for prompt caching. The store is in-memory and per worker.
+
+Each conversation belongs to whoever started it (a user id, or the
+client address for anonymous requests); a conversation_id sent by
+anyone else starts a new conversation instead of reading its history.
+
+With a `shared` store (shared_state.SQLiteState, used when serve.py runs
+several workers) every exchange is also written there, and a request
+reads the latest copy first, so a conversation continues on whichever
+worker takes its next message.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_BUDGET = 16000
+
+# Fraction of the budget the window shrinks to once it overflows
+WINDOW_LOW_WATERMARK = 0.75
+
+# Input-token budget for the context window, per model
+MODEL_CONTEXT_BUDGETS: Dict[str, int] = {
+    "claude-sonnet-4-20250514": 16000,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def context_budget(model: str) -> int:
+    """Input-token budget for `model`"""
+    return MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+@dataclass
+class Turn:
+    """One message in a conversation"""
+    role: str
+    content: str
+    tokens: int
+
+
+@dataclass
+class Conversation:
+    """Ordered turns plus a running token total"""
+    id: str
+    owner: Optional[str] = None
+    turns: Deque[Turn] = field(default_factory=deque)
+    total_tokens: int = 0
+    window_start: int = 0  # absolute index of the first turn sent upstream
+    dropped: int = 0  # turns trimmed from the front of `turns`
+    updated_at: float = field(default_factory=time.time)
+
+    def append(self, role: str, content: str, tokens: Optional[int] = None):
+        """Add a turn, updating the running token count"""
+        turn = Turn(role, content, tokens if tokens is not None else estimate_tokens(content))
+        self.turns.append(turn)
+        self.total_tokens += turn.tokens
+        self.updated_at = time.time()
+
+    def trim(self, max_tokens: int):
+        """Forget the oldest turns once the history exceeds `max_tokens`"""
+        while self.turns and self.total_tokens > max_tokens:
+            self.total_tokens -= self.turns.popleft().tokens
+            self.dropped += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "turns": [[t.role, t.content, t.tokens] for t in self.turns],
+            "window_start": self.window_start,
+            "dropped": self.dropped,
+        }
+
+    @classmethod
+    def from_dict(cls, conversation_id: str, data: Dict[str, Any]) -> "Conversation":
+        turns = deque(Turn(role, content, tokens) for role, content, tokens in data["turns"])
+        return cls(
+            conversation_id,
+            data["owner"],
+            turns,
+            sum(t.tokens for t in turns),
+            data["window_start"],
+            data["dropped"],
+        )
+
+    def context(self, message: str, budget: int) -> List[Dict[str, str]]:
+        """Messages for an upstream call within `budget` input tokens
+
+        The new user message is always included. The window start only
+        moves when the budget overflows, and then drops the oldest turns
+        down to WINDOW_LOW_WATERMARK of the budget, so the prefix stays
+        byte-identical across several turns and prompt caching keeps
+        hitting. The window always starts on a user turn.
+        """
+        turns = list(self.turns)
+        start = max(self.window_start - self.dropped, 0)
+        used = estimate_tokens(message) + sum(t.tokens for t in turns[start:])
+        if used > budget:
+            target = budget * WINDOW_LOW_WATERMARK
+            while start < len(turns) and used > target:
+                used -= turns[start].tokens
+                start += 1
+        while start < len(turns) and turns[start].role != "user":
+            start += 1
+        self.window_start = start + self.dropped
+        messages = [{"role": t.role, "content": t.content} for t in turns[start:]]
+        messages.append({"role": "user", "content": message})
+        return messages
+
+
+class ConversationStore:
+    """LRU-bounded map of conversation_id -> Conversation"""
+
+    def __init__(
+        self,
+        max_conversations: int = 10000,
+        max_history_tokens: int = 64000,
+        shared: Any = None,
+        shared_ttl: float = 86400.0,
+    ):
+        self.max_conversations = max_conversations
+        self.max_history_tokens = max_history_tokens
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.history_tokens = 0
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        # Writes to the shared store, one at a time and in order
+        self._write_lock = asyncio.Lock()
+        self._pending: Set[asyncio.Task] = set()
+
+    async def open(self, conversation_id: Optional[str] = None, owner: Optional[str] = None) -> Conversation:
+        """get_or_create, from the shared store's copy when there is one"""
+        if self.shared is not None and conversation_id:
+            try:
+                data = await asyncio.to_thread(self.shared.get, "conversation", conversation_id)
+            except Exception as e:
+                logger.warning(f"⚠️  Conversation read failed, using this worker's copy: {e}")
+                data = None
+            if data is not None:
+                self._replace(Conversation.from_dict(conversation_id, data))
+        return self.get_or_create(conversation_id, owner)
+
+    def _replace(self, conversation: Conversation):
+        old = self._conversations.pop(conversation.id, None)
+        if old is not None:
+            self.history_tokens -= old.total_tokens
+        self._conversations[conversation.id] = conversation
+        self.history_tokens += conversation.total_tokens
+        self._evict()
+
+    def _evict(self):
+        while len(self._conversations) > self.max_conversations:
+            _, evicted = self._conversations.popitem(last=False)
+            self.history_tokens -= evicted.total_tokens
+
+    def get_or_create(self, conversation_id: Optional[str] = None, owner: Optional[str] = None) -> Conversation:
+        """Look up `owner`'s conversation, creating it (with a new id if none given)
+
+        Someone else's conversation_id gets a new conversation under a new id.
+        """
+        conversation = self._conversations.get(conversation_id) if conversation_id else None
+        if conversation is not None and conversation.owner != owner:
+            conversation, conversation_id = None, None
+        conversation_id = conversation_id or uuid.uuid4().hex
+        if conversation is None:
+            conversation = Conversation(conversation_id, owner)
+            self._conversations[conversation_id] = conversation
+            self._evict()
+        else:
+            self._conversations.move_to_end(conversation_id)
+        return conversation
+
+    def record_exchange(
+        self,
+        conversation: Conversation,
+        user_message: str,
+        assistant_message: str,
+        output_tokens: Optional[int] = None,
+    ):
+        """Store a completed user/assistant exchange
+
+        Both turns are added together once the answer is complete, so a
+        failed stream never leaves a dangling user turn in the history.
+        The shared store is written in the background.
+        """
+        before = conversation.total_tokens
+        conversation.append("user", user_message)
+        conversation.append("assistant", assistant_message, output_tokens)
+        conversation.trim(self.max_history_tokens)
+        if self._conversations.get(conversation.id) is conversation:
+            self.history_tokens += conversation.total_tokens - before
+        if self.shared is not None:
+            task = asyncio.ensure_future(self._save(conversation.id, conversation.to_dict()))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _save(self, conversation_id: str, data: Dict[str, Any]):
+        async with self._write_lock:
+            try:
+                await asyncio.to_thread(self.shared.put, "conversation", conversation_id, data, self.shared_ttl)
+            except Exception as e:
+                logger.warning(f"⚠️  Conversation write failed: {e}")
+
+    def snapshot(self) -> Dict[str, int]:
+        """Store size for /metrics"""
+        return {
+            "conversations": len(self._conversations),
+            "history_tokens": self.history_tokens,
+        }
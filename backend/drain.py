@@ -0,0 +1,150 @@
+"""
+Zyron AI - Graceful drain for restarts
+
+Draining makes /health fail and refuses new /chat and /chat/batch
+requests with 503, so load balancers and clients move to another
+instance, while answers that are already streaming run to completion.
+Once nothing is in flight, or the deadline passes and the stragglers
+have been cancelled, the process exits through the server's normal
+shutdown path.
+
+Under the pre-fork launcher (serve.py) a drain started in one worker is
+signalled to the supervisor, which forwards SIGUSR1 to every worker.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SERVING = "serving"
+DRAINING = "draining"
+DRAINED = "drained"
+
+# Set by serve.py in the workers it forks
+SUPERVISOR_ENV = "ZYRON_SUPERVISOR_PID"
+DRAIN_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+
+class DrainController:
+    """Serving -> draining -> drained state of one worker process"""
+
+    def __init__(
+        self,
+        in_flight: Callable[[], int],
+        cancel_streams: Callable[[], int],
+        timeout: float = 120.0,
+        cancel_grace: float = 5.0,
+        retry_after: int = 5,
+        exit_when_drained: bool = True,
+        poll_interval: float = 0.25,
+    ):
+        self.in_flight = in_flight
+        self.cancel_streams = cancel_streams
+        self.timeout = timeout
+        self.cancel_grace = cancel_grace
+        self.retry_after = retry_after
+        self.exit_when_drained = exit_when_drained
+        self.poll_interval = poll_interval
+
+        self.state = SERVING
+        self.started_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.rejected = 0
+        self.cancelled = 0
+        self._jobs: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.state != SERVING
+
+    def start(self, timeout: Optional[float] = None) -> bool:
+        """Begin draining; False if a drain is already under way"""
+        if self.draining:
+            return False
+        self.state = DRAINING
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + (self.timeout if timeout is None else timeout)
+        logger.info(f"🚰 Draining: {self.in_flight()} in flight, deadline in {self.deadline - self.started_at:.0f}s")
+        self._task = asyncio.ensure_future(self._run())
+        supervisor = os.getenv(SUPERVISOR_ENV)
+        if supervisor and DRAIN_SIGNAL is not None:
+            # The supervisor drains the sibling workers; it ignores repeats
+            os.kill(int(supervisor), DRAIN_SIGNAL)
+        return True
+
+    def install_signal_handler(self):
+        """Start draining on SIGUSR1, where the platform has it
+
+        Only possible when the loop runs in the main thread; an app served
+        from another thread (e.g. tests) can still drain over HTTP.
+        """
+        if DRAIN_SIGNAL is None:
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(DRAIN_SIGNAL, self.start)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def reject(self) -> int:
+        """Count a refused request and return its Retry-After"""
+        self.rejected += 1
+        return self.retry_after
+
+    @contextmanager
+    def job(self) -> Iterator[None]:
+        """Mark the current task as long-running work to cancel at the deadline"""
+        task = asyncio.current_task()
+        self._jobs.add(task)
+        try:
+            yield
+        finally:
+            self._jobs.discard(task)
+
+    def interrupted(self) -> bool:
+        """Whether the deadline passed and in-flight work is being cancelled"""
+        return self.draining and self.deadline is not None and time.monotonic() >= self.deadline
+
+    async def _wait_idle(self, until: float) -> bool:
+        while self.in_flight() > 0:
+            if time.monotonic() >= until:
+                return False
+            await asyncio.sleep(self.poll_interval)
+        return True
+
+    async def _run(self):
+        if not await self._wait_idle(self.deadline):
+            self.cancelled = self.cancel_streams()
+            for task in list(self._jobs):
+                task.cancel()
+                self.cancelled += 1
+            logger.warning(f"⏱️  Drain deadline passed, cancelled {self.cancelled} streams and jobs")
+            # Let cancelled responses close their connections before exiting
+            await self._wait_idle(time.monotonic() + self.cancel_grace)
+        self.state = DRAINED
+        self.finished_at = time.monotonic()
+        logger.info(f"✅ Drained in {self.finished_at - self.started_at:.1f}s")
+        if self.exit_when_drained:
+            # Same path as a plain SIGTERM: close the listener, run lifespan shutdown
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def snapshot(self) -> Dict[str, object]:
+        """Drain status for /metrics and /admin/drain"""
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "in_flight": self.in_flight(),
+            "remaining_seconds": round(max(0.0, self.deadline - now), 1) if self.state == DRAINING else None,
+            "elapsed_seconds": round((self.finished_at or now) - self.started_at, 1) if self.started_at else None,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "exits": self.exit_when_drained,
+            "pid": os.getpid(),
+        }
@@ -0,0 +1,112 @@
+"""
+Zyron AI - Columnar binary graph format
+
+A workspace graph as typed columns the browser can hand to WebGL as is
+(views on the response buffer, no per-node parsing), instead of JSON row
+objects with UUID strings, repeated keys and coordinates as text.
+
+Layout, little-endian. Every 4-byte column starts 4-byte aligned:
+
+    header (32 bytes)
+        0  magic        b"ZGB1"
+        4  uint32       format version (1)
+        8  uint32       node count n
+        12 uint32       edge count m
+        16 float64      workspace graph version (see graph_sync)
+        24 uint32       side table length in bytes
+        28 uint32       reserved (0)
+    positions   float32 n x 3   x, y, z
+    sizes       float32 n
+    importance  float32 n
+    edges       uint32  m x 2   source, target node indices
+    weights     float32 m
+    ids         uint8   n x 16  node UUIDs
+    colors      uint8   n x 3   r, g, b
+    types       uint8   n       index into NODE_TYPES
+    side table  UTF-8 JSON      {"labels": [...]} by node index
+
+Edges whose endpoints are not in the node list are left out.
+"""
+
+import json
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+
+MAGIC = b"ZGB1"
+FORMAT_VERSION = 1
+MEDIA_TYPE = "application/vnd.zyron.graph"
+HEADER = struct.Struct("<4sIIIdII")
+NODE_TYPES = ("concept", "topic", "question")
+DEFAULT_COLOR = (0x3B, 0x82, 0xF6)
+
+
+def _rgb(color: Any) -> tuple:
+    """'#RRGGBB' to bytes; anything else gets the schema default"""
+    if isinstance(color, str) and len(color) == 7 and color[0] == "#":
+        try:
+            value = int(color[1:], 16)
+        except ValueError:
+            return DEFAULT_COLOR
+        return value >> 16, (value >> 8) & 0xFF, value & 0xFF
+    return DEFAULT_COLOR
+
+
+def encode_graph(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], version: int = 0) -> bytes:
+    """Encode graph_nodes / graph_edges rows"""
+    n = len(nodes)
+    index = {row["id"]: i for i, row in enumerate(nodes)}
+    positions = np.array(
+        [(row["position_x"] or 0.0, row["position_y"] or 0.0, row["position_z"] or 0.0) for row in nodes],
+        dtype="<f4",
+    ).reshape(n, 3)
+    sizes = np.array([row["size"] if row["size"] is not None else 1.0 for row in nodes], dtype="<f4")
+    importance = np.array([row["importance"] if row["importance"] is not None else 0.5 for row in nodes], dtype="<f4")
+    source = np.array([index.get(e["source_node_id"], -1) for e in edges], dtype=np.int64)
+    target = np.array([index.get(e["target_node_id"], -1) for e in edges], dtype=np.int64)
+    linked = (source >= 0) & (target >= 0)
+    pairs = np.stack([source[linked], target[linked]], axis=1).astype("<u4")
+    weights = np.array([1.0 if e["weight"] is None else e["weight"] for e in edges], dtype="<f4")[linked]
+    ids = bytes.fromhex("".join(str(row["id"]) for row in nodes).replace("-", ""))
+    palette: Dict[Any, tuple] = {}
+    colors = np.array(
+        [palette[c] if c in palette else palette.setdefault(c, _rgb(c)) for c in (row["color"] for row in nodes)],
+        dtype=np.uint8,
+    ).reshape(n, 3)
+    type_index = {name: i for i, name in enumerate(NODE_TYPES)}
+    types = np.array([type_index.get(row["type"], 0) for row in nodes], dtype=np.uint8)
+    side = json.dumps({"labels": [row["label"] for row in nodes]}, ensure_ascii=False, separators=(",", ":")).encode()
+    return b"".join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, n, len(pairs), float(version), len(side), 0),
+        positions.tobytes(), sizes.tobytes(), importance.tobytes(), pairs.tobytes(), weights.tobytes(),
+        ids, colors.tobytes(), types.tobytes(), side,
+    ])
+
+
+def decode_graph(data: bytes) -> Dict[str, Any]:
+    """Column views of an encoded graph (the Python twin of the frontend decoder)"""
+    magic, fmt, n, m, version, side_length, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("Not a ZGB1 graph")
+    offset = HEADER.size
+
+    def column(dtype, count, shape=None):
+        nonlocal offset
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array.reshape(shape) if shape else array
+
+    graph = {
+        "version": int(version),
+        "positions": column("<f4", n * 3, (n, 3)),
+        "sizes": column("<f4", n),
+        "importance": column("<f4", n),
+        "edges": column("<u4", m * 2, (m, 2)),
+        "weights": column("<f4", m),
+        "ids": column(np.uint8, n * 16, (n, 16)),
+        "colors": column(np.uint8, n * 3, (n, 3)),
+        "types": column(np.uint8, n),
+    }
+    graph["labels"] = json.loads(data[offset:offset + side_length])["labels"]
+    return graph
@@ -0,0 +1,464 @@
+"""
+Zyron AI - In-memory workspace graph index
+
+"What is this concept connected to" used to be one `graph_edges` lookup
+per hop. GraphIndexService keeps recently queried workspace graphs in
+memory as a compressed sparse row (CSR) adjacency and answers k-hop
+neighborhoods, shortest paths and strongest neighbors without touching
+the store.
+
+The adjacency is undirected: relations count in both directions, and
+parallel edges (e.g. `relates_to` and `part_of` between the same two
+concepts) are merged into one entry whose weight is their sum.
+
+Indexes follow the graph through the versioned reads of graph_sync: once
+a workspace is marked stale (the concept pipeline wrote to it) or its
+index is older than `max_age`, the next query applies
+`changes(since=<index version>)`. New adjacency entries go to a small
+overlay next to the CSR arrays, and the CSR is rebuilt once the overlay
+grows past a fraction of the graph. Least recently queried workspaces
+are dropped when the indexes together exceed `max_bytes`.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from graph_sync import DEFAULT_TOMBSTONE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry cost of the Python-side tables, for the memory cap
+NODE_BYTES = 200
+EDGE_BYTES = 200
+OVERLAY_BYTES = 150
+
+
+def build_csr(edges: List[Tuple[int, int, float]], n: int) -> Tuple[np.ndarray, ...]:
+    """(indptr, indices, weights, counts) of the undirected adjacency of n nodes
+
+    Both directions of every edge are entries; parallel edges share one entry
+    (weights summed, `counts` of them kept so removals can be undone).
+    """
+    links = np.array([edge for edge in edges if edge[0] != edge[1]], dtype=np.float64).reshape(-1, 3)
+    rows = np.concatenate([links[:, 0], links[:, 1]]).astype(np.int64)
+    cols = np.concatenate([links[:, 1], links[:, 0]]).astype(np.int64)
+    keys, inverse = np.unique(rows * n + cols, return_inverse=True)
+    weights = np.bincount(inverse, weights=np.concatenate([links[:, 2], links[:, 2]]), minlength=len(keys))
+    counts = np.bincount(inverse, minlength=len(keys)).astype(np.int32)
+    # np.unique sorts the keys: rows ascending, neighbors ascending within a row
+    indices = (keys % max(n, 1)).astype(np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // max(n, 1), minlength=n), out=indptr[1:])
+    return indptr, indices, weights, counts
+
+
+class WorkspaceIndex:
+    """CSR adjacency of one workspace graph, with an overlay for recent changes
+
+    Not thread-safe: built in a worker thread, then only used from the
+    event loop.
+    """
+
+    def __init__(self, workspace_id: str, snapshot: Dict[str, Any]):
+        self.workspace_id = workspace_id
+        self.ids: List[str] = []
+        self.labels: List[str] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.index: Dict[str, int] = {}
+        # Edge id -> (source index, target index, weight), to undo updates and deletes
+        self.edges: Dict[str, Tuple[int, int, float]] = {}
+        self.overlay: Dict[int, Dict[int, List]] = {}
+        self.pending = 0
+        # Masks are skipped while nothing is deleted
+        self.dead_entries = 0
+        self.dead_nodes = 0
+        self._add_nodes(snapshot["nodes"])
+        for row in snapshot["edges"]["inserted"]:
+            self._register(row)
+        self.version = snapshot["version"]
+        self.checked_at = time.monotonic()
+        self.rebuild()
+
+    def rebuild(self, arrays: Optional[Tuple[np.ndarray, ...]] = None):
+        """Fold the overlay into fresh CSR arrays (from build_csr, computed here when not given)"""
+        self.indptr, self.indices, self.weights, self.counts = arrays or build_csr(list(self.edges.values()), len(self.ids))
+        self.overlay = {}
+        self.pending = 0
+        self.dead_entries = 0
+        self.memory = self._memory()
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self.pending > max(1024, len(self.indices) // 10)
+
+    def _add_nodes(self, nodes: Dict[str, List]):
+        known = len(self.ids)
+        for row in nodes["inserted"] + nodes["updated"]:
+            i = self.index.get(row["id"])
+            if i is None:
+                self.index[row["id"]] = len(self.ids)
+                self.ids.append(row["id"])
+                self.labels.append(row["label"])
+            else:
+                self.labels[i] = row["label"]
+                if i < known:
+                    self.alive[i] = True
+        self.alive = np.concatenate([self.alive, np.ones(len(self.ids) - known, dtype=bool)])
+        for id_ in nodes["deleted"]:
+            i = self.index.get(id_)
+            if i is not None:
+                self.alive[i] = False
+        self.dead_nodes = len(self.alive) - int(self.alive.sum())
+
+    def _register(self, row: Dict[str, Any]) -> Optional[Tuple[int, int, float]]:
+        """Record an edge row; None when an endpoint is unknown"""
+        u, v = self.index.get(row["source_node_id"]), self.index.get(row["target_node_id"])
+        if u is None or v is None:
+            return None
+        edge = self.edges[row["id"]] = (u, v, 1.0 if row["weight"] is None else float(row["weight"]))
+        return edge
+
+    def apply(self, changes: Dict[str, Any]):
+        """Apply a `store.changes` answer newer than this index"""
+        edges = changes["edges"]
+        self._add_nodes(changes["nodes"])
+        for id_ in edges["deleted"]:
+            old = self.edges.pop(id_, None)
+            if old is not None:
+                self._adjust(old[0], old[1], -old[2], -1)
+        for row in edges["inserted"] + edges["updated"]:
+            old = self.edges.get(row["id"])
+            if old is not None:
+                self._adjust(old[0], old[1], -old[2], -1)
+            edge = self._register(row)
+            if edge is not None:
+                self._adjust(*edge, 1)
+        self.version = changes["version"]
+        self.memory = self._memory()
+
+    def _adjust(self, u: int, v: int, weight: float, count: int):
+        if u == v:
+            return
+        for a, b in ((u, v), (v, u)):
+            position = self._find(a, b)
+            if position >= 0:
+                before = self.counts[position]
+                self.weights[position] += weight
+                self.counts[position] += count
+                if self.counts[position] == 0:
+                    self.dead_entries += 1
+                    self.pending += 1
+                elif before == 0:
+                    self.dead_entries -= 1
+                continue
+            row = self.overlay.setdefault(a, {})
+            entry = row.get(b)
+            if entry is None:
+                entry = row[b] = [0.0, 0]
+                self.pending += 1
+            entry[0] += weight
+            entry[1] += count
+            if entry[1] <= 0:
+                del row[b]
+
+    def _find(self, a: int, b: int) -> int:
+        """Position of neighbor b in row a of the CSR, or -1"""
+        if a + 1 >= len(self.indptr):
+            return -1
+        start, end = self.indptr[a], self.indptr[a + 1]
+        position = start + int(np.searchsorted(self.indices[start:end], b))
+        return position if position < end and self.indices[position] == b else -1
+
+    def _memory(self) -> int:
+        arrays = self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes + self.counts.nbytes
+        return (arrays + NODE_BYTES * len(self.ids) + EDGE_BYTES * len(self.edges)
+                + OVERLAY_BYTES * sum(len(row) for row in self.overlay.values()))
+
+    def node(self, node_id: str) -> int:
+        i = self.index.get(node_id)
+        if i is None or not self.alive[i]:
+            raise KeyError(node_id)
+        return i
+
+    def _expand(self, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(from, to, weight) of every live relation of the frontier nodes"""
+        if len(frontier) <= 32:
+            sources, targets, weights = [], [], []
+            for i in frontier.tolist():
+                nodes, linked = self.neighbors(i)
+                sources.extend([i] * len(nodes))
+                targets.extend(nodes)
+                weights.extend(linked)
+            return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64), np.array(weights)
+        rows = frontier[frontier + 1 < len(self.indptr)]
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        # CSR positions of all the rows' entries, in one gather
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        linked = self.counts[positions] > 0
+        sources = np.repeat(rows, lengths)[linked]
+        targets = self.indices[positions][linked].astype(np.int64)
+        weights = self.weights[positions][linked]
+        if self.overlay:
+            if len(frontier) <= len(self.overlay):
+                rows = [i for i in frontier.tolist() if i in self.overlay]
+            else:
+                keys = np.fromiter(self.overlay, dtype=np.int64, count=len(self.overlay))
+                rows = keys[np.isin(keys, frontier)].tolist()
+            extra = [(i, j, w) for i in rows for j, (w, _) in self.overlay[i].items()]
+            if extra:
+                more = np.array(extra, dtype=np.float64).reshape(-1, 3)
+                sources = np.concatenate([sources, more[:, 0].astype(np.int64)])
+                targets = np.concatenate([targets, more[:, 1].astype(np.int64)])
+                weights = np.concatenate([weights, more[:, 2]])
+        live = self.alive[targets]
+        return sources[live], targets[live], weights[live]
+
+    def neighbors(self, i: int) -> Tuple[List[int], List[float]]:
+        """Live neighbors of node i and the summed weights of their relations"""
+        if i + 1 < len(self.indptr):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            row, weights = self.indices[start:end], self.weights[start:end]
+            if self.dead_entries or self.dead_nodes:
+                keep = (self.counts[start:end] > 0) & self.alive[row]
+                row, weights = row[keep], weights[keep]
+            nodes, weights = row.tolist(), weights.tolist()
+        else:
+            nodes, weights = [], []
+        for j, (weight, _) in self.overlay.get(i, {}).items():
+            if not self.dead_nodes or self.alive[j]:
+                nodes.append(j)
+                weights.append(weight)
+        return nodes, weights
+
+    def _describe(self, i: int, **fields) -> Dict[str, Any]:
+        return {"id": self.ids[i], "label": self.labels[i], **fields}
+
+    def neighborhood(self, node_id: str, hops: int, limit: int) -> Dict[str, Any]:
+        """Nodes within `hops` relations of a node, nearest first (breadth-first, a level at a time)"""
+        start = self.node(node_id)
+        seen = np.zeros(len(self.ids), dtype=bool)
+        seen[start] = True
+        frontier = np.array([start], dtype=np.int64)
+        found: List[Dict[str, Any]] = []
+        truncated = False
+        for depth in range(1, hops + 1):
+            targets = self._expand(frontier)[1]
+            frontier = np.unique(targets[~seen[targets]])
+            if not len(frontier):
+                break
+            seen[frontier] = True
+            room = limit - len(found)
+            found.extend(self._describe(j, hops=depth) for j in frontier[:room].tolist())
+            if len(frontier) > room:
+                truncated = True
+                break
+        return {"node": self._describe(start), "nodes": found, "truncated": truncated}
+
+    def shortest_path(self, source_id: str, target_id: str, weighted: bool = False) -> Dict[str, Any]:
+        """Fewest relations from source to target; with `weighted`, relation
+        cost is 1 / weight, so paths prefer strong relations"""
+        source, target = self.node(source_id), self.node(target_id)
+        found = self._dijkstra(source, target) if weighted else self._bfs(source, target)
+        if found is None:
+            return {"path": None, "hops": None, "cost": None}
+        path, cost = found
+        return {"path": [self._describe(i) for i in path], "hops": len(path) - 1, "cost": round(cost, 6)}
+
+    def _bfs(self, source: int, target: int) -> Optional[Tuple[List[int], float]]:
+        """Bidirectional breadth-first search, growing the smaller frontier a level at a time"""
+        n = len(self.ids)
+        depth = [np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64)]
+        parent = [np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64)]
+        frontiers = [np.array([source], dtype=np.int64), np.array([target], dtype=np.int64)]
+        levels = [0, 0]
+        depth[0][source] = depth[1][target] = 0
+        meet = source if source == target else None
+        while meet is None and len(frontiers[0]) and len(frontiers[1]):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            sources, targets, _ = self._expand(frontiers[side])
+            new = depth[side][targets] < 0
+            sources, targets = sources[new], targets[new]
+            parent[side][targets] = sources
+            frontier = np.unique(targets)
+            levels[side] += 1
+            depth[side][frontier] = levels[side]
+            frontiers[side] = frontier
+            reached = frontier[depth[1 - side][frontier] >= 0]
+            if len(reached):
+                meet = int(reached[np.argmin(depth[1 - side][reached])])
+        if meet is None:
+            return None
+        path = [meet]
+        while path[-1] != source:
+            path.append(int(parent[0][path[-1]]))
+        path.reverse()
+        while path[-1] != target:
+            path.append(int(parent[1][path[-1]]))
+        return path, len(path) - 1
+
+    def _dijkstra(self, source: int, target: int) -> Optional[Tuple[List[int], float]]:
+        """Bidirectional Dijkstra, settling the side with the nearer frontier first"""
+        if source == target:
+            return [source], 0.0
+        dist: Tuple[Dict[int, float], Dict[int, float]] = ({source: 0.0}, {target: 0.0})
+        parent: Tuple[Dict[int, int], Dict[int, int]] = ({source: source}, {target: target})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        done: Tuple[Set[int], Set[int]] = (set(), set())
+        best, meet = float("inf"), None
+        # Stops once no path through the unsettled nodes can beat the best one found
+        while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best:
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d, i = heapq.heappop(heaps[side])
+            if i in done[side]:
+                continue
+            done[side].add(i)
+            near, far = dist[side], dist[1 - side]
+            for j, w in zip(*self.neighbors(i)):
+                step = d + 1.0 / max(w, 1e-9)
+                if step < near.get(j, float("inf")):
+                    near[j] = step
+                    parent[side][j] = i
+                    heapq.heappush(heaps[side], (step, j))
+                if j in far and near[j] + far[j] < best:
+                    best, meet = near[j] + far[j], j
+        if meet is None:
+            return None
+        path = [meet]
+        while path[-1] != source:
+            path.append(parent[0][path[-1]])
+        path.reverse()
+        while path[-1] != target:
+            path.append(parent[1][path[-1]])
+        return path, best
+
+    def top_neighbors(self, node_id: str, k: int) -> Dict[str, Any]:
+        """The k neighbors with the strongest relations to a node"""
+        i = self.node(node_id)
+        nodes, weights = self.neighbors(i)
+        best = heapq.nlargest(k, zip(weights, nodes))
+        return {"node": self._describe(i), "neighbors": [self._describe(j, weight=w) for w, j in best]}
+
+
+class GraphIndexService:
+    """Per-workspace graph indexes, loaded on first query and kept under a memory cap (LRU)"""
+
+    def __init__(self, store, max_bytes: int = 256 * 1024 * 1024, max_age: float = 30.0,
+                 tombstone_seconds: float = DEFAULT_TOMBSTONE_SECONDS):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.tombstone_seconds = tombstone_seconds
+        self._indexes: "OrderedDict[str, WorkspaceIndex]" = OrderedDict()
+        self._stale: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.loads = 0
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.evictions = 0
+
+    def invalidate(self, workspace_ids: Iterable[str]):
+        """Mark indexes out of date (e.g. after the pipeline wrote their graphs)"""
+        self._stale.update(ws for ws in workspace_ids if ws in self._indexes)
+
+    def _fresh(self, workspace_id: str) -> Optional[WorkspaceIndex]:
+        index = self._indexes.get(workspace_id)
+        if index is None or workspace_id in self._stale or time.monotonic() - index.checked_at > self.max_age:
+            return None
+        self._indexes.move_to_end(workspace_id)
+        return index
+
+    async def get(self, workspace_id: str) -> WorkspaceIndex:
+        """The index of a workspace, loaded or brought up to date first if needed"""
+        index = self._fresh(workspace_id)
+        if index is not None:
+            return index
+        # One store connection: loads and refreshes run one at a time
+        async with self._lock:
+            index = self._fresh(workspace_id)
+            if index is not None:
+                return index
+            index = self._indexes.get(workspace_id)
+            checked_at = time.monotonic()
+            # Writes landing during the read below mark the workspace stale again
+            self._stale.discard(workspace_id)
+            changes = await asyncio.to_thread(
+                self.store.changes, workspace_id, None if index is None else index.version, self.tombstone_seconds
+            )
+            edge_rows = sum(len(changes["edges"][kind]) for kind in ("inserted", "updated", "deleted"))
+            if index is None or changes["full"] or edge_rows > max(1024, len(index.edges) // 10):
+                if index is not None and not changes["full"]:
+                    # Many changed edges: loading afresh beats patching them one by one
+                    changes = await asyncio.to_thread(self.store.changes, workspace_id, None, self.tombstone_seconds)
+                started = time.perf_counter()
+                index = await asyncio.to_thread(WorkspaceIndex, workspace_id, changes)
+                self.loads += 1
+                logger.info(
+                    f"🗂️  Indexed workspace {workspace_id}: {len(index.ids)} nodes, {len(index.edges)} edges "
+                    f"in {time.perf_counter() - started:.3f}s"
+                )
+            else:
+                index.apply(changes)
+                self.refreshes += 1
+                if index.needs_rebuild:
+                    # Queries keep using the current arrays and overlay meanwhile
+                    index.rebuild(await asyncio.to_thread(build_csr, list(index.edges.values()), len(index.ids)))
+                    self.rebuilds += 1
+            index.checked_at = checked_at
+            self._indexes[workspace_id] = index
+            self._indexes.move_to_end(workspace_id)
+            self._evict()
+            return index
+
+    def _evict(self):
+        total = sum(index.memory for index in self._indexes.values())
+        # The most recently used index stays, even alone over the cap
+        while total > self.max_bytes and len(self._indexes) > 1:
+            workspace_id, index = self._indexes.popitem(last=False)
+            self._stale.discard(workspace_id)
+            total -= index.memory
+            self.evictions += 1
+
+    async def _query(self, workspace_id: str, method: str, *args) -> Dict[str, Any]:
+        index = await self.get(workspace_id)
+        started = time.perf_counter()
+        result = getattr(index, method)(*args)
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return result
+
+    async def neighborhood(self, workspace_id: str, node_id: str, hops: int = 1, limit: int = 1000) -> Dict[str, Any]:
+        return await self._query(workspace_id, "neighborhood", node_id, hops, limit)
+
+    async def shortest_path(self, workspace_id: str, source_id: str, target_id: str, weighted: bool = False) -> Dict[str, Any]:
+        return await self._query(workspace_id, "shortest_path", source_id, target_id, weighted)
+
+    async def top_neighbors(self, workspace_id: str, node_id: str, k: int = 10) -> Dict[str, Any]:
+        return await self._query(workspace_id, "top_neighbors", node_id, k)
+
+    def close(self):
+        self._indexes.clear()
+        self.store.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        return {
+            "workspaces": len(self._indexes),
+            "bytes": sum(index.memory for index in self._indexes.values()),
+            "max_bytes": self.max_bytes,
+            "stale": len(self._stale),
+            "queries": self.queries,
+            "avg_query_us": round(self.query_seconds / self.queries * 1e6, 1) if self.queries else 0.0,
+            "loads": self.loads,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,427 @@
+"""
+Zyron AI - Force-directed 3D layout for workspace graphs
+
+Computes `position_x/y/z` of graph_nodes on the server so the browser
+only draws. The layout is Fruchterman-Reingold in three dimensions,
+written as whole-array NumPy operations:
+
+- repulsion between all nodes uses Barnes-Hut: nodes are sorted along a
+  Morton (Z-order) curve, which gives every octree level as runs of equal
+  code prefixes. Pairs of cells are compared level by level; far apart
+  cells exchange their centre-of-mass force (plus its gradient, so the
+  force is still right away from the centre) and near ones are opened
+  into their children, so each level is a handful of array operations.
+  O(n log n) per iteration;
+- attraction along edges, weighted by edge weight;
+- a weak pull to the centre keeps disconnected parts from drifting off.
+
+Runs warm-start from stored positions. New nodes (still at the origin)
+are placed next to their already placed neighbours, and when only a few
+nodes are new a short, cool relaxation settles them while the rest of
+the graph barely moves.
+
+Layouts on request (POST /workspaces/{id}/graph/layout) are limited to
+one per workspace every `min_interval` seconds; scheduled ones are
+already debounced.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bits per axis of the Morton codes, i.e. octree depth
+DEPTH = 10
+# Step size of already placed nodes during an incremental layout, relative to new ones
+INCREMENTAL_SETTLE = 0.02
+# Nodes that moved less than this (in edge lengths) keep their stored position
+MIN_MOVE = 0.1
+
+
+def _spread_bits(x: np.ndarray) -> np.ndarray:
+    """Insert two zero bits between each of the low 10 bits"""
+    x = x & np.uint64(0x3FF)
+    x = (x | (x << np.uint64(16))) & np.uint64(0x030000FF)
+    x = (x | (x << np.uint64(8))) & np.uint64(0x0300F00F)
+    x = (x | (x << np.uint64(4))) & np.uint64(0x030C30C3)
+    x = (x | (x << np.uint64(2))) & np.uint64(0x09249249)
+    return x
+
+
+def _apply(grad: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Symmetric 3x3 matrices (xx yy zz xy xz yz rows) times vectors"""
+    return np.stack([
+        grad[:, 0] * v[:, 0] + grad[:, 3] * v[:, 1] + grad[:, 4] * v[:, 2],
+        grad[:, 3] * v[:, 0] + grad[:, 1] * v[:, 1] + grad[:, 5] * v[:, 2],
+        grad[:, 4] * v[:, 0] + grad[:, 5] * v[:, 1] + grad[:, 2] * v[:, 2],
+    ], axis=1)
+
+
+class Octree:
+    """Barnes-Hut octree over `positions`, stored level by level as flat arrays"""
+
+    def __init__(self, positions: np.ndarray):
+        low = positions.min(axis=0)
+        self.size = float((positions.max(axis=0) - low).max()) * (1 + 1e-9) or 1.0
+        cells = ((positions - low) / self.size * (1 << DEPTH)).astype(np.uint64)
+        np.minimum(cells, np.uint64((1 << DEPTH) - 1), out=cells)
+        self.codes = (
+            _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1))
+            | (_spread_bits(cells[:, 2]) << np.uint64(2))
+        )
+        order = np.argsort(self.codes, kind="stable")
+        sorted_codes = self.codes[order]
+        sorted_positions = positions[order]
+        n = len(positions)
+        # Level L (1..DEPTH): cell prefixes, body counts, centres of mass, child ranges in level L+1
+        self.prefixes: List[np.ndarray] = [np.zeros(1, dtype=np.uint64)]
+        self.counts: List[np.ndarray] = [np.array([n])]
+        self.centers: List[np.ndarray] = [sorted_positions.mean(axis=0, keepdims=True)]
+        self.radii: List[np.ndarray] = [np.zeros(1)]
+        for level in range(1, DEPTH + 1):
+            prefix = sorted_codes >> np.uint64(3 * (DEPTH - level))
+            starts = np.flatnonzero(np.concatenate(([True], prefix[1:] != prefix[:-1])))
+            counts = np.diff(np.append(starts, n))
+            self.prefixes.append(prefix[starts])
+            self.counts.append(counts)
+            centers = np.add.reduceat(sorted_positions, starts, axis=0) / counts[:, None]
+            self.centers.append(centers)
+            # Distance from the centre of mass to the farthest node: 0 for single nodes
+            offset = sorted_positions - np.repeat(centers, counts, axis=0)
+            self.radii.append(np.sqrt(np.maximum.reduceat(np.einsum("ij,ij->i", offset, offset), starts)))
+        # Children of level L cells are a contiguous run of level L+1 cells
+        self.child_start: List[np.ndarray] = []
+        self.child_count: List[np.ndarray] = []
+        self.parent: List[np.ndarray] = [np.zeros(0, dtype=np.int64)]
+        for level in range(DEPTH):
+            parents = self.prefixes[level + 1] >> np.uint64(3)
+            start = np.searchsorted(parents, self.prefixes[level], "left")
+            self.child_start.append(start)
+            self.child_count.append(np.searchsorted(parents, self.prefixes[level], "right") - start)
+            self.parent.append(np.searchsorted(self.prefixes[level], parents))
+        # Deepest cell of every node, in input order
+        self.leaf = np.empty(n, dtype=np.int64)
+        self.leaf[order] = np.searchsorted(self.prefixes[DEPTH], sorted_codes)
+
+    def repulsion(self, strength: float, theta: float) -> np.ndarray:
+        """Per-node sum over all other nodes of strength * d / |d|^2 (d points away from them)
+
+        Dual-tree traversal: pairs of same-level cells are compared, a
+        well-separated pair ((radius_a + radius_b) / distance < theta, radii
+        measured from the centres of mass to the farthest node) exchanges
+        its centre-of-mass force and that force's gradient, and other pairs
+        are replaced by the pairs of their children. Each unordered pair is
+        visited once. The first-order expansions are then pushed down the
+        tree to the nodes.
+        """
+        theta2 = theta * theta
+        cell_forces = [np.zeros((len(p), 3)) for p in self.prefixes]
+        # Gradients as the 6 entries of a symmetric 3x3 matrix: xx yy zz xy xz yz
+        cell_grads = [np.zeros((len(p), 6)) for p in self.prefixes]
+        # Unordered pairs of level-1 cells, a cell with itself included
+        first, second = np.triu_indices(len(self.prefixes[1]))
+        for level in range(1, DEPTH + 1):
+            if len(first) == 0:
+                break
+            counts = self.counts[level]
+            centers = self.centers[level]
+            same = first == second
+            delta = centers[first] - centers[second]
+            dist2 = np.einsum("ij,ij->i", delta, delta) + 1e-12
+            extent = self.radii[level][first] + self.radii[level][second]
+            # Far enough apart (two single nodes always are: exact), or no deeper level to open
+            accept = ~same & ((extent * extent < theta2 * dist2) | (level == DEPTH))
+            if accept.any():
+                a, b = first[accept], second[accept]
+                d, inv = delta[accept], strength / dist2[accept]
+                # Per pair, 9 columns: the force on `a` (x y z), then the gradient of the force
+                # field, (I - 2 d d^T / |d|^2) / |d|^2, as xx yy zz xy xz yz. Both cells see
+                # the same gradient and opposite forces.
+                outer = 2 * inv / dist2[accept]
+                values = np.empty((len(a), 9))
+                values[:, :3] = d * inv[:, None]
+                values[:, 3:6] = inv[:, None] - outer[:, None] * d * d
+                values[:, 6] = -outer * d[:, 0] * d[:, 1]
+                values[:, 7] = -outer * d[:, 0] * d[:, 2]
+                values[:, 8] = -outer * d[:, 1] * d[:, 2]
+                cells, columns = len(counts), np.arange(9)
+                for cell, other in ((a, b), (b, a)):
+                    summed = np.bincount(
+                        (cell[:, None] * 9 + columns).ravel(),
+                        (values * counts[other][:, None]).ravel(),
+                        minlength=cells * 9,
+                    ).reshape(cells, 9)
+                    cell_forces[level] += summed[:, :3]
+                    cell_grads[level] += summed[:, 3:]
+                    values[:, :3] *= -1
+            if level == DEPTH:
+                break
+            # A cell paired with itself only matters while it holds several nodes
+            open_ = ~accept & (~same | (counts[first] > 1))
+            first, second = self._child_pairs(level, first[open_], second[open_], same[open_])
+        # Push expansions down: each child gets its parent's, moved to the child's centre
+        for level in range(1, DEPTH):
+            parent = self.parent[level + 1]
+            shift = self.centers[level + 1] - self.centers[level][parent]
+            cell_forces[level + 1] += cell_forces[level][parent] + _apply(cell_grads[level][parent], shift)
+            cell_grads[level + 1] += cell_grads[level][parent]
+        return cell_forces[DEPTH][self.leaf]
+
+    def _child_pairs(self, level: int, first: np.ndarray, second: np.ndarray, same: np.ndarray):
+        """Children pairs (at level + 1) of opened cell pairs"""
+        start_a, count_a = self.child_start[level][first], self.child_count[level][first]
+        start_b, count_b = self.child_start[level][second], self.child_count[level][second]
+        # All count_a x count_b combinations per pair, flattened
+        sizes = count_a * count_b
+        pair = np.repeat(np.arange(len(first)), sizes)
+        rank = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        child_a = start_a[pair] + rank // count_b[pair]
+        child_b = start_b[pair] + rank % count_b[pair]
+        # A cell opened against itself: keep each unordered pair of its children once
+        keep = ~same[pair] | (child_a <= child_b)
+        return child_a[keep], child_b[keep]
+
+
+@dataclass
+class LayoutResult:
+    positions: np.ndarray
+    iterations: int
+    incremental: bool
+    seconds: float
+
+
+def force_layout(
+    positions: np.ndarray,
+    edges: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    placed: Optional[np.ndarray] = None,
+    iterations: int = 50,
+    incremental_iterations: int = 20,
+    incremental_fraction: float = 0.1,
+    theta: float = 1.5,
+    gravity: float = 0.02,
+    seed: int = 0,
+) -> LayoutResult:
+    """Lay out `positions` (n x 3) with `edges` (m x 2 node indices)
+
+    `placed` marks nodes whose position is meaningful; the others are
+    seeded next to their placed neighbours. When at most
+    `incremental_fraction` of the nodes are new, only
+    `incremental_iterations` short steps are run.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    n = len(positions)
+    positions = np.array(positions, dtype=np.float64).reshape(n, 3)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    weights = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=np.float64)
+    placed = np.zeros(n, dtype=bool) if placed is None else np.asarray(placed, dtype=bool)
+    if n == 0:
+        return LayoutResult(positions, 0, False, 0.0)
+
+    # Natural edge length: nodes spread over a ball whose volume grows with n
+    k = 1.0
+    radius = k * max(1.0, n ** (1 / 3))
+    new = ~placed
+    incremental = placed.any() and new.sum() <= incremental_fraction * n
+    if new.any():
+        positions[new] = _seed_positions(positions, placed, edges, rng, radius, k)
+
+    steps = incremental_iterations if incremental else iterations
+    # Maximum step per iteration: from the layout size down to a fraction of an edge.
+    # Warm starts begin cool and mostly move the new nodes; placed ones only settle.
+    temperature = 0.5 * k if incremental else radius
+    mobility = np.where(new, 1.0, INCREMENTAL_SETTLE) if incremental else np.ones(n)
+    cooling = (0.01 * k / temperature) ** (1 / max(1, steps))
+    source, target = edges[:, 0], edges[:, 1]
+    for _ in range(steps):
+        forces = Octree(positions).repulsion(k * k, theta)
+        if len(edges):
+            delta = positions[target] - positions[source]
+            dist = np.sqrt(np.einsum("ij,ij->i", delta, delta)) + 1e-9
+            pull = delta * (weights * dist / k)[:, None]
+            for axis in range(3):
+                forces[:, axis] += np.bincount(source, pull[:, axis], minlength=n)
+                forces[:, axis] -= np.bincount(target, pull[:, axis], minlength=n)
+        forces -= gravity * positions
+        length = np.sqrt(np.einsum("ij,ij->i", forces, forces)) + 1e-12
+        positions += forces * (np.minimum(length, temperature * mobility) / length)[:, None]
+        temperature *= cooling
+    return LayoutResult(positions, steps, bool(incremental), time.perf_counter() - started)
+
+
+def _seed_positions(positions, placed, edges, rng, radius: float, k: float) -> np.ndarray:
+    """Starting points for unplaced nodes: near placed neighbours, else random in the ball"""
+    new = np.flatnonzero(~placed)
+    seeded = rng.normal(size=(len(new), 3))
+    seeded *= (radius * rng.random(len(new)) ** (1 / 3) / np.linalg.norm(seeded, axis=1))[:, None]
+    if placed.any() and len(edges):
+        n = len(positions)
+        # Mean position of each node's placed neighbours
+        both = np.concatenate([edges, edges[:, ::-1]])
+        useful = placed[both[:, 1]]
+        owner, neighbour = both[useful, 0], both[useful, 1]
+        count = np.bincount(owner, minlength=n)
+        sums = np.stack([np.bincount(owner, positions[neighbour, axis], minlength=n) for axis in range(3)], axis=1)
+        has = count[new] > 0
+        near = sums[new[has]] / count[new[has], None]
+        seeded[has] = near + rng.normal(scale=0.5 * k, size=(has.sum(), 3))
+    return seeded
+
+
+def is_placed(rows: List[Dict]) -> np.ndarray:
+    """Stored nodes that have a position (the schema default is the origin)"""
+    return np.array([bool(r["position_x"] or r["position_y"] or r["position_z"]) for r in rows], dtype=bool)
+
+
+class LayoutRateLimited(Exception):
+    """A layout was requested again too soon after the last one for the workspace"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Layout requested too often, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class GraphLayoutService:
+    """Runs layouts per workspace in a worker thread and writes positions back in bulk"""
+
+    def __init__(self, store, debounce: float = 5.0, iterations: int = 50, incremental_iterations: int = 20,
+                 theta: float = 1.5, min_interval: float = 10.0):
+        self.store = store
+        self.debounce = debounce
+        self.iterations = iterations
+        self.incremental_iterations = incremental_iterations
+        self.theta = theta
+        self.min_interval = min_interval
+        self._scheduled: Dict[str, asyncio.TimerHandle] = {}
+        # Locks of workspaces with a layout running or waiting, and how many
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        # Last requested layout per workspace, oldest first (kept for min_interval)
+        self._requested: "OrderedDict[str, float]" = OrderedDict()
+        self._running: Set[asyncio.Task] = set()
+        self.layouts = 0
+        self.incremental_layouts = 0
+        self.nodes_written = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.last: Optional[Dict] = None
+
+    def schedule(self, workspace_ids):
+        """Lay out these workspaces once their graph has been quiet for `debounce` seconds"""
+        loop = asyncio.get_running_loop()
+        for workspace_id in workspace_ids:
+            handle = self._scheduled.pop(workspace_id, None)
+            if handle is not None:
+                handle.cancel()
+            self._scheduled[workspace_id] = loop.call_later(self.debounce, self._start, workspace_id)
+
+    def _start(self, workspace_id: str):
+        self._scheduled.pop(workspace_id, None)
+        task = asyncio.ensure_future(self.run(workspace_id))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def request(self, workspace_id: str, full: bool = False) -> Dict:
+        """Lay out one workspace now for a client; LayoutRateLimited within min_interval of the last request"""
+        now = time.monotonic()
+        while self._requested and next(iter(self._requested.values())) <= now - self.min_interval:
+            self._requested.popitem(last=False)
+        last = self._requested.get(workspace_id)
+        if last is not None:
+            self.rate_limited += 1
+            raise LayoutRateLimited(max(1, math.ceil(last + self.min_interval - now)))
+        self._requested[workspace_id] = now
+        return await self.run(workspace_id, full=full)
+
+    async def run(self, workspace_id: str, full: bool = False) -> Dict:
+        """Lay out one workspace now; one layout per workspace at a time"""
+        lock = self._locks.setdefault(workspace_id, asyncio.Lock())
+        self._lock_users[workspace_id] = self._lock_users.get(workspace_id, 0) + 1
+        try:
+            async with lock:
+                summary = await asyncio.to_thread(self._layout, workspace_id, full)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Layout of workspace {workspace_id} failed: {e}", exc_info=True)
+            raise
+        finally:
+            # The last one out drops the lock, so idle workspaces cost nothing
+            self._lock_users[workspace_id] -= 1
+            if not self._lock_users[workspace_id]:
+                del self._lock_users[workspace_id]
+                del self._locks[workspace_id]
+        self.layouts += 1
+        self.incremental_layouts += summary["incremental"]
+        self.nodes_written += summary["written"]
+        self.last = summary
+        logger.info(
+            f"🕸️  Laid out workspace {workspace_id}: {summary['nodes']} nodes, {summary['edges']} edges, "
+            f"{summary['iterations']} iterations in {summary['seconds']:.2f}s"
+        )
+        return summary
+
+    def _layout(self, workspace_id: str, full: bool) -> Dict:
+        nodes = self.store.nodes(workspace_id)
+        edges = self.store.edges(workspace_id)
+        index = {row["id"]: i for i, row in enumerate(nodes)}
+        pairs = [
+            (index[e["source_node_id"]], index[e["target_node_id"]], e["weight"] or 1.0)
+            for e in edges
+            if e["source_node_id"] in index and e["target_node_id"] in index
+        ]
+        positions = np.array([[r["position_x"] or 0.0, r["position_y"] or 0.0, r["position_z"] or 0.0] for r in nodes])
+        result = force_layout(
+            positions,
+            np.array([p[:2] for p in pairs], dtype=np.int64).reshape(-1, 2),
+            # Weights keep growing with mentions: pull harder for repeated relations, but not linearly
+            np.log1p(np.array([p[2] for p in pairs], dtype=np.float64)),
+            placed=None if full else is_placed(nodes),
+            iterations=self.iterations,
+            incremental_iterations=self.incremental_iterations,
+            theta=self.theta,
+        )
+        # Only rows that visibly moved are written (and sent to clients as changed)
+        moved = np.flatnonzero(np.linalg.norm(result.positions - positions, axis=1) >= MIN_MOVE) if len(nodes) else []
+        started = time.perf_counter()
+        self.store.update_positions(workspace_id, [nodes[i]["id"] for i in moved], result.positions[moved])
+        return {
+            "workspace_id": workspace_id,
+            "nodes": len(nodes),
+            "written": len(moved),
+            "edges": len(pairs),
+            "iterations": result.iterations,
+            "incremental": result.incremental,
+            "seconds": round(result.seconds, 3),
+            "write_seconds": round(time.perf_counter() - started, 3),
+        }
+
+    async def close(self):
+        for handle in self._scheduled.values():
+            handle.cancel()
+        self._scheduled.clear()
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        self.store.close()
+
+    def snapshot(self) -> Dict:
+        """Counters for /metrics"""
+        return {
+            "layouts": self.layouts,
+            "incremental_layouts": self.incremental_layouts,
+            "nodes_written": self.nodes_written,
+            "scheduled": len(self._scheduled),
+            "running": len(self._running),
+            "locked_workspaces": len(self._locks),
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "last": self.last,
+        }
@@ -0,0 +1,472 @@
+"""
+Zyron AI - Workspace concept graph storage
+
+The Visual Brain graph lives in the `graph_nodes` and `graph_edges`
+tables (SUPABASE_SCHEMA.sql). The extraction pipeline writes to it in
+batches through a store:
+
+- SQLiteGraphStore keeps the same tables in a local file (dev and tests);
+- SupabaseGraphStore calls the `apply_concept_graph` database function
+  over PostgREST.
+
+Both also read a workspace's rows and write layout positions back in
+bulk for graph_layout.
+
+Every workspace has a graph version that goes up with each write. Rows
+carry the version that last changed them (`version`) and the one that
+inserted them (`created_version`), and deleted rows leave a tombstone,
+so `changes(workspace_id, since)` returns only what a client holding
+version `since` is missing.
+
+Node and edge ids are derived from the workspace and the concept key
+(uuid5), so re-extracting a concept updates its row instead of adding a
+duplicate. Every applied message id is recorded in
+`graph_processed_messages` in the same transaction as its counts, so
+processing a message twice changes nothing. A batch the store refuses
+(e.g. a message for a workspace that does not exist) raises
+GraphWriteRejected; other errors are worth retrying.
+"""
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+# Client errors that say nothing about the batch itself (auth, timeouts, rate limits)
+RETRYABLE_STATUS = frozenset({401, 403, 408, 429})
+
+# Namespace for node and edge uuid5 ids
+GRAPH_NAMESPACE = uuid.UUID("5b0e6d1c-2f7a-4c36-9a41-3c8f0e9d2b17")
+
+
+class GraphWriteRejected(Exception):
+    """The store refused a batch because of what is in it; sending it again would fail again"""
+
+
+def node_id(workspace_id: str, key: str) -> str:
+    return str(uuid.uuid5(GRAPH_NAMESPACE, f"node:{workspace_id}:{key}"))
+
+
+def edge_id(workspace_id: str, source_id: str, target_id: str, edge_type: str) -> str:
+    return str(uuid.uuid5(GRAPH_NAMESPACE, f"edge:{workspace_id}:{source_id}:{target_id}:{edge_type}"))
+
+
+def importance(mentions: int) -> float:
+    """0.5 for a concept seen once, approaching 1 as mentions grow"""
+    return mentions / (mentions + 1)
+
+
+@dataclass
+class GraphNode:
+    id: str
+    label: str
+    type: str
+    # Mentions in this message
+    mentions: int
+
+
+@dataclass
+class GraphEdge:
+    id: str
+    source: str
+    target: str
+    type: str
+    weight: float
+
+
+@dataclass
+class MessageGraph:
+    """Concepts and relations extracted from one assistant message"""
+    message_id: str
+    workspace_id: str
+    nodes: List[GraphNode] = field(default_factory=list)
+    edges: List[GraphEdge] = field(default_factory=list)
+
+
+class SQLiteGraphStore:
+    """graph_nodes / graph_edges in a local SQLite file
+
+    Same calling conventions as usage_ledger.SQLiteStore: calls block, run
+    in a worker thread and are serialized by the caller; each process
+    opens its own connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.conn
+        self.close()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = self._connect()
+            self._pid = os.getpid()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Deleting a node deletes (and tombstones) its edges
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS graph_nodes (
+                id TEXT PRIMARY KEY,
+                workspace_id TEXT NOT NULL,
+                label TEXT NOT NULL,
+                type TEXT NOT NULL,
+                position_x REAL DEFAULT 0,
+                position_y REAL DEFAULT 0,
+                position_z REAL DEFAULT 0,
+                color TEXT DEFAULT '#3B82F6',
+                size REAL DEFAULT 1.0,
+                mentions_count INTEGER DEFAULT 1,
+                importance REAL DEFAULT 0.5,
+                metadata TEXT DEFAULT '{}',
+                created_at REAL NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                created_version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_nodes_workspace ON graph_nodes (workspace_id);
+            CREATE TABLE IF NOT EXISTS graph_edges (
+                id TEXT PRIMARY KEY,
+                workspace_id TEXT NOT NULL,
+                source_node_id TEXT REFERENCES graph_nodes (id) ON DELETE CASCADE,
+                target_node_id TEXT REFERENCES graph_nodes (id) ON DELETE CASCADE,
+                weight REAL DEFAULT 1.0,
+                type TEXT DEFAULT 'relates_to',
+                created_at REAL NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                created_version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_edges_workspace ON graph_edges (workspace_id);
+            CREATE INDEX IF NOT EXISTS idx_edges_source ON graph_edges (source_node_id);
+            CREATE INDEX IF NOT EXISTS idx_edges_target ON graph_edges (target_node_id);
+            CREATE TABLE IF NOT EXISTS graph_processed_messages (
+                message_id TEXT PRIMARY KEY,
+                workspace_id TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS graph_versions (
+                workspace_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                -- Tombstones up to this version were dropped
+                pruned_version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS graph_tombstones (
+                kind TEXT NOT NULL,
+                id TEXT NOT NULL,
+                workspace_id TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                deleted_at REAL NOT NULL,
+                PRIMARY KEY (kind, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_tombstones_workspace ON graph_tombstones (workspace_id, version);
+        """)
+        # Files created before graph versions existed
+        for table in ("graph_nodes", "graph_edges"):
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column in ("version", "created_version"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_nodes_version ON graph_nodes (workspace_id, version)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_edges_version ON graph_edges (workspace_id, version)")
+        # Deletes from anywhere leave a tombstone at a new version
+        for table, kind in (("graph_nodes", "node"), ("graph_edges", "edge")):
+            conn.executescript(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_tombstone AFTER DELETE ON {table} BEGIN
+                    INSERT OR IGNORE INTO graph_versions (workspace_id) VALUES (old.workspace_id);
+                    UPDATE graph_versions SET version = version + 1 WHERE workspace_id = old.workspace_id;
+                    INSERT OR REPLACE INTO graph_tombstones (kind, id, workspace_id, version, deleted_at)
+                    SELECT '{kind}', old.id, old.workspace_id, version, (julianday('now') - 2440587.5) * 86400
+                    FROM graph_versions WHERE workspace_id = old.workspace_id;
+                END;
+            """)
+        conn.commit()
+        return conn
+
+    def _next_versions(self, workspace_ids: Iterable[str]) -> Dict[str, int]:
+        """Bump the graph version of each workspace (inside the caller's transaction)"""
+        versions = {}
+        for workspace_id in set(workspace_ids):
+            self.conn.execute("INSERT OR IGNORE INTO graph_versions (workspace_id) VALUES (?)", (workspace_id,))
+            versions[workspace_id] = self.conn.execute(
+                "UPDATE graph_versions SET version = version + 1 WHERE workspace_id = ? RETURNING version",
+                (workspace_id,),
+            ).fetchone()[0]
+        return versions
+
+    def processed(self, message_ids: Iterable[str]) -> Set[str]:
+        """The ids in `message_ids` that were already applied"""
+        ids = list(message_ids)
+        done: Set[str] = set()
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT message_id FROM graph_processed_messages WHERE message_id IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            done.update(row[0] for row in rows)
+        return done
+
+    def apply(self, batch: List[MessageGraph]) -> Tuple[int, int]:
+        """Add a batch of messages' counts in one transaction: (applied, already processed)"""
+        try:
+            return self._apply(batch)
+        except sqlite3.IntegrityError as e:
+            # Rolled back; the batch breaks a constraint and would on every try
+            raise GraphWriteRejected(str(e)) from e
+
+    def _apply(self, batch: List[MessageGraph]) -> Tuple[int, int]:
+        now = time.time()
+        nodes: Dict[str, Tuple[str, str, str, int]] = {}
+        edges: Dict[str, Tuple[str, str, str, str, float]] = {}
+        applied = skipped = 0
+        with self.conn:
+            for message in batch:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO graph_processed_messages (message_id, workspace_id, processed_at) VALUES (?, ?, ?)",
+                    (message.message_id, message.workspace_id, now),
+                )
+                if cursor.rowcount == 0:
+                    skipped += 1
+                    continue
+                applied += 1
+                for node in message.nodes:
+                    seen = nodes.get(node.id)
+                    mentions = node.mentions + (seen[3] if seen else 0)
+                    nodes[node.id] = (message.workspace_id, node.label, node.type, mentions)
+                for edge in message.edges:
+                    seen = edges.get(edge.id)
+                    weight = edge.weight + (seen[4] if seen else 0.0)
+                    edges[edge.id] = (message.workspace_id, edge.source, edge.target, edge.type, weight)
+            versions = self._next_versions([ws for ws, *_ in nodes.values()] + [ws for ws, *_ in edges.values()])
+            self.conn.executemany(
+                """
+                INSERT INTO graph_nodes (id, workspace_id, label, type, mentions_count, importance, created_at,
+                                         version, created_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    mentions_count = mentions_count + excluded.mentions_count,
+                    importance = (mentions_count + excluded.mentions_count) * 1.0
+                                 / (mentions_count + excluded.mentions_count + 1),
+                    version = excluded.version
+                """,
+                [
+                    (id_, ws, label, type_, m, importance(m), now, versions[ws], versions[ws])
+                    for id_, (ws, label, type_, m) in nodes.items()
+                ],
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO graph_edges (id, workspace_id, source_node_id, target_node_id, type, weight, created_at,
+                                         version, created_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET weight = weight + excluded.weight, version = excluded.version
+                """,
+                [(id_, *edge, now, versions[edge[0]], versions[edge[0]]) for id_, edge in edges.items()],
+            )
+        return applied, skipped
+
+    def nodes(self, workspace_id: str) -> List[Dict[str, Any]]:
+        cursor = self.conn.execute("SELECT * FROM graph_nodes WHERE workspace_id = ? ORDER BY created_at, id", (workspace_id,))
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def edges(self, workspace_id: str) -> List[Dict[str, Any]]:
+        cursor = self.conn.execute("SELECT * FROM graph_edges WHERE workspace_id = ? ORDER BY created_at, id", (workspace_id,))
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def update_positions(self, workspace_id: str, node_ids: List[str], positions) -> int:
+        """Write layout positions (one x, y, z row per id) in one transaction"""
+        if not node_ids:
+            return 0
+        with self.conn:
+            version = self._next_versions([workspace_id])[workspace_id]
+            self.conn.executemany(
+                "UPDATE graph_nodes SET position_x = ?, position_y = ?, position_z = ?, version = ? WHERE id = ?",
+                [(float(x), float(y), float(z), version, id_) for id_, (x, y, z) in zip(node_ids, positions)],
+            )
+        return len(node_ids)
+
+    def changes(self, workspace_id: str, since: Optional[int], tombstone_seconds: float) -> Dict[str, Any]:
+        """Rows inserted, updated and deleted after version `since`; everything when
+        `since` is None, unknown, or older than the tombstones still kept"""
+        with self.conn:
+            cutoff = time.time() - tombstone_seconds
+            self.conn.execute("INSERT OR IGNORE INTO graph_versions (workspace_id) VALUES (?)", (workspace_id,))
+            self.conn.execute(
+                """
+                UPDATE graph_versions SET pruned_version = MAX(pruned_version, (
+                    SELECT MAX(version) FROM graph_tombstones WHERE workspace_id = ? AND deleted_at < ?
+                ))
+                WHERE workspace_id = ? AND EXISTS (
+                    SELECT 1 FROM graph_tombstones WHERE workspace_id = ? AND deleted_at < ?
+                )
+                """,
+                (workspace_id, cutoff, workspace_id, workspace_id, cutoff),
+            )
+            self.conn.execute("DELETE FROM graph_tombstones WHERE workspace_id = ? AND deleted_at < ?", (workspace_id, cutoff))
+            version, pruned = self.conn.execute(
+                "SELECT version, pruned_version FROM graph_versions WHERE workspace_id = ?", (workspace_id,)
+            ).fetchone()
+            full = since is None or since > version or since < pruned
+            after = -1 if full else since
+            result: Dict[str, Any] = {"version": version, "full": full}
+            for table, kind in (("graph_nodes", "nodes"), ("graph_edges", "edges")):
+                cursor = self.conn.execute(
+                    f"SELECT * FROM {table} WHERE workspace_id = ? AND version > ? ORDER BY created_at, id",
+                    (workspace_id, after),
+                )
+                names = [d[0] for d in cursor.description]
+                rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+                if kind == "nodes":
+                    for row in rows:
+                        row["metadata"] = json.loads(row["metadata"] or "{}")
+                deleted = [] if full else [
+                    row[0] for row in self.conn.execute(
+                        "SELECT id FROM graph_tombstones WHERE workspace_id = ? AND kind = ? AND version > ?",
+                        (workspace_id, kind[:-1], since),
+                    )
+                ]
+                result[kind] = {
+                    "inserted": [row for row in rows if row["created_version"] > after],
+                    "updated": [row for row in rows if row["created_version"] <= after],
+                    "deleted": deleted,
+                }
+        return result
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+class SupabaseGraphStore:
+    """The Supabase tables, through PostgREST and the apply_concept_graph function
+
+    Needs the service role key: the pipeline writes on behalf of every
+    workspace, outside any user's row-level security context.
+    """
+
+    def __init__(self, url: str, service_key: str, timeout: float = 30.0):
+        self.url = url.rstrip("/") + "/rest/v1"
+        self.headers = {
+            "apikey": service_key,
+            "Authorization": f"Bearer {service_key}",
+            "Content-Type": "application/json",
+        }
+        self.timeout = timeout
+        self._client: Optional[httpx.Client] = None
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(headers=self.headers, timeout=self.timeout)
+        return self._client
+
+    def processed(self, message_ids: Iterable[str]) -> Set[str]:
+        ids = list(message_ids)
+        done: Set[str] = set()
+        for start in range(0, len(ids), 200):
+            chunk = ",".join(json.dumps(i) for i in ids[start:start + 200])
+            response = self.client.get(
+                f"{self.url}/graph_processed_messages",
+                params={"select": "message_id", "message_id": f"in.({chunk})"},
+            )
+            response.raise_for_status()
+            done.update(row["message_id"] for row in response.json())
+        return done
+
+    def apply(self, batch: List[MessageGraph]) -> Tuple[int, int]:
+        payload = [
+            {
+                "message_id": m.message_id,
+                "workspace_id": m.workspace_id,
+                "nodes": [{"id": n.id, "label": n.label, "type": n.type, "mentions": n.mentions} for n in m.nodes],
+                "edges": [
+                    {"id": e.id, "source": e.source, "target": e.target, "type": e.type, "weight": e.weight}
+                    for e in m.edges
+                ],
+            }
+            for m in batch
+        ]
+        response = self.client.post(f"{self.url}/rpc/apply_concept_graph", json={"batch": payload})
+        # PostgREST answers 4xx for bad input (a malformed id, an unknown workspace)
+        if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_STATUS:
+            raise GraphWriteRejected(f"{response.status_code}: {response.text[:200]}")
+        response.raise_for_status()
+        result = response.json()
+        return result["applied"], result["skipped"]
+
+    def _select(self, table: str, workspace_id: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        while True:
+            response = self.client.get(
+                f"{self.url}/{table}",
+                params={
+                    "select": "*",
+                    "workspace_id": f"eq.{workspace_id}",
+                    "order": "created_at,id",
+                    "limit": page_size,
+                    "offset": len(rows),
+                },
+            )
+            response.raise_for_status()
+            page = response.json()
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    def nodes(self, workspace_id: str) -> List[Dict[str, Any]]:
+        return self._select("graph_nodes", workspace_id)
+
+    def edges(self, workspace_id: str) -> List[Dict[str, Any]]:
+        return self._select("graph_edges", workspace_id)
+
+    def update_positions(self, workspace_id: str, node_ids: List[str], positions, chunk: int = 5000) -> int:
+        """Bulk position write through set_graph_positions, a few thousand nodes per call"""
+        rows = [
+            {"id": id_, "x": float(x), "y": float(y), "z": float(z)}
+            for id_, (x, y, z) in zip(node_ids, positions)
+        ]
+        for start in range(0, len(rows), chunk):
+            response = self.client.post(
+                f"{self.url}/rpc/set_graph_positions", json={"positions": rows[start:start + chunk]}
+            )
+            response.raise_for_status()
+        return len(rows)
+
+    def changes(self, workspace_id: str, since: Optional[int], tombstone_seconds: float) -> Dict[str, Any]:
+        """Versions and tombstones are kept by triggers; graph_changes builds the delta in one call"""
+        response = self.client.post(
+            f"{self.url}/rpc/graph_changes",
+            json={"ws": workspace_id, "since": since, "tombstone_seconds": tombstone_seconds},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def graph_store_from_env():
+    """Supabase when SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are set, SQLite otherwise"""
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if url and key:
+        return SupabaseGraphStore(url, key)
+    return SQLiteGraphStore(os.getenv("GRAPH_DB_PATH", "data/graph.sqlite3"))
@@ -1,11 +1,43 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic, NotFoundError
 import os
+import asyncio
+import json
+import math
 from dotenv import load_dotenv
 import logging
+from contextlib import asynccontextmanager
+import hmac
 import sys
+import time
+from typing import Optional, Tuple
+
+from admission import AdmissionController, AdmissionRejected, AdmittedStreamingResponse, Permit, client_id_for
+from auth import AccessDenied, Authenticator, Caller, SupabaseWorkspaceOwners, WorkspaceAccess, canonical_uuid
+from batch import BATCH_ID, BatchItem, BatchRunner, cached_result, message_result, ndjson_line, read_items, read_lines
+from coalescer import coalesce
+from concept_graph import ConceptGraphPipeline, GraphJob
+from conversations import ConversationStore, context_budget, estimate_tokens
+from drain import DrainController
+from graph_binary import MEDIA_TYPE as GRAPH_BINARY_MEDIA_TYPE
+from graph_index import GraphIndexService
+from graph_layout import GraphLayoutService, LayoutRateLimited
+from graph_store import graph_store_from_env
+from graph_sync import DEFAULT_TOMBSTONE_SECONDS, GraphSyncService
+from markdown_blocks import BlockScanner
+from prompt_cache import cached_system, with_cache_breakpoint
+from resilience import CircuitBreaker, ResilientUpstream
+from resumable import ResumableStream, StreamRegistry
+from routing import ModelRouter, RouteDecision, RouteRequest, load_routing
+from response_cache import CachedResponse, ResponseCache, ResponseRecorder, cache_key, redis_client_from_env, replay
+from shared_state import SQLiteState, worker_count
+from singleflight import Flight, SingleFlight
+from stream_encoding import block_end_event, delta_event, done_event, dumps, encoder_for, error_event, usage_event
+from telemetry import MetricsRegistry
+from usage_ledger import SQLiteStore, UsageLedger, UsageRecord
+from ws_chat import ChatSocketHub
 
 # Configuration logging
 logging.basicConfig(
@@ -18,8 +50,25 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # `kill -USR1` drains this worker; serve.py uses it to drain all of them
+    drain.install_signal_handler()
+    yield
+    if ledger is not None:
+        await ledger.close()
+    if graph_pipeline is not None:
+        await graph_pipeline.close()
+    if graph_layout is not None:
+        await graph_layout.close()
+    graph_sync.close()
+    graph_index.close()
+    if shared_state is not None:
+        shared_state.close()
+    await workspace_access.close()
+
 # Initialize FastAPI
-app = FastAPI(title="Zyron AI")
+app = FastAPI(title="Zyron AI", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -28,6 +77,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Conversation-Id", "X-Stream-Id"],
 )
 
 # Initialize Anthropic client - SIMPLE
@@ -36,50 +86,834 @@ if not api_key:
     logger.error("❌ ANTHROPIC_API_KEY not found in .env")
     raise ValueError("ANTHROPIC_API_KEY is required")
 
-client = Anthropic(api_key=api_key)
+# Async client: the stream loop awaits upstream tokens on the event loop
+# instead of parking a threadpool worker for the whole response.
+# SDK retries are off; ResilientUpstream owns retry policy and counts failures.
+client = AsyncAnthropic(api_key=api_key, max_retries=0)
 logger.info("✅ Anthropic client initialized")
 
+SYSTEM_PROMPT = "Format your responses with clear markdown structure: use ## for headings, - for bullet points, **bold** for emphasis, and proper line breaks between sections."
+
+# Anthropic prompt caching on the system prompt and conversation prefix
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "true").lower() == "true"
+
+# Per-worker stream telemetry, served from /metrics
+stream_metrics = MetricsRegistry()
+
+# State the workers of one instance share (serve.py sets SHARED_STATE_PATH when it forks several)
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")
+shared_state = SQLiteState(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
+
+# Server-side conversation history, keyed by conversation_id
+conversations = ConversationStore(
+    shared=shared_state,
+    shared_ttl=float(os.getenv("CONVERSATION_TTL_SECONDS", "86400")),
+)
+
+# SSE frame coalescing (window 0 sends one frame per upstream delta)
+COALESCE_WINDOW_MS = float(os.getenv("SSE_COALESCE_WINDOW_MS", "16"))
+COALESCE_MAX_CHARS = int(os.getenv("SSE_COALESCE_MAX_CHARS", "1024"))
+# block_end events as markdown blocks of an answer complete
+MARKDOWN_BLOCK_EVENTS = os.getenv("MARKDOWN_BLOCK_EVENTS", "true").lower() == "true"
+
+# Response cache for repeated prompts: memory LRU, plus Redis when REDIS_HOST is set
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "true").lower() == "true"
+RESPONSE_CACHE_REPLAY_PACED = os.getenv("RESPONSE_CACHE_REPLAY", "instant") == "paced"
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "600")),
+    redis_client=redis_client_from_env(
+        os.getenv("REDIS_HOST"),
+        int(os.getenv("REDIS_PORT", "6379")),
+        os.getenv("REDIS_PASSWORD"),
+    ),
+)
+
+# Admission control: global and per-client stream caps with a fair, bounded queue
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "64")),
+    max_per_client=int(os.getenv("ADMISSION_MAX_PER_CLIENT", "4")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "128")),
+    max_queue_per_client=int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT", "8")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+    # Caps count the streams of every worker of this instance
+    shared=AdmissionController.shared_counters() if worker_count() > 1 else None,
+)
+# Trusted proxies in front of the server; the client id is read from X-Forwarded-For that many entries from the right
+ADMISSION_PROXY_HOPS = (
+    int(os.getenv("ADMISSION_TRUSTED_PROXY_HOPS", "1"))
+    if os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() == "true" else 0
+)
+
+# Pre-first-byte retries, optional TTFT hedging and a circuit breaker, per upstream model
+def make_upstream() -> ResilientUpstream:
+    return ResilientUpstream(
+        max_attempts=int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.25")),
+        max_delay=float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "4")),
+        hedge=os.getenv("UPSTREAM_HEDGE", "false").lower() == "true",
+        hedge_percentile=float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "95")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("UPSTREAM_BREAKER_RESET", "30")),
+        ),
+    )
+
+# Model table, routing rules and health-based fallback (MODEL_ROUTING_FILE overrides the built-in table)
+router = ModelRouter(
+    load_routing(os.getenv("MODEL_ROUTING_FILE")),
+    make_upstream,
+    health_window=float(os.getenv("ROUTING_HEALTH_WINDOW_SECONDS", "60")),
+    max_error_rate=float(os.getenv("ROUTING_MAX_ERROR_RATE", "0.25")),
+    min_samples=int(os.getenv("ROUTING_MIN_SAMPLES", "10")),
+    probe_rate=float(os.getenv("ROUTING_PROBE_RATE", "0.05")),
+)
+
+# Supabase access tokens; explicit model tiers are only honoured for entitled callers
+authenticator = Authenticator(
+    os.getenv("SUPABASE_JWT_SECRET"),
+    [tier.strip() for tier in os.getenv("AUTH_USER_TIERS", "fast,standard").split(",") if tier.strip()],
+)
+
+# Workspace ownership, checked before reading or writing a workspace graph with the service role key
+workspace_access = WorkspaceAccess(
+    SupabaseWorkspaceOwners(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_SERVICE_ROLE_KEY") else None,
+    cache_seconds=float(os.getenv("WORKSPACE_OWNER_CACHE_SECONDS", "60")),
+)
+
+# Identical in-flight requests share one upstream stream
+inflight = SingleFlight()
+
+# Answers are buffered per stream so dropped clients can resume with Last-Event-ID
+streams = StreamRegistry(
+    grace=float(os.getenv("RESUME_GRACE_SECONDS", "30")),
+    disconnect_grace=float(os.getenv("DISCONNECT_GRACE_SECONDS", "5")),
+    max_events=int(os.getenv("RESUME_BUFFER_MAX_EVENTS", "4096")),
+    max_streams=int(os.getenv("RESUME_MAX_STREAMS", "1000")),
+)
+
+# Bulk /chat/batch jobs: NDJSON requests in, NDJSON results out
+batches = BatchRunner(
+    concurrency=int(os.getenv("BATCH_CONCURRENCY", "8")),
+    max_concurrency=int(os.getenv("BATCH_MAX_CONCURRENCY", "32")),
+    chunk_size=int(os.getenv("BATCH_API_CHUNK_SIZE", "1000")),
+    shared=shared_state,
+)
+BATCH_MAX_LINE_BYTES = int(os.getenv("BATCH_MAX_LINE_BYTES", str(1 << 20)))
+
+# /ws/chat: many chat streams per persistent connection
+chat_sockets = ChatSocketHub(
+    disconnect_grace=streams.disconnect_grace,
+    max_streams=int(os.getenv("WS_MAX_STREAMS_PER_CONNECTION", "16")),
+    send_queue=int(os.getenv("WS_SEND_QUEUE_MESSAGES", "64")),
+    heartbeat=float(os.getenv("WS_HEARTBEAT_SECONDS", "20")),
+    idle_timeout=float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60")),
+)
+
+# Per-request token usage and cost, written in batches off the hot path
+ledger = None
+if os.getenv("USAGE_LEDGER", "true").lower() == "true":
+    ledger = UsageLedger(
+        SQLiteStore(os.getenv("USAGE_LEDGER_PATH", "data/usage.sqlite3")),
+        flush_interval=float(os.getenv("USAGE_LEDGER_FLUSH_SECONDS", "1")),
+    )
+# Required in X-Usage-Token to read /usage from anywhere but localhost
+USAGE_TOKEN = os.getenv("USAGE_TOKEN", "")
+
+# Server-side 3D layout of workspace graphs, re-run once a workspace's graph stops changing
+graph_layout = None
+if os.getenv("GRAPH_LAYOUT", "true").lower() == "true":
+    # Its own store (and SQLite connection): layouts run in a thread next to pipeline writes
+    graph_layout = GraphLayoutService(
+        graph_store_from_env(),
+        debounce=float(os.getenv("GRAPH_LAYOUT_DEBOUNCE_SECONDS", "5")),
+        iterations=int(os.getenv("GRAPH_LAYOUT_ITERATIONS", "50")),
+        incremental_iterations=int(os.getenv("GRAPH_LAYOUT_INCREMENTAL_ITERATIONS", "20")),
+        theta=float(os.getenv("GRAPH_LAYOUT_THETA", "1.5")),
+        min_interval=float(os.getenv("GRAPH_LAYOUT_MIN_INTERVAL_SECONDS", "10")),
+    )
+
+# Versioned graph reads: clients fetch only what changed since the version they hold
+graph_sync = GraphSyncService(
+    graph_store_from_env(),
+    tombstone_seconds=float(os.getenv("GRAPH_SYNC_TOMBSTONE_SECONDS", str(DEFAULT_TOMBSTONE_SECONDS))),
+)
+
+# In-memory adjacency of recently queried workspace graphs, for neighborhood and path queries
+graph_index = GraphIndexService(
+    graph_store_from_env(),
+    max_bytes=int(float(os.getenv("GRAPH_INDEX_MAX_MB", "256")) * 1024 * 1024),
+    max_age=float(os.getenv("GRAPH_INDEX_MAX_AGE_SECONDS", "30")),
+    tombstone_seconds=graph_sync.tombstone_seconds,
+)
+
+def graph_applied(workspace_ids):
+    """The concept pipeline wrote to these workspaces' graphs"""
+    graph_index.invalidate(workspace_ids)
+    if graph_layout is not None:
+        graph_layout.schedule(workspace_ids)
+
+# Workspace concept graph: completed answers are extracted and written in batches off the hot path
+graph_pipeline = None
+if os.getenv("GRAPH_PIPELINE", "true").lower() == "true":
+    graph_pipeline = ConceptGraphPipeline(
+        graph_store_from_env(),
+        concurrency=int(os.getenv("GRAPH_PIPELINE_CONCURRENCY", "4")),
+        batch_size=int(os.getenv("GRAPH_PIPELINE_BATCH_SIZE", "200")),
+        flush_interval=float(os.getenv("GRAPH_PIPELINE_FLUSH_SECONDS", "2")),
+        max_pending=int(os.getenv("GRAPH_PIPELINE_MAX_PENDING", "10000")),
+        on_applied=graph_applied,
+    )
+
+# Graceful drain for restarts: refuse new work, let running streams finish, then exit
+drain = DrainController(
+    in_flight=lambda: streams.snapshot()["active"] + admission.active + admission.queued,
+    cancel_streams=streams.cancel_all,
+    timeout=float(os.getenv("DRAIN_TIMEOUT_SECONDS", "120")),
+    retry_after=int(os.getenv("DRAIN_RETRY_AFTER_SECONDS", "5")),
+    exit_when_drained=os.getenv("DRAIN_EXIT", "true").lower() == "true",
+)
+# Required in X-Drain-Token to drain from anywhere but localhost
+DRAIN_TOKEN = os.getenv("DRAIN_TOKEN", "")
+
+
+async def stream_upstream(flight: Flight, messages: list, system, key: str, decision: RouteDecision):
+    """Producer for a single flight: stream upstream and publish each delta"""
+    recorder = ResponseRecorder()
+    upstream_stream = await router.upstream(decision.model).open(lambda: client.messages.stream(
+        model=decision.model,
+        max_tokens=decision.max_tokens,
+        messages=messages,
+        system=system
+    ))
+    async with upstream_stream:
+        # Hot loop: no logging or other I/O, subscribers are woken in memory
+        async for text in coalesce(upstream_stream.text_stream(), COALESCE_WINDOW_MS, COALESCE_MAX_CHARS):
+            recorder.add(text)
+            flight.publish(text)
+        final_message = await upstream_stream.get_final_message()
+    # Only complete answers are worth replaying
+    if RESPONSE_CACHE and final_message.stop_reason == "end_turn":
+        answer = recorder.response
+        answer.output_tokens = final_message.usage.output_tokens
+        response_cache.put(key, answer)
+    return final_message
+
+def batch_request(item: BatchItem, caller: Optional[Caller] = None) -> dict:
+    """Messages API parameters for one batch item, on the model its route picks"""
+    decision = router.route(RouteRequest(estimate_tokens(item.message), tier=authenticator.tier(caller, item.tier)))
+    return {
+        "model": decision.model,
+        "max_tokens": min(item.max_tokens or decision.max_tokens, decision.max_tokens),
+        "system": item.system or SYSTEM_PROMPT,
+        "messages": [{"role": "user", "content": item.message}],
+    }
+
+async def answer_batch_item(item: BatchItem, caller: Optional[Caller] = None) -> dict:
+    """Answer one batch item through the response cache and resilient upstream"""
+    params = batch_request(item, caller)
+    key = cache_key(params["model"], params["system"], params["messages"], params["max_tokens"])
+    cached = await response_cache.get(key) if RESPONSE_CACHE else None
+    if cached is not None:
+        result = cached_result(item.id, cached.text, cached.output_tokens)
+        result["model"] = params["model"]
+        return result
+    started = time.perf_counter()
+    async with await router.upstream(params["model"]).open(lambda: client.messages.stream(**params)) as stream:
+        final_message = await stream.get_final_message()
+    result = message_result(item.id, final_message)
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if RESPONSE_CACHE and final_message.stop_reason == "end_turn":
+        response_cache.put(key, CachedResponse([(0.0, result["text"])], final_message.usage.output_tokens))
+    return result
+
 @app.get("/")
 def root():
     return {"status": "Zyron AI is alive"}
 
 @app.get("/health")
 def health():
+    # Failing health checks during a drain moves traffic to other instances
+    if drain.draining:
+        return JSONResponse(status_code=503, content={"status": drain.state})
     return {"status": "healthy"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "streams": stream_metrics.snapshot(),
+        "conversations": conversations.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "single_flight": inflight.snapshot(),
+        "admission": admission.snapshot(),
+        "upstream": {model: u.snapshot() for model, u in router.upstreams.items()},
+        "routing": router.snapshot(),
+        "auth": authenticator.snapshot(),
+        "workspace_access": workspace_access.snapshot(),
+        "resumable_streams": streams.snapshot(),
+        "websockets": chat_sockets.snapshot(),
+        "batch": batches.snapshot(),
+        "usage_ledger": ledger.snapshot() if ledger is not None else None,
+        "graph_pipeline": graph_pipeline.snapshot() if graph_pipeline is not None else None,
+        "graph_layout": graph_layout.snapshot() if graph_layout is not None else None,
+        "graph_sync": graph_sync.snapshot(),
+        "graph_index": graph_index.snapshot(),
+        "drain": drain.snapshot(),
+        "process": {"cpu_seconds": time.process_time()},
+    }
+
 @app.post("/chat")
-async def chat(message: dict):
+async def chat(message: dict, request: Request):
+    client_id = client_id_for(
+        request.client, request.headers.get("x-forwarded-for"), ADMISSION_PROXY_HOPS
+    )
+    # SSE by default, NDJSON when the client's Accept header prefers it
+    encoder = encoder_for(request.headers.get("accept"))
+    caller = authenticator.caller(request.headers.get("authorization"))
+    stream, after, permit = await open_chat_stream(
+        message, client_id, request.headers.get("last-event-id"), caller, peer_host(request.client)
+    )
+    return AdmittedStreamingResponse(
+        stream.read(after, streams.disconnect_grace, encoder),
+        media_type=encoder.media_type,
+        headers={"X-Conversation-Id": stream.conversation_id, "X-Stream-Id": stream.id, "Vary": "Accept"},
+        permit=permit,
+    )
+
+@app.websocket("/ws/chat")
+async def ws_chat(websocket: WebSocket):
+    """Many concurrent chat streams over one connection (protocol in ws_chat.py)"""
+    client_id = client_id_for(
+        websocket.client, websocket.headers.get("x-forwarded-for"), ADMISSION_PROXY_HOPS
+    )
+
+    # Browsers cannot set headers on a WebSocket, so chat messages may carry the token instead
+    header_caller = authenticator.caller(websocket.headers.get("authorization"))
+
+    async def open_stream(message: dict):
+        token = message.get("token")
+        caller = authenticator.caller(f"Bearer {token}") if isinstance(token, str) else header_caller
+        return await open_chat_stream(
+            message, client_id, message.get("last_event_id"), caller, peer_host(websocket.client)
+        )
+
+    await chat_sockets.serve(websocket, open_stream)
+
+async def open_chat_stream(
+    message: dict,
+    client_id: str,
+    last_event_id: Optional[str],
+    caller: Optional[Caller] = None,
+    host: Optional[str] = None,
+) -> Tuple[ResumableStream, int, Permit]:
+    """Resume the stream `last_event_id` points into, or start answering `message`
+
+    The message's `tier` only counts when `caller` is entitled to it,
+    and a `workspace_id` must be one `caller` owns (or, without Supabase,
+    `host`, the socket peer, must be localhost). Returns the stream, the
+    sequence number to read after and the admission permit to release
+    once the client stops reading. Raises HTTPException when the request
+    is refused.
+    """
+    resume = streams.resume(last_event_id)
+    if resume is not None:
+        stream, after = resume
+        logger.info(f"🔁 Resuming stream {stream.id} after event {after}")
+        return stream, after, await acquire_permit(client_id)
+
+    reject_if_draining()
     user_message = message.get("message", "")
-    logger.info(f"📨 Received chat request: {user_message}")
+    workspace_id = message.get("workspace_id")
+    if workspace_id is not None and workspace_id != "":
+        workspace_id = await authorize_workspace(caller, workspace_id, client_id, host)
+    else:
+        workspace_id = None
+    # The id the client stores the answer under; the concept graph records it as processed
+    message_id = canonical_uuid(message.get("message_id"))
+    decision = router.route(RouteRequest(
+        prompt_tokens=estimate_tokens(user_message),
+        tier=authenticator.tier(caller, message.get("tier")),
+        guest=caller is None and message.get("guest") is True,
+        workspace_id=workspace_id,
+    ))
+    # Anonymous conversations belong to the client address
+    owner = f"user:{caller.user_id}" if caller is not None else f"client:{client_id}"
+    conversation = await conversations.open(message.get("conversation_id"), owner)
+    history = conversation.context(user_message, context_budget(decision.model))
+    key = cache_key(decision.model, SYSTEM_PROMPT, history, decision.max_tokens)
+    system = SYSTEM_PROMPT
+    if PROMPT_CACHE:
+        system = cached_system(SYSTEM_PROMPT)
+        history = with_cache_breakpoint(history)
+    logger.info(f"📨 Received chat request ({decision.route.name}): {user_message}")
+
+    cached = await response_cache.get(key) if RESPONSE_CACHE else None
+    # Fail fast while upstream is unhealthy, unless the answer needs no new upstream call
+    breaker = router.upstream(decision.model).breaker
+    if cached is None and key not in inflight and breaker.is_open():
+        retry_after = breaker.reject()
+        logger.warning(f"🔌 Upstream circuit open, failing fast for {retry_after:.0f}s")
+        raise HTTPException(
+            status_code=503,
+            detail="Upstream temporarily unavailable",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    permit = await acquire_permit(client_id)
+
+    async def generate(stream: ResumableStream):
+        # Runs as a background task so the answer survives a dropped connection
+        metrics = stream_metrics.start_stream()
+        flight = None
+        leader = False
+        blocks = BlockScanner() if MARKDOWN_BLOCK_EVENTS else None
+
+        def publish_delta(text: str):
+            event = delta_event(text)
+            metrics.record_chunk(len(event[1]))
+            stream.publish(event)
+            if blocks is not None:
+                for block, rest in blocks.feed(text):
+                    stream.publish(block_end_event(block, rest))
 
-    def generate():
-        logger.info("🚀 Starting stream generator")
         try:
-            with client.messages.stream(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1024,
-                messages=[{
-                    "role": "user",
-                    "content": user_message
-                }],
-                system="Format your responses with clear markdown structure: use ## for headings, - for bullet points, **bold** for emphasis, and proper line breaks between sections."
-            ) as stream:
-                logger.info("✅ Stream created successfully")
-                chunk_count = 0
-                for text in stream.text_stream:
-                    chunk_count += 1
-                    # CRITICAL FIX: Use JSON to properly escape the text
-                    # This handles newlines, quotes, and special characters
-                    import json
-                    escaped_text = json.dumps(text)
-                    logger.info(f"📦 Chunk {chunk_count}: {text[:20]}...")
-                    yield f"data: {escaped_text}\n\n"
-                logger.info(f"✅ Stream completed with {chunk_count} chunks")
+            if cached is not None:
+                async for text in replay(cached, paced=RESPONSE_CACHE_REPLAY_PACED):
+                    publish_delta(text)
+                metrics.output_tokens = cached.output_tokens
+                stop_reason = "end_turn"
+                answer = cached.text
+                conversations.record_exchange(conversation, user_message, answer, cached.output_tokens)
+            else:
+                flight, leader = inflight.join(key, lambda f: stream_upstream(f, history, system, key, decision))
+                async for text in flight.subscribe():
+                    publish_delta(text)
+                final_message = flight.result
+                stop_reason = final_message.stop_reason
+                if leader:
+                    metrics.record_usage(final_message.usage)
+                else:
+                    # Upstream usage is billed once, to the request that started the flight
+                    metrics.output_tokens = final_message.usage.output_tokens
+                answer = "".join(flight.chunks)
+                conversations.record_exchange(conversation, user_message, answer, final_message.usage.output_tokens)
+            if blocks is not None:
+                for block, rest in blocks.finish():
+                    stream.publish(block_end_event(block, rest))
+            stream.publish(usage_event(
+                metrics.input_tokens, metrics.tokens, metrics.cache_read_tokens, metrics.cache_write_tokens,
+                model=decision.model,
+            ))
+            stream.publish(done_event(stop_reason))
+            metrics.finish()
+            if graph_pipeline is not None and workspace_id and message_id:
+                graph_pipeline.submit(GraphJob(message_id, workspace_id, answer))
+        except asyncio.CancelledError:
+            # Leaving the flight closes the upstream stream unless another request shares it
+            saved = 0
+            if flight is not None:
+                metrics.output_tokens = estimate_tokens("".join(flight.chunks))
+                if not flight.done and flight.subscribers == 0:
+                    saved = max(0, stream_metrics.expected_output_tokens(decision.max_tokens) - metrics.output_tokens)
+            metrics.cancel(saved)
+            logger.info(f"🛑 Stream {stream.id} cancelled, ~{saved} output tokens saved")
+            raise
         except Exception as e:
+            metrics.finish(error=str(e))
             logger.error(f"❌ Stream error: {str(e)}", exc_info=True)
-            yield f"data: Error: {str(e)}\n\n"
+            stream.publish(error_event(str(e)))
+        finally:
+            stream_metrics.record(metrics)
+            summary = metrics.to_dict()
+            logger.info(f"📊 Stream summary: {json.dumps(summary)}")
+            status = "cancelled" if metrics.cancelled else "error" if metrics.error else "ok"
+            router.record(decision, status, summary["ttft_ms"], metrics.tokens)
+            if ledger is not None:
+                if cached is not None:
+                    served_from = "response_cache"
+                elif flight is not None and not leader:
+                    served_from = "single_flight"
+                else:
+                    served_from = "upstream"
+                ledger.record(UsageRecord(
+                    kind="chat",
+                    model=decision.model,
+                    client_id=client_id,
+                    status=status,
+                    conversation_id=conversation.id,
+                    prompt_key=key[:16],
+                    input_tokens=metrics.input_tokens,
+                    output_tokens=metrics.tokens,
+                    cache_read_tokens=metrics.cache_read_tokens,
+                    cache_write_tokens=metrics.cache_write_tokens,
+                    ttft_ms=summary["ttft_ms"],
+                    duration_ms=summary["duration_ms"],
+                    served_from=served_from,
+                ))
+
+    return streams.create(conversation.id, generate), 0, permit
+
+@app.delete("/chat/streams/{stream_id}", status_code=204)
+async def cancel_stream(stream_id: str):
+    """Stop generating: cancel the answer and its upstream call right away"""
+    if streams.cancel(stream_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown stream")
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request, mode: str = "direct", concurrency: int = 0):
+    """Answer an NDJSON body of {"id", "message", "system"?, "max_tokens"?} lines
+
+    Results stream back as NDJSON in completion order. mode=batches submits
+    the items to the Message Batches API instead and answers once they are
+    submitted, with a line per batch id for GET /chat/batch/{batch_id}.
+    Needs a signed-in caller.
+    """
+    if mode not in ("direct", "batches"):
+        raise HTTPException(status_code=400, detail="mode must be 'direct' or 'batches'")
+    caller = batch_caller(request)
+    reject_if_draining()
+    client_id = client_id_for(
+        request.client, request.headers.get("x-forwarded-for"), ADMISSION_PROXY_HOPS
+    )
+    # Refused up front when saturated; the first item (or submission) runs on this slot
+    permit = await acquire_permit(client_id)
+    items = read_items(request.stream(), BATCH_MAX_LINE_BYTES)
+    if mode == "batches":
+        # Submissions are one upstream call at a time, all on the job's slot
+        results = batches.message_batches(
+            client, items, lambda item: batch_request(item, caller), owner=caller.user_id
+        )
+    else:
+        spare = [permit]
+
+        async def admit() -> Permit:
+            # Every item holds its own slot, so fan-out stays within the per-client and global caps
+            return spare.pop() if spare else await admission.acquire_when_free(client_id)
+
+        results = batches.direct(
+            items, lambda item: answer_batch_item(item, caller), concurrency or None, admit=admit
+        )
+    logger.info(f"📦 Batch job from {client_id} ({mode})")
+
+    async def generate():
+        try:
+            with drain.job():
+                async for result in results:
+                    record_batch_usage(result, "message_batch" if mode == "batches" else "batch", client_id)
+                    yield ndjson_line(result)
+        except asyncio.CancelledError:
+            if not drain.interrupted():
+                raise
+            # Tell the client the job was cut short rather than just closing the body
+            logger.warning(f"🚰 Batch job from {client_id} interrupted by drain")
+            yield ndjson_line({"status": "error", "error": "Server restarting, job interrupted"})
+        except Exception as e:
+            logger.error(f"❌ Batch error: {str(e)}", exc_info=True)
+            yield ndjson_line({"status": "error", "error": str(e)})
+
+    return AdmittedStreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        permit=permit,
+        # The body is still being read while results stream out
+        watch_disconnect=False,
+    )
+
+@app.get("/chat/batch/{batch_id}")
+async def chat_batch_results(request: Request, batch_id: str):
+    """Status of a mode=batches submission, then its NDJSON results
+
+    Answers {"batch_id", "status", "request_counts"} while the batch is
+    processing; once its status is "ended" the results stream back as
+    NDJSON, one line per item. Poll this instead of holding the submitting
+    request open. Only the user who submitted the batch can read it; to
+    anyone else it is unknown.
+    """
+    caller = batch_caller(request)
+    if not BATCH_ID.match(batch_id):
+        raise HTTPException(status_code=400, detail="Invalid batch id")
+    if await batches.owner(batch_id) != caller.user_id:
+        raise HTTPException(status_code=404, detail="Unknown batch")
+    try:
+        status = await batches.status(client, batch_id)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Unknown batch")
+    if status["status"] != "ended":
+        return status
+    client_id = client_id_for(
+        request.client, request.headers.get("x-forwarded-for"), ADMISSION_PROXY_HOPS
+    )
+    # Usage is recorded once, on the first download
+    first = batches.first_collection(batch_id)
+
+    async def generate():
+        try:
+            async for result in batches.results(client, batch_id, count=first):
+                if first:
+                    record_batch_usage(result, "message_batch", client_id)
+                yield ndjson_line(result)
+        except Exception as e:
+            logger.error(f"❌ Batch results error: {str(e)}", exc_info=True)
+            yield ndjson_line({"status": "error", "error": str(e)})
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+def batch_caller(request: Request) -> Caller:
+    """The signed-in caller of a batch request, else 401"""
+    caller = authenticator.caller(request.headers.get("authorization"))
+    if caller is None:
+        raise HTTPException(
+            status_code=401, detail="Batch jobs need an access token", headers={"WWW-Authenticate": "Bearer"}
+        )
+    return caller
+
+def record_batch_usage(result: dict, kind: str, client_id: str):
+    """Ledger entry for one batch result line (submitted-batch lines carry no usage)"""
+    if ledger is None or "id" not in result:
+        return
+    usage = result.get("usage", {})
+    ledger.record(UsageRecord(
+        kind=kind,
+        model=result.get("model", router.default.model),
+        client_id=client_id,
+        status="ok" if result["status"] == "ok" else "error",
+        input_tokens=usage.get("input_tokens") or 0,
+        output_tokens=usage.get("output_tokens") or 0,
+        duration_ms=result.get("duration_ms"),
+        served_from="response_cache" if result.get("cached") else "upstream",
+    ))
+
+@app.get("/usage")
+async def usage(request: Request, group_by: str = "hour", since: float = 0, until: float = 0):
+    """Token and cost rollups by hour, client or model (epoch-second bounds)
+
+    Spend per client address is for operators: localhost only, unless
+    USAGE_TOKEN is set and presented.
+    """
+    check_usage_access(request)
+    if ledger is None:
+        raise HTTPException(status_code=404, detail="Usage ledger disabled")
+    if group_by not in ("hour", "client", "model"):
+        raise HTTPException(status_code=400, detail="group_by must be hour, client or model")
+    rows = await ledger.rollup(group_by, since or None, until or None)
+    return {"group_by": group_by, "rows": rows}
+
+@app.post("/graph/extract")
+async def graph_extract(request: Request, wait: bool = False):
+    """Queue a backlog of assistant messages for the concept graph
+
+    The body is NDJSON, one {"message_id", "workspace_id", "content"} per
+    line, for workspaces the caller owns (lines for other workspaces are
+    counted as forbidden). Messages already applied are skipped, so a
+    backlog can be sent again after a failure. With wait=true the response
+    is sent once every queued message is written.
+    """
+    if graph_pipeline is None:
+        raise HTTPException(status_code=404, detail="Concept graph pipeline disabled")
+    reject_if_draining()
+    client_id = client_id_for(
+        request.client, request.headers.get("x-forwarded-for"), ADMISSION_PROXY_HOPS
+    )
+    caller = authenticator.caller(request.headers.get("authorization"))
+    queued = already_processed = invalid = forbidden = 0
+    jobs = []
+
+    async def backfill():
+        nonlocal queued, already_processed
+        added, skipped = await graph_pipeline.backfill(jobs)
+        queued += added
+        already_processed += skipped
+        jobs.clear()
+
+    async for line in read_lines(request.stream(), BATCH_MAX_LINE_BYTES):
+        try:
+            data = json.loads(line) if line is not None else None
+        except ValueError:
+            data = None
+        fields = [data.get(name) for name in ("message_id", "workspace_id", "content")] if isinstance(data, dict) else []
+        if len(fields) != 3 or not all(isinstance(value, str) and value for value in fields):
+            invalid += 1
+            continue
+        message_id, workspace_id, content = fields
+        try:
+            workspace_id = await workspace_access.check(caller, workspace_id, peer_host(request.client))
+        except AccessDenied as e:
+            if e.status == 400:
+                invalid += 1
+            elif e.status == 403:
+                forbidden += 1
+            else:
+                # Not signed in, or owners cannot be looked up: no line would get through
+                raise access_denied(e, client_id)
+            continue
+        jobs.append(GraphJob(message_id, workspace_id, content))
+        if len(jobs) >= 500:
+            await backfill()
+    await backfill()
+    if wait:
+        await graph_pipeline.join()
+    logger.info(
+        f"🧠 Concept graph backlog: {queued} queued, {already_processed} already processed, "
+        f"{invalid} invalid, {forbidden} forbidden"
+    )
+    return {"queued": queued, "already_processed": already_processed, "invalid": invalid, "forbidden": forbidden}
+
+@app.get("/workspaces/{workspace_id}/graph")
+async def workspace_graph(request: Request, workspace_id: str, since: Optional[int] = None):
+    """Graph rows changed since version `since` (a full snapshot without it)
+
+    Returns {"version", "full", "nodes": {"inserted", "updated", "deleted"},
+    "edges": {...}}. Clients apply deletions, then upserts by id, and send
+    the returned version next time. With `Accept: application/vnd.zyron.graph`
+    the whole graph is sent in the columnar binary format instead. Only
+    the workspace's owner may read it.
+    """
+    workspace_id = await request_workspace(request, workspace_id)
+    if GRAPH_BINARY_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(content=await graph_sync.binary(workspace_id), media_type=GRAPH_BINARY_MEDIA_TYPE)
+    result = await graph_sync.changes(workspace_id, since)
+    # Large snapshots: skip FastAPI's per-field encoding
+    return Response(content=dumps(result), media_type="application/json")
+
+@app.post("/workspaces/{workspace_id}/graph/layout")
+async def layout_workspace_graph(request: Request, workspace_id: str, full: bool = False):
+    """Lay out a workspace graph now and store the node positions
+
+    Warm-starts from the stored positions (a short relaxation when only a
+    few nodes are new); full=true lays the whole graph out from scratch.
+    Only the workspace's owner may ask, once per GRAPH_LAYOUT_MIN_INTERVAL_SECONDS.
+    """
+    if graph_layout is None:
+        raise HTTPException(status_code=404, detail="Graph layout disabled")
+    reject_if_draining()
+    workspace_id = await request_workspace(request, workspace_id)
+    try:
+        return await graph_layout.request(workspace_id, full=full)
+    except LayoutRateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Layout requested too often for this workspace",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+@app.get("/workspaces/{workspace_id}/graph/neighbors")
+async def graph_neighbors(request: Request, workspace_id: str, node: str, hops: int = 1, limit: int = 1000):
+    """Nodes within `hops` relations of `node`, nearest first, with their distance (owner only)"""
+    workspace_id = await request_workspace(request, workspace_id)
+    if not 1 <= hops <= 6 or limit < 1:
+        raise HTTPException(status_code=400, detail="hops must be 1-6 and limit positive")
+    try:
+        return await graph_index.neighborhood(workspace_id, node, hops, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown node")
+
+@app.get("/workspaces/{workspace_id}/graph/top")
+async def graph_top_neighbors(request: Request, workspace_id: str, node: str, k: int = 10):
+    """The `k` neighbors of `node` with the strongest (highest summed weight) relations (owner only)"""
+    workspace_id = await request_workspace(request, workspace_id)
+    if k < 1:
+        raise HTTPException(status_code=400, detail="k must be positive")
+    try:
+        return await graph_index.top_neighbors(workspace_id, node, k)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown node")
+
+@app.get("/workspaces/{workspace_id}/graph/path")
+async def graph_path(request: Request, workspace_id: str, source: str, target: str, weighted: bool = False):
+    """Shortest chain of relations from `source` to `target` (`path` is null when unconnected)
+
+    weighted=true counts each relation as 1 / weight, preferring strong relations.
+    Only the workspace's owner may ask.
+    """
+    workspace_id = await request_workspace(request, workspace_id)
+    try:
+        return await graph_index.shortest_path(workspace_id, source, target, weighted)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown node")
+
+@app.post("/admin/drain", status_code=202)
+async def start_drain(request: Request, timeout: float = 0):
+    """Stop taking new requests, finish running streams, then exit
+
+    Restart tooling polls GET /admin/drain until the state is "drained"
+    or the process is gone.
+    """
+    check_drain_access(request)
+    if drain.start(timeout or None):
+        logger.info(f"🚰 Drain requested by {request.client.host if request.client else 'unknown'}")
+    return drain.snapshot()
+
+@app.get("/admin/drain")
+def drain_status(request: Request):
+    check_drain_access(request)
+    return drain.snapshot()
+
+def check_drain_access(request: Request):
+    """Localhost only, unless DRAIN_TOKEN is set and presented"""
+    if DRAIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("x-drain-token", ""), DRAIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid drain token")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Drain is only allowed from localhost")
+
+def check_usage_access(request: Request):
+    """Localhost only, unless USAGE_TOKEN is set and presented"""
+    if USAGE_TOKEN:
+        if not hmac.compare_digest(request.headers.get("x-usage-token", ""), USAGE_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid usage token")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Usage is only available from localhost")
+
+def access_denied(e: AccessDenied, client_id: str) -> HTTPException:
+    """The HTTP error for a refused workspace request"""
+    logger.warning(f"🔒 Workspace request from {client_id} refused: {e.detail}")
+    headers = {"WWW-Authenticate": "Bearer"} if e.status == 401 else None
+    return HTTPException(status_code=e.status, detail=e.detail, headers=headers)
+
+def peer_host(client) -> Optional[str]:
+    """Address of the socket peer; unlike the admission client id, never read from X-Forwarded-For"""
+    return client.host if client is not None else None
+
+async def authorize_workspace(caller: Optional[Caller], workspace_id, client_id: str, host: Optional[str]) -> str:
+    """The canonical id of a workspace `caller` owns, else HTTPException (see auth.WorkspaceAccess)
+
+    `host` (the socket peer) decides the localhost access without Supabase;
+    `client_id` is only logged.
+    """
+    try:
+        return await workspace_access.check(caller, workspace_id, host)
+    except AccessDenied as e:
+        raise access_denied(e, client_id)
+
+async def request_workspace(request: Request, workspace_id: str) -> str:
+    """authorize_workspace for the caller and client of an HTTP request"""
+    client_id = client_id_for(
+        request.client, request.headers.get("x-forwarded-for"), ADMISSION_PROXY_HOPS
+    )
+    caller = authenticator.caller(request.headers.get("authorization"))
+    return await authorize_workspace(caller, workspace_id, client_id, peer_host(request.client))
+
+def reject_if_draining():
+    """503 with Retry-After for new work while this instance drains"""
+    if drain.draining:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is restarting",
+            headers={"Retry-After": str(drain.reject())},
+        )
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+async def acquire_permit(client_id: str) -> Permit:
+    """Admission permit for a /chat stream, or 429 with Retry-After"""
+    try:
+        return await admission.acquire(client_id)
+    except AdmissionRejected as e:
+        logger.warning(f"⛔ Rejected chat request from {client_id}: {e.reason}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many concurrent chat streams ({e.reason})",
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
 if __name__ == "__main__":
     import uvicorn
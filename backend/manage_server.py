@@ -12,6 +12,8 @@ import subprocess
 import time
 import json
 import logging
+import urllib.error
+import urllib.request
 from pathlib import Path
 from typing import Optional, Tuple
 from datetime import datetime
@@ -24,6 +26,9 @@ LOG_FILE = LOG_DIR / "backend.log"
 PID_FILE = LOG_DIR / "backend.pid"
 STATUS_FILE = LOG_DIR / "backend_status.json"
 
+# Extra seconds to wait beyond the server's own drain deadline
+DRAIN_WAIT_MARGIN = 15
+
 logging.basicConfig(
     level=logging.INFO,
     format="[%(asctime)s] [%(levelname)s] %(message)s",
@@ -129,6 +134,60 @@ def kill_process_on_port(port: int, force: bool = False) -> bool:
         logger.error(f"Error killing process {pid}: {e}")
         return False
 
+def drain_request(port: int, method: str = "GET") -> Optional[dict]:
+    """Call the backend drain endpoint; None if the server is gone"""
+    req = urllib.request.Request(f"http://127.0.0.1:{port}/admin/drain", method=method)
+    if os.getenv("DRAIN_TOKEN"):
+        req.add_header("X-Drain-Token", os.getenv("DRAIN_TOKEN"))
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError:
+        raise
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+def drain_server(port: int) -> bool:
+    """Let in-flight streams finish before the server is stopped
+
+    The backend stops accepting new chats, fails its health check and
+    exits once its streams are done or its drain deadline passes.
+    Returns False if the server cannot drain or does not finish in time.
+    """
+    try:
+        status = drain_request(port, "POST")
+    except urllib.error.HTTPError as e:
+        logger.warning(f"Server on port {port} cannot drain (HTTP {e.code}), stopping directly")
+        return False
+    if status is None:
+        logger.info(f"No server answering on port {port}, nothing to drain")
+        return True
+
+    logger.info(f"Draining server on port {port}: {status.get('in_flight', 0)} requests in flight")
+    deadline = time.time() + (status.get("remaining_seconds") or 0) + DRAIN_WAIT_MARGIN
+    while time.time() < deadline:
+        # Done once the server is gone, or drained if it stays up
+        if status is None or (status.get("state") == "drained" and not status.get("exits")):
+            logger.info(colored("Server drained", Colors.GREEN))
+            return True
+        time.sleep(0.5)
+        try:
+            status = drain_request(port)
+        except urllib.error.HTTPError:
+            status = None
+
+    logger.warning(f"Server on port {port} did not drain in time")
+    return False
+
+def wait_for_port(port: int, timeout: float = 30) -> bool:
+    """Wait until the port has been released"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if is_port_available(port):
+            return True
+        time.sleep(0.2)
+    return False
+
 def find_available_port(start_port: int, max_attempts: int = 10) -> int:
     """Find an available port starting from start_port"""
     for port in range(start_port, start_port + max_attempts):
@@ -149,8 +208,8 @@ def save_status(port: int, pid: int, status: str = "running"):
         json.dump(status_data, f, indent=2)
     logger.info(f"Status saved: {status_data}")
 
-def start_server(port: int = 8000, force_kill: bool = False) -> int:
-    """Start the Uvicorn server"""
+def start_server(port: int = 8000, force_kill: bool = False, env: str = "dev") -> int:
+    """Start the server through serve.py with the config of `env`"""
     backend_dir = Path(__file__).parent
     project_root = backend_dir.parent
 
@@ -159,7 +218,7 @@ def start_server(port: int = 8000, force_kill: bool = False) -> int:
     if not venv_python.exists():
         raise RuntimeError(f"Virtual environment not found at {backend_dir}/.venv")
 
-    logger.info(f"Starting Zyron-Ai backend server on port {port}")
+    logger.info(f"Starting Zyron-Ai backend server on port {port} ({env} config)")
     logger.info(f"Force kill: {force_kill}")
 
     # Check and handle port
@@ -177,13 +236,12 @@ def start_server(port: int = 8000, force_kill: bool = False) -> int:
 
     # Start server
     os.chdir(backend_dir)
+    # Workers, reload and timeouts come from config/zyron.<env>.yaml
     cmd = [
         str(venv_python),
-        "-m", "uvicorn",
-        "server:app",
-        "--reload",
-        f"--port", str(port),
-        "--log-level", "info"
+        "serve.py",
+        "--env", env,
+        "--port", str(port),
     ]
 
     logger.info(f"Command: {' '.join(cmd)}")
@@ -232,7 +290,11 @@ def stop_server(force: bool = False):
 
         if pid and pid > 0:
             logger.info(f"Stopping server (PID {pid})...")
-            os.kill(pid, signal.SIGKILL if force else signal.SIGTERM)
+            try:
+                os.kill(pid, signal.SIGKILL if force else signal.SIGTERM)
+            except ProcessLookupError:
+                # Already exited, e.g. at the end of a drain
+                pass
             logger.info(colored("Server stopped", Colors.GREEN))
 
         if port:
@@ -275,7 +337,7 @@ def main():
         'action',
         nargs='?',
         default='start',
-        choices=['start', 'stop', 'restart', 'status', 'kill'],
+        choices=['start', 'stop', 'restart', 'drain', 'status', 'kill'],
         help='Action to perform'
     )
     parser.add_argument(
@@ -284,25 +346,36 @@ def main():
         default=8000,
         help='Port to run server on (default: 8000)'
     )
+    parser.add_argument(
+        '--env', '-e',
+        choices=['dev', 'staging', 'prod'],
+        default=os.getenv('ZYRON_ENV', 'dev'),
+        help='Config environment for start/restart (default: dev)'
+    )
     parser.add_argument(
         '--force', '-f',
         action='store_true',
-        help='Force kill any process on the port'
+        help='Force kill any process on the port (restart skips draining)'
     )
 
     args = parser.parse_args()
 
     try:
         if args.action == 'start':
-            return start_server(args.port, args.force)
+            return start_server(args.port, args.force, args.env)
         elif args.action == 'stop':
             stop_server(args.force)
             return 0
         elif args.action == 'restart':
             logger.info("Restarting server...")
-            stop_server()
-            time.sleep(2)
-            return start_server(args.port, args.force)
+            if not args.force:
+                drain_server(args.port)
+            stop_server(args.force)
+            if not wait_for_port(args.port):
+                logger.warning(f"Port {args.port} still in use after stop")
+            return start_server(args.port, args.force, args.env)
+        elif args.action == 'drain':
+            return 0 if drain_server(args.port) else 1
         elif args.action == 'status':
             get_status()
             return 0
@@ -0,0 +1,166 @@
+"""
+Zyron AI - Incremental markdown block scanner
+
+Follows a streamed markdown answer one delta at a time and reports every
+top-level block (paragraph, heading, fenced code, list, blockquote,
+table, thematic break) as soon as it is complete, so clients can render
+finished blocks once and re-parse only the open tail.
+
+Lines are classified when their newline arrives. Every character is
+looked at once and each complete line once, so the work per delta is
+bounded by the delta plus the line it finishes. A block ends either
+after the line that closes it (a blank line after a paragraph, a heading,
+a closing fence) or before the first line that cannot belong to it
+(a heading interrupting a paragraph, text after a list). In the second
+case that line may already have been sent, so each completed block comes
+with `rest`: the text already streamed that follows the block.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+# Up to three spaces of indentation, as CommonMark allows for block starts
+FENCE = re.compile(r" {0,3}(`{3,}|~{3,})")
+HEADING = re.compile(r" {0,3}#{1,6}(?:[ \t]|$)")
+THEMATIC_BREAK = re.compile(r" {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+SETEXT_UNDERLINE = re.compile(r" {0,3}(?:=+|-+)[ \t]*$")
+LIST_ITEM = re.compile(r" {0,3}(?:[-*+]|\d{1,9}[.)])(?:[ \t]|$)")
+# Only lists starting at 1 may interrupt a paragraph
+INTERRUPTING_LIST_ITEM = re.compile(r" {0,3}(?:[-*+]|1[.)])[ \t]+\S")
+BLOCKQUOTE = re.compile(r" {0,3}>")
+TABLE_ROW = re.compile(r" {0,3}\|")
+# List item content continues on lines indented at least this much
+CONTINUATION = re.compile(r"(?: {2,}|\t)\S")
+
+PARAGRAPH = "paragraph"
+HEADING_BLOCK = "heading"
+CODE = "code"
+LIST = "list"
+BLOCKQUOTE_BLOCK = "blockquote"
+TABLE = "table"
+BREAK = "thematic_break"
+
+# (block kind, text already sent after the block)
+CompletedBlock = Tuple[str, str]
+
+
+class BlockScanner:
+    """Streaming top-level block boundaries of one markdown answer"""
+
+    def __init__(self):
+        # Kind of the block the current line belongs to, None between blocks
+        self.block: Optional[str] = None
+        # Opening fence of a code block
+        self.fence = ""
+        # A list followed by a blank line ends at the next unindented non-item line
+        self.after_blank = False
+        # Pieces of the current line from earlier deltas
+        self._line: List[str] = []
+
+    def feed(self, text: str) -> List[CompletedBlock]:
+        """Blocks completed by `text`, in order"""
+        completed: List[CompletedBlock] = []
+        start = 0
+        end = text.find("\n")
+        while end != -1:
+            prefix = "".join(self._line) if self._line else ""
+            self._line.clear()
+            before, after = self._line_ended(prefix + text[start:end])
+            if before:
+                # The finished line itself is the first one past the block
+                completed.append((before, prefix + text[start:]))
+            if after:
+                completed.append((after, text[end + 1:]))
+            start = end + 1
+            end = text.find("\n", start)
+        if start < len(text):
+            self._line.append(text[start:])
+        return completed
+
+    def finish(self) -> List[CompletedBlock]:
+        """Close the answer: the last line and whatever block is still open"""
+        completed: List[CompletedBlock] = []
+        if self._line:
+            line = "".join(self._line)
+            self._line.clear()
+            before, after = self._line_ended(line)
+            if before:
+                completed.append((before, line))
+            if after:
+                completed.append((after, ""))
+        if self.block is not None:
+            completed.append((self.block, ""))
+            self.block = None
+        return completed
+
+    def _line_ended(self, line: str) -> Tuple[Optional[str], Optional[str]]:
+        """(block ended before this line, block ended after it)"""
+        block = self.block
+        if block == CODE:
+            match = FENCE.match(line)
+            if match and match.group(1)[0] == self.fence[0] and len(match.group(1)) >= len(self.fence) \
+                    and not line[match.end():].strip():
+                self.block = None
+                return None, CODE
+            return None, None
+
+        if not line.strip():
+            if block == LIST:
+                self.after_blank = True
+                return None, None
+            if block is not None:
+                self.block = None
+                return None, block
+            return None, None
+
+        if block == LIST:
+            if THEMATIC_BREAK.match(line):
+                pass
+            elif LIST_ITEM.match(line) or CONTINUATION.match(line):
+                self.after_blank = False
+                return None, None
+            elif not self.after_blank and not self._interrupts(line):
+                # Lazy continuation of the item's paragraph
+                return None, None
+            self.block = None
+            return LIST, self._start(line)
+
+        if block is not None:
+            if block == PARAGRAPH and SETEXT_UNDERLINE.match(line):
+                self.block = None
+                return None, HEADING_BLOCK
+            if self._interrupts(line):
+                self.block = None
+                return block, self._start(line)
+            return None, None
+
+        return None, self._start(line)
+
+    def _interrupts(self, line: str) -> bool:
+        """Whether `line` starts a new block even right after paragraph text"""
+        if BLOCKQUOTE.match(line):
+            return self.block != BLOCKQUOTE_BLOCK
+        return bool(
+            FENCE.match(line) or HEADING.match(line) or THEMATIC_BREAK.match(line)
+            or INTERRUPTING_LIST_ITEM.match(line)
+        )
+
+    def _start(self, line: str) -> Optional[str]:
+        """Open the block `line` starts; returns its kind if the line completes it"""
+        match = FENCE.match(line)
+        if match:
+            self.block, self.fence = CODE, match.group(1)
+            return None
+        if HEADING.match(line):
+            return HEADING_BLOCK
+        if THEMATIC_BREAK.match(line):
+            return BREAK
+        if LIST_ITEM.match(line):
+            self.block, self.after_blank = LIST, False
+        elif BLOCKQUOTE.match(line):
+            self.block = BLOCKQUOTE_BLOCK
+        elif TABLE_ROW.match(line):
+            self.block = TABLE
+        else:
+            self.block = PARAGRAPH
+        return None
@@ -0,0 +1,31 @@
+"""
+Zyron AI - Anthropic prompt caching
+
+Places `cache_control` breakpoints on the stable prefix of each request:
+one on the system prompt and one on the newest user message. The next
+turn's breakpoint finds the previous one by prefix lookback, so the whole
+conversation prefix is read from cache instead of re-processed.
+"""
+
+from typing import Any, Dict, List
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def cached_system(prompt: str) -> List[Dict[str, Any]]:
+    """System prompt as a text block carrying a cache breakpoint"""
+    return [{"type": "text", "text": prompt, "cache_control": CACHE_CONTROL}]
+
+
+def with_cache_breakpoint(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy of `messages` with a cache breakpoint on the last message"""
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = [dict(block) for block in content]
+    blocks[-1]["cache_control"] = CACHE_CONTROL
+    return messages[:-1] + [{"role": last["role"], "content": blocks}]
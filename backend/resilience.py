@@ -0,0 +1,305 @@
+"""
+Zyron AI - Upstream stream resilience
+
+Opening an upstream stream goes through three guards, all of which act
+before the first byte reaches the client:
+
+- a circuit breaker that fails fast while upstream is unhealthy;
+- jittered exponential-backoff retries on overloaded/5xx/connection errors;
+- optional hedging: when the first token is slower than a TTFT percentile,
+  a second identical request is raised and the first to produce a token wins.
+
+Once a token has been handed out the stream is committed and errors
+propagate to the caller unchanged. Every attempt's outcome (its TTFT, or
+a retryable failure) is kept for a rolling health window that the model
+router reads.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import AbstractAsyncContextManager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from anthropic import APIConnectionError, APIStatusError, APITimeoutError
+
+from telemetry import percentile
+
+RETRYABLE_ERROR_TYPES = {"overloaded_error", "api_error", "rate_limit_error"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("upstream circuit open")
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an upstream error is worth another attempt"""
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        if error.status_code == 429 or error.status_code >= 500:
+            return True
+        # Errors raised from an in-stream `event: error` arrive with HTTP 200
+        body = error.body if isinstance(error.body, dict) else {}
+        return body.get("error", {}).get("type") in RETRYABLE_ERROR_TYPES
+    return False
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_total = 0
+        self.rejected_total = 0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected without reaching upstream"""
+        if self.state == self.OPEN:
+            return self.retry_after() > 0
+        return self.state == self.HALF_OPEN and self._probing
+
+    def reject(self) -> float:
+        """Count a call turned away while open; returns its retry delay"""
+        self.rejected_total += 1
+        return self.retry_after() or self.reset_timeout
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError"""
+        if self.state == self.OPEN and self.retry_after() == 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probing):
+            raise CircuitOpenError(self.reject())
+        if self.state == self.HALF_OPEN:
+            self._probing = True
+
+    def abandon(self):
+        """Neither success nor failure (cancelled call, client error)"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened_total += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class UpstreamStream:
+    """An opened upstream stream whose first text delta is already read"""
+
+    def __init__(self, manager: AbstractAsyncContextManager, stream: Any, first: Optional[str]):
+        self.manager = manager
+        self.stream = stream
+        self.first = first
+        self._closed = False
+
+    async def text_stream(self) -> AsyncIterator[str]:
+        """The first delta followed by the rest of the upstream text"""
+        if self.first is None:
+            return
+        yield self.first
+        async for text in self.stream.text_stream:
+            yield text
+
+    async def get_final_message(self) -> Any:
+        return await self.stream.get_final_message()
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            await self.manager.__aexit__(None, None, None)
+
+    async def __aenter__(self) -> "UpstreamStream":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+async def _open_attempt(factory: Callable[[], AbstractAsyncContextManager]) -> UpstreamStream:
+    """Enter one upstream stream and wait for its first text delta"""
+    manager = factory()
+    stream = await manager.__aenter__()
+    try:
+        try:
+            first = await stream.text_stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+    except BaseException:
+        await manager.__aexit__(None, None, None)
+        raise
+    return UpstreamStream(manager, stream, first)
+
+
+class ResilientUpstream:
+    """Retry, hedging and circuit breaking around stream opening"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 4.0,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.5,
+        breaker: Optional[CircuitBreaker] = None,
+        window: int = 500,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+
+        self.attempts_total = 0
+        self.retries_total = 0
+        self.hedges_total = 0
+        self.hedge_wins = 0
+        self.failures_total = 0
+        self._ttft: Deque[float] = deque(maxlen=window)
+        # (monotonic time, TTFT seconds or None for a failed attempt)
+        self._outcomes: Deque[Tuple[float, Optional[float]]] = deque(maxlen=window)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def hedge_delay(self) -> Optional[float]:
+        """TTFT after which a hedged request is raised, or None"""
+        if not self.hedge or len(self._ttft) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, percentile(list(self._ttft), self.hedge_percentile))
+
+    async def open(self, factory: Callable[[], AbstractAsyncContextManager]) -> UpstreamStream:
+        """Open an upstream stream, retrying and hedging until a first token arrives
+
+        `factory` must return a fresh `client.messages.stream(...)` manager
+        on every call.
+        """
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                upstream = await self._race(factory)
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.abandon()
+                    raise
+                self.failures_total += 1
+                self.breaker.record_failure()
+                self._outcomes.append((time.monotonic(), None))
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                self.retries_total += 1
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            self.breaker.record_success()
+            ttft = time.monotonic() - started
+            self._ttft.append(ttft)
+            self._outcomes.append((time.monotonic(), ttft))
+            return upstream
+        raise RuntimeError("unreachable")
+
+    async def _race(self, factory: Callable[[], AbstractAsyncContextManager]) -> UpstreamStream:
+        self.attempts_total += 1
+        primary = asyncio.ensure_future(_open_attempt(factory))
+        delay = self.hedge_delay()
+        if delay is None:
+            return await primary
+
+        try:
+            await asyncio.wait((primary,), timeout=delay)
+        except BaseException:
+            primary.cancel()
+            raise
+        if primary.done():
+            return primary.result()
+
+        self.attempts_total += 1
+        self.hedges_total += 1
+        hedged = asyncio.ensure_future(_open_attempt(factory))
+        pending = {primary, hedged}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    winner = task.result()
+                    if task is hedged:
+                        self.hedge_wins += 1
+                    for other in done - {task}:
+                        if other.exception() is None:
+                            await other.result().aclose()
+                    return winner
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def health(self, window: float) -> Dict[str, Any]:
+        """Attempts, error rate and TTFT p50/p95 over the last `window` seconds"""
+        since = time.monotonic() - window
+        recent = [ttft for at, ttft in self._outcomes if at >= since]
+        ttfts = [t for t in recent if t is not None]
+        return {
+            "samples": len(recent),
+            "error_rate": round(1 - len(ttfts) / len(recent), 3) if recent else 0.0,
+            "ttft_p50_ms": round(percentile(ttfts, 50) * 1000, 1) if ttfts else None,
+            "ttft_p95_ms": round(percentile(ttfts, 95) * 1000, 1) if ttfts else None,
+            "circuit_open": self.breaker.is_open(),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        return {
+            "attempts": self.attempts_total,
+            "retries": self.retries_total,
+            "failures": self.failures_total,
+            "hedges": self.hedges_total,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": None if self.hedge_delay() is None else self.hedge_delay() * 1000,
+            "circuit": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "opened_total": self.breaker.opened_total,
+                "rejected_total": self.breaker.rejected_total,
+            },
+        }
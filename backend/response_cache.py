@@ -0,0 +1,215 @@
+"""
+Zyron AI - Response cache with streaming replay
+
+Completed /chat answers are cached under a key built from the normalized
+(model, system, messages, max_tokens) request. Lookups go to an in-memory
+LRU tier with TTL first, then to an optional Redis tier. Cached answers
+keep their chunk timing so hits can be replayed at full speed or paced
+like the original stream.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model: str, system: Any, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Stable hash of a normalized chat request
+
+    Text content is stripped of surrounding whitespace and the payload is
+    serialized with sorted keys, so cosmetic differences share one entry.
+    """
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items() if k != "cache_control"}
+        if isinstance(value, list):
+            return [normalize(v) for v in value]
+        return value
+
+    payload = json.dumps(
+        [model, normalize(system), normalize(messages), max_tokens],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    """A completed answer and the timing of its chunks"""
+    chunks: List[Tuple[float, str]] = field(default_factory=list)
+    output_tokens: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(text for _, text in self.chunks)
+
+    def to_json(self) -> str:
+        return json.dumps({"chunks": self.chunks, "output_tokens": self.output_tokens})
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CachedResponse":
+        data = json.loads(raw)
+        return cls([(offset, text) for offset, text in data["chunks"]], data.get("output_tokens"))
+
+
+class ResponseRecorder:
+    """Collects chunks with their offset from the first chunk"""
+
+    def __init__(self):
+        self.response = CachedResponse()
+        self._first: Optional[float] = None
+
+    def add(self, text: str):
+        now = time.perf_counter()
+        if self._first is None:
+            self._first = now
+        self.response.chunks.append((now - self._first, text))
+
+
+async def replay(response: CachedResponse, paced: bool = False, speed: float = 1.0) -> AsyncIterator[str]:
+    """Yield cached chunks, optionally spaced like the original stream"""
+    started = time.perf_counter()
+    for offset, text in response.chunks:
+        if paced:
+            delay = offset / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield text
+
+
+class MemoryTier:
+    """LRU map with per-entry expiry"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, response = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: CachedResponse):
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisTier:
+    """Shared tier on any client exposing async `get` and `set(key, value, ex=)`"""
+
+    def __init__(self, client: Any, ttl: float, prefix: str = "zyron:response:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        return CachedResponse.from_json(raw)
+
+    async def put(self, key: str, response: CachedResponse):
+        await self.client.set(self.prefix + key, response.to_json(), ex=int(self.ttl))
+
+
+def redis_client_from_env(host: Optional[str], port: int = 6379, password: Optional[str] = None) -> Any:
+    """Async Redis client, or None when no host is set or redis isn't installed"""
+    if not host:
+        return None
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        logger.warning("⚠️  REDIS_HOST is set but the redis package is not installed; using memory tier only")
+        return None
+    return redis.Redis(host=host, port=port, password=password or None)
+
+
+class ResponseCache:
+    """Two-tier response cache with hit/miss counters"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 600.0, redis_client: Any = None):
+        self.memory = MemoryTier(max_entries, ttl)
+        self.redis = RedisTier(redis_client, ttl) if redis_client is not None else None
+        self.hits_memory = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.stores = 0
+        self.redis_errors = 0
+        self._pending: Set[asyncio.Task] = set()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """Look up `key` in memory, then Redis (promoting Redis hits)"""
+        response = self.memory.get(key)
+        if response is not None:
+            self.hits_memory += 1
+            return response
+        if self.redis is not None:
+            try:
+                response = await self.redis.get(key)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"⚠️  Response cache Redis read failed: {e}")
+                response = None
+            if response is not None:
+                self.hits_redis += 1
+                self.memory.put(key, response)
+                return response
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: CachedResponse):
+        """Store `response`; the Redis write runs in the background"""
+        self.stores += 1
+        self.memory.put(key, response)
+        if self.redis is not None:
+            task = asyncio.ensure_future(self._put_redis(key, response))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _put_redis(self, key: str, response: CachedResponse):
+        try:
+            await self.redis.put(key, response)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"⚠️  Response cache Redis write failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        lookups = self.hits_memory + self.hits_redis + self.misses
+        return {
+            "entries": len(self.memory),
+            "hits_memory": self.hits_memory,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "hit_ratio": (self.hits_memory + self.hits_redis) / lookups if lookups else None,
+            "stores": self.stores,
+            "evictions": self.memory.evictions,
+            "redis_enabled": self.redis is not None,
+            "redis_errors": self.redis_errors,
+        }
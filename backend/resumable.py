@@ -0,0 +1,284 @@
+"""
+Zyron AI - Resumable /chat streams
+
+Each /chat answer is produced by a background task into a per-stream
+replay buffer of typed events, and HTTP responses only read from that
+buffer, framing events for their transport (stream_encoding). Events
+carry ids of the form `<stream id>:<seq>`, so a client that
+reconnects with Last-Event-ID continues after the last event it saw
+instead of starting a new upstream call. Buffers are bounded and kept
+for a grace period after the answer completes. A stream that nobody is
+reading is cancelled after a shorter disconnect grace period, or at once
+when the client asks for it ("Stop generating"). A reader may be given
+a credit window, so it is only sent as many events as its client has
+asked for; the buffer bounds what a slow reader costs in memory.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from stream_encoding import Event, SSEEncoder, error_event
+
+# Sent to a reader that fell behind the buffer; the rest of its answer is gone
+LAGGED_ERROR = error_event("Stream fell too far behind to continue, send the message again")
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a `<stream id>:<seq>` Last-Event-ID, None if malformed"""
+    if not value:
+        return None
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class CreditWindow:
+    """Credit-based flow control for one reader: events it may still be sent"""
+
+    def __init__(self, credit: int):
+        self.credit = credit
+        self.stalls = 0
+        self.closed = False
+        self._waiter: Optional[asyncio.Future] = None
+
+    def grant(self, events: int):
+        self.credit += events
+        self._wake()
+
+    def close(self):
+        """Stop the reader: a pending or later `take` returns 0"""
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def take(self, wanted: int) -> int:
+        """Wait for credit, then spend up to `wanted` of it; 0 once closed"""
+        while self.credit <= 0:
+            if self.closed:
+                return 0
+            self.stalls += 1
+            self._waiter = asyncio.get_running_loop().create_future()
+            await self._waiter
+        if self.closed:
+            return 0
+        taken = min(wanted, self.credit)
+        self.credit -= taken
+        return taken
+
+
+class ResumableStream:
+    """Replay buffer of encoded events for one /chat answer"""
+
+    def __init__(self, stream_id: str, conversation_id: str, max_events: int):
+        self.id = stream_id
+        self.conversation_id = conversation_id
+        self._id_prefix = f"{stream_id}:".encode()
+        self.events: Deque[Event] = deque(maxlen=max_events)
+        # Sequence number of events[0]; earlier events fell out of the buffer
+        self.first_seq = 1
+        self.next_seq = 1
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.readers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.abandoned = False
+        self.cancelled = False
+        self._waiter: Optional[asyncio.Future] = None
+        self._orphan_timer: Optional[asyncio.TimerHandle] = None
+
+    def publish(self, event: Event):
+        """Append an encoded event and wake readers"""
+        if len(self.events) == self.events.maxlen:
+            self.first_seq += 1
+        self.events.append(event)
+        self.next_seq += 1
+        self._notify()
+
+    def finish(self):
+        """Mark the answer complete; the buffer stays for the grace period"""
+        if not self.done:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    def can_resume(self, after: int) -> bool:
+        """Whether every event after `after` is still buffered"""
+        return self.first_seq <= after + 1 <= self.next_seq
+
+    def _notify(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        self._waiter = None
+
+    async def _wait(self):
+        if self._waiter is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+        await asyncio.wait((self._waiter,))
+
+    async def read(
+        self, after: int, grace: float, encoder: Optional[SSEEncoder] = None, window: Optional[CreditWindow] = None
+    ) -> AsyncIterator[bytes]:
+        """Yield framed events after sequence number `after`
+
+        Events that are already buffered go out together as one chunk, or
+        as many of them as `window` has credit for, until the window is
+        closed. A reader that falls behind the buffer gets an `error`
+        event instead of a silent end. When the last reader leaves before the answer is complete, the
+        producer is cancelled unless a reader comes back within `grace`.
+        """
+        encoder = encoder or SSEEncoder()
+        seq = after + 1
+        self.readers += 1
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+            self._orphan_timer = None
+        try:
+            while True:
+                if seq < self.first_seq:
+                    # The reader fell further behind than the buffer holds; resuming
+                    # from this id misses too, so the client starts a new answer
+                    yield encoder.frame(b"%s%d" % (self._id_prefix, seq - 1), LAGGED_ERROR)
+                    return
+                if seq < self.next_seq:
+                    end = self.next_seq
+                    if window is not None:
+                        taken = await window.take(end - seq)
+                        if not taken:
+                            # The window was closed: the client is done with this stream
+                            return
+                        if seq < self.first_seq:
+                            # Overtaken while waiting for credit: give it back and report the lag
+                            window.grant(taken)
+                            continue
+                        end = seq + taken
+                    start, prefix = self.first_seq, self._id_prefix
+                    if seq == end - 1:
+                        # Caught up with the producer: the common case while streaming
+                        chunk = encoder.frame(b"%s%d" % (prefix, seq), self.events[seq - start])
+                    else:
+                        chunk = encoder.frames(
+                            (b"%s%d" % (prefix, n), self.events[n - start]) for n in range(seq, end)
+                        )
+                    seq = end
+                    yield chunk
+                    continue
+                if self.done:
+                    return
+                await self._wait()
+        finally:
+            self.readers -= 1
+            if self.readers == 0 and not self.done:
+                self._orphan_timer = asyncio.get_running_loop().call_later(grace, self._abandon)
+
+    def _abandon(self):
+        self._orphan_timer = None
+        if self.readers == 0 and not self.done and self.task is not None:
+            self.abandoned = True
+            self.task.cancel()
+
+    def cancel(self) -> bool:
+        """Stop producing the answer; False if it already finished"""
+        if self.done or self.task is None:
+            return False
+        self.cancelled = True
+        self.task.cancel()
+        return True
+
+
+Producer = Callable[[ResumableStream], Awaitable[Any]]
+
+
+class StreamRegistry:
+    """Active and recently finished streams, addressable by stream id"""
+
+    def __init__(
+        self,
+        grace: float = 30.0,
+        disconnect_grace: float = 5.0,
+        max_events: int = 4096,
+        max_streams: int = 1000,
+    ):
+        self.grace = grace
+        self.disconnect_grace = disconnect_grace
+        self.max_events = max_events
+        self.max_streams = max_streams
+        self.created = 0
+        self.resumed = 0
+        self.resume_misses = 0
+        self.abandoned = 0
+        self.cancelled = 0
+        self._streams: "OrderedDict[str, ResumableStream]" = OrderedDict()
+
+    def create(self, conversation_id: str, producer: Producer) -> ResumableStream:
+        """Start `producer` filling a new stream's buffer in the background"""
+        self._purge()
+        stream = ResumableStream(uuid.uuid4().hex, conversation_id, self.max_events)
+        self._streams[stream.id] = stream
+        self.created += 1
+        stream.task = asyncio.ensure_future(self._run(stream, producer))
+        return stream
+
+    async def _run(self, stream: ResumableStream, producer: Producer):
+        try:
+            await producer(stream)
+        except asyncio.CancelledError:
+            if stream.abandoned:
+                self.abandoned += 1
+            elif stream.cancelled:
+                self.cancelled += 1
+        finally:
+            stream.finish()
+
+    def resume(self, last_event_id: Optional[str]) -> Optional[Tuple[ResumableStream, int]]:
+        """Stream and offset to continue from, or None when a fresh answer is needed"""
+        parsed = parse_event_id(last_event_id)
+        if parsed is None:
+            return None
+        self._purge()
+        stream_id, after = parsed
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.abandoned or stream.cancelled or not stream.can_resume(after):
+            self.resume_misses += 1
+            return None
+        self.resumed += 1
+        return stream, after
+
+    def cancel(self, stream_id: str) -> Optional[bool]:
+        """Cancel a stream by id; None if unknown, False if already finished"""
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            return None
+        return stream.cancel()
+
+    def cancel_all(self) -> int:
+        """Cancel every unfinished stream, e.g. at a drain deadline"""
+        return sum(1 for stream in list(self._streams.values()) if stream.cancel())
+
+    def _purge(self):
+        """Drop streams whose grace period is over, and the oldest finished ones past the cap"""
+        now = time.monotonic()
+        finished = [s for s in self._streams.values() if s.done]
+        excess = len(self._streams) - self.max_streams
+        for stream in finished:
+            if stream.finished_at + self.grace < now or excess > 0:
+                del self._streams[stream.id]
+                excess -= 1
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters for /metrics"""
+        return {
+            "streams": len(self._streams),
+            "active": sum(1 for s in self._streams.values() if not s.done),
+            "created": self.created,
+            "resumed": self.resumed,
+            "resume_misses": self.resume_misses,
+            "abandoned": self.abandoned,
+            "cancelled": self.cancelled,
+        }
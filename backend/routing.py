@@ -0,0 +1,250 @@
+"""
+Zyron AI - Model routing
+
+Each chat request and batch item is routed to one entry of a model table
+("fast", "standard", "deep", ...). Rules are checked in order against the
+prompt length, the tier the client asked for, guest mode and the
+workspace; the first match picks the route, otherwise the default route
+is used. A requested tier only reaches the rules when the caller is
+entitled to it (auth.py); anonymous and guest requests never pick one.
+The table and rules can be replaced with a YAML or JSON file
+(MODEL_ROUTING_FILE).
+
+Routing also follows live upstream health. Every model has its own
+ResilientUpstream (retries, hedging, circuit breaker), whose rolling TTFT
+and error rate decide whether the model is degraded: circuit open, error
+rate above the limit, or TTFT p95 above the route's `ttft_slo_ms`.
+Requests for a degraded route move to its first healthy fallback, except
+for a small probe share that keeps measuring the degraded model so
+traffic returns once it recovers.
+"""
+
+import json
+import logging
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from resilience import ResilientUpstream
+from telemetry import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUTING: Dict[str, Any] = {
+    "default": "standard",
+    "routes": {
+        "fast": {"model": "claude-3-5-haiku-20241022", "max_tokens": 1024, "ttft_slo_ms": 2000,
+                 "fallbacks": ["standard"]},
+        "standard": {"model": "claude-sonnet-4-20250514", "max_tokens": 1024, "ttft_slo_ms": 4000,
+                     "fallbacks": ["fast"]},
+        "deep": {"model": "claude-opus-4-20250514", "max_tokens": 2048, "ttft_slo_ms": 8000,
+                 "fallbacks": ["standard"]},
+    },
+    "rules": [
+        # Short guest-mode questions go to the faster, cheaper model
+        {"name": "guest-short", "guest": True, "max_prompt_tokens": 200, "route": "fast"},
+        {"name": "tier-fast", "tier": "fast", "route": "fast"},
+        {"name": "tier-deep", "tier": "deep", "route": "deep"},
+    ],
+}
+
+
+@dataclass
+class Route:
+    """One entry of the model table"""
+    name: str
+    model: str
+    max_tokens: int = 1024
+    ttft_slo_ms: float = 4000.0
+    fallbacks: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RouteRequest:
+    """What the rules look at"""
+    prompt_tokens: int
+    # Only set for callers entitled to the tier they asked for
+    tier: Optional[str] = None
+    guest: bool = False
+    workspace_id: Optional[str] = None
+
+
+@dataclass
+class Rule:
+    """Conditions that are all met by a request, or left unset"""
+    route: str
+    name: str = ""
+    tier: Optional[List[str]] = None
+    guest: Optional[bool] = None
+    workspaces: Optional[List[str]] = None
+    min_prompt_tokens: Optional[int] = None
+    max_prompt_tokens: Optional[int] = None
+
+    def matches(self, request: RouteRequest) -> bool:
+        if self.tier is not None and request.tier not in self.tier:
+            return False
+        if self.guest is not None and request.guest != self.guest:
+            return False
+        if self.workspaces is not None and request.workspace_id not in self.workspaces:
+            return False
+        if self.min_prompt_tokens is not None and request.prompt_tokens < self.min_prompt_tokens:
+            return False
+        if self.max_prompt_tokens is not None and request.prompt_tokens > self.max_prompt_tokens:
+            return False
+        return True
+
+
+@dataclass
+class RouteDecision:
+    route: Route
+    # Rule name, or "default"
+    reason: str
+    # Route the rules picked when health moved the request elsewhere
+    shifted_from: Optional[str] = None
+
+    @property
+    def model(self) -> str:
+        return self.route.model
+
+    @property
+    def max_tokens(self) -> int:
+        return self.route.max_tokens
+
+
+class RouteStats:
+    """Per-route request counters for /metrics"""
+
+    def __init__(self, window: int = 500):
+        self.requests = 0
+        self.shifted_in = 0
+        self.shifted_away = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.output_tokens = 0
+        self.ttft: Deque[float] = deque(maxlen=window)
+
+
+def load_routing(path: Optional[str]) -> Dict[str, Any]:
+    """Routing config from a YAML/JSON file, or the built-in table"""
+    if not path:
+        return DEFAULT_ROUTING
+    with open(path) as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        import yaml
+        return yaml.safe_load(f)
+
+
+class ModelRouter:
+    """Picks a model per request from rules and live upstream health"""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        upstream_factory: Callable[[], ResilientUpstream],
+        health_window: float = 60.0,
+        max_error_rate: float = 0.25,
+        min_samples: int = 10,
+        probe_rate: float = 0.05,
+    ):
+        self.routes: Dict[str, Route] = {
+            name: Route(name=name, **spec) for name, spec in config["routes"].items()
+        }
+        self.rules: List[Rule] = []
+        for index, spec in enumerate(config.get("rules", [])):
+            spec = dict(spec)
+            spec.setdefault("name", f"rule-{index}")
+            if isinstance(spec.get("tier"), str):
+                spec["tier"] = [spec["tier"]]
+            self.rules.append(Rule(**spec))
+        self.default = self.routes[config.get("default", "standard")]
+        for name in [r.route for r in self.rules] + [f for r in self.routes.values() for f in r.fallbacks]:
+            if name not in self.routes:
+                raise ValueError(f"Model routing refers to unknown route '{name}'")
+
+        self.health_window = health_window
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.probe_rate = probe_rate
+        self.upstreams: Dict[str, ResilientUpstream] = {}
+        for route in self.routes.values():
+            if route.model not in self.upstreams:
+                self.upstreams[route.model] = upstream_factory()
+        self.stats: Dict[str, RouteStats] = {name: RouteStats() for name in self.routes}
+        self._degraded: Dict[str, Optional[str]] = {name: None for name in self.routes}
+
+    def upstream(self, model: str) -> ResilientUpstream:
+        return self.upstreams[model]
+
+    def degraded(self, route: Route) -> Optional[str]:
+        """Why `route`'s model is unhealthy right now, None if it is healthy"""
+        health = self.upstreams[route.model].health(self.health_window)
+        problem = None
+        if health["circuit_open"]:
+            problem = "circuit open"
+        elif health["samples"] >= self.min_samples:
+            if health["error_rate"] > self.max_error_rate:
+                problem = f"error rate {health['error_rate']:.0%}"
+            elif health["ttft_p95_ms"] is not None and health["ttft_p95_ms"] > route.ttft_slo_ms:
+                problem = f"TTFT p95 {health['ttft_p95_ms']:.0f}ms over {route.ttft_slo_ms:.0f}ms"
+        if problem != self._degraded[route.name]:
+            if problem:
+                logger.warning(f"⚠️  Route {route.name} ({route.model}) degraded: {problem}")
+            else:
+                logger.info(f"✅ Route {route.name} ({route.model}) healthy again")
+            self._degraded[route.name] = problem
+        return problem
+
+    def route(self, request: RouteRequest) -> RouteDecision:
+        route, reason = self.default, "default"
+        for rule in self.rules:
+            if rule.matches(request):
+                route, reason = self.routes[rule.route], rule.name
+                break
+        decision = RouteDecision(route, reason)
+        if route.fallbacks and self.degraded(route) and random.random() >= self.probe_rate:
+            for name in route.fallbacks:
+                fallback = self.routes[name]
+                if not self.degraded(fallback):
+                    self.stats[route.name].shifted_away += 1
+                    self.stats[name].shifted_in += 1
+                    decision = RouteDecision(fallback, reason, shifted_from=route.name)
+                    break
+        self.stats[decision.route.name].requests += 1
+        return decision
+
+    def record(self, decision: RouteDecision, status: str, ttft_ms: Optional[float], output_tokens: int):
+        """Outcome of a routed request"""
+        stats = self.stats[decision.route.name]
+        if status == "error":
+            stats.errors += 1
+        elif status == "cancelled":
+            stats.cancelled += 1
+        if ttft_ms is not None:
+            stats.ttft.append(ttft_ms)
+        stats.output_tokens += output_tokens or 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-route and per-model numbers for /metrics"""
+        routes = {}
+        for name, route in self.routes.items():
+            stats = self.stats[name]
+            ttft = list(stats.ttft)
+            routes[name] = {
+                "model": route.model,
+                "requests": stats.requests,
+                "shifted_in": stats.shifted_in,
+                "shifted_away": stats.shifted_away,
+                "errors": stats.errors,
+                "cancelled": stats.cancelled,
+                "output_tokens": stats.output_tokens,
+                "ttft_p50_ms": percentile(ttft, 50),
+                "ttft_p95_ms": percentile(ttft, 95),
+                "degraded": self._degraded[name],
+            }
+        return {
+            "default": self.default.name,
+            "routes": routes,
+            "models": {model: upstream.health(self.health_window) for model, upstream in self.upstreams.items()},
+        }
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Zyron AI - Server launcher
+
+Runs the backend with the `backend:` settings of the merged ConfigLoader
+config (config/base.yaml + config/zyron.<env>.yaml): workers, reload,
+event loop, HTTP parser and WebSocket implementation, keep-alive, listen backlog and timeouts.
+`workers: auto` starts one worker per CPU core available to the process.
+
+With several workers and `preload: true` the app is imported once in a
+supervisor process that binds the socket and forks the workers, so the
+interpreter and every imported module are shared copy-on-write instead
+of being loaded once per worker. The supervisor restarts workers that
+die and forwards SIGTERM (graceful shutdown) and SIGUSR1 (drain) to all
+of them.
+
+The workers of one instance share a listening socket, so a follow-up
+request can reach any of them. Before forking, the supervisor sets
+ZYRON_WORKERS and SHARED_STATE_PATH so that admission caps count the
+streams of every worker and conversations and batch owners are kept in a
+SQLite file all workers read (see shared_state.py). What stays in a
+worker's memory (PER_WORKER_STATE) degrades rather than breaks. Without
+pre-fork nothing can be shared in memory, so more than one spawned worker
+still needs `allow_multiple_workers: true`.
+
+    python serve.py --env prod
+    python serve.py --env dev --port 9000
+"""
+
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.config_loader import ConfigLoader  # noqa: E402
+import shared_state  # noqa: E402
+
+APP = "main:app"
+
+# Conversations, batch owners and admission caps when forking several workers
+SHARED_STATE_PATH = "data/shared_state.sqlite3"
+
+# In-memory state of a worker that a request routed to another worker misses, even when pre-forked
+PER_WORKER_STATE = (
+    "resumable stream buffers (a Last-Event-ID resume starts a new answer; "
+    "DELETE /chat/streams/{id} falls back to ending the stream once the client has gone)",
+    "the response cache memory tier and single-flight (Redis is shared)",
+    "graph layout rate limits",
+)
+
+# Without pre-fork every worker imports the app on its own and shares no memory
+SPAWNED_WORKER_STATE = ("admission caps, which multiply by the worker count",) + PER_WORKER_STATE
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    stream=sys.stdout,
+)
+logger = logging.getLogger("zyron.serve")
+
+
+def cpu_count() -> int:
+    """CPU cores this process may run on (container and affinity aware)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def resolve_workers(value: Any) -> int:
+    if value in (None, "", "auto", 0):
+        return cpu_count()
+    return max(1, int(value))
+
+
+def load_settings(env: str) -> Dict[str, Any]:
+    """Server settings from the merged config, with launcher defaults"""
+    loader = ConfigLoader(env=env)
+    loader.load_config()
+    return {
+        "host": loader.get("backend.host", "127.0.0.1"),
+        "port": int(loader.get("backend.port", 8000)),
+        "workers": resolve_workers(loader.get("backend.workers", 1)),
+        "allow_multiple_workers": bool(loader.get("backend.allow_multiple_workers", False)),
+        "reload": bool(loader.get("backend.reload", False)),
+        "preload": bool(loader.get("backend.preload", True)),
+        "loop": loader.get("backend.loop", "auto"),
+        "http": loader.get("backend.http", "auto"),
+        "ws": loader.get("backend.ws", "websockets-sansio"),
+        "keep_alive": int(loader.get("backend.keep_alive", 5)),
+        "backlog": int(loader.get("backend.backlog", 2048)),
+        "timeout": int(loader.get("backend.timeout", 300)),
+        "log_level": loader.get("backend.log_level", "info"),
+    }
+
+
+def uvicorn_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "host": settings["host"],
+        "port": settings["port"],
+        "loop": settings["loop"],
+        "http": settings["http"],
+        "ws": settings["ws"],
+        "timeout_keep_alive": settings["keep_alive"],
+        "backlog": settings["backlog"],
+        # Running streams get the same deadline on shutdown as during a drain
+        "timeout_graceful_shutdown": settings["timeout"],
+        "log_level": settings["log_level"],
+    }
+
+
+class Supervisor:
+    """Pre-fork supervisor: preloads the app, forks workers, keeps them alive"""
+
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        # Worker pid -> its slot (row) in the shared admission counters
+        self.children: Dict[int, int] = {}
+        self.stopping = False
+        self.draining = False
+
+    def spawn(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            # Worker: uvicorn installs its own handlers for SIGINT/SIGTERM
+            for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+                signal.signal(sig, signal.SIG_DFL)
+            shared_state.set_worker_slot(slot)
+            code = 1
+            try:
+                uvicorn.Server(self.config).run(sockets=[self.socket])
+                code = 0
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+
+    def forward(self, sig: int):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+        self.forward(signal.SIGTERM)
+
+    def handle_drain(self, signum, frame):
+        # A worker asks for a drain once it starts one; forward it only once
+        if not self.draining:
+            self.draining = True
+            logger.info("🚰 Draining all workers")
+            self.forward(signal.SIGUSR1)
+
+    def run(self) -> int:
+        # Size the shared state for the workers before the app creates it
+        os.environ["ZYRON_WORKERS"] = str(self.workers)
+        os.environ.setdefault("SHARED_STATE_PATH", SHARED_STATE_PATH)
+        # Import the app once here so the workers share its memory
+        self.config.load()
+        self.socket = self.config.bind_socket()
+        os.environ["ZYRON_SUPERVISOR_PID"] = str(os.getpid())
+
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGUSR1, self.handle_drain)
+
+        for slot in range(self.workers):
+            self.spawn(slot)
+        logger.info(f"✅ Supervisor {os.getpid()} started {self.workers} workers")
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in self.children:
+                continue
+            slot = self.children.pop(pid)
+            # Admission slots the worker still held are freed with it
+            shared_state.reset_worker(slot)
+            if not self.stopping and not self.draining:
+                logger.warning(f"⚠️  Worker {pid} exited ({status}), restarting")
+                time.sleep(0.5)
+                self.spawn(slot)
+
+        self.socket.close()
+        logger.info("👋 All workers exited")
+        return 0
+
+
+def serve(settings: Dict[str, Any]) -> int:
+    """Run uvicorn in the process model the settings ask for"""
+    # The drain deadline follows the configured timeout unless set explicitly
+    os.environ.setdefault("DRAIN_TIMEOUT_SECONDS", str(settings["timeout"]))
+    options = uvicorn_options(settings)
+
+    if settings["reload"]:
+        logger.info("🔄 Reload mode: one worker, restarted on code changes")
+        uvicorn.run(APP, reload=True, reload_dirs=[str(Path(__file__).parent)], **options)
+        return 0
+
+    workers = settings["workers"]
+    prefork = settings["preload"] and hasattr(os, "fork")
+    if workers > 1 and not prefork and not settings["allow_multiple_workers"]:
+        logger.warning(
+            f"⚠️  {workers} workers requested without pre-fork, starting 1: these are kept per worker "
+            f"and are not shared: {'; '.join(SPAWNED_WORKER_STATE)}. Set backend.preload, or "
+            "backend.allow_multiple_workers to start more anyway"
+        )
+        workers = 1
+    if workers == 1:
+        uvicorn.run(APP, **options)
+        return 0
+
+    if prefork:
+        logger.info(
+            f"🚀 Pre-forking {workers} workers on {settings['host']}:{settings['port']} "
+            f"(still per worker: {'; '.join(PER_WORKER_STATE)})"
+        )
+        return Supervisor(uvicorn.Config(APP, **options), workers).run()
+
+    # Spawned workers each import the app themselves
+    logger.info(f"🚀 Starting {workers} workers on {settings['host']}:{settings['port']}")
+    uvicorn.run(APP, workers=workers, **options)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Zyron AI backend server")
+    parser.add_argument("--env", default=os.getenv("ZYRON_ENV", "dev"), choices=["dev", "staging", "prod"],
+                        help="Config environment (default: $ZYRON_ENV or dev)")
+    parser.add_argument("--host", help="Override backend.host")
+    parser.add_argument("--port", "-p", type=int, help="Override backend.port")
+    parser.add_argument("--workers", "-w", help="Override backend.workers (a number or 'auto')")
+    parser.add_argument("--reload", action=argparse.BooleanOptionalAction, default=None,
+                        help="Override backend.reload")
+    args = parser.parse_args()
+
+    # Imports of main.py (e.g. data/usage.sqlite3) are relative to backend/
+    os.chdir(Path(__file__).parent)
+    settings = load_settings(args.env)
+    if args.host:
+        settings["host"] = args.host
+    if args.port:
+        settings["port"] = args.port
+    if args.workers:
+        settings["workers"] = resolve_workers(args.workers)
+    if args.reload is not None:
+        settings["reload"] = args.reload
+
+    logger.info(f"⚙️  Server settings ({args.env}): {settings}")
+    return serve(settings)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Zyron AI - State shared by the workers of one instance
+
+serve.py can pre-fork several workers from one process that already
+imported the app. State that must agree across those workers lives here
+instead of in a worker's memory:
+
+- SharedCounters: integer counters in anonymous shared memory, created
+  before the fork and inherited by every worker (admission caps). Each
+  worker only adds to its own row, so the supervisor can zero the row
+  of a worker that died holding slots.
+- SQLiteState: a small key/value table in a SQLite file that every
+  worker opens (conversation history, batch owners), with expiry.
+
+Without serve.py's pre-fork (one worker, tests) counters live in this
+process and nothing is shared.
+"""
+
+import json
+import mmap
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+
+# A worker that died inside `locked` never releases the lock; others go on without it after this
+LOCK_TIMEOUT_SECONDS = 1.0
+
+# Row of the current worker; serve.py sets it in each forked worker
+_worker_slot = 0
+_counters: List["SharedCounters"] = []
+
+
+def set_worker_slot(slot: int):
+    """Called in a freshly forked worker: its rows in every SharedCounters"""
+    global _worker_slot
+    _worker_slot = slot
+
+
+def reset_worker(slot: int):
+    """Called by the supervisor when a worker exits: drop what it still held"""
+    for counters in _counters:
+        counters.reset(slot)
+
+
+def worker_count() -> int:
+    """Workers serve.py is about to fork (ZYRON_WORKERS), 1 otherwise"""
+    return max(1, int(os.getenv("ZYRON_WORKERS", "1")))
+
+
+class SharedCounters:
+    """`width` int64 counters per worker slot, in memory shared across fork
+
+    Reads sum the column over all slots; writes go to the current
+    worker's row. `locked()` (a process-shared RLock) makes check-then-add
+    sequences atomic across workers.
+    """
+
+    def __init__(self, width: int, slots: Optional[int] = None):
+        self.slots = slots or worker_count()
+        self.width = width
+        # MAP_SHARED anonymous memory: forked children see the same pages
+        self._memory = mmap.mmap(-1, self.slots * width * 8)
+        self.rows = np.frombuffer(self._memory, dtype=np.int64).reshape(self.slots, width)
+        self.lock = multiprocessing.RLock()
+        _counters.append(self)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        acquired = self.lock.acquire(timeout=LOCK_TIMEOUT_SECONDS)
+        try:
+            yield
+        finally:
+            if acquired:
+                self.lock.release()
+
+    def total(self, column: int) -> int:
+        return int(self.rows[:, column].sum())
+
+    def add(self, column: int, amount: int = 1):
+        self.rows[_worker_slot, column] += amount
+
+    def reset(self, slot: int):
+        # Nobody writes a dead worker's row until its replacement starts
+        if slot < self.slots:
+            self.rows[slot] = 0
+
+
+class SQLiteState:
+    """Key/value rows with expiry in a SQLite file shared by the workers
+
+    Calls block and are meant to run in a worker thread. Each process
+    opens its own connection on first use, so a store created before the
+    server forks is safe to share; calls within a process are serialized.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        # Create the table up front so a bad path fails at startup
+        self.conn
+        self.close()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shared_state (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> Any:
+        """The stored value, None when missing or expired"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM shared_state WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, namespace: str, key: str, value: Any, ttl: float):
+        """Store `value` (JSON-serializable) for `ttl` seconds"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO shared_state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl),
+            )
+            self._writes += 1
+            # Expired rows are dropped now and then rather than on every write
+            if self._writes % 500 == 0:
+                self.conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (now,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,129 @@
+"""
+Zyron AI - Single-flight coalescing of identical in-flight requests
+
+The first request for a key starts one upstream producer task; every
+request for that key, the first included, subscribes to the flight's
+fan-out buffer. Late joiners replay the already-emitted prefix and then
+follow live deltas. The producer is cancelled once all subscribers leave,
+and the flight leaves the registry at that moment, so a request arriving
+while the cancellation runs starts a new flight instead of joining a
+dying one.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class Flight:
+    """One upstream stream shared by every identical request"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        # Called when the last subscriber leaves an unfinished flight
+        self.on_abandon: Optional[Callable[["Flight"], None]] = None
+        self._waiter: Optional[asyncio.Future] = None
+
+    def publish(self, text: str):
+        """Append a delta and wake subscribers"""
+        self.chunks.append(text)
+        self._notify()
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None):
+        """Mark the flight complete with the producer's result or error"""
+        self.done = True
+        self.result = result
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        self._waiter = None
+
+    async def _wait(self):
+        if self._waiter is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+        # asyncio.wait never cancels the shared future when one subscriber is cancelled
+        await asyncio.wait((self._waiter,))
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Yield every delta from the start of the flight, then live ones"""
+        index = 0
+        self.subscribers += 1
+        try:
+            while True:
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                if self.done:
+                    break
+                await self._wait()
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.task is not None:
+                if self.on_abandon is not None:
+                    self.on_abandon(self)
+                self.task.cancel()
+
+
+Producer = Callable[[Flight], Awaitable[Any]]
+
+
+class SingleFlight:
+    """Registry of in-flight upstream streams keyed by normalized request"""
+
+    def __init__(self):
+        self.flights_started = 0
+        self.joins = 0
+        self._flights: Dict[str, Flight] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def join(self, key: str, producer: Producer) -> Tuple[Flight, bool]:
+        """Return the flight for `key`, starting `producer` if there is none
+
+        The boolean is True for the request that started the flight.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.joins += 1
+            return flight, False
+        flight = Flight(key)
+        flight.on_abandon = self._forget
+        self._flights[key] = flight
+        self.flights_started += 1
+        flight.task = asyncio.ensure_future(self._run(flight, producer))
+        return flight, True
+
+    def _forget(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    async def _run(self, flight: Flight, producer: Producer):
+        try:
+            result = await producer(flight)
+        except BaseException as e:
+            flight.finish(error=e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            flight.finish(result)
+        finally:
+            self._forget(flight)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters for /metrics"""
+        return {
+            "in_flight": len(self._flights),
+            "upstream_streams": self.flights_started,
+            "coalesced_requests": self.joins,
+        }
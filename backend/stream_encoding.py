@@ -0,0 +1,138 @@
+"""
+Zyron AI - Stream encoding for /chat
+
+An answer is a sequence of typed events: `delta` (a text chunk),
+`block_end` (a markdown block is complete), `usage` (token counts), `done`
+(stop reason) and `error`. Each event payload is
+JSON-encoded once, when it is published, with orjson when it is
+installed. Transports only add framing around the encoded bytes:
+
+    SSE     id: <stream id>:<seq>\\nevent: delta\\ndata: "text"\\n\\n
+    NDJSON  {"id":"<stream id>:<seq>","event":"delta","data":"text"}\\n
+
+NDJSON is chosen when the request's Accept header prefers
+application/x-ndjson. A frame is built with a single bytes formatting
+operation, and every frame a reader has not sent yet goes out as one
+chunk.
+"""
+
+import json
+from typing import Any, Iterable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    # Optional speedup; the stdlib encoder produces equivalent JSON
+    orjson = None
+
+# Built once: json.dumps() with non-default options creates an encoder per call
+_json_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+DELTA = b"delta"
+BLOCK_END = b"block_end"
+USAGE = b"usage"
+DONE = b"done"
+ERROR = b"error"
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# (event type, JSON-encoded payload)
+Event = Tuple[bytes, bytes]
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _json_encode(value).encode()
+
+
+def delta_event(text: str) -> Event:
+    return DELTA, dumps(text)
+
+
+def block_end_event(block: str, rest: str) -> Event:
+    """A finished markdown block; `rest` is the text already sent after it"""
+    return BLOCK_END, dumps({"block": block, "rest": rest})
+
+
+def usage_event(
+    input_tokens: int,
+    output_tokens: Optional[int],
+    cache_read_tokens: int = 0,
+    cache_write_tokens: int = 0,
+    model: Optional[str] = None,
+) -> Event:
+    return USAGE, dumps({
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cache_read_tokens": cache_read_tokens,
+        "cache_write_tokens": cache_write_tokens,
+        "model": model,
+    })
+
+
+def done_event(stop_reason: Optional[str]) -> Event:
+    return DONE, dumps({"stop_reason": stop_reason})
+
+
+def error_event(message: str) -> Event:
+    return ERROR, dumps({"message": message})
+
+
+class SSEEncoder:
+    """Frames events as Server-Sent Events"""
+
+    media_type = SSE_MEDIA_TYPE
+    template = b"id: %s\nevent: %s\ndata: %s\n\n"
+
+    def frame(self, event_id: bytes, event: Event) -> bytes:
+        return self.template % (event_id, event[0], event[1])
+
+    def frames(self, events: Iterable[Tuple[bytes, Event]]) -> bytes:
+        """(id, event) pairs as one chunk"""
+        template = self.template
+        return b"".join([template % (event_id, event[0], event[1]) for event_id, event in events])
+
+
+class NDJSONEncoder(SSEEncoder):
+    """Frames events as newline-delimited JSON objects"""
+
+    media_type = NDJSON_MEDIA_TYPE
+    template = b'{"id":"%s","event":"%s","data":%s}\n'
+
+
+def _quality(accept: str, media_type: str) -> float:
+    """q-value the Accept header gives `media_type`, 0 if not acceptable"""
+    best, best_specificity = 0.0, -1
+    main_type = media_type.split("/")[0]
+    for part in accept.split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        if media == media_type:
+            specificity = 2
+        elif media == f"{main_type}/*":
+            specificity = 1
+        elif media == "*/*":
+            specificity = 0
+        else:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if specificity > best_specificity:
+            best, best_specificity = q, specificity
+    return best
+
+
+def encoder_for(accept: Optional[str]) -> SSEEncoder:
+    """NDJSON if the client prefers it over SSE, SSE otherwise"""
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        if _quality(accept, NDJSON_MEDIA_TYPE) > _quality(accept, SSE_MEDIA_TYPE):
+            return NDJSONEncoder()
+    return SSEEncoder()
@@ -0,0 +1,204 @@
+"""
+Zyron AI - In-memory stream telemetry
+
+Per-stream counters are plain attribute updates so the /chat token loop
+does no I/O besides its yield; one summary record is logged per stream
+and aggregates are served from /metrics. Counters are per worker process.
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, None for an empty sample"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class StreamMetrics:
+    """Counters for a single /chat stream"""
+    started: float = field(default_factory=time.perf_counter)
+    first_chunk_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    chunks: int = 0
+    bytes: int = 0
+    output_tokens: Optional[int] = None
+    input_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    error: Optional[str] = None
+    cancelled: bool = False
+    tokens_saved: int = 0
+
+    def record_usage(self, usage: Any):
+        """Copy token counts from an upstream `usage` object"""
+        self.output_tokens = usage.output_tokens
+        self.input_tokens = usage.input_tokens or 0
+        self.cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        self.cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+
+    def record_chunk(self, size: int):
+        """Count one emitted frame of `size` bytes"""
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self.chunks += 1
+        self.bytes += size
+
+    def finish(self, error: Optional[str] = None):
+        """Mark the stream as finished"""
+        self.finished_at = time.perf_counter()
+        self.error = error
+
+    def cancel(self, tokens_saved: int = 0):
+        """Mark the stream as stopped by its client before completion"""
+        self.cancelled = True
+        self.tokens_saved = tokens_saved
+        self.finish()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from stream start to first chunk"""
+        if self.first_chunk_at is None:
+            return None
+        return self.first_chunk_at - self.started
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Seconds from stream start to finish"""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started
+
+    @property
+    def tokens(self) -> int:
+        """Output tokens reported upstream, falling back to chunk count"""
+        return self.output_tokens if self.output_tokens is not None else self.chunks
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        """Output tokens per second over the generation phase"""
+        if self.first_chunk_at is None or self.finished_at is None:
+            return None
+        elapsed = self.finished_at - self.first_chunk_at
+        return self.tokens / elapsed if elapsed > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary record for logging"""
+        return {
+            "ttft_ms": None if self.ttft is None else round(self.ttft * 1000, 1),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 1),
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "tokens": self.tokens,
+            "tokens_per_sec": None if self.tokens_per_sec is None else round(self.tokens_per_sec, 1),
+            "input_tokens": self.input_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "error": self.error,
+            "cancelled": self.cancelled,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+class MetricsRegistry:
+    """Aggregates finished StreamMetrics into totals and rolling percentiles"""
+
+    def __init__(self, window: int = 1000):
+        self.active = 0
+        self.streams_total = 0
+        self.errors_total = 0
+        self.chunks_total = 0
+        self.bytes_total = 0
+        self.tokens_total = 0
+        self.input_tokens_total = 0
+        self.cache_read_tokens_total = 0
+        self.cache_write_tokens_total = 0
+        self.cache_hits = 0
+        self.cancelled_total = 0
+        self.tokens_saved_total = 0
+        self._ttft: Deque[float] = deque(maxlen=window)
+        self._duration: Deque[float] = deque(maxlen=window)
+        self._tokens_per_sec: Deque[float] = deque(maxlen=window)
+        self._answer_tokens: Deque[int] = deque(maxlen=window)
+
+    def start_stream(self) -> StreamMetrics:
+        """Begin tracking a new stream"""
+        self.active += 1
+        return StreamMetrics()
+
+    def record(self, stream: StreamMetrics):
+        """Fold a finished stream into the aggregates"""
+        if stream.finished_at is None:
+            stream.finish()
+        self.active -= 1
+        self.streams_total += 1
+        if stream.error:
+            self.errors_total += 1
+        self.chunks_total += stream.chunks
+        self.bytes_total += stream.bytes
+        self.tokens_total += stream.tokens
+        self.input_tokens_total += stream.input_tokens
+        self.cache_read_tokens_total += stream.cache_read_tokens
+        self.cache_write_tokens_total += stream.cache_write_tokens
+        if stream.cache_read_tokens:
+            self.cache_hits += 1
+        if stream.cancelled:
+            self.cancelled_total += 1
+            self.tokens_saved_total += stream.tokens_saved
+        elif not stream.error and stream.output_tokens is not None:
+            self._answer_tokens.append(stream.output_tokens)
+        if stream.ttft is not None:
+            self._ttft.append(stream.ttft)
+        self._duration.append(stream.duration)
+        if stream.tokens_per_sec is not None:
+            self._tokens_per_sec.append(stream.tokens_per_sec)
+
+    def expected_output_tokens(self, max_tokens: int) -> int:
+        """Median length of recent complete answers, `max_tokens` until one is seen"""
+        if not self._answer_tokens:
+            return max_tokens
+        return min(max_tokens, int(percentile(list(self._answer_tokens), 50)))
+
+    @staticmethod
+    def _summary(values: Deque[float], scale: float = 1.0) -> Dict[str, Optional[float]]:
+        sample = [v * scale for v in values]
+        return {
+            "p50": percentile(sample, 50),
+            "p95": percentile(sample, 95),
+            "p99": percentile(sample, 99),
+        }
+
+    def prompt_cache_snapshot(self) -> Dict[str, Any]:
+        """Prompt-cache token totals and hit ratios"""
+        prompt_tokens = self.input_tokens_total + self.cache_read_tokens_total + self.cache_write_tokens_total
+        return {
+            "input_tokens": self.input_tokens_total,
+            "cache_read_tokens": self.cache_read_tokens_total,
+            "cache_write_tokens": self.cache_write_tokens_total,
+            "token_hit_ratio": self.cache_read_tokens_total / prompt_tokens if prompt_tokens else None,
+            "request_hit_ratio": self.cache_hits / self.streams_total if self.streams_total else None,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current aggregates as a JSON-serializable dict"""
+        return {
+            "active": self.active,
+            "streams_total": self.streams_total,
+            "errors_total": self.errors_total,
+            "chunks_total": self.chunks_total,
+            "bytes_total": self.bytes_total,
+            "tokens_total": self.tokens_total,
+            "cancelled_total": self.cancelled_total,
+            "tokens_saved_total": self.tokens_saved_total,
+            "ttft_ms": self._summary(self._ttft, 1000),
+            "duration_ms": self._summary(self._duration, 1000),
+            "tokens_per_sec": self._summary(self._tokens_per_sec),
+            "prompt_cache": self.prompt_cache_snapshot(),
+        }
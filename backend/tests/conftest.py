@@ -0,0 +1,112 @@
+"""
+Shared test setup for the backend
+
+Tests import the backend modules directly, like the app does when it is
+started from backend/. main.py reads its configuration when it is
+imported, so the environment is set here first: a throwaway data
+directory, no Supabase, a known JWT secret for access tokens, and the
+mock upstream from bench.mock_upstream instead of the Anthropic API.
+
+    cd backend && python -m pytest -q
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+DATA = tempfile.mkdtemp(prefix="zyron-tests-")
+os.environ.update({
+    "ANTHROPIC_API_KEY": "test-key",
+    "USAGE_LEDGER_PATH": os.path.join(DATA, "usage.sqlite3"),
+    "GRAPH_DB_PATH": os.path.join(DATA, "graph.sqlite3"),
+    "SUPABASE_URL": "",
+    "SUPABASE_SERVICE_ROLE_KEY": "",
+    "REDIS_HOST": "",
+    "DRAIN_EXIT": "false",
+    "SUPABASE_JWT_SECRET": "test-jwt-secret",
+})
+
+
+def access_token(sub: str = "user_1", secret: str = "test-jwt-secret", **claims) -> str:
+    """An HS256 access token like the ones Clerk's supabase template issues"""
+    def encode(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    claims = {"sub": sub, "exp": time.time() + 600, "role": "authenticated", **claims}
+    signing_input = f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode(claims)}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+def ndjson_events(body: str) -> list:
+    """Events of an NDJSON /chat response as (event, data) pairs"""
+    return [(line["event"], line["data"]) for line in map(json.loads, body.splitlines()) if line]
+
+
+@pytest.fixture(scope="session")
+def upstream():
+    """The mock Messages API on a local port, answering "hello " five times without delay"""
+    import uvicorn
+
+    from bench.mock_upstream import MockConfig, create_app
+
+    mock = create_app(MockConfig(tokens=5, ttft_ms=0, token_latency_ms=0, token_text="hello ", batch_delay_ms=0))
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(mock, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    mock.state.port = port
+    while not server.started:
+        time.sleep(0.01)
+    yield mock
+    server.should_exit = True
+    thread.join(5)
+
+
+class DictOwners:
+    """Workspace owner lookup from a dict, counting lookups"""
+
+    def __init__(self, owners: dict):
+        self.owners = owners
+        self.lookups = 0
+
+    async def owner(self, workspace_id: str):
+        self.lookups += 1
+        return self.owners.get(workspace_id)
+
+
+@pytest.fixture
+def workspace_owners(app_client, monkeypatch):
+    """Ownership checks in main against a {workspace_id: user_id} dict the test fills in"""
+    import main
+    from auth import WorkspaceAccess
+
+    owners = DictOwners({})
+    monkeypatch.setattr(main, "workspace_access", WorkspaceAccess(owners))
+    return owners.owners
+
+
+@pytest.fixture(scope="session")
+def app_client(upstream):
+    """TestClient for main.app, its Anthropic client pointed at `upstream`"""
+    from fastapi.testclient import TestClient
+
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{upstream.state.port}"
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, AdmittedStreamingResponse, client_id_for
+
+
+def test_caps_per_client_and_globally():
+    async def main():
+        controller = AdmissionController(max_concurrent=3, max_per_client=2, queue_timeout=0.05)
+        permits = [await controller.acquire("a"), await controller.acquire("a"), await controller.acquire("b")]
+        with pytest.raises(AdmissionRejected, match="queue timeout"):
+            await controller.acquire("c")
+        permits[0].release()
+        permits[0].release()
+        return controller, await controller.acquire("c")
+
+    controller, _ = asyncio.run(main())
+
+    assert controller.active == 3
+    assert controller.rejected_timeout == 1
+
+
+def test_queue_full_is_rejected_with_retry_after():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=1)
+        held = await controller.acquire("a")
+        waiting = asyncio.ensure_future(controller.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c")
+        held.release()
+        (await waiting).release()
+        return rejected.value
+
+    rejected = asyncio.run(main())
+
+    assert rejected.reason == "queue full"
+    assert rejected.retry_after >= 1
+
+
+def test_freed_slots_go_round_robin_across_clients():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_per_client=1, queue_timeout=5)
+        held = await controller.acquire("seed")
+        order = []
+
+        async def request(client_id):
+            permit = await controller.acquire(client_id)
+            order.append(client_id)
+            await asyncio.sleep(0)
+            permit.release()
+
+        # The noisy client queues first and more, but the others are served in between
+        tasks = [asyncio.ensure_future(request(c)) for c in ["noisy"] * 4 + ["b", "c"]]
+        await asyncio.sleep(0)
+        held.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(main())
+
+    assert order[:3] == ["noisy", "b", "c"]
+    assert order.count("noisy") == 4
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, queue_timeout=5)
+        held = await controller.acquire("a")
+        waiting = asyncio.ensure_future(controller.acquire("b"))
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        held.release()
+        return controller
+
+    controller = asyncio.run(main())
+
+    assert controller.queued == 0
+    assert controller.active == 0
+
+
+def test_permit_is_released_when_the_client_disconnects():
+    async def main():
+        controller = AdmissionController(max_concurrent=1)
+        permit = await controller.acquire("a")
+        produced = []
+
+        async def body():
+            for i in range(1000):
+                produced.append(i)
+                yield b"x"
+                await asyncio.sleep(0.01)
+
+        messages = asyncio.Queue()
+
+        async def receive():
+            return await messages.get()
+
+        async def send(message):
+            if message["type"] == "http.response.body" and len(produced) == 3:
+                messages.put_nowait({"type": "http.disconnect"})
+
+        response = AdmittedStreamingResponse(body(), permit=permit)
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "path": "/chat", "headers": []}
+        await asyncio.wait_for(response(scope, receive, send), 2)
+        return controller, response, produced
+
+    controller, response, produced = asyncio.run(main())
+
+    assert response.disconnected
+    assert controller.active == 0
+    assert len(produced) < 10
+
+
+def test_workers_sharing_counters_share_the_caps():
+    async def main():
+        shared = AdmissionController.shared_counters()
+        first, second = (
+            AdmissionController(max_concurrent=2, max_per_client=1, queue_timeout=1, shared=shared, poll_interval=0.01)
+            for _ in range(2)
+        )
+        held = [await first.acquire("a"), await first.acquire("b")]
+        # Global cap reached on the other worker
+        waiting = asyncio.ensure_future(second.acquire("c"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        with pytest.raises(AdmissionRejected, match="queue timeout"):
+            second.queue_timeout = 0.05
+            await second.acquire("a")
+        # A slot freed on the first worker is picked up by the second one's queue
+        held[0].release()
+        granted = await asyncio.wait_for(waiting, 1)
+        return shared, first, second, granted
+
+    shared, first, second, granted = asyncio.run(main())
+
+    assert first.active == 1 and second.active == 1 and shared.total(0) == 2
+    granted.release()
+    assert shared.total(0) == 1
+
+
+def test_client_id_only_trusts_forwarded_for_when_configured():
+    assert client_id_for(("10.0.0.1", 5000), "1.2.3.4, 10.0.0.1", 0) == "10.0.0.1"
+    # The leftmost entries are the client's own and can be anything
+    assert client_id_for(("10.0.0.1", 5000), "spoofed, 1.2.3.4", 1) == "1.2.3.4"
+    assert client_id_for(("10.0.0.2", 5000), "spoofed, 1.2.3.4, 10.0.0.1", 2) == "1.2.3.4"
+    assert client_id_for(("10.0.0.1", 5000), "1.2.3.4", 3) == "1.2.3.4"
+    assert client_id_for(None, None, 1) == "unknown"
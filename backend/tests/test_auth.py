@@ -0,0 +1,120 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from auth import AccessDenied, Authenticator, Caller, WorkspaceAccess, bearer_token
+from conftest import DictOwners, access_token
+
+SECRET = "test-jwt-secret"
+WORKSPACE = "7d4c7f9e-0b7a-4a52-9c1e-2f6f7d1d8b10"
+
+
+def test_bearer_token():
+    assert bearer_token("Bearer abc") == "abc"
+    assert bearer_token("bearer  abc ") == "abc"
+    for bad in (None, "", "Bearer", "Bearer ", "Basic abc"):
+        assert bearer_token(bad) is None
+
+
+def test_valid_token_yields_caller_with_user_and_claimed_tiers():
+    auth = Authenticator(SECRET, ["fast", "standard"])
+
+    caller = auth.caller("Bearer " + access_token("user_42", tiers=["deep", 3]))
+
+    assert caller.user_id == "user_42"
+    assert caller.tiers == {"fast", "standard", "deep"}
+    assert auth.snapshot()["authenticated"] == 1
+
+
+def test_forged_expired_and_malformed_tokens_are_anonymous():
+    auth = Authenticator(SECRET)
+    tokens = [
+        access_token(secret="someone-else"),
+        access_token(exp=time.time() - 3600),
+        access_token(nbf=time.time() + 3600),
+        access_token(sub=""),
+        "not.a.jwt",
+        "garbage",
+    ]
+
+    assert [auth.caller("Bearer " + token) for token in tokens] == [None] * len(tokens)
+    assert auth.snapshot()["invalid_tokens"] == len(tokens)
+
+
+def test_without_a_secret_everyone_is_anonymous():
+    auth = Authenticator(None)
+
+    assert auth.caller("Bearer " + access_token()) is None
+    assert auth.snapshot()["enabled"] is False
+
+
+def test_tier_needs_an_entitled_caller():
+    auth = Authenticator(SECRET, ["fast"])
+    user = auth.caller("Bearer " + access_token())
+    paying = auth.caller("Bearer " + access_token(tiers=["deep"]))
+
+    assert auth.tier(None, "deep") is None
+    assert auth.tier(user, "deep") is None
+    assert auth.tier(user, "fast") == "fast"
+    assert auth.tier(paying, "deep") == "deep"
+    assert auth.tier(paying, None) is None
+    assert auth.snapshot()["tiers_denied"] == 2
+
+
+def check(access, caller, workspace_id, host="203.0.113.7"):
+    return asyncio.run(access.check(caller, workspace_id, host))
+
+
+def denied(access, caller, workspace_id, host="203.0.113.7"):
+    with pytest.raises(AccessDenied) as error:
+        check(access, caller, workspace_id, host)
+    return error.value.status
+
+
+def test_workspace_access_checks_the_owner():
+    owners = DictOwners({WORKSPACE: "user_1"})
+    access = WorkspaceAccess(owners)
+    owner = Caller("user_1", frozenset(), "token")
+
+    assert check(access, owner, WORKSPACE.upper()) == WORKSPACE
+    assert denied(access, Caller("user_2", frozenset(), "token"), WORKSPACE) == 403
+    assert denied(access, None, WORKSPACE) == 401
+    assert denied(access, owner, str(uuid.uuid4())) == 403
+    assert denied(access, owner, "../workspaces") == 400
+    # The owner was looked up once, then cached; unknown workspaces are not cached
+    assert owners.lookups == 2
+    assert access.snapshot()["forbidden"] == 2
+
+
+def test_workspace_access_without_owner_lookup_serves_localhost_only():
+    access = WorkspaceAccess(None)
+
+    assert check(access, None, WORKSPACE, host="127.0.0.1") == WORKSPACE
+    assert denied(access, None, WORKSPACE) == 403
+
+
+def test_workspace_owner_lookup_failure_is_unavailable():
+    class Down:
+        async def owner(self, workspace_id):
+            raise ConnectionError("supabase down")
+
+    access = WorkspaceAccess(Down())
+
+    assert denied(access, Caller("user_1", frozenset(), "token"), WORKSPACE) == 503
+    assert access.snapshot()["lookup_errors"] == 1
+
+
+def test_forwarded_localhost_does_not_unlock_workspaces(app_client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "workspace_access", WorkspaceAccess(None))
+    # Behind a trusted proxy the admission client id comes from X-Forwarded-For
+    monkeypatch.setattr(main, "ADMISSION_PROXY_HOPS", 1)
+    spoofed = {"X-Forwarded-For": "127.0.0.1"}
+
+    chat = app_client.post("/chat", json={"message": "hi", "workspace_id": WORKSPACE}, headers=spoofed)
+    graph = app_client.get(f"/workspaces/{WORKSPACE}/graph/top?node={WORKSPACE}", headers=spoofed)
+
+    assert chat.status_code == 403 and graph.status_code == 403
@@ -0,0 +1,175 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from admission import AdmissionController
+from batch import BatchItem, BatchRunner, parse_item, read_items, read_lines
+from conftest import access_token
+from shared_state import SQLiteState
+
+
+async def body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(iterator):
+    return [value async for value in iterator]
+
+
+def lines_of(*chunks, max_line_bytes=10):
+    return asyncio.run(collect(read_lines(body(*chunks), max_line_bytes)))
+
+
+def test_read_lines_splits_across_chunks():
+    assert lines_of(b"one\ntw", b"o\n\nthr", b"ee") == [b"one", b"two", b"three"]
+
+
+def test_every_oversized_line_is_rejected():
+    # In one chunk, split across chunks, and as the unterminated last line
+    assert lines_of(b"short\n" + b"x" * 20 + b"\nok\n") == [b"short", None, b"ok"]
+    assert lines_of(b"ok\n" + b"x" * 8, b"x" * 8, b"x\nafter\n") == [b"ok", None, b"after"]
+    assert lines_of(b"ok\n" + b"x" * 11) == [b"ok", None]
+    assert lines_of(b"x" * 10 + b"\n") == [b"x" * 10]
+
+
+def test_parse_item_validation():
+    assert parse_item(b'{"id": "a", "message": "hi", "tier": "fast"}', 0) == BatchItem("a", "hi", tier="fast")
+    assert parse_item(b'{"message": "hi"}', 7).id == "7"
+    assert "invalid JSON" in parse_item(b"{", 0).error
+    assert parse_item(b"[1]", 0).error == "each line must be a JSON object"
+    assert parse_item(b'{"message": " "}', 0).error == "message must be a non-empty string"
+    assert parse_item(b'{"message": "hi", "max_tokens": 0}', 0).error == "max_tokens must be a positive integer"
+
+
+def test_direct_caps_concurrency_and_reports_each_item():
+    in_flight = peak = 0
+
+    async def answer(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if item.message == "fail":
+            raise RuntimeError("upstream error")
+        return {"id": item.id, "status": "ok"}
+
+    lines = [json.dumps({"id": str(i), "message": "fail" if i == 3 else "hi"}) for i in range(20)] + ["{"]
+    runner = BatchRunner(concurrency=4)
+
+    results = asyncio.run(collect(runner.direct(read_items(body("\n".join(lines).encode())), answer)))
+
+    assert peak == 4
+    assert len(results) == 21
+    assert {r["id"] for r in results if r["status"] == "error"} == {"3", "20"}
+    assert runner.snapshot()["errors_total"] == 2
+
+
+def test_direct_items_each_hold_an_admission_slot():
+    in_flight = peak = 0
+
+    async def answer(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"id": item.id, "status": "ok"}
+
+    async def main():
+        admission = AdmissionController(max_concurrent=64, max_per_client=3)
+        lines = "\n".join(json.dumps({"id": str(i), "message": "hi"}) for i in range(12)).encode()
+        results = await collect(BatchRunner(concurrency=32).direct(
+            read_items(body(lines)), answer, admit=lambda: admission.acquire_when_free("client"),
+        ))
+        return results, admission
+
+    results, admission = asyncio.run(main())
+
+    assert len(results) == 12 and peak == 3
+    assert admission.active == 0
+
+
+class FakeBatches:
+    def __init__(self):
+        self.created = []
+
+    async def create(self, requests):
+        self.created.append(requests)
+        return SimpleNamespace(id=f"msgbatch_{len(self.created)}")
+
+
+def test_message_batches_submit_in_chunks_and_return():
+    client = SimpleNamespace(messages=SimpleNamespace(batches=FakeBatches()))
+    runner = BatchRunner(chunk_size=2)
+    lines = b"\n".join([
+        b'{"id": "a", "message": "1"}', b'{"id": "b", "message": "2"}',
+        b'{"id": "bad id", "message": "3"}', b'{"id": "c", "message": "4"}',
+    ])
+
+    results = asyncio.run(collect(runner.message_batches(
+        client, read_items(body(lines)), lambda item: {"messages": [{"role": "user", "content": item.message}]},
+    )))
+
+    assert [r["status"] for r in results] == ["submitted", "error", "submitted"]
+    assert [r.get("batch_id") for r in results if r["status"] == "submitted"] == ["msgbatch_1", "msgbatch_2"]
+    assert [[r["custom_id"] for r in batch] for batch in client.messages.batches.created] == [["a", "b"], ["c"]]
+
+
+def test_batch_owners_are_found_from_any_worker(tmp_path):
+    shared = SQLiteState(str(tmp_path / "shared.sqlite3"))
+    client = SimpleNamespace(messages=SimpleNamespace(batches=FakeBatches()))
+    submitting, other = BatchRunner(shared=shared), BatchRunner(shared=shared)
+
+    async def main():
+        await collect(submitting.message_batches(
+            client, read_items(body(b'{"id": "a", "message": "1"}')), lambda item: {}, owner="user_1",
+        ))
+        return await other.owner("msgbatch_1"), await other.owner("msgbatch_2")
+
+    assert asyncio.run(main()) == ("user_1", None)
+    shared.close()
+
+
+def test_first_collection_is_counted_once():
+    runner = BatchRunner()
+
+    assert runner.first_collection("msgbatch_1") is True
+    assert runner.first_collection("msgbatch_1") is False
+
+
+def test_batches_mode_then_results_by_batch_id(app_client):
+    owner = {"Authorization": f"Bearer {access_token('user_1')}"}
+    lines = "\n".join(json.dumps({"id": f"i{i}", "message": f"batch item {i}"}) for i in range(3))
+    submitted = app_client.post("/chat/batch?mode=batches", content=lines, headers=owner)
+    batch_id = json.loads(submitted.text.splitlines()[0])["batch_id"]
+
+    someone_else = app_client.get(
+        f"/chat/batch/{batch_id}", headers={"Authorization": f"Bearer {access_token('user_2')}"}
+    )
+    anonymous = app_client.get(f"/chat/batch/{batch_id}")
+    response = app_client.get(f"/chat/batch/{batch_id}", headers=owner)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["id"] for r in results) == ["i0", "i1", "i2"]
+    assert all(r["status"] == "ok" and r["text"] == "hello " * 5 for r in results)
+    assert someone_else.status_code == 404 and anonymous.status_code == 401
+    assert app_client.get("/chat/batch/not a batch", headers=owner).status_code == 400
+    assert app_client.get("/chat/batch/msgbatch_unknown", headers=owner).status_code == 404
+
+
+def test_direct_mode_streams_results(app_client):
+    lines = "\n".join(json.dumps({"id": f"d{i}", "message": f"direct item {i}"}) for i in range(3))
+
+    anonymous = app_client.post("/chat/batch", content=lines)
+    response = app_client.post(
+        "/chat/batch", content=lines, headers={"Authorization": f"Bearer {access_token('user_1')}"}
+    )
+
+    assert anonymous.status_code == 401
+
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["id"] for r in results) == ["d0", "d1", "d2"]
+    assert all(r["text"] == "hello " * 5 for r in results)
@@ -0,0 +1,20 @@
+from bench.load import Config, StreamTrace
+
+
+def test_config_splits_server_options_from_environment():
+    config = Config.parse("tuned:workers=2,loop=uvloop,SSE_COALESCE_WINDOW_MS=0")
+
+    assert config.name == "tuned"
+    assert config.workers == 2
+    assert config.uvicorn_args == ["--loop", "uvloop"]
+    assert config.env == {"SSE_COALESCE_WINDOW_MS": "0"}
+    assert Config.parse(":").name == "default"
+
+
+def test_stream_trace_timings():
+    trace = StreamTrace(started=1.0, frames=[1.2, 1.25, 1.4], finished=1.5)
+
+    assert round(trace.ttft, 3) == 0.2
+    assert round(trace.duration, 3) == 0.5
+    assert [round(gap, 3) for gap in trace.gaps] == [0.05, 0.15]
+    assert StreamTrace(started=0).ttft is None
@@ -0,0 +1,64 @@
+"""Stop generating: cancelling a /chat answer closes its upstream stream"""
+
+import asyncio
+from types import SimpleNamespace
+
+
+class EndlessUpstream:
+    """client.messages.stream() stand-in that generates until it is closed"""
+
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+        self.messages = SimpleNamespace(stream=self.stream)
+
+    def stream(self, **params):
+        upstream = self
+
+        async def text_stream():
+            while True:
+                yield "token "
+                await asyncio.sleep(0.005)
+
+        class Manager:
+            async def __aenter__(self):
+                upstream.opened += 1
+                return SimpleNamespace(text_stream=text_stream())
+
+            async def __aexit__(self, *exc_info):
+                upstream.closed += 1
+
+        return Manager()
+
+
+def test_cancel_closes_upstream_and_counts_saved_tokens(app_client, monkeypatch):
+    import main
+
+    upstream = EndlessUpstream()
+    monkeypatch.setattr(main, "client", upstream)
+    before = main.stream_metrics.snapshot()
+
+    async def scenario():
+        stream, after, permit = await main.open_chat_stream({"message": "never ending"}, "cancel-test", None)
+        reader = stream.read(after, 5)
+        await reader.__anext__()
+        await reader.aclose()
+        assert main.streams.cancel(stream.id) is True
+        await asyncio.wait((stream.task,), timeout=2)
+        permit.release()
+        return stream
+
+    stream = asyncio.run(scenario())
+
+    after = main.stream_metrics.snapshot()
+    assert stream.done and stream.cancelled
+    assert upstream.opened == upstream.closed == 1
+    assert after["cancelled_total"] == before["cancelled_total"] + 1
+    assert after["tokens_saved_total"] > before["tokens_saved_total"]
+
+
+def test_delete_stream_endpoint(app_client):
+    response = app_client.post("/chat", json={"message": "finished already"}, headers={"Accept": "application/x-ndjson"})
+
+    assert app_client.delete(f"/chat/streams/{response.headers['x-stream-id']}").status_code == 204
+    assert app_client.delete("/chat/streams/unknown").status_code == 404
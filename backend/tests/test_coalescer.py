@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from coalescer import coalesce
+
+
+async def paced(chunks, gap=0.0):
+    for chunk in chunks:
+        if gap:
+            await asyncio.sleep(gap)
+        yield chunk
+
+
+async def collect(deltas, window_ms, max_chars=1024):
+    return [text async for text in coalesce(deltas, window_ms, max_chars)]
+
+
+def test_zero_window_passes_deltas_through():
+    frames = asyncio.run(collect(paced(["a", "b", "c"]), 0))
+
+    assert frames == ["a", "b", "c"]
+
+
+def test_first_delta_is_flushed_alone_and_the_rest_merged():
+    chunks = [f"t{i} " for i in range(50)]
+
+    frames = asyncio.run(collect(paced(chunks, gap=0.001), window_ms=200))
+
+    assert frames[0] == "t0 "
+    assert "".join(frames) == "".join(chunks)
+    assert len(frames) < 5
+
+
+def test_size_threshold_flushes_before_the_window():
+    chunks = ["x" * 10] * 20
+
+    frames = asyncio.run(collect(paced(chunks, gap=0.001), window_ms=10_000, max_chars=50))
+
+    assert "".join(frames) == "".join(chunks)
+    assert all(len(frame) <= 60 for frame in frames[1:])
+    assert len(frames) >= 4
+
+
+def test_buffer_is_flushed_while_upstream_stalls():
+    async def stalling():
+        yield "first"
+        await asyncio.sleep(0.05)
+        yield "second"
+        await asyncio.sleep(0.5)
+        yield "third"
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        arrivals = []
+        async for text in coalesce(stalling(), window_ms=20):
+            arrivals.append((text, loop.time() - started))
+        return arrivals
+
+    arrivals = asyncio.run(main())
+
+    assert [text for text, _ in arrivals] == ["first", "second", "third"]
+    assert arrivals[1][1] < 0.25
+
+
+def test_upstream_error_is_raised_after_buffered_text():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("upstream broke")
+
+    async def main():
+        frames = []
+        with pytest.raises(RuntimeError, match="upstream broke"):
+            async for text in coalesce(failing(), window_ms=20):
+                frames.append(text)
+        return frames
+
+    assert asyncio.run(main()) == ["partial"]
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from concept_graph import ConceptGraphPipeline, GraphJob, extract_concepts, message_graph, validate_job
+from conftest import access_token
+from graph_store import GraphWriteRejected
+
+WORKSPACE = "7d4c7f9e-0b7a-4a52-9c1e-2f6f7d1d8b10"
+
+
+class FakeStore:
+    """Applies batches in memory; messages named in `bad` make the whole batch fail"""
+
+    def __init__(self, bad=(), outages=0):
+        self.bad = set(bad)
+        self.outages = outages
+        self.applied = []
+
+    def processed(self, message_ids):
+        return {m.message_id for m in self.applied} & set(message_ids)
+
+    def apply(self, batch):
+        if self.outages:
+            self.outages -= 1
+            raise ConnectionError("store unavailable")
+        if any(m.message_id in self.bad for m in batch):
+            raise GraphWriteRejected("invalid input syntax for type uuid")
+        self.applied.extend(batch)
+        return len(batch), 0
+
+    def close(self):
+        pass
+
+
+def test_extract_concepts_topics_concepts_and_relations():
+    text = (
+        "## Vector Search\n\n"
+        "The **HNSW index** speeds up Approximate Nearest Neighbor queries in PostgreSQL.\n\n"
+        "```\nIgnored Code\n```\n"
+    )
+
+    concepts, relations = extract_concepts(text)
+
+    assert {key: c.type for key, c in concepts.items()} == {
+        "vector search": "topic",
+        "hnsw index": "concept",
+        "approximate nearest neighbor": "concept",
+        "postgresql": "concept",
+    }
+    assert relations[("hnsw index", "vector search", "part_of")] == 1
+    assert relations[("approximate nearest neighbor", "hnsw index", "relates_to")] == 1
+
+
+def test_node_ids_are_stable_within_a_workspace():
+    first = message_graph("m1", WORKSPACE, "Uses **Redis** for caching.")
+    second = message_graph("m2", WORKSPACE, "Then **redis** again.")
+    other = message_graph("m3", str(uuid.uuid4()), "Uses **Redis** too.")
+
+    assert first.nodes[0].id == second.nodes[0].id != other.nodes[0].id
+
+
+def test_validate_job_canonicalizes_the_workspace_id():
+    job = validate_job(GraphJob("m1", WORKSPACE.upper(), "text"))
+
+    assert job.workspace_id == WORKSPACE
+    for bad in (
+        GraphJob("m1", "not-a-uuid", "text"),
+        GraphJob("m1", None, "text"),
+        GraphJob("", WORKSPACE, "text"),
+        GraphJob("m1", WORKSPACE, None),
+    ):
+        with pytest.raises(ValueError):
+            validate_job(bad)
+
+
+def test_submit_refuses_invalid_jobs():
+    async def main():
+        pipeline = ConceptGraphPipeline(FakeStore())
+        accepted = pipeline.submit(GraphJob("m1", "workspace-1", "text"))
+        snapshot = pipeline.snapshot()
+        await pipeline.close()
+        return accepted, snapshot
+
+    accepted, snapshot = asyncio.run(main())
+
+    assert not accepted
+    assert snapshot["invalid"] == 1 and snapshot["submitted"] == 0
+
+
+def test_rejected_batch_is_split_until_the_bad_message_is_isolated():
+    store = FakeStore(bad={"m5"})
+
+    async def main():
+        pipeline = ConceptGraphPipeline(store, batch_size=8)
+        queued, _ = await pipeline.backfill(GraphJob(f"m{i}", WORKSPACE, f"About **Topic {i}**.") for i in range(8))
+        await pipeline.join()
+        snapshot = pipeline.snapshot()
+        await pipeline.close()
+        return queued, snapshot
+
+    queued, snapshot = asyncio.run(main())
+
+    assert queued == 8
+    assert sorted(m.message_id for m in store.applied) == [f"m{i}" for i in range(8) if i != 5]
+    assert snapshot["applied"] == 7 and snapshot["rejected"] == 1
+    assert snapshot["unwritten"] == 0
+
+
+def test_batch_is_kept_while_the_store_is_unavailable():
+    store = FakeStore(outages=1)
+
+    async def main():
+        pipeline = ConceptGraphPipeline(store, batch_size=10)
+        for i in range(3):
+            pipeline.submit(GraphJob(f"m{i}", WORKSPACE, "Some **Concept**."))
+        await pipeline.queue.join()
+        await pipeline.flush()
+        failed = pipeline.snapshot()
+        await pipeline.flush()
+        written = pipeline.snapshot()
+        await pipeline.close()
+        return failed, written
+
+    failed, written = asyncio.run(main())
+
+    assert failed["errors"] == 1 and failed["unwritten"] == 3 and failed["applied"] == 0
+    assert written["unwritten"] == 0 and written["applied"] == 3
+    assert len(store.applied) == 3
+
+
+def test_chat_answer_in_an_owned_workspace_is_queued_under_its_message_id(app_client, workspace_owners):
+    import main
+
+    workspace_owners[WORKSPACE] = "user_1"
+    message_id = str(uuid.uuid4())
+    before = main.graph_pipeline.snapshot()["submitted"]
+
+    response = app_client.post(
+        "/chat",
+        json={"message": "graph me", "workspace_id": WORKSPACE, "message_id": message_id},
+        headers={"Accept": "application/x-ndjson", "Authorization": f"Bearer {access_token('user_1')}"},
+    )
+
+    assert response.status_code == 200
+    assert main.graph_pipeline.snapshot()["submitted"] == before + 1
+
+
+def test_chat_refuses_a_workspace_the_caller_does_not_own(app_client, workspace_owners):
+    workspace_owners[WORKSPACE] = "user_1"
+    body = {"message": "not mine", "workspace_id": WORKSPACE}
+
+    anonymous = app_client.post("/chat", json=body)
+    someone_else = app_client.post("/chat", json=body, headers={"Authorization": f"Bearer {access_token('user_2')}"})
+    malformed = app_client.post(
+        "/chat", json={**body, "workspace_id": "x"}, headers={"Authorization": f"Bearer {access_token('user_1')}"}
+    )
+
+    assert [anonymous.status_code, someone_else.status_code, malformed.status_code] == [401, 403, 400]
+
+
+def test_graph_extract_only_queues_the_callers_workspaces(app_client, workspace_owners):
+    other = str(uuid.uuid4())
+    workspace_owners.update({WORKSPACE: "user_1", other: "user_2"})
+    lines = [
+        {"message_id": str(uuid.uuid4()), "workspace_id": WORKSPACE, "content": "About **Graphs**."},
+        {"message_id": str(uuid.uuid4()), "workspace_id": other, "content": "About **Secrets**."},
+        {"message_id": str(uuid.uuid4()), "workspace_id": "not-a-uuid", "content": "About **Nothing**."},
+    ]
+    body = "\n".join(map(json.dumps, lines))
+
+    response = app_client.post(
+        "/graph/extract?wait=true", content=body, headers={"Authorization": f"Bearer {access_token('user_1')}"}
+    )
+    anonymous = app_client.post("/graph/extract", content=body)
+
+    assert response.json() == {"queued": 1, "already_processed": 0, "invalid": 1, "forbidden": 1}
+    assert anonymous.status_code == 401
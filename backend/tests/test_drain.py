@@ -0,0 +1,74 @@
+import asyncio
+
+from drain import DRAINED, DRAINING, SERVING, DrainController
+
+
+def controller(in_flight, cancel_streams=lambda: 0, **kwargs):
+    return DrainController(
+        in_flight=in_flight, cancel_streams=cancel_streams, exit_when_drained=False, poll_interval=0.01, **kwargs
+    )
+
+
+def test_drain_waits_for_in_flight_work():
+    async def main():
+        remaining = [2]
+        drain = controller(lambda: remaining[0], timeout=5)
+        assert drain.start() is True
+        assert drain.start() is False
+        assert drain.draining and drain.state == DRAINING
+        assert drain.reject() == drain.retry_after
+        await asyncio.sleep(0.03)
+        assert drain.state == DRAINING
+        remaining[0] = 0
+        await asyncio.sleep(0.03)
+        return drain
+
+    drain = asyncio.run(main())
+
+    assert drain.state == DRAINED
+    assert drain.cancelled == 0
+    assert drain.snapshot()["rejected"] == 1
+
+
+def test_deadline_cancels_streams_and_jobs():
+    async def main():
+        streams = [3]
+
+        def cancel_streams():
+            cancelled, streams[0] = streams[0], 0
+            return cancelled
+
+        drain = controller(lambda: streams[0], cancel_streams, timeout=0.05, cancel_grace=1)
+
+        async def job():
+            with drain.job():
+                await asyncio.sleep(10)
+
+        running = asyncio.ensure_future(job())
+        await asyncio.sleep(0)
+        drain.start()
+        await asyncio.wait((running,), timeout=1)
+        await asyncio.sleep(0.03)
+        return drain, running
+
+    drain, running = asyncio.run(main())
+
+    assert running.cancelled()
+    assert drain.cancelled == 4
+    assert drain.state == DRAINED
+
+
+def test_serving_snapshot():
+    drain = controller(lambda: 0)
+
+    snapshot = drain.snapshot()
+
+    assert snapshot["state"] == SERVING
+    assert snapshot["remaining_seconds"] is None and snapshot["elapsed_seconds"] is None
+
+
+def test_drain_endpoint_is_localhost_only(app_client):
+    # TestClient requests come from the host "testclient"
+    assert app_client.post("/admin/drain").status_code == 403
+    assert app_client.get("/admin/drain").status_code == 403
+    assert app_client.get("/health").status_code == 200
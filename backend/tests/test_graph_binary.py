@@ -0,0 +1,85 @@
+import json
+import os
+import uuid
+
+import pytest
+
+from conftest import access_token
+from graph_binary import HEADER, MEDIA_TYPE, decode_graph, encode_graph
+from graph_store import GraphEdge, GraphNode, MessageGraph, SQLiteGraphStore
+
+
+def node(label: str, **columns) -> dict:
+    row = {
+        "id": str(uuid.uuid4()), "label": label, "type": "concept", "position_x": 1.0, "position_y": 2.0,
+        "position_z": 3.0, "size": 1.5, "importance": 0.75, "color": "#FF8000",
+    }
+    row.update(columns)
+    return row
+
+
+def edge(source: dict, target: dict, weight=2.0) -> dict:
+    return {"source_node_id": source["id"], "target_node_id": target["id"], "weight": weight}
+
+
+def test_encode_decode_round_trip():
+    a = node("Réseau", type="topic")
+    b = node("HNSW", position_x=None, size=None, importance=None, color="not a color", type="unknown")
+    c = node("Graph")
+    edges = [edge(a, b), edge(b, c, None), edge(a, {"id": str(uuid.uuid4())})]
+
+    graph = decode_graph(encode_graph([a, b, c], edges, version=42))
+
+    assert graph["version"] == 42
+    assert graph["labels"] == ["Réseau", "HNSW", "Graph"]
+    assert graph["positions"].tolist() == [[1, 2, 3], [0, 2, 3], [1, 2, 3]]
+    assert graph["sizes"].tolist() == [1.5, 1.0, 1.5]
+    assert graph["importance"].tolist() == [0.75, 0.5, 0.75]
+    assert graph["types"].tolist() == [1, 0, 0]
+    assert graph["colors"].tolist() == [[255, 128, 0], [0x3B, 0x82, 0xF6], [255, 128, 0]]
+    assert [str(uuid.UUID(bytes=bytes(row))) for row in graph["ids"]] == [a["id"], b["id"], c["id"]]
+    # The edge to a node outside the list is left out
+    assert graph["edges"].tolist() == [[0, 1], [1, 2]]
+    assert graph["weights"].tolist() == [2.0, 1.0]
+
+
+@pytest.mark.parametrize("n", [0, 1, 5])
+def test_chains_of_any_size_round_trip(n):
+    nodes = [node(f"n{i}") for i in range(n)]
+
+    data = encode_graph(nodes, [edge(nodes[i], nodes[i + 1]) for i in range(n - 1)])
+    graph = decode_graph(data)
+
+    # The header, 40 bytes per node and 12 per edge, then the side table
+    side = json.dumps({"labels": graph["labels"]}, separators=(",", ":")).encode()
+    assert len(data) == HEADER.size + 40 * n + 12 * max(n - 1, 0) + len(side)
+    assert graph["positions"].shape == (n, 3) and graph["edges"].shape == (max(n - 1, 0), 2)
+    assert graph["labels"] == [f"n{i}" for i in range(n)]
+
+
+def test_decode_refuses_other_data():
+    with pytest.raises(ValueError):
+        decode_graph(b"JSON" + bytes(28))
+
+
+def test_binary_graph_endpoint_needs_the_owner(app_client, workspace_owners):
+    workspace_id = str(uuid.uuid4())
+    workspace_owners[workspace_id] = "user_1"
+    store = SQLiteGraphStore(os.environ["GRAPH_DB_PATH"])
+    a, b = (str(uuid.uuid4()) for _ in range(2))
+    store.apply([MessageGraph(str(uuid.uuid4()), workspace_id, [
+        GraphNode(a, "Alpha", "concept", 1), GraphNode(b, "Beta", "topic", 2),
+    ], [GraphEdge(str(uuid.uuid4()), a, b, "part_of", 1.0)])])
+    store.close()
+    url = f"/workspaces/{workspace_id}/graph"
+
+    anonymous = app_client.get(url, headers={"Accept": MEDIA_TYPE})
+    owner = app_client.get(url, headers={"Accept": MEDIA_TYPE, "Authorization": f"Bearer {access_token('user_1')}"})
+
+    assert anonymous.status_code == 401
+    assert owner.headers["content-type"] == MEDIA_TYPE
+    graph = decode_graph(owner.content)
+    # Nodes come back in (created_at, id) order and the ids are random
+    labels = graph["labels"]
+    assert sorted(labels) == ["Alpha", "Beta"]
+    assert graph["edges"].tolist() == [[labels.index("Alpha"), labels.index("Beta")]]
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from conftest import access_token
+from graph_index import GraphIndexService, WorkspaceIndex, build_csr
+from graph_store import GraphEdge, GraphNode, MessageGraph, SQLiteGraphStore, edge_id, node_id
+
+KEEP = 3600
+
+
+def relations(workspace_id: str, *pairs, weight: float = 1.0, kind: str = "relates_to") -> MessageGraph:
+    """One message relating each (a, b) pair of concept keys"""
+    keys = sorted({key for pair in pairs for key in pair})
+    nodes = [GraphNode(node_id(workspace_id, key), key.title(), "concept", 1) for key in keys]
+    edges = [
+        GraphEdge(edge_id(workspace_id, node_id(workspace_id, a), node_id(workspace_id, b), kind),
+                  node_id(workspace_id, a), node_id(workspace_id, b), kind, weight)
+        for a, b in pairs
+    ]
+    return MessageGraph(str(uuid.uuid4()), workspace_id, nodes, edges)
+
+
+def labels(rows):
+    return [row["label"] for row in rows]
+
+
+def test_build_csr_merges_parallel_edges_in_both_directions():
+    indptr, indices, weights, counts = build_csr([(0, 1, 1.0), (1, 0, 2.0), (1, 2, 0.5), (2, 2, 9.0)], 3)
+
+    assert indptr.tolist() == [0, 1, 3, 4]
+    assert indices.tolist() == [1, 0, 2, 1]
+    assert weights.tolist() == [3.0, 3.0, 0.5, 0.5]
+    # The self loop is left out
+    assert counts.tolist() == [2, 2, 1, 1]
+
+
+def test_index_follows_inserts_and_deletes_then_rebuilds(tmp_path):
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite3"))
+    ws = str(uuid.uuid4())
+    store.apply([relations(ws, ("alpha", "beta"), ("beta", "gamma"))])
+    index = WorkspaceIndex(ws, store.changes(ws, None, KEEP))
+    alpha, beta, gamma = (node_id(ws, key) for key in ("alpha", "beta", "gamma"))
+
+    store.apply([relations(ws, ("gamma", "delta"), ("alpha", "beta"), weight=2.0)])
+    with store.conn:
+        store.conn.execute(
+            "DELETE FROM graph_edges WHERE id = ?", (edge_id(ws, beta, gamma, "relates_to"),)
+        )
+    index.apply(store.changes(ws, index.version, KEEP))
+
+    # The new relation is in the overlay, the deleted one is masked in the CSR
+    assert index.overlay and index.dead_entries == 2
+    assert labels(index.neighborhood(alpha, 3, 10)["nodes"]) == ["Beta"]
+    assert index.shortest_path(alpha, gamma)["path"] is None
+    assert labels(index.neighborhood(gamma, 1, 10)["nodes"]) == ["Delta"]
+    before = index.top_neighbors(alpha, 5)["neighbors"]
+
+    index.rebuild()
+
+    assert not index.overlay and index.dead_entries == 0
+    assert index.top_neighbors(alpha, 5)["neighbors"] == before
+    assert labels(index.neighborhood(gamma, 1, 10)["nodes"]) == ["Delta"]
+    store.close()
+
+
+def test_paths_prefer_strong_relations_when_weighted(tmp_path):
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite3"))
+    ws = str(uuid.uuid4())
+    store.apply([
+        relations(ws, ("a", "d"), weight=0.1),
+        relations(ws, ("a", "b"), ("b", "c"), ("c", "d"), weight=5.0),
+    ])
+    index = WorkspaceIndex(ws, store.changes(ws, None, KEEP))
+    a, d = node_id(ws, "a"), node_id(ws, "d")
+
+    fewest = index.shortest_path(a, d)
+    strongest = index.shortest_path(a, d, weighted=True)
+
+    assert labels(fewest["path"]) == ["A", "D"] and fewest["hops"] == 1
+    assert labels(strongest["path"]) == ["A", "B", "C", "D"] and strongest["cost"] == pytest.approx(0.6)
+    with pytest.raises(KeyError):
+        index.shortest_path(a, str(uuid.uuid4()))
+    store.close()
+
+
+def test_service_refreshes_stale_indexes_from_the_changes(tmp_path):
+    path = str(tmp_path / "graph.sqlite3")
+    writer = SQLiteGraphStore(path)
+    ws = str(uuid.uuid4())
+    writer.apply([relations(ws, ("alpha", "beta"))])
+    service = GraphIndexService(SQLiteGraphStore(path), max_age=KEEP, tombstone_seconds=KEEP)
+    alpha = node_id(ws, "alpha")
+
+    async def main():
+        first = await service.neighborhood(ws, alpha)
+        writer.apply([relations(ws, ("alpha", "gamma"))])
+        cached = await service.neighborhood(ws, alpha)
+        service.invalidate([ws])
+        refreshed = await service.neighborhood(ws, alpha)
+        return first, cached, refreshed
+
+    first, cached, refreshed = asyncio.run(main())
+
+    assert labels(first["nodes"]) == labels(cached["nodes"]) == ["Beta"]
+    assert sorted(labels(refreshed["nodes"])) == ["Beta", "Gamma"]
+    snapshot = service.snapshot()
+    assert snapshot["loads"] == 1 and snapshot["refreshes"] == 1 and snapshot["queries"] == 3
+    service.close()
+    writer.close()
+
+
+def test_index_endpoints_serve_only_the_owner(app_client, workspace_owners):
+    ws = str(uuid.uuid4())
+    workspace_owners[ws] = "user_1"
+    store = SQLiteGraphStore(os.environ["GRAPH_DB_PATH"])
+    store.apply([relations(ws, ("alpha", "beta"))])
+    store.close()
+    alpha, beta = node_id(ws, "alpha"), node_id(ws, "beta")
+    urls = [
+        f"/workspaces/{ws}/graph/neighbors?node={alpha}",
+        f"/workspaces/{ws}/graph/top?node={alpha}",
+        f"/workspaces/{ws}/graph/path?source={alpha}&target={beta}",
+    ]
+    someone_else = {"Authorization": f"Bearer {access_token('user_2')}"}
+    owner = {"Authorization": f"Bearer {access_token('user_1')}"}
+
+    for url in urls:
+        anonymous = app_client.get(url)
+        assert anonymous.status_code == 401 and anonymous.headers["www-authenticate"] == "Bearer"
+        assert app_client.get(url, headers=someone_else).status_code == 403
+        assert app_client.get(url, headers=owner).status_code == 200
+
+    assert app_client.get(f"/workspaces/{ws}/graph/path?source={alpha}&target={beta}", headers=owner).json()["hops"] == 1
+    assert app_client.get(f"/workspaces/not-a-uuid/graph/top?node={alpha}", headers=owner).status_code == 400
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from conftest import access_token
+from graph_layout import GraphLayoutService, LayoutRateLimited, force_layout
+from graph_store import GraphEdge, GraphNode, MessageGraph, SQLiteGraphStore, edge_id, node_id
+
+
+def chain_graph(workspace_id: str, size: int) -> MessageGraph:
+    """`size` concepts in a chain"""
+    ids = [node_id(workspace_id, f"concept {i}") for i in range(size)]
+    nodes = [GraphNode(id_, f"Concept {i}", "concept", 1) for i, id_ in enumerate(ids)]
+    edges = [
+        GraphEdge(edge_id(workspace_id, a, b, "relates_to"), a, b, "relates_to", 1.0)
+        for a, b in zip(ids, ids[1:])
+    ]
+    return MessageGraph(str(uuid.uuid4()), workspace_id, nodes, edges)
+
+
+def test_force_layout_places_linked_nodes_closer_than_unlinked_ones():
+    edges = np.array([[0, 1], [2, 3]])
+
+    result = force_layout(np.zeros((4, 3)), edges, iterations=100)
+
+    distance = lambda a, b: np.linalg.norm(result.positions[a] - result.positions[b])
+    assert np.isfinite(result.positions).all()
+    assert not result.incremental
+    assert distance(0, 1) < distance(0, 2) and distance(2, 3) < distance(1, 3)
+
+
+def test_few_new_nodes_get_an_incremental_layout():
+    placed = np.ones(40, dtype=bool)
+    placed[-1] = False
+    positions = np.random.default_rng(1).normal(size=(40, 3)) * 5
+    positions[-1] = 0
+    edges = np.array([[i, i + 1] for i in range(39)])
+
+    result = force_layout(positions, edges, placed=placed, incremental_iterations=7)
+
+    assert result.incremental and result.iterations == 7
+    assert np.linalg.norm(result.positions[:-1] - positions[:-1], axis=1).max() < 1.0
+
+
+def test_service_writes_positions_and_drops_idle_locks(tmp_path):
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite3"))
+    workspace_id = str(uuid.uuid4())
+    store.apply([chain_graph(workspace_id, 20)])
+    service = GraphLayoutService(store, min_interval=60)
+
+    async def main():
+        # Two layouts of one workspace at once share its lock
+        summaries = await asyncio.gather(service.run(workspace_id), service.run(workspace_id))
+        await service.request(workspace_id)
+        with pytest.raises(LayoutRateLimited):
+            await service.request(workspace_id)
+        return summaries[0]
+
+    first = asyncio.run(main())
+
+    assert first["nodes"] == 20 and first["written"] == 20
+    assert all(row["position_x"] or row["position_y"] for row in store.nodes(workspace_id))
+    assert service.snapshot()["locked_workspaces"] == 0
+    assert service.snapshot()["rate_limited"] == 1
+    store.close()
+
+
+def test_layout_endpoint_needs_the_owner_and_is_rate_limited(app_client, workspace_owners):
+    workspace_id = str(uuid.uuid4())
+    workspace_owners[workspace_id] = "user_1"
+    store = SQLiteGraphStore(os.environ["GRAPH_DB_PATH"])
+    store.apply([chain_graph(workspace_id, 5)])
+    store.close()
+    url = f"/workspaces/{workspace_id}/graph/layout"
+    owner = {"Authorization": f"Bearer {access_token('user_1')}"}
+
+    assert app_client.post(url).status_code == 401
+    assert app_client.post(url, headers={"Authorization": f"Bearer {access_token('user_2')}"}).status_code == 403
+    first = app_client.post(url, headers=owner)
+    again = app_client.post(url, headers=owner)
+
+    assert first.status_code == 200 and first.json()["nodes"] == 5
+    assert again.status_code == 429 and int(again.headers["retry-after"]) >= 1
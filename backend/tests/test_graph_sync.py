@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+import uuid
+
+from conftest import access_token
+from graph_store import GraphEdge, GraphNode, MessageGraph, SQLiteGraphStore, edge_id, node_id
+from graph_sync import GraphSyncService
+
+KEEP = 3600
+
+
+def concepts(workspace_id: str, *keys: str, linked: bool = True) -> MessageGraph:
+    """One message mentioning `keys`, consecutive ones related"""
+    ids = [node_id(workspace_id, key) for key in keys]
+    edges = [
+        GraphEdge(edge_id(workspace_id, a, b, "relates_to"), a, b, "relates_to", 1.0)
+        for a, b in zip(ids, ids[1:])
+    ] if linked else []
+    nodes = [GraphNode(id_, key.title(), "concept", 1) for id_, key in zip(ids, keys)]
+    return MessageGraph(str(uuid.uuid4()), workspace_id, nodes, edges)
+
+
+def ids(rows):
+    return sorted(row["id"] for row in rows)
+
+
+def test_changes_since_a_version_has_inserts_updates_and_deletions(tmp_path):
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite3"))
+    ws = str(uuid.uuid4())
+    store.apply([concepts(ws, "alpha", "beta")])
+    first = store.changes(ws, None, KEEP)
+
+    store.apply([concepts(ws, "beta", "gamma")])
+    with store.conn:
+        store.conn.execute("DELETE FROM graph_nodes WHERE id = ?", (node_id(ws, "alpha"),))
+    delta = store.changes(ws, first["version"], KEEP)
+
+    assert first["full"] and ids(first["nodes"]["inserted"]) == sorted([node_id(ws, "alpha"), node_id(ws, "beta")])
+    assert not delta["full"] and delta["version"] > first["version"]
+    assert ids(delta["nodes"]["inserted"]) == [node_id(ws, "gamma")]
+    assert ids(delta["nodes"]["updated"]) == [node_id(ws, "beta")]
+    assert delta["nodes"]["updated"][0]["mentions_count"] == 2
+    assert delta["nodes"]["deleted"] == [node_id(ws, "alpha")]
+    # The alpha-beta edge went with its node
+    assert delta["edges"]["deleted"] == [edge_id(ws, node_id(ws, "alpha"), node_id(ws, "beta"), "relates_to")]
+    assert ids(delta["edges"]["inserted"]) == [edge_id(ws, node_id(ws, "beta"), node_id(ws, "gamma"), "relates_to")]
+    store.close()
+
+
+def test_current_version_is_empty_and_unknown_versions_are_full(tmp_path):
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite3"))
+    ws = str(uuid.uuid4())
+    store.apply([concepts(ws, "alpha", "beta")])
+    version = store.changes(ws, None, KEEP)["version"]
+
+    unchanged = store.changes(ws, version, KEEP)
+    ahead = store.changes(ws, version + 10, KEEP)
+
+    assert not unchanged["full"]
+    assert all(not unchanged[kind][change] for kind in ("nodes", "edges") for change in ("inserted", "updated", "deleted"))
+    assert ahead["full"] and len(ahead["nodes"]["inserted"]) == 2
+    store.close()
+
+
+def test_clients_behind_pruned_tombstones_get_a_full_snapshot(tmp_path):
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite3"))
+    ws = str(uuid.uuid4())
+    store.apply([concepts(ws, "alpha", "beta", linked=False)])
+    before_delete = store.changes(ws, None, KEEP)["version"]
+    with store.conn:
+        store.conn.execute("DELETE FROM graph_nodes WHERE id = ?", (node_id(ws, "alpha"),))
+    after_delete = store.changes(ws, None, KEEP)["version"]
+    time.sleep(0.05)
+
+    # Tombstones older than 0.01s are dropped: the deletion can no longer be sent
+    stale = store.changes(ws, before_delete, 0.01)
+    current = store.changes(ws, after_delete, 0.01)
+
+    assert stale["full"] and ids(stale["nodes"]["inserted"]) == [node_id(ws, "beta")]
+    assert not current["full"]
+    assert store.conn.execute("SELECT COUNT(*) FROM graph_tombstones WHERE workspace_id = ?", (ws,)).fetchone()[0] == 0
+    store.close()
+
+
+def test_sync_service_counts_full_and_unchanged_reads(tmp_path):
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite3"))
+    ws = str(uuid.uuid4())
+    store.apply([concepts(ws, "alpha", "beta")])
+    service = GraphSyncService(store, tombstone_seconds=KEEP)
+
+    async def main():
+        full = await service.changes(ws)
+        await service.changes(ws, full["version"])
+
+    asyncio.run(main())
+
+    assert service.snapshot() == {"requests": 2, "full": 1, "unchanged": 1, "rows_sent": 3, "binary": 0}
+    service.close()
+
+
+def test_graph_endpoint_serves_only_the_owner(app_client, workspace_owners):
+    ws = str(uuid.uuid4())
+    workspace_owners[ws] = "user_1"
+    store = SQLiteGraphStore(os.environ["GRAPH_DB_PATH"])
+    store.apply([concepts(ws, "alpha", "beta")])
+    store.close()
+
+    anonymous = app_client.get(f"/workspaces/{ws}/graph")
+    someone_else = app_client.get(
+        f"/workspaces/{ws}/graph", headers={"Authorization": f"Bearer {access_token('user_2')}"}
+    )
+    owner = app_client.get(f"/workspaces/{ws}/graph", headers={"Authorization": f"Bearer {access_token('user_1')}"})
+
+    assert anonymous.status_code == 401 and anonymous.headers["www-authenticate"] == "Bearer"
+    assert someone_else.status_code == 403
+    assert owner.status_code == 200 and owner.json()["full"] and len(owner.json()["nodes"]["inserted"]) == 2
@@ -0,0 +1,71 @@
+"""/chat end to end: async upstream stream in, typed events out"""
+
+from conftest import access_token, ndjson_events
+
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+def test_health(app_client):
+    assert app_client.get("/").json() == {"status": "Zyron AI is alive"}
+    assert app_client.get("/health").json() == {"status": "healthy"}
+
+
+def test_chat_streams_upstream_text(app_client):
+    response = app_client.post("/chat", json={"message": "stream test"}, headers=NDJSON)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["x-stream-id"]
+    events = ndjson_events(response.text)
+    text = "".join(data for event, data in events if event == "delta")
+    assert text == "hello " * 5
+    assert events[-1] == ("done", {"stop_reason": "end_turn"})
+    usage = dict(events)["usage"]
+    assert usage["output_tokens"] == 5
+
+
+def test_chat_defaults_to_sse(app_client):
+    response = app_client.post("/chat", json={"message": "sse test"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = [frame for frame in response.text.split("\n\n") if frame]
+    assert all(frame.startswith("id: ") for frame in frames)
+    assert frames[-1].split("\n")[1] == "event: done"
+
+
+def test_conversation_id_round_trip(app_client):
+    first = app_client.post("/chat", json={"message": "remember me"}, headers=NDJSON)
+    conversation_id = first.headers["x-conversation-id"]
+
+    second = app_client.post(
+        "/chat", json={"message": "and again", "conversation_id": conversation_id}, headers=NDJSON
+    )
+
+    assert second.headers["x-conversation-id"] == conversation_id
+
+
+def test_conversations_belong_to_their_user(app_client):
+    owner = {**NDJSON, "Authorization": f"Bearer {access_token('user_1')}"}
+    first = app_client.post("/chat", json={"message": "private"}, headers=owner)
+    conversation_id = first.headers["x-conversation-id"]
+
+    other = app_client.post(
+        "/chat", json={"message": "peek", "conversation_id": conversation_id},
+        headers={**NDJSON, "Authorization": f"Bearer {access_token('user_2')}"},
+    )
+    anonymous = app_client.post("/chat", json={"message": "peek", "conversation_id": conversation_id}, headers=NDJSON)
+    again = app_client.post("/chat", json={"message": "mine", "conversation_id": conversation_id}, headers=owner)
+
+    assert other.headers["x-conversation-id"] != conversation_id
+    assert anonymous.headers["x-conversation-id"] != conversation_id
+    assert again.headers["x-conversation-id"] == conversation_id
+
+
+def test_metrics_count_streams(app_client):
+    before = app_client.get("/metrics").json()["streams"]
+    app_client.post("/chat", json={"message": "count me"}, headers=NDJSON)
+
+    after = app_client.get("/metrics").json()["streams"]
+
+    assert after["streams_total"] == before["streams_total"] + 1
+    assert after["tokens_total"] == before["tokens_total"] + 5
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from markdown_blocks import BlockScanner
+
+DOCUMENT = """# Title
+Intro paragraph
+over two lines.
+
+- one
+- two
+
+  continued item
+
+After the list.
+```python
+print("hi")
+```
+> quoted
+> still quoted
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+---
+Setext heading
+==============
+1. first
+2. second
+lazy continuation of the second item"""
+
+
+def boundaries(chunks):
+    """(kind, offset) of every block end, offsets into the whole text"""
+    scanner, sent, found = BlockScanner(), 0, []
+    for chunk in chunks:
+        sent += len(chunk)
+        found.extend((kind, sent - len(rest)) for kind, rest in scanner.feed(chunk))
+    found.extend((kind, sent - len(rest)) for kind, rest in scanner.finish())
+    return found
+
+
+def test_blocks_of_a_document():
+    found = boundaries([DOCUMENT])
+
+    assert [kind for kind, _ in found] == [
+        "heading", "paragraph", "list", "paragraph", "code", "blockquote", "table", "thematic_break",
+        "heading", "list",
+    ]
+    offsets = [offset for _, offset in found]
+    assert offsets == sorted(offsets) and offsets[-1] == len(DOCUMENT)
+    assert DOCUMENT[:found[2][1]].endswith("continued item\n\n")
+    assert DOCUMENT[found[2][1]:].startswith("After the list.")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_boundaries_do_not_depend_on_chunking(seed):
+    rng = random.Random(seed)
+    chunks, position = [], 0
+    while position < len(DOCUMENT):
+        size = rng.choice([1, 1, 2, 3, 7, 20, 60])
+        chunks.append(DOCUMENT[position:position + size])
+        position += size
+
+    assert boundaries(chunks) == boundaries([DOCUMENT])
+
+
+def test_unclosed_code_block_ends_with_the_answer():
+    assert boundaries(["Text\n\n```\ncode\n", "more code"]) == [("paragraph", 6), ("code", 24)]
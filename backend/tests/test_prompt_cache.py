@@ -0,0 +1,32 @@
+from prompt_cache import CACHE_CONTROL, cached_system, with_cache_breakpoint
+
+
+def test_cached_system_is_one_text_block_with_a_breakpoint():
+    assert cached_system("be brief") == [{"type": "text", "text": "be brief", "cache_control": CACHE_CONTROL}]
+
+
+def test_breakpoint_goes_on_the_last_message_only():
+    messages = [
+        {"role": "user", "content": "first"},
+        {"role": "assistant", "content": "answer"},
+        {"role": "user", "content": "second"},
+    ]
+
+    marked = with_cache_breakpoint(messages)
+
+    assert marked[:2] == messages[:2]
+    assert marked[-1] == {"role": "user", "content": [{"type": "text", "text": "second", "cache_control": CACHE_CONTROL}]}
+    # The caller's history is not modified
+    assert messages[-1]["content"] == "second"
+
+
+def test_block_content_is_copied_before_marking():
+    blocks = [{"type": "text", "text": "a"}, {"type": "text", "text": "b"}]
+    messages = [{"role": "user", "content": blocks}]
+
+    marked = with_cache_breakpoint(messages)
+
+    assert "cache_control" not in marked[0]["content"][0]
+    assert marked[0]["content"][1]["cache_control"] == CACHE_CONTROL
+    assert "cache_control" not in blocks[1]
+    assert with_cache_breakpoint([]) == []
@@ -0,0 +1,158 @@
+import asyncio
+
+import anthropic
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, ResilientUpstream, is_retryable
+
+
+REQUEST = anthropic.DefaultAsyncHttpxClient().build_request("POST", "http://upstream.test/v1/messages")
+
+
+def connection_error():
+    return anthropic.APIConnectionError(request=REQUEST)
+
+
+class FakeStream:
+    def __init__(self, texts, ttft):
+        self.texts = texts
+        self.ttft = ttft
+
+    @property
+    def text_stream(self):
+        async def generate():
+            await asyncio.sleep(self.ttft)
+            for text in self.texts:
+                yield text
+        if not hasattr(self, "_iterator"):
+            self._iterator = generate()
+        return self._iterator
+
+    async def get_final_message(self):
+        return "final"
+
+
+class FakeUpstream:
+    """Factory for stream managers that fail, stall or answer, in the given order"""
+
+    def __init__(self, *plan):
+        self.plan = list(plan)
+        self.opened = 0
+        self.closed = 0
+
+    def __call__(self):
+        outcome = self.plan[min(self.opened, len(self.plan) - 1)]
+        self.opened += 1
+        upstream = self
+
+        class Manager:
+            async def __aenter__(self):
+                if isinstance(outcome, BaseException):
+                    raise outcome
+                return FakeStream(["hello", " world"], outcome)
+
+            async def __aexit__(self, *exc_info):
+                upstream.closed += 1
+
+        return Manager()
+
+
+async def read(upstream):
+    async with upstream:
+        return [text async for text in upstream.text_stream()]
+
+
+async def read_opened(resilient, upstream):
+    return await read(await resilient.open(upstream))
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    asyncio.run(asyncio.sleep(0.06))
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened_total == 2
+
+    asyncio.run(asyncio.sleep(0.06))
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and not breaker.is_open()
+    assert breaker.rejected_total == 2
+
+
+def test_abandoned_probe_lets_the_next_call_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.abandon()
+
+    breaker.before_call()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_retryable_errors():
+    assert is_retryable(connection_error())
+    assert not is_retryable(ValueError("bad request"))
+
+
+def test_retries_before_the_first_token():
+    upstream = FakeUpstream(connection_error(), connection_error(), 0)
+    resilient = ResilientUpstream(max_attempts=3, base_delay=0)
+
+    text = asyncio.run(read_opened(resilient, upstream))
+
+    assert text == ["hello", " world"]
+    assert resilient.snapshot()["retries"] == 2
+    assert resilient.breaker.state == CircuitBreaker.CLOSED
+    assert resilient.health(60)["error_rate"] == round(2 / 3, 3)
+
+
+def test_exhausted_retries_open_the_breaker():
+    resilient = ResilientUpstream(max_attempts=2, base_delay=0, breaker=CircuitBreaker(failure_threshold=2))
+    upstream = FakeUpstream(connection_error())
+
+    with pytest.raises(anthropic.APIConnectionError):
+        asyncio.run(read_opened(resilient, upstream))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(read_opened(resilient, upstream))
+
+    assert upstream.opened == 2
+    assert resilient.snapshot()["circuit"]["state"] == CircuitBreaker.OPEN
+
+
+def test_client_errors_are_not_retried():
+    resilient = ResilientUpstream(max_attempts=3, base_delay=0)
+    upstream = FakeUpstream(ValueError("invalid request"))
+
+    with pytest.raises(ValueError):
+        asyncio.run(read_opened(resilient, upstream))
+
+    assert upstream.opened == 1
+    assert resilient.breaker.failures == 0
+
+
+def test_slow_first_token_is_hedged():
+    resilient = ResilientUpstream(hedge=True, hedge_min_samples=1, hedge_min_delay=0.02)
+    resilient._ttft.append(0.001)
+    upstream = FakeUpstream(1.0, 0)
+
+    text = asyncio.run(read_opened(resilient, upstream))
+
+    assert text == ["hello", " world"]
+    assert resilient.hedges_total == 1 and resilient.hedge_wins == 1
+    # The losing attempt was cancelled and its stream closed
+    assert upstream.closed == 2
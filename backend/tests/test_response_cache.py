@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from response_cache import CachedResponse, MemoryTier, ResponseCache, ResponseRecorder, cache_key, replay
+
+
+class FakeRedis:
+    """Dict-backed stand-in for redis.asyncio.Redis"""
+
+    def __init__(self, fail: bool = False):
+        self.data = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = value.encode()
+
+
+def answer(*chunks):
+    return CachedResponse([(i * 0.01, text) for i, text in enumerate(chunks)], output_tokens=len(chunks))
+
+
+def test_cache_key_ignores_whitespace_and_cache_control():
+    messages = [{"role": "user", "content": "hi"}]
+    plain = cache_key("m", [{"type": "text", "text": "system"}], messages, 100)
+    marked = cache_key(
+        "m", [{"type": "text", "text": "system ", "cache_control": {"type": "ephemeral"}}],
+        [{"role": "user", "content": " hi\n"}], 100,
+    )
+
+    assert plain == marked
+    assert plain != cache_key("m", [{"type": "text", "text": "system"}], messages, 200)
+    assert plain != cache_key("other", [{"type": "text", "text": "system"}], messages, 100)
+
+
+def test_memory_tier_expires_and_evicts_lru():
+    tier = MemoryTier(max_entries=2, ttl=60)
+    tier.put("a", answer("a"))
+    tier.put("b", answer("b"))
+    tier.get("a")
+    tier.put("c", answer("c"))
+
+    assert tier.get("b") is None
+    assert tier.get("a").text == "a"
+    assert tier.evictions == 1
+
+    short = MemoryTier(max_entries=2, ttl=-1)
+    short.put("a", answer("a"))
+    assert short.get("a") is None
+
+
+def test_recorder_and_json_round_trip():
+    recorder = ResponseRecorder()
+    recorder.add("hello ")
+    recorder.add("world")
+
+    restored = CachedResponse.from_json(recorder.response.to_json())
+
+    assert restored.text == "hello world"
+    assert restored.chunks[0][0] == 0.0
+
+
+def test_paced_replay_keeps_chunk_timing():
+    response = CachedResponse([(0.0, "a"), (0.1, "b")])
+
+    async def timed(paced):
+        started = time.perf_counter()
+        text = "".join([chunk async for chunk in replay(response, paced=paced)])
+        return text, time.perf_counter() - started
+
+    assert asyncio.run(timed(False))[1] < 0.05
+    text, elapsed = asyncio.run(timed(True))
+    assert text == "ab" and elapsed >= 0.09
+
+
+def test_redis_tier_shares_and_promotes_answers():
+    async def main():
+        redis = FakeRedis()
+        writer = ResponseCache(redis_client=redis)
+        writer.put("k", answer("shared"))
+        await asyncio.gather(*writer._pending)
+
+        reader = ResponseCache(redis_client=redis)
+        first = await reader.get("k")
+        second = await reader.get("k")
+        return reader.snapshot(), first, second
+
+    snapshot, first, second = asyncio.run(main())
+
+    assert first.text == second.text == "shared"
+    assert snapshot["hits_redis"] == 1 and snapshot["hits_memory"] == 1
+    assert snapshot["hit_ratio"] == 1.0
+
+
+def test_redis_errors_degrade_to_a_miss():
+    async def main():
+        cache = ResponseCache(redis_client=FakeRedis(fail=True))
+        cache.put("k", answer("x"))
+        await asyncio.gather(*cache._pending)
+        return await cache.get("missing"), cache.snapshot()
+
+    response, snapshot = asyncio.run(main())
+
+    assert response is None
+    assert snapshot["misses"] == 1
+    assert snapshot["redis_errors"] == 2
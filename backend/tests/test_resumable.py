@@ -0,0 +1,127 @@
+import asyncio
+
+from resumable import ResumableStream, StreamRegistry, parse_event_id
+from stream_encoding import NDJSONEncoder, delta_event, done_event
+from conftest import ndjson_events
+
+
+def filled(count: int, max_events: int = 100) -> ResumableStream:
+    stream = ResumableStream("s", "c", max_events)
+    for i in range(count):
+        stream.publish(delta_event(f"t{i}"))
+    return stream
+
+
+async def read_all(stream, after=0, **kwargs):
+    chunks = [chunk async for chunk in stream.read(after, 5, NDJSONEncoder(), **kwargs)]
+    return ndjson_events(b"".join(chunks).decode())
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc:12") == ("abc", 12)
+    assert parse_event_id("a:b:3") == ("a:b", 3)
+    for bad in (None, "", "abc", "abc:", ":3", "abc:x"):
+        assert parse_event_id(bad) is None
+
+
+def test_buffered_events_are_replayed_after_the_last_seen_id():
+    stream = filled(5)
+    stream.finish()
+
+    events = asyncio.run(read_all(stream, after=2))
+
+    assert [data for _, data in events] == ["t2", "t3", "t4"]
+
+
+def test_reader_follows_live_events_until_done():
+    async def main():
+        stream = ResumableStream("s", "c", 100)
+        reader = asyncio.ensure_future(read_all(stream))
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            stream.publish(delta_event(f"t{i}"))
+        stream.publish(done_event("end_turn"))
+        stream.finish()
+        return await reader
+
+    events = asyncio.run(main())
+
+    assert [event for event, _ in events] == ["delta"] * 3 + ["done"]
+
+
+def test_reader_behind_the_buffer_gets_an_error_event():
+    stream = filled(10, max_events=4)
+    stream.finish()
+
+    assert not stream.can_resume(2)
+    events = asyncio.run(read_all(stream, after=2))
+
+    assert [event for event, _ in events] == ["error"]
+
+
+def test_registry_resumes_and_misses():
+    async def main():
+        registry = StreamRegistry(max_events=3)
+
+        async def produce(stream):
+            for i in range(5):
+                stream.publish(delta_event(f"t{i}"))
+
+        stream = registry.create("c", produce)
+        await stream.task
+        return registry, stream
+
+    registry, stream = asyncio.run(main())
+
+    assert registry.resume(f"{stream.id}:3") == (stream, 3)
+    assert registry.resume(f"{stream.id}:0") is None
+    assert registry.resume("unknown:1") is None
+    assert registry.resume("garbage") is None
+    assert registry.snapshot()["resumed"] == 1
+    assert registry.snapshot()["resume_misses"] == 2
+
+
+def test_unread_stream_is_cancelled_after_the_disconnect_grace():
+    async def main():
+        registry = StreamRegistry()
+
+        async def produce(stream):
+            while True:
+                stream.publish(delta_event("x"))
+                await asyncio.sleep(0.01)
+
+        stream = registry.create("c", produce)
+        reader = stream.read(0, 0.05)
+        await reader.__anext__()
+        await reader.aclose()
+        await asyncio.sleep(0.02)
+        assert not stream.task.done()
+        await asyncio.wait((stream.task,), timeout=1)
+        return registry, stream
+
+    registry, stream = asyncio.run(main())
+
+    assert stream.abandoned and stream.done
+    assert registry.snapshot()["abandoned"] == 1
+    assert registry.resume(f"{stream.id}:1") is None
+
+
+def test_stop_generating_cancels_at_once():
+    async def main():
+        registry = StreamRegistry()
+
+        async def produce(stream):
+            await asyncio.sleep(10)
+
+        stream = registry.create("c", produce)
+        await asyncio.sleep(0)
+        assert registry.cancel(stream.id) is True
+        await asyncio.wait((stream.task,), timeout=1)
+        return registry, stream
+
+    registry, stream = asyncio.run(main())
+
+    assert stream.done
+    assert registry.cancel(stream.id) is False
+    assert registry.cancel("unknown") is None
+    assert registry.snapshot()["cancelled"] == 1
@@ -0,0 +1,43 @@
+import pytest
+
+from conftest import access_token, ndjson_events
+from resilience import ResilientUpstream
+from routing import DEFAULT_ROUTING, ModelRouter, RouteRequest
+
+NDJSON = {"Accept": "application/x-ndjson"}
+DEEP_MODEL = DEFAULT_ROUTING["routes"]["deep"]["model"]
+STANDARD_MODEL = DEFAULT_ROUTING["routes"]["standard"]["model"]
+
+
+def test_rules_pick_the_first_matching_route():
+    router = ModelRouter(DEFAULT_ROUTING, ResilientUpstream)
+
+    assert router.route(RouteRequest(50, guest=True)).reason == "guest-short"
+    assert router.route(RouteRequest(5000, guest=True)).route.name == "standard"
+    assert router.route(RouteRequest(50, tier="deep")).route.name == "deep"
+    assert router.route(RouteRequest(50)).reason == "default"
+    assert router.snapshot()["routes"]["standard"]["requests"] == 2
+
+
+def test_unknown_route_in_rules_is_rejected():
+    config = dict(DEFAULT_ROUTING, rules=[{"tier": "huge", "route": "huge"}])
+
+    with pytest.raises(ValueError, match="huge"):
+        ModelRouter(config, ResilientUpstream)
+
+
+def routed_model(app_client, body: dict, headers: dict = None) -> str:
+    response = app_client.post("/chat", json=body, headers={**NDJSON, **(headers or {})})
+    return dict(ndjson_events(response.text))["usage"]["model"]
+
+
+def test_requested_tier_is_ignored_without_an_entitled_token(app_client):
+    assert routed_model(app_client, {"message": "guest wants deep", "tier": "deep"}) == STANDARD_MODEL
+    user = {"Authorization": "Bearer " + access_token()}
+    assert routed_model(app_client, {"message": "user wants deep", "tier": "deep"}, user) == STANDARD_MODEL
+
+
+def test_requested_tier_is_honoured_for_an_entitled_caller(app_client):
+    paying = {"Authorization": "Bearer " + access_token(tiers=["deep"])}
+
+    assert routed_model(app_client, {"message": "paying user wants deep", "tier": "deep"}, paying) == DEEP_MODEL
@@ -0,0 +1,47 @@
+import serve
+
+
+def settings(**overrides):
+    base = serve.load_settings("dev")
+    base.update(reload=False, **overrides)
+    return base
+
+
+def test_resolve_workers():
+    assert serve.resolve_workers("auto") == serve.cpu_count()
+    assert serve.resolve_workers(None) == serve.cpu_count()
+    assert serve.resolve_workers("3") == 3
+    assert serve.resolve_workers(-2) == 1
+
+
+def test_settings_come_from_the_merged_config():
+    loaded = serve.load_settings("dev")
+
+    assert loaded["workers"] == 1
+    assert loaded["allow_multiple_workers"] is False
+    options = serve.uvicorn_options(loaded)
+    assert options["timeout_graceful_shutdown"] == loaded["timeout"]
+    assert options["timeout_keep_alive"] == loaded["keep_alive"]
+
+
+def test_multiple_workers_need_an_explicit_opt_in(monkeypatch):
+    runs = []
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **options: runs.append(options))
+    # serve() fills in the drain deadline from the settings when unset
+    monkeypatch.setenv("DRAIN_TIMEOUT_SECONDS", "600")
+
+    serve.serve(settings(workers=4, preload=False))
+    serve.serve(settings(workers=4, preload=False, allow_multiple_workers=True))
+
+    assert "workers" not in runs[0]
+    assert runs[1]["workers"] == 4
+
+
+def test_pre_forked_workers_share_state_without_the_opt_in(monkeypatch):
+    started = []
+    monkeypatch.setattr(serve.Supervisor, "run", lambda self: started.append(self.workers) or 0)
+    monkeypatch.setenv("DRAIN_TIMEOUT_SECONDS", "600")
+
+    serve.serve(settings(workers=4, preload=True))
+
+    assert started == [4]
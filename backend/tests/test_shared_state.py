@@ -0,0 +1,49 @@
+import os
+import time
+
+import shared_state
+from shared_state import SharedCounters, SQLiteState
+
+
+def test_counters_sum_the_rows_of_every_worker():
+    counters = SharedCounters(2, slots=3)
+    try:
+        counters.add(0, 2)
+        shared_state.set_worker_slot(2)
+        counters.add(0)
+        counters.add(1, 5)
+
+        assert counters.total(0) == 3 and counters.total(1) == 5
+
+        shared_state.reset_worker(2)
+        assert counters.total(0) == 2 and counters.total(1) == 0
+    finally:
+        shared_state.set_worker_slot(0)
+
+
+def test_forked_workers_write_the_same_counters():
+    counters = SharedCounters(1, slots=2)
+    pid = os.fork()
+    if pid == 0:
+        shared_state.set_worker_slot(1)
+        with counters.locked():
+            counters.add(0, 7)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert counters.total(0) == 7
+
+
+def test_sqlite_state_round_trips_and_expires(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    writer, reader = SQLiteState(path), SQLiteState(path)
+
+    writer.put("batch_owner", "msgbatch_1", "user_1", ttl=60)
+    writer.put("conversation", "c1", {"turns": [["user", "hi", 2]]}, ttl=0.01)
+    time.sleep(0.02)
+
+    assert reader.get("batch_owner", "msgbatch_1") == "user_1"
+    assert reader.get("conversation", "msgbatch_1") is None
+    assert reader.get("conversation", "c1") is None
+    writer.close()
+    reader.close()
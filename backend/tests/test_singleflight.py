@@ -0,0 +1,126 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def producer(chunks, gap=0.01, started=None):
+    async def run(flight):
+        if started is not None:
+            started.append(flight.key)
+        for chunk in chunks:
+            await asyncio.sleep(gap)
+            flight.publish(chunk)
+        return "final"
+    return run
+
+
+async def read(flight):
+    return [text async for text in flight.subscribe()]
+
+
+def test_identical_requests_share_one_producer():
+    async def main():
+        registry = SingleFlight()
+        started = []
+        first, leader = registry.join("k", producer(["a", "b", "c"], started=started))
+        second, follower = registry.join("k", producer(["x"], started=started))
+        results = await asyncio.gather(read(first), read(second))
+        return registry, started, leader, follower, first, second, results
+
+    registry, started, leader, follower, first, second, results = asyncio.run(main())
+
+    assert first is second
+    assert (leader, follower) == (True, False)
+    assert started == ["k"]
+    assert results == [["a", "b", "c"]] * 2
+    assert first.result == "final"
+    assert registry.snapshot() == {"in_flight": 0, "upstream_streams": 1, "coalesced_requests": 1}
+
+
+def test_late_joiner_replays_the_prefix():
+    async def main():
+        registry = SingleFlight()
+        flight, _ = registry.join("k", producer(["a", "b", "c", "d"], gap=0.02))
+        early = asyncio.ensure_future(read(flight))
+        await asyncio.sleep(0.05)
+        late, _ = registry.join("k", producer([]))
+        assert late is flight and len(flight.chunks) >= 1
+        return await early, await read(late)
+
+    early, late = asyncio.run(main())
+
+    assert early == late == ["a", "b", "c", "d"]
+
+
+def test_producer_is_cancelled_when_every_subscriber_leaves():
+    async def main():
+        registry = SingleFlight()
+        flight, _ = registry.join("k", producer(["a"] * 100))
+        readers = [asyncio.ensure_future(read(flight)) for _ in range(2)]
+        await asyncio.sleep(0.03)
+        readers[0].cancel()
+        await asyncio.sleep(0.03)
+        assert not flight.task.done()
+        readers[1].cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return registry, flight
+
+    registry, flight = asyncio.run(main())
+
+    assert flight.task.cancelled()
+    assert "k" not in registry
+
+
+def test_request_during_a_slow_cancellation_starts_a_new_flight():
+    async def slow_to_stop(flight):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # e.g. closing the upstream connection
+            await asyncio.sleep(0.05)
+            raise
+
+    async def main():
+        registry = SingleFlight()
+        first, _ = registry.join("k", slow_to_stop)
+        reader = asyncio.ensure_future(read(first))
+        await asyncio.sleep(0.01)
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        assert not first.task.done()
+        second, leader = registry.join("k", producer(["fresh"]))
+        return first, second, leader, await read(second)
+
+    first, second, leader, chunks = asyncio.run(main())
+
+    assert second is not first and leader
+    assert chunks == ["fresh"]
+
+
+def test_producer_error_reaches_every_subscriber():
+    async def failing(flight):
+        flight.publish("partial")
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def main():
+        registry = SingleFlight()
+        flight, _ = registry.join("k", failing)
+        registry.join("k", failing)
+        return await asyncio.gather(read(flight), read(flight), return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_finished_flight_is_removed_so_the_next_request_starts_fresh():
+    async def main():
+        registry = SingleFlight()
+        flight, _ = registry.join("k", producer(["a"]))
+        await read(flight)
+        await asyncio.sleep(0)
+        return registry.join("k", producer(["b"]))[1]
+
+    assert asyncio.run(main()) is True
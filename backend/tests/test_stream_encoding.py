@@ -0,0 +1,40 @@
+import json
+
+from stream_encoding import (
+    NDJSONEncoder, SSEEncoder, block_end_event, delta_event, done_event, dumps, encoder_for, error_event, usage_event,
+)
+
+
+def test_payloads_are_compact_utf8_json():
+    assert dumps({"a": [1, "é"]}) == '{"a":[1,"é"]}'.encode()
+    assert delta_event('say "hi"\n') == (b"delta", b'"say \\"hi\\"\\n"')
+    assert json.loads(block_end_event("paragraph", "ne")[1]) == {"block": "paragraph", "rest": "ne"}
+    assert json.loads(done_event("end_turn")[1]) == {"stop_reason": "end_turn"}
+    assert json.loads(error_event("boom")[1]) == {"message": "boom"}
+    assert json.loads(usage_event(10, 5, model="m")[1])["output_tokens"] == 5
+
+
+def test_sse_frames():
+    frame = SSEEncoder().frame(b"s:1", delta_event("hi"))
+
+    assert frame == b'id: s:1\nevent: delta\ndata: "hi"\n\n'
+    assert SSEEncoder().frames([(b"s:1", delta_event("a")), (b"s:2", done_event(None))]) == (
+        b'id: s:1\nevent: delta\ndata: "a"\n\nid: s:2\nevent: done\ndata: {"stop_reason":null}\n\n'
+    )
+
+
+def test_ndjson_frames_are_one_json_object_per_line():
+    chunk = NDJSONEncoder().frames([(b"s:1", delta_event("a\nb")), (b"s:2", usage_event(1, 2))])
+
+    lines = [json.loads(line) for line in chunk.decode().splitlines()]
+    assert lines[0] == {"id": "s:1", "event": "delta", "data": "a\nb"}
+    assert lines[1]["event"] == "usage" and lines[1]["data"]["input_tokens"] == 1
+
+
+def test_encoder_negotiation():
+    assert isinstance(encoder_for(None), SSEEncoder)
+    assert isinstance(encoder_for("application/x-ndjson"), NDJSONEncoder)
+    assert not isinstance(encoder_for("text/event-stream"), NDJSONEncoder)
+    assert isinstance(encoder_for("text/event-stream;q=0.5, application/x-ndjson"), NDJSONEncoder)
+    assert not isinstance(encoder_for("text/event-stream, application/x-ndjson;q=0.9"), NDJSONEncoder)
+    assert not isinstance(encoder_for("application/x-ndjson;q=0, */*"), NDJSONEncoder)
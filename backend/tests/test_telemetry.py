@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from telemetry import MetricsRegistry, StreamMetrics, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile([], 50) is None
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 100) == 100
+    assert percentile([7.0], 99) == 7.0
+
+
+def test_stream_metrics_fall_back_to_chunk_count():
+    metrics = StreamMetrics()
+    metrics.record_chunk(10)
+    metrics.record_chunk(5)
+    metrics.finish()
+
+    assert metrics.tokens == 2
+    assert metrics.bytes == 15
+    assert metrics.ttft is not None and metrics.ttft <= metrics.duration
+
+
+def test_record_usage_copies_cache_tokens():
+    metrics = StreamMetrics()
+    metrics.record_usage(SimpleNamespace(
+        output_tokens=40, input_tokens=None, cache_read_input_tokens=900, cache_creation_input_tokens=None,
+    ))
+
+    assert (metrics.output_tokens, metrics.input_tokens) == (40, 0)
+    assert (metrics.cache_read_tokens, metrics.cache_write_tokens) == (900, 0)
+
+
+def test_registry_aggregates_finished_streams():
+    registry = MetricsRegistry()
+    ok = registry.start_stream()
+    ok.record_chunk(3)
+    ok.record_usage(SimpleNamespace(output_tokens=12, input_tokens=100, cache_read_input_tokens=300))
+    failed = registry.start_stream()
+    assert registry.active == 2
+
+    registry.record(ok)
+    failed.finish(error="boom")
+    registry.record(failed)
+
+    snapshot = registry.snapshot()
+    assert snapshot["active"] == 0
+    assert snapshot["streams_total"] == 2
+    assert snapshot["errors_total"] == 1
+    assert snapshot["tokens_total"] == 12
+    assert snapshot["prompt_cache"]["token_hit_ratio"] == 300 / 400
+    assert snapshot["prompt_cache"]["request_hit_ratio"] == 0.5
+    assert snapshot["duration_ms"]["p50"] is not None
+
+
+def test_cancelled_streams_count_saved_tokens_but_not_answer_length():
+    registry = MetricsRegistry()
+    for length in (100, 200, 300):
+        metrics = registry.start_stream()
+        metrics.output_tokens = length
+        registry.record(metrics)
+    cancelled = registry.start_stream()
+    cancelled.output_tokens = 5
+    cancelled.cancel(tokens_saved=195)
+    registry.record(cancelled)
+
+    assert registry.cancelled_total == 1
+    assert registry.tokens_saved_total == 195
+    assert registry.expected_output_tokens(1024) == 200
+    assert registry.expected_output_tokens(150) == 150
+    assert MetricsRegistry().expected_output_tokens(1024) == 1024
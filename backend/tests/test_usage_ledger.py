@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from usage_ledger import SQLiteStore, UsageLedger, UsageRecord
+
+SONNET = "claude-sonnet-4-20250514"
+
+
+def test_cost_by_model_kind_and_source():
+    record = UsageRecord("chat", SONNET, "c", input_tokens=1_000_000, output_tokens=100_000, cache_read_tokens=1_000_000)
+
+    assert record.cost_usd == pytest.approx(3.00 + 1.50 + 0.30)
+    assert UsageRecord("message_batch", SONNET, "c", output_tokens=1_000_000).cost_usd == pytest.approx(7.50)
+    assert UsageRecord("chat", SONNET, "c", output_tokens=10, served_from="response_cache").cost_usd == 0
+    assert UsageRecord("chat", "unknown-model", "c", output_tokens=10).cost_usd == 0
+
+
+def test_records_are_batched_and_rolled_up(tmp_path):
+    async def main():
+        ledger = UsageLedger(SQLiteStore(str(tmp_path / "usage.sqlite3")), flush_interval=60, max_batch=3)
+        for i in range(5):
+            ledger.record(UsageRecord(
+                "chat", SONNET, "alice" if i < 3 else "bob", status="ok" if i else "error",
+                output_tokens=10, ts=3600.0 * (i // 2) + 1,
+            ))
+        # A full batch wakes the writer long before the flush interval
+        await asyncio.sleep(0.05)
+        written_early = ledger.written
+        by_client = await ledger.rollup("client")
+        by_hour = await ledger.rollup("hour", since=3600, until=7200)
+        snapshot = ledger.snapshot()
+        await ledger.close()
+        return written_early, by_client, by_hour, snapshot
+
+    written_early, by_client, by_hour, snapshot = asyncio.run(main())
+
+    assert written_early == 5
+    assert [(row["bucket"], row["requests"], row["output_tokens"]) for row in by_client] == [("alice", 3, 30), ("bob", 2, 20)]
+    assert by_client[0]["errors"] == 1
+    assert [row["bucket"] for row in by_hour] == ["1970-01-01T01:00:00Z"]
+    assert snapshot == {"recorded": 5, "written": 5, "pending": 0, "dropped": 0, "write_errors": 0}
+
+
+def test_full_queue_drops_the_oldest_and_write_errors_are_counted(tmp_path):
+    class BrokenStore(SQLiteStore):
+        def write_many(self, records):
+            raise OSError("disk full")
+
+    async def main():
+        ledger = UsageLedger(BrokenStore(str(tmp_path / "u.sqlite3")), flush_interval=60, max_pending=2)
+        for _ in range(3):
+            ledger.record(UsageRecord("chat", SONNET, "c"))
+        dropped = ledger.dropped
+        await ledger.flush()
+        await ledger.close()
+        return dropped, ledger.snapshot()
+
+    dropped, snapshot = asyncio.run(main())
+
+    assert dropped == 1
+    assert snapshot["write_errors"] == 1 and snapshot["written"] == 0
+
+
+def test_usage_endpoint_is_for_operators(app_client, monkeypatch):
+    import main
+
+    # TestClient requests come from "testclient", not localhost
+    assert app_client.get("/usage").status_code == 403
+    monkeypatch.setattr(main, "USAGE_TOKEN", "operator-secret")
+    assert app_client.get("/usage", headers={"X-Usage-Token": "wrong"}).status_code == 403
+    allowed = app_client.get("/usage?group_by=client", headers={"X-Usage-Token": "operator-secret"})
+    assert allowed.status_code == 200 and allowed.json()["group_by"] == "client"
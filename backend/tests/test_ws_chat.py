@@ -0,0 +1,89 @@
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+
+from resumable import CreditWindow
+
+
+def test_credit_window_take_and_grant():
+    async def main():
+        window = CreditWindow(2)
+        assert await window.take(5) == 2
+        waiting = asyncio.ensure_future(window.take(3))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        window.grant(1)
+        return await waiting, window.stalls
+
+    assert asyncio.run(main()) == (1, 1)
+
+
+def test_closing_the_window_wakes_a_waiting_reader():
+    async def main():
+        window = CreditWindow(0)
+        waiting = asyncio.ensure_future(window.take(3))
+        await asyncio.sleep(0)
+        window.close()
+        first = await asyncio.wait_for(waiting, 1)
+        window.grant(10)
+        return first, await window.take(3)
+
+    assert asyncio.run(main()) == (0, 0)
+
+
+@contextmanager
+def chat_socket(app_client):
+    """A /ws/chat connection that is closed, and finished on the server, on exit"""
+    import main
+
+    with app_client.websocket_connect("/ws/chat") as ws:
+        yield ws
+        ws.close()
+        # Leaving the session cancels the app task; let the server side finish first
+        deadline = time.monotonic() + 5
+        while main.chat_sockets.sockets and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def receive_until(ws, done):
+    """Messages from the socket until one satisfies `done`"""
+    messages = []
+    while not messages or not done(messages[-1]):
+        messages.extend(json.loads(line) for line in ws.receive_text().splitlines())
+    return messages
+
+
+def test_ws_chat_streams_an_answer(app_client):
+    with chat_socket(app_client) as ws:
+        ws.send_text(json.dumps({"type": "chat", "stream": "a", "message": "ws test"}))
+
+        messages = receive_until(ws, lambda m: m.get("type") == "end")
+
+    assert messages[0]["type"] == "started"
+    text = "".join(m["data"] for m in messages if m.get("event") == "delta")
+    assert text == "hello " * 5
+    assert messages[-1] == {"type": "end", "stream": "a", "reason": "complete"}
+
+
+def test_ws_chat_cancel_ends_a_reader_waiting_for_credit(app_client):
+    with chat_socket(app_client) as ws:
+        ws.send_text(json.dumps({"type": "chat", "stream": "a", "message": "slow reader", "window": 1}))
+        receive_until(ws, lambda m: "event" in m)
+
+        ws.send_text(json.dumps({"type": "cancel", "stream": "a"}))
+        messages = receive_until(ws, lambda m: m.get("type") == "end")
+
+    assert messages[-1] == {"type": "end", "stream": "a", "reason": "cancelled"}
+
+
+def test_ws_chat_rejects_binary_frames(app_client):
+    with chat_socket(app_client) as ws:
+        ws.send_bytes(b"\x00\x01")
+
+        messages = receive_until(ws, lambda m: m.get("type") == "error")
+        ws.send_text(json.dumps({"type": "ping"}))
+        pong = receive_until(ws, lambda m: m.get("type") == "pong")
+
+    assert messages[-1]["status"] == 400
+    assert pong[-1] == {"type": "pong"}
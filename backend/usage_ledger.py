@@ -0,0 +1,250 @@
+"""
+Zyron AI - Token usage and cost ledger
+
+Every finished /chat stream and /chat/batch item is recorded with its
+token counts, latency and client. Recording only appends to an in-memory
+queue; a background task writes queued records in batches to an
+append-only store (SQLite in dev) off the event loop. Rollups by hour,
+client and model are computed by the store.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens: (input, output, cache write, cache read)
+MODEL_PRICES: Dict[str, Tuple[float, float, float, float]] = {
+    "claude-sonnet-4-20250514": (3.00, 15.00, 3.75, 0.30),
+    "claude-opus-4-20250514": (15.00, 75.00, 18.75, 1.50),
+    "claude-3-5-haiku-20241022": (0.80, 4.00, 1.00, 0.08),
+}
+# Message Batches API requests are billed at half price
+BATCH_DISCOUNT = 0.5
+
+ROLLUPS = {
+    "hour": "strftime('%Y-%m-%dT%H:00:00Z', ts, 'unixepoch')",
+    "client": "client_id",
+    "model": "model",
+}
+
+
+@dataclass
+class UsageRecord:
+    """One upstream (or cache-served) answer"""
+    kind: str
+    model: str
+    client_id: str
+    status: str = "ok"
+    conversation_id: Optional[str] = None
+    prompt_key: Optional[str] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    ttft_ms: Optional[float] = None
+    duration_ms: Optional[float] = None
+    # "upstream", or "response_cache" / "single_flight" when no upstream call was billed
+    served_from: str = "upstream"
+    ts: float = 0.0
+    cost_usd: float = 0.0
+
+    def __post_init__(self):
+        if not self.ts:
+            self.ts = time.time()
+        self.cost_usd = cost_usd(self)
+
+
+def cost_usd(record: UsageRecord) -> float:
+    """Estimated upstream cost of a record, 0 for unknown models and deduplicated answers"""
+    prices = MODEL_PRICES.get(record.model)
+    if prices is None or record.served_from != "upstream":
+        return 0.0
+    input_price, output_price, write_price, read_price = prices
+    cost = (
+        record.input_tokens * input_price
+        + record.output_tokens * output_price
+        + record.cache_write_tokens * write_price
+        + record.cache_read_tokens * read_price
+    ) / 1_000_000
+    return cost * BATCH_DISCOUNT if record.kind == "message_batch" else cost
+
+
+COLUMNS = [f.name for f in fields(UsageRecord)]
+
+
+class SQLiteStore:
+    """Append-only usage table in a local SQLite file
+
+    Calls block and are meant to run in a worker thread; the connection is
+    opened with check_same_thread=False and all calls are serialized by
+    the ledger. Each process opens its own connection on first use, so a
+    store created before the server forks its workers is safe to share.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        # Create the table up front so a bad path fails at startup
+        self.conn
+        self.close()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = self._connect()
+            self._pid = os.getpid()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                conversation_id TEXT,
+                prompt_key TEXT,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                cache_read_tokens INTEGER NOT NULL,
+                cache_write_tokens INTEGER NOT NULL,
+                ttft_ms REAL,
+                duration_ms REAL,
+                served_from TEXT NOT NULL,
+                cost_usd REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS usage_ts ON usage (ts)")
+        conn.commit()
+        return conn
+
+    def write_many(self, records: List[UsageRecord]):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO usage ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                [tuple(asdict(r)[c] for c in COLUMNS) for r in records],
+            )
+
+    def rollup(self, group_by: str, since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Totals per hour, client or model between two epoch timestamps"""
+        bucket = ROLLUPS[group_by]
+        cursor = self.conn.execute(
+            f"""
+            SELECT {bucket} AS bucket,
+                   COUNT(*) AS requests,
+                   SUM(status != 'ok') AS errors,
+                   SUM(served_from != 'upstream') AS deduplicated,
+                   SUM(input_tokens) AS input_tokens,
+                   SUM(output_tokens) AS output_tokens,
+                   SUM(cache_read_tokens) AS cache_read_tokens,
+                   SUM(cache_write_tokens) AS cache_write_tokens,
+                   ROUND(SUM(cost_usd), 6) AS cost_usd,
+                   ROUND(AVG(ttft_ms), 1) AS avg_ttft_ms,
+                   ROUND(AVG(duration_ms), 1) AS avg_duration_ms
+            FROM usage
+            WHERE ts >= ? AND ts < ?
+            GROUP BY bucket
+            ORDER BY bucket
+            """,
+            (since or 0, until or float("inf")),
+        )
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+class UsageLedger:
+    """Queues usage records and flushes them to a store in batches"""
+
+    def __init__(self, store: SQLiteStore, flush_interval: float = 1.0, max_batch: int = 500, max_pending: int = 10000):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending: Deque[UsageRecord] = deque()
+        self.max_pending = max_pending
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def record(self, record: UsageRecord):
+        """Queue a record; never blocks or does I/O"""
+        if len(self.pending) >= self.max_pending:
+            # The store is not keeping up; keep the newest records
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(record)
+        self.recorded += 1
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        if len(self.pending) >= self.max_batch:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything queued so far"""
+        async with self._lock:
+            while self.pending:
+                batch = [self.pending.popleft() for _ in range(min(self.max_batch, len(self.pending)))]
+                try:
+                    await asyncio.to_thread(self.store.write_many, batch)
+                except Exception as e:
+                    self.write_errors += 1
+                    logger.warning(f"⚠️  Usage ledger write failed, {len(batch)} records lost: {e}")
+                    continue
+                self.written += len(batch)
+
+    async def rollup(self, group_by: str, since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Store rollup, including records that are still queued"""
+        await self.flush()
+        async with self._lock:
+            return await asyncio.to_thread(self.store.rollup, group_by, since, until)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        self.store.close()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters for /metrics"""
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "pending": len(self.pending),
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+        }
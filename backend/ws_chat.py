@@ -0,0 +1,321 @@
+"""
+Zyron AI - Multiplexed chat streams over one WebSocket
+
+/ws/chat carries any number of concurrent, independently cancellable
+chat streams over a single persistent connection, so a chat turn costs
+one message instead of a new HTTP request. Every WebSocket message is
+one or more JSON lines. The client names each stream with its own
+`stream` key:
+
+    -> {"type": "chat", "stream": "s1", "message": "...", "conversation_id": "...",
+        "last_event_id": "<stream id>:<seq>", "window": 64, "token": "<access token>"}
+    -> {"type": "credit", "stream": "s1", "events": 32}
+    -> {"type": "cancel", "stream": "s1"}
+    -> {"type": "ping"} / {"type": "pong"}
+
+    <- {"type": "started", "stream": "s1", "stream_id": "...", "conversation_id": "..."}
+    <- {"stream": "s1", "id": "<stream id>:<seq>", "event": "delta", "data": "text"}
+    <- {"type": "end", "stream": "s1", "reason": "complete|cancelled|lagged"}
+    <- {"type": "error", "stream": "s1", "status": 429, "detail": "...", "retry_after": 3}
+    <- {"type": "ping"} / {"type": "pong"}
+
+`token` is the user's Supabase access token, which browsers cannot send
+as a WebSocket header; like /chat's Authorization header it is optional
+and only needed for a `tier`. Stream events are the typed /chat events
+(delta, usage, done, error) and streams are the same resumable streams,
+so a client that loses its connection sends `last_event_id` on a new
+one to continue an answer.
+
+Flow control works at two levels. A stream opened with a `window` is
+sent at most that many events until the client returns credit; the rest
+wait in the stream's replay buffer. All streams of a connection share a
+bounded send queue, so a client that reads its socket slowly holds its
+streams back instead of growing server memory. One heartbeat task per
+worker pings every connection each interval and closes the ones it has
+not heard from within the idle timeout.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, WebSocket
+
+from admission import Permit
+from resumable import CreditWindow, ResumableStream
+from stream_encoding import NDJSONEncoder, dumps
+
+logger = logging.getLogger(__name__)
+
+# Application close code (4000-4999) for connections that stopped answering pings
+IDLE_CLOSE_CODE = 4408
+STREAM_KEY = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+PING = '{"type":"ping"}\n'
+
+# Opens (or resumes) the stream a chat message asks for: (stream, events already seen, permit)
+OpenStream = Callable[[dict], Awaitable[Tuple[ResumableStream, int, Permit]]]
+
+
+class StreamEncoder(NDJSONEncoder):
+    """NDJSON event frames tagged with the client's stream key"""
+
+    def __init__(self, key: str):
+        # `key` matched STREAM_KEY, so it needs no JSON escaping
+        self.template = b'{"stream":"' + key.encode() + b'",' + NDJSONEncoder.template[1:]
+
+
+@dataclass
+class Channel:
+    """One client stream on a connection"""
+    window: Optional[CreditWindow]
+    task: Optional[asyncio.Task] = None
+    stream: Optional[ResumableStream] = None
+    cancelled: bool = False
+
+
+class ChatSocket:
+    """One /ws/chat connection: many streams, one bounded send queue"""
+
+    def __init__(self, hub: "ChatSocketHub", websocket: WebSocket, open_stream: OpenStream):
+        self.hub = hub
+        self.websocket = websocket
+        self.open_stream = open_stream
+        self.outbox: asyncio.Queue = asyncio.Queue(hub.send_queue)
+        self.channels: Dict[str, Channel] = {}
+        self.last_seen = time.monotonic()
+        self.idle = False
+        self._receiver: Optional[asyncio.Task] = None
+
+    async def run(self):
+        await self.websocket.accept()
+        hub = self.hub
+        self._receiver = asyncio.ensure_future(self._receive())
+        tasks = [self._receiver, asyncio.ensure_future(self._write())]
+        hub.attach(self)
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            hub.detach(self)
+            # Readers leave their streams, which keep running for the disconnect grace period
+            pending = tasks + [c.task for c in self.channels.values() if c.task is not None]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self.idle:
+            logger.info(f"💤 Closing idle chat socket after {hub.idle_timeout:.0f}s without a message")
+            try:
+                await self.websocket.close(code=IDLE_CLOSE_CODE)
+            except RuntimeError:
+                pass
+
+    def ping(self):
+        try:
+            self.outbox.put_nowait(PING)
+        except asyncio.QueueFull:
+            # Data is already waiting to be sent; that will do as a sign of life
+            pass
+
+    def close_idle(self):
+        self.idle = True
+        self._receiver.cancel()
+
+    async def _receive(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            # A binary frame has no text and is rejected like any other non-JSON message
+            text = message.get("text") or ""
+            self.last_seen = time.monotonic()
+            for line in [line for line in text.splitlines() if line.strip()] or [""]:
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("not an object")
+                except ValueError:
+                    await self._reject(None, 400, "Messages must be JSON objects")
+                    continue
+                await self._handle(message)
+
+    async def _handle(self, message: dict):
+        kind = message.get("type")
+        if kind == "ping":
+            await self.send({"type": "pong"})
+            return
+        if kind == "pong":
+            return
+        key = message.get("stream")
+        if not isinstance(key, str) or not STREAM_KEY.match(key):
+            await self._reject(None, 400, "Missing or invalid stream key")
+            return
+        channel = self.channels.get(key)
+        if kind == "chat":
+            await self._start(key, message)
+        elif kind == "credit" and channel is not None and channel.window is not None:
+            events = message.get("events")
+            if isinstance(events, int) and events > 0:
+                channel.window.grant(events)
+        elif kind == "cancel" and channel is not None:
+            if channel.stream is not None:
+                # Stops the upstream call; the reader ends with reason "cancelled",
+                # also when it is waiting for credit or the answer is already complete
+                channel.cancelled = True
+                channel.stream.cancel()
+                if channel.window is not None:
+                    channel.window.close()
+            else:
+                # Still waiting for admission
+                channel.task.cancel()
+                await self.send({"type": "end", "stream": key, "reason": "cancelled"})
+        elif kind not in ("credit", "cancel"):
+            await self._reject(key, 400, f"Unknown message type: {kind}")
+
+    async def _start(self, key: str, message: dict):
+        if key in self.channels:
+            await self._reject(key, 409, "Stream key already in use")
+            return
+        if len(self.channels) >= self.hub.max_streams:
+            await self._reject(key, 429, "Too many streams on this connection")
+            return
+        window = message.get("window")
+        if window is not None and (not isinstance(window, int) or window <= 0):
+            await self._reject(key, 400, "window must be a positive number of events")
+            return
+        channel = Channel(CreditWindow(window) if window else None)
+        self.channels[key] = channel
+        # Admission may queue; the connection keeps serving other streams meanwhile
+        channel.task = asyncio.ensure_future(self._pump(key, channel, message))
+
+    async def _pump(self, key: str, channel: Channel, message: dict):
+        hub = self.hub
+        permit = None
+        try:
+            try:
+                stream, after, permit = await self.open_stream(message)
+            except HTTPException as e:
+                retry_after = (e.headers or {}).get("Retry-After")
+                await self._reject(key, e.status_code, e.detail, int(retry_after) if retry_after else None)
+                return
+            channel.stream = stream
+            hub.streams += 1
+            hub.open_streams += 1
+            try:
+                await self.send({
+                    "type": "started", "stream": key, "stream_id": stream.id, "conversation_id": stream.conversation_id,
+                })
+                async for chunk in stream.read(after, hub.disconnect_grace, StreamEncoder(key), channel.window):
+                    await self._put(chunk.decode())
+                if stream.cancelled or channel.cancelled:
+                    reason = "cancelled"
+                else:
+                    reason = "complete" if stream.done else "lagged"
+                await self.send({"type": "end", "stream": key, "reason": reason})
+            finally:
+                hub.open_streams -= 1
+                if channel.window is not None:
+                    channel.window.close()
+                    hub.credit_stalls += channel.window.stalls
+        finally:
+            if permit is not None:
+                permit.release()
+            self.channels.pop(key, None)
+
+    async def _reject(self, key: Optional[str], status: int, detail: str, retry_after: Optional[int] = None):
+        self.hub.rejected += 1
+        error = {"type": "error", "stream": key, "status": status, "detail": detail}
+        if retry_after:
+            error["retry_after"] = retry_after
+        await self.send(error)
+
+    async def send(self, message: dict):
+        await self._put(dumps(message).decode() + "\n")
+
+    async def _put(self, text: str):
+        if self.outbox.full():
+            # The client reads slower than its streams produce
+            self.hub.send_waits += 1
+        await self.outbox.put(text)
+
+    async def _write(self):
+        outbox = self.outbox
+        while True:
+            parts: List[str] = [await outbox.get()]
+            # Whatever else is queued goes out in the same WebSocket message
+            while not outbox.empty():
+                parts.append(outbox.get_nowait())
+            await self.websocket.send_text("".join(parts))
+            self.hub.messages_sent += 1
+
+
+class ChatSocketHub:
+    """Settings and counters shared by the /ws/chat connections of a worker"""
+
+    def __init__(
+        self,
+        disconnect_grace: float = 5.0,
+        max_streams: int = 16,
+        send_queue: int = 64,
+        heartbeat: float = 20.0,
+        idle_timeout: float = 60.0,
+    ):
+        self.disconnect_grace = disconnect_grace
+        self.max_streams = max_streams
+        self.send_queue = send_queue
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.sockets: Set[ChatSocket] = set()
+        self.connections = 0
+        self.streams = 0
+        self.open_streams = 0
+        self.rejected = 0
+        self.credit_stalls = 0
+        self.send_waits = 0
+        self.messages_sent = 0
+        self.idle_closes = 0
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def serve(self, websocket: WebSocket, open_stream: OpenStream):
+        """Run one connection until the client leaves or goes silent"""
+        await ChatSocket(self, websocket, open_stream).run()
+
+    def attach(self, socket: ChatSocket):
+        self.sockets.add(socket)
+        self.connections += 1
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.ensure_future(self._heartbeat())
+
+    def detach(self, socket: ChatSocket):
+        self.sockets.discard(socket)
+
+    async def _heartbeat(self):
+        """Ping every connection; close the ones that went silent"""
+        try:
+            while self.sockets:
+                await asyncio.sleep(self.heartbeat)
+                now = time.monotonic()
+                for socket in list(self.sockets):
+                    if now - socket.last_seen > self.idle_timeout:
+                        self.idle_closes += 1
+                        socket.close_idle()
+                    else:
+                        socket.ping()
+        finally:
+            self._heartbeat_task = None
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters for /metrics"""
+        return {
+            "connections": self.connections,
+            "open_connections": len(self.sockets),
+            "streams": self.streams,
+            "open_streams": self.open_streams,
+            "rejected": self.rejected,
+            "credit_stalls": self.credit_stalls,
+            "send_waits": self.send_waits,
+            "messages_sent": self.messages_sent,
+            "idle_closes": self.idle_closes,
+        }
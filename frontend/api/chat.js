@@ -5,12 +5,68 @@ export const config = {
   runtime: 'edge', // Use Edge Runtime for streaming
 };
 
+// Same table as the backend's default model routing
+const MODELS = {
+  fast: process.env.ANTHROPIC_FAST_MODEL || 'claude-3-5-haiku-20241022',
+  standard: process.env.ANTHROPIC_MODEL || 'claude-sonnet-4-20250514',
+  deep: process.env.ANTHROPIC_DEEP_MODEL || 'claude-opus-4-20250514',
+};
+const MAX_TOKENS = { fast: 1024, standard: 1024, deep: 2048 };
+// ~200 tokens at 4 characters per token
+const GUEST_SHORT_CHARS = 800;
+// Tiers every signed-in user may ask for; a token's `tiers` claim grants more
+const USER_TIERS = (process.env.AUTH_USER_TIERS ?? 'fast,standard')
+  .split(',')
+  .map((tier) => tier.trim())
+  .filter(Boolean);
+
+function base64UrlDecode(segment) {
+  const base64 = segment.replace(/-/g, '+').replace(/_/g, '/');
+  return Uint8Array.from(atob(base64 + '='.repeat((4 - (base64.length % 4)) % 4)), (c) => c.charCodeAt(0));
+}
+
+// Claims of the caller's Supabase access token (HS256, SUPABASE_JWT_SECRET),
+// null for guests and for forged or expired tokens, like the backend's auth.py
+async function verifiedClaims(req) {
+  const secret = process.env.SUPABASE_JWT_SECRET;
+  const match = /^Bearer\s+(\S+)$/i.exec(req.headers.get('authorization') || '');
+  if (!secret || !match) return null;
+  try {
+    const [header, payload, signature] = match[1].split('.');
+    if (JSON.parse(new TextDecoder().decode(base64UrlDecode(header))).alg !== 'HS256') return null;
+    const encoder = new TextEncoder();
+    const key = await crypto.subtle.importKey(
+      'raw', encoder.encode(secret), { name: 'HMAC', hash: 'SHA-256' }, false, ['verify']
+    );
+    const valid = await crypto.subtle.verify(
+      'HMAC', key, base64UrlDecode(signature), encoder.encode(`${header}.${payload}`)
+    );
+    if (!valid) return null;
+    const claims = JSON.parse(new TextDecoder().decode(base64UrlDecode(payload)));
+    if (typeof claims.sub !== 'string' || !claims.sub) return null;
+    if (typeof claims.exp !== 'number' || claims.exp < Date.now() / 1000) return null;
+    return claims;
+  } catch {
+    return null;
+  }
+}
+
+// An explicit tier is only honoured for signed-in users entitled to it
+function pickTier({ message, tier, guest, claims }) {
+  if (claims && typeof tier === 'string' && Object.hasOwn(MODELS, tier)) {
+    const granted = Array.isArray(claims.tiers) ? claims.tiers : [];
+    if (USER_TIERS.includes(tier) || granted.includes(tier)) return tier;
+  }
+  if (!claims && guest === true && message.length <= GUEST_SHORT_CHARS) return 'fast';
+  return 'standard';
+}
+
 export default async function handler(req) {
   // CORS headers
   const corsHeaders = {
     'Access-Control-Allow-Origin': '*',
     'Access-Control-Allow-Methods': 'POST, OPTIONS',
-    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
   };
 
   // Handle preflight
@@ -26,7 +82,7 @@ export default async function handler(req) {
   }
 
   try {
-    const { message } = await req.json();
+    const { message, tier, guest } = await req.json();
 
     if (!message) {
       return new Response(JSON.stringify({ error: 'Message is required' }), {
@@ -40,9 +96,11 @@ export default async function handler(req) {
     });
 
     // Create streaming response
+    const claims = await verifiedClaims(req);
+    const route = pickTier({ message, tier, guest, claims });
     const stream = await anthropic.messages.stream({
-      model: 'claude-sonnet-4-20250514',
-      max_tokens: 1024,
+      model: MODELS[route],
+      max_tokens: MAX_TOKENS[route],
       messages: [{ role: 'user', content: message }],
     });
 
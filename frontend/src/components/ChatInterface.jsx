@@ -62,6 +62,7 @@ export default function ChatInterface() {
       const reader = res.body.getReader()
       const decoder = new TextDecoder()
       let buffer = ''
+      let eventType = 'delta'
 
       while (true) {
         const { done, value } = await reader.read()
@@ -75,7 +76,12 @@ export default function ChatInterface() {
 
         for (let i = 0; i < lines.length - 1; i++) {
           const line = lines[i]
-          if (line.startsWith('data: ')) {
+          if (line.startsWith('event: ')) {
+            eventType = line.slice(7)
+          } else if (line.startsWith('data: ') && eventType !== 'delta') {
+            // usage/done/error events are not answer text
+            eventType = 'delta'
+          } else if (line.startsWith('data: ')) {
             const text = line.slice(6)
             if (text) {
               setResponse((prev) => prev + text)
@@ -1,8 +1,8 @@
 import { useState } from 'react'
 import { useStore } from '../store/useStore'
-import MessageContent from './MessageContent'
+import MarkdownMessage from './MarkdownMessage'
 
-export default function ChatPanelContent({ onSendMessage, isThinking }) {
+export default function ChatPanelContent({ onSendMessage, isThinking, streamingAnswer }) {
   const [localMessage, setLocalMessage] = useState('')
   const messages = useStore(state => state.messages)
   const currentConversationId = useStore(state => state.currentConversationId)
@@ -188,6 +188,15 @@ export default function ChatPanelContent({ onSendMessage, isThinking }) {
 
         {/* Messages - always display if there are any */}
         {messages.map((msg, idx) => {
+          // Answers streamed in this session carry their block ends and are rendered as received
+          if (msg.role === 'assistant' && msg.blockEnds) {
+            return (
+              <div key={idx} style={bubbleStyle(msg.role)}>
+                <MarkdownMessage content={msg.content} blockEnds={msg.blockEnds} />
+              </div>
+            )
+          }
+
           // INLINE CLEANING - Remove all encoding issues
           const cleanText = (msg.content || '')
             .replace(/"""/g, '"')      // Remove triple quotes
@@ -203,26 +212,22 @@ export default function ChatPanelContent({ onSendMessage, isThinking }) {
           return (
             <div
               key={idx}
-              style={{
-                width: '100%',
-                maxWidth: '700px',
-                padding: '12px 16px',
-                margin: '8px 0',
-                borderRadius: '8px',
-                background: msg.role === 'user' ? '#3B82F6' : '#F3F4F6',
-                color: msg.role === 'user' ? 'white' : '#1F2937',
-                alignSelf: msg.role === 'user' ? 'flex-end' : 'flex-start',
-                whiteSpace: 'pre-wrap',
-                lineHeight: '1.7'
-              }}
+              style={{ ...bubbleStyle(msg.role), whiteSpace: 'pre-wrap' }}
             >
               {cleanText}
             </div>
           );
         })}
 
+        {/* The answer being streamed: finished blocks are parsed once, only the open tail re-renders */}
+        {streamingAnswer?.content && (
+          <div style={bubbleStyle('assistant')}>
+            <MarkdownMessage content={streamingAnswer.content} blockEnds={streamingAnswer.blockEnds} />
+          </div>
+        )}
+
         {/* Loading indicator */}
-        {isThinking && (
+        {isThinking && !streamingAnswer?.content && (
           <div style={{
             display: 'flex',
             gap: '8px',
@@ -332,3 +337,17 @@ export default function ChatPanelContent({ onSendMessage, isThinking }) {
     </div>
   )
 }
+
+function bubbleStyle(role) {
+  return {
+    width: '100%',
+    maxWidth: '700px',
+    padding: '12px 16px',
+    margin: '8px 0',
+    borderRadius: '8px',
+    background: role === 'user' ? '#3B82F6' : '#F3F4F6',
+    color: role === 'user' ? 'white' : '#1F2937',
+    alignSelf: role === 'user' ? 'flex-end' : 'flex-start',
+    lineHeight: '1.7'
+  }
+}
@@ -2,6 +2,7 @@ import { useState, useRef, useCallback, Suspense, lazy } from 'react'
 import { useStreamingChat } from '../hooks/useStreamingChat'
 import { useClerk } from '@clerk/clerk-react'
 import MessageContent from './MessageContent'
+import MarkdownMessage from './MarkdownMessage'
 
 const VisualBrain = lazy(() => import('./VisualBrain'))
 
@@ -21,6 +22,9 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
   const [messages, setMessages] = useState([])
   const [tokens, setTokens] = useState([])
   const [inputValue, setInputValue] = useState('')
+  // The answer being streamed, rendered block by block as block_end events arrive
+  const [streamingAnswer, setStreamingAnswer] = useState(null)
+  const blockEndsRef = useRef([])
   const visualBrainRef = useRef(null)
   const { openSignUp } = useClerk()
 
@@ -29,6 +33,21 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
   const showWarning = remainingMessages !== null && remainingMessages <= 3
   const showWelcome = messages.length === 0 && !isLoading
 
+  const startAnswer = useCallback(() => {
+    blockEndsRef.current = []
+    setStreamingAnswer({ content: '', blockEnds: [] })
+  }, [])
+
+  const appendToAnswer = useCallback((token) => {
+    setStreamingAnswer((prev) => prev && { ...prev, content: prev.content + token })
+  }, [])
+
+  // Text before `offset` is final: MarkdownMessage parses it once
+  const handleBlock = useCallback((offset) => {
+    blockEndsRef.current = [...blockEndsRef.current, offset]
+    setStreamingAnswer((prev) => prev && { ...prev, blockEnds: blockEndsRef.current })
+  }, [])
+
   /**
    * Handle send message (with limit check)
    */
@@ -51,6 +70,7 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
       created_at: new Date().toISOString(),
     }
     setMessages((prev) => [...prev, userMsg])
+    startAnswer()
 
     // Stream response from backend
     await sendMessage(
@@ -61,6 +81,7 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
         console.log('🧠 visualBrainRef.current exists?', !!visualBrainRef.current)
         console.log('🧠 addToken method exists?', !!visualBrainRef.current?.addToken)
         setTokens((prev) => [...prev, token])
+        appendToAnswer(token)
         if (visualBrainRef.current) {
           console.log('✅ Calling addToken on Visual Brain')
           visualBrainRef.current.addToken(token)
@@ -74,16 +95,20 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
           id: (Date.now() + 1).toString(),
           role: 'assistant',
           content: fullContent,
+          blockEnds: blockEndsRef.current,
           created_at: new Date().toISOString(),
         }
+        setStreamingAnswer(null)
         setMessages((prev) => [...prev, assistantMsg])
       },
       // onError: handle errors
       (err) => {
         console.error('Streaming error:', err)
-      }
+        setStreamingAnswer(null)
+      },
+      { guest: true, onBlock: handleBlock }
     )
-  }, [inputValue, isLoading, onBeforeSend, sendMessage])
+  }, [inputValue, isLoading, onBeforeSend, sendMessage, startAnswer, appendToAnswer, handleBlock])
 
   /**
    * Handle suggestion click
@@ -106,6 +131,7 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
       created_at: new Date().toISOString(),
     }
     setMessages((prev) => [...prev, userMsg])
+    startAnswer()
 
     // Stream response
     await sendMessage(
@@ -114,6 +140,7 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
         console.log('🎯 [RETRY] TOKEN RECEIVED:', token.substring(0, 50))
         console.log('🧠 [RETRY] visualBrainRef.current exists?', !!visualBrainRef.current)
         setTokens((prev) => [...prev, token])
+        appendToAnswer(token)
         if (visualBrainRef.current) {
           console.log('✅ [RETRY] Calling addToken on Visual Brain')
           visualBrainRef.current.addToken(token)
@@ -126,15 +153,19 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
           id: (Date.now() + 1).toString(),
           role: 'assistant',
           content: fullContent,
+          blockEnds: blockEndsRef.current,
           created_at: new Date().toISOString(),
         }
+        setStreamingAnswer(null)
         setMessages((prev) => [...prev, assistantMsg])
       },
       (err) => {
         console.error('Streaming error:', err)
-      }
+        setStreamingAnswer(null)
+      },
+      { guest: true, onBlock: handleBlock }
     )
-  }, [isLoading, onBeforeSend, sendMessage])
+  }, [isLoading, onBeforeSend, sendMessage, startAnswer, appendToAnswer, handleBlock])
 
   return (
     <div style={{ display: 'flex', flexDirection: 'column', height: '100vh', background: '#f7f7f7' }}>
@@ -352,15 +383,35 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
                     color: msg.role === 'user' ? 'white' : '#1F2937',
                     alignSelf: msg.role === 'user' ? 'flex-end' : 'flex-start',
                     maxWidth: '80%',
-                    whiteSpace: 'pre-wrap',
+                    whiteSpace: msg.role === 'user' ? 'pre-wrap' : 'normal',
                     lineHeight: '1.7'
                   }}
                 >
-                  {cleanText}
+                  {msg.role === 'assistant' ? (
+                    <MarkdownMessage content={msg.content || ''} blockEnds={msg.blockEnds} />
+                  ) : (
+                    cleanText
+                  )}
                 </div>
               );
             })}
 
+            {/* Answer being streamed */}
+            {streamingAnswer?.content && (
+              <div style={{
+                padding: '12px 16px',
+                marginBottom: '12px',
+                borderRadius: '8px',
+                background: '#F3F4F6',
+                color: '#1F2937',
+                alignSelf: 'flex-start',
+                maxWidth: '80%',
+                lineHeight: '1.7'
+              }}>
+                <MarkdownMessage content={streamingAnswer.content} blockEnds={streamingAnswer.blockEnds} />
+              </div>
+            )}
+
             {/* Error message */}
             {error && (
               <div style={{
@@ -375,7 +426,7 @@ export default function GuestChatLayout({ onBeforeSend, remainingMessages }) {
             )}
 
             {/* Loading indicator */}
-            {isLoading && (
+            {isLoading && !streamingAnswer?.content && (
               <div style={{
                 padding: '12px 16px',
                 marginBottom: '12px',
@@ -6,6 +6,7 @@ import ChatPanelContent from './ChatPanelContent'
 import WorkspaceSidebar from './WorkspaceSidebar'
 import { useAppInitialization } from '../hooks/useAppInitialization'
 import { useStore } from '../store/useStore'
+import { authHeaders } from '../lib/authToken'
 // import './MainLayout.css' // ❌ DISABLED - Using inline styles only
 
 // Use Vercel Serverless Function in production, local backend in development
@@ -15,7 +16,9 @@ export default function MainLayout() {
   const { isInitialized, user } = useAppInitialization()
   const [isThinking, setIsThinking] = useState(false)
   const [tokens, setTokens] = useState([])
-  const [response, setResponse] = useState('')
+  // The answer being streamed, rendered block by block as block_end events arrive
+  const [streamingAnswer, setStreamingAnswer] = useState(null)
+  const blockEndsRef = useRef([])
   const [message, setMessage] = useState('')
   const [workspaceSidebarOpen, setWorkspaceSidebarOpen] = useState(false)
   const [conversationSidebarOpen, setConversationSidebarOpen] = useState(true)  // Sidebar visible by default
@@ -91,7 +94,8 @@ export default function MainLayout() {
 
     try {
       setIsThinking(true)
-      setResponse('')
+      blockEndsRef.current = []
+      setStreamingAnswer({ content: '', blockEnds: [] })
       setTokens([])
 
       // 1. Add user message to store IMMEDIATELY
@@ -100,12 +104,20 @@ export default function MainLayout() {
       console.log('✅ User message added to store')
 
       // 2. Call API and stream response
+      // The answer is stored under this id; the backend's concept graph records the same one
+      const assistantMessageId = crypto.randomUUID()
       const res = await fetch(`${API_URL}/chat`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...(await authHeaders()),
         },
-        body: JSON.stringify({ message: messageText }),
+        body: JSON.stringify({
+          message: messageText,
+          conversation_id: finalConversationId,
+          workspace_id: currentWorkspaceId,
+          message_id: assistantMessageId,
+        }),
       })
 
       if (!res.ok) {
@@ -115,8 +127,25 @@ export default function MainLayout() {
       const reader = res.body.getReader()
       const decoder = new TextDecoder()
       let buffer = ''
+      let eventType = 'delta'
       let fullResponse = ''
 
+      // Delta data is a JSON string; raw text is kept if it does not parse
+      const appendText = (data) => {
+        let text = data
+        try {
+          text = JSON.parse(data)
+        } catch (e) {
+          // Keep the raw text
+        }
+        if (typeof text !== 'string' || !text) return
+        fullResponse += text
+        setStreamingAnswer((prev) => prev && { ...prev, content: prev.content + text })
+        setTokens((prev) => [...prev, text])
+        // Activate Visual Brain nodes for each token
+        visualBrainRef.current?.addToken(text)
+      }
+
       while (true) {
         const { done, value } = await reader.read()
         if (done) break
@@ -127,44 +156,42 @@ export default function MainLayout() {
 
         for (let i = 0; i < lines.length - 1; i++) {
           const line = lines[i]
-          if (line.startsWith('data: ')) {
-            const text = line.slice(6)
-            if (text) {
-              fullResponse += text
-              setResponse((prev) => prev + text)
-              setTokens((prev) => [...prev, text])
-              // Activate Visual Brain nodes for each token
-              console.log('🔵 About to call addToken with:', text)
-              console.log('🔵 visualBrainRef.current exists?', !!visualBrainRef.current)
-              console.log('🔵 visualBrainRef.current.addToken exists?', !!visualBrainRef.current?.addToken)
-              visualBrainRef.current?.addToken(text)
+          if (line.startsWith('event: ')) {
+            eventType = line.slice(7)
+          } else if (line.startsWith('data: ') && eventType === 'block_end') {
+            // Text before the block's end is final: MarkdownMessage parses it once
+            eventType = 'delta'
+            try {
+              const { rest } = JSON.parse(line.slice(6))
+              blockEndsRef.current = [...blockEndsRef.current, fullResponse.length - rest.length]
+              setStreamingAnswer((prev) => prev && { ...prev, blockEnds: blockEndsRef.current })
+            } catch (e) {
+              // Only a rendering hint; the text itself is unaffected
             }
+          } else if (line.startsWith('data: ') && eventType !== 'delta') {
+            // usage/done/error events are not answer text
+            eventType = 'delta'
+          } else if (line.startsWith('data: ')) {
+            appendText(line.slice(6))
           }
         }
       }
 
-      if (buffer.startsWith('data: ')) {
-        const text = buffer.slice(6)
-        if (text) {
-          fullResponse += text
-          setResponse((prev) => prev + text)
-          setTokens((prev) => [...prev, text])
-          // Activate Visual Brain nodes for remaining buffer
-          visualBrainRef.current?.addToken(text)
-        }
+      if (buffer.startsWith('data: ') && eventType === 'delta') {
+        appendText(buffer.slice(6))
       }
 
       // 3. Add assistant response to store
       console.log('📝 Adding assistant response to store...')
-      await addMessage(finalConversationId, 'assistant', fullResponse)
+      await addMessage(finalConversationId, 'assistant', fullResponse, assistantMessageId, blockEndsRef.current)
       console.log('✅ Assistant response added to store')
 
     } catch (error) {
       console.error('❌ Error:', error)
-      setResponse(`Error: ${error.message}`)
       // Add error message to store
       await addMessage(finalConversationId, 'assistant', `Error: ${error.message}`)
     } finally {
+      setStreamingAnswer(null)
       setIsThinking(false)
     }
   }
@@ -187,7 +214,6 @@ export default function MainLayout() {
     if (currentWorkspaceId && user) {
       await createConversation(currentWorkspaceId, user.id, 'Nouvelle conversation')
       setMessage('')
-      setResponse('')
       setTokens([])
       // Don't auto-close sidebar on desktop - only on mobile
       if (window.innerWidth < 768) {
@@ -200,7 +226,6 @@ export default function MainLayout() {
     console.log('🔄 Selecting conversation:', conversationId)
     setCurrentConversation(conversationId)
     setMessage('')
-    setResponse('')
     setTokens([])
 
     // Load messages for this conversation
@@ -536,7 +561,7 @@ export default function MainLayout() {
         }}>
           <ChatPanelContent
             message={message}
-            response={response}
+            streamingAnswer={streamingAnswer}
             isThinking={isThinking}
             onSendMessage={handleSendMessage}
           />
@@ -587,6 +612,7 @@ export default function MainLayout() {
             ref={visualBrainRef}
             isThinking={isThinking}
             tokens={tokens}
+            workspaceId={currentWorkspaceId}
             onNodeClick={(node) => console.log('Node clicked:', node)}
           />
         </div>
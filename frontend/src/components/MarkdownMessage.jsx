@@ -1,96 +1,116 @@
-import React from 'react';
+import React, { memo } from 'react';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import CopyButton from './CopyButton';
+import { linkDefinitions, splitBlocks } from '../utils/markdownBlocks';
 import './MarkdownMessage.css';
 
-const MarkdownMessage = ({ content }) => {
-  return (
-    <ReactMarkdown
-      remarkPlugins={[remarkGfm]}
-      components={{
-        // Code blocks avec syntax highlighting
-        code({ inline, className, children, ...props }) {
-          const match = /language-(\w+)/.exec(className || '');
-          const language = match ? match[1] : '';
-          const codeContent = String(children).replace(/\n$/, '');
+const remarkPlugins = [remarkGfm];
+
+const components = {
+  // Code blocks avec syntax highlighting
+  code({ inline, className, children, ...props }) {
+    const match = /language-(\w+)/.exec(className || '');
+    const language = match ? match[1] : '';
+    const codeContent = String(children).replace(/\n$/, '');
 
-          return !inline && language ? (
-            <div className="code-block-wrapper">
-              <div className="code-block-header">
-                <span className="code-language">{language}</span>
-                <CopyButton
-                  text={codeContent}
-                  label="Copy"
-                  variant="subtle"
-                  feedbackDuration={1500}
-                />
-              </div>
-              <pre className="code-block-pre">
-                <code className="code-block-code" {...props}>
-                  {codeContent}
-                </code>
-              </pre>
-            </div>
-          ) : (
-            <code className="inline-code" {...props}>
-              {children}
-            </code>
-          );
-        },
+    return !inline && language ? (
+      <div className="code-block-wrapper">
+        <div className="code-block-header">
+          <span className="code-language">{language}</span>
+          <CopyButton
+            text={codeContent}
+            label="Copy"
+            variant="subtle"
+            feedbackDuration={1500}
+          />
+        </div>
+        <pre className="code-block-pre">
+          <code className="code-block-code" {...props}>
+            {codeContent}
+          </code>
+        </pre>
+      </div>
+    ) : (
+      <code className="inline-code" {...props}>
+        {children}
+      </code>
+    );
+  },
 
-        // Liens cliquables
-        a({ children, href, ...props }) {
-          return (
-            <a
-              href={href}
-              target="_blank"
-              rel="noopener noreferrer"
-              className="markdown-link"
-              {...props}
-            >
-              {children}
-            </a>
-          );
-        },
+  // Liens cliquables
+  a({ children, href, ...props }) {
+    return (
+      <a
+        href={href}
+        target="_blank"
+        rel="noopener noreferrer"
+        className="markdown-link"
+        {...props}
+      >
+        {children}
+      </a>
+    );
+  },
 
-        // Paragraphes
-        p({ children, ...props }) {
-          return <p className="markdown-paragraph" {...props}>{children}</p>;
-        },
+  // Paragraphes
+  p({ children, ...props }) {
+    return <p className="markdown-paragraph" {...props}>{children}</p>;
+  },
 
-        // Headers
-        h1({ children, ...props }) {
-          return <h1 className="markdown-h1" {...props}>{children}</h1>;
-        },
-        h2({ children, ...props }) {
-          return <h2 className="markdown-h2" {...props}>{children}</h2>;
-        },
-        h3({ children, ...props }) {
-          return <h3 className="markdown-h3" {...props}>{children}</h3>;
-        },
+  // Headers
+  h1({ children, ...props }) {
+    return <h1 className="markdown-h1" {...props}>{children}</h1>;
+  },
+  h2({ children, ...props }) {
+    return <h2 className="markdown-h2" {...props}>{children}</h2>;
+  },
+  h3({ children, ...props }) {
+    return <h3 className="markdown-h3" {...props}>{children}</h3>;
+  },
 
-        // Listes
-        ul({ children, ...props }) {
-          return <ul className="markdown-list" {...props}>{children}</ul>;
-        },
-        ol({ children, ...props }) {
-          return <ol className="markdown-list numbered" {...props}>{children}</ol>;
-        },
+  // Listes
+  ul({ children, ...props }) {
+    return <ul className="markdown-list" {...props}>{children}</ul>;
+  },
+  ol({ children, ...props }) {
+    return <ol className="markdown-list numbered" {...props}>{children}</ol>;
+  },
 
-        // Blockquotes
-        blockquote({ children, ...props }) {
-          return <blockquote className="markdown-blockquote" {...props}>{children}</blockquote>;
-        },
+  // Blockquotes
+  blockquote({ children, ...props }) {
+    return <blockquote className="markdown-blockquote" {...props}>{children}</blockquote>;
+  },
+
+  // Tables
+  table({ children, ...props }) {
+    return <table className="markdown-table" {...props}>{children}</table>;
+  },
+};
 
-        // Tables
-        table({ children, ...props }) {
-          return <table className="markdown-table" {...props}>{children}</table>;
-        },
-      }}
-    >
-      {content}
-    </ReactMarkdown>
+// One finished block: parsed once, skipped by later renders of the same message.
+// `definitions` are the message's link definitions, so references resolve across blocks
+const MarkdownBlock = memo(({ text, definitions }) => (
+  <ReactMarkdown remarkPlugins={remarkPlugins} components={components}>
+    {definitions ? `${text}\n\n${definitions}` : text}
+  </ReactMarkdown>
+));
+
+MarkdownBlock.displayName = 'MarkdownBlock';
+
+/**
+ * `blockEnds` are offsets into `content` where a markdown block ends
+ * (the stream's block_end events). While an answer streams, only the
+ * text after the last offset is parsed again on each chunk.
+ */
+const MarkdownMessage = ({ content, blockEnds = [] }) => {
+  const definitions = blockEnds.length > 0 ? linkDefinitions(content) : '';
+  return (
+    <>
+      {splitBlocks(content, blockEnds).map(({ start, text }) => (
+        <MarkdownBlock key={start} text={text} definitions={definitions} />
+      ))}
+    </>
   );
 };
 
@@ -23,7 +23,7 @@ const MessageWithCopy = memo(({ message }) => {
     <div className={`message-wrapper ${messageRole}`}>
       <div className={`message ${messageRole}`}>
         {messageRole === 'assistant' ? (
-          <MarkdownMessage content={messageContent} />
+          <MarkdownMessage content={messageContent} blockEnds={message.blockEnds} />
         ) : (
           messageContent
         )}
@@ -78,14 +78,15 @@ const MessageWithCopy = memo(({ message }) => {
     </div>
   );
 }, (prevProps, nextProps) => {
-  // Custom comparison: only re-render if message content/role changed
+  // Custom comparison: only re-render if message content/role/block ends changed
   const prevRole = prevProps.message.role
   const nextRole = nextProps.message.role
   const prevContent = prevProps.message.content
   const nextContent = nextProps.message.content
 
   // Return true if props are equal (skip re-render), false to re-render
-  return prevRole === nextRole && prevContent === nextContent
+  return prevRole === nextRole && prevContent === nextContent &&
+    prevProps.message.blockEnds === nextProps.message.blockEnds
 });
 
 MessageWithCopy.displayName = 'MessageWithCopy'
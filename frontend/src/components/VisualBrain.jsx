@@ -19,11 +19,13 @@ import {
   BackSide,
   LineBasicMaterial,
   Line,
+  LineSegments,
   Color,
   Fog,
   Raycaster
 } from 'three';
 import { OrbitControls } from 'three/examples/jsm/controls/OrbitControls';
+import { graphSyncService } from '../services/graphSyncService';
 
 // Apple-grade easing functions for fluid animations
 const EASING = {
@@ -151,6 +153,8 @@ const VisualBrain = forwardRef((props, ref) => {
   const edgeObjectsRef = useRef([]);
   const particlesRef = useRef(null);
   const animationIdRef = useRef(null);
+  const workspaceGraphRef = useRef(null);
+  const { workspaceId } = props;
 
   // Seeded random for consistent positions
   const seededRandom = (seed) => {
@@ -356,6 +360,78 @@ const VisualBrain = forwardRef((props, ref) => {
     };
   }, []);
 
+  // Show the workspace concept graph when there is one: the binary columns
+  // (utils/graphBinary.js) become the GPU buffers as is, and the edge pairs
+  // index the same position buffer. The demo brain is hidden meanwhile.
+  useEffect(() => {
+    if (!workspaceId || !sceneRef.current) return;
+    let cancelled = false;
+
+    graphSyncService.fetchBinary(workspaceId)
+      .then(graph => {
+        if (cancelled || graph.nodeCount === 0 || !sceneRef.current) return;
+        removeWorkspaceGraph();
+
+        const position = new BufferAttribute(graph.positions, 3);
+        const nodesGeo = new BufferGeometry();
+        nodesGeo.setAttribute('position', position);
+        nodesGeo.setAttribute('color', new BufferAttribute(graph.colors, 3, true));
+        const nodes = new Points(nodesGeo, new PointsMaterial({
+          size: 0.5,
+          vertexColors: true,
+          transparent: true,
+          opacity: 0.9
+        }));
+
+        const edgesGeo = new BufferGeometry();
+        edgesGeo.setAttribute('position', position);
+        edgesGeo.setIndex(new BufferAttribute(graph.edges, 1));
+        const edges = new LineSegments(edgesGeo, new LineBasicMaterial({
+          color: 0x94a3b8,
+          transparent: true,
+          opacity: 0.35
+        }));
+
+        // Layout coordinates have no fixed scale: fit the graph to the demo brain's size
+        nodesGeo.computeBoundingSphere();
+        const { center, radius } = nodesGeo.boundingSphere;
+        const scale = radius > 0 ? 12 / radius : 1;
+        for (const object of [nodes, edges]) {
+          object.scale.setScalar(scale);
+          object.position.copy(center).multiplyScalar(-scale);
+          sceneRef.current.add(object);
+        }
+        workspaceGraphRef.current = [nodes, edges];
+        setDemoBrainVisible(false);
+      })
+      .catch(error => console.warn('⚠️ Workspace graph unavailable:', error.message));
+
+    return () => {
+      cancelled = true;
+      removeWorkspaceGraph();
+      setDemoBrainVisible(true);
+    };
+  }, [workspaceId]);
+
+  const removeWorkspaceGraph = () => {
+    for (const object of workspaceGraphRef.current || []) {
+      sceneRef.current?.remove(object);
+      object.geometry.dispose();
+      object.material.dispose();
+    }
+    workspaceGraphRef.current = null;
+  };
+
+  const setDemoBrainVisible = (visible) => {
+    nodeObjectsRef.current.forEach(nodeObj => {
+      nodeObj.visible = visible;
+      if (nodeObj.userData.halo) nodeObj.userData.halo.visible = visible;
+    });
+    edgeObjectsRef.current.forEach(edge => {
+      edge.visible = visible;
+    });
+  };
+
   const createNode = (node, scene) => {
     const pos = nodePositions[node.id];
     const position = new Vector3(pos.x, pos.y, pos.z);
@@ -1,13 +1,16 @@
 import { useCallback, useRef, useState } from 'react'
+import { authHeaders } from '../lib/authToken'
 
 /**
  * Custom hook for handling streaming chat API calls with error recovery
  * Provides:
  * - AbortController for "Stop generating" functionality
  * - Retry logic with exponential backoff
- * - Streaming response parsing (Server-Sent Events format)
+ * - Streaming response parsing (Server-Sent Events with typed delta/usage/done/error events)
  * - Error recovery and fallback
  * - Loading state management
+ * - Server-side conversation history (conversation_id round-trip)
+ * - Retries resume a dropped stream with Last-Event-ID instead of regenerating
  *
  * @param {string} apiUrl - Base API URL (e.g., 'http://localhost:8001')
  * @param {number} maxRetries - Maximum number of retries (default: 2)
@@ -19,6 +22,8 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
   const [isAborted, setIsAborted] = useState(false)
   const abortControllerRef = useRef(null)
   const retriesRef = useRef(0)
+  const conversationIdRef = useRef(null)
+  const streamIdRef = useRef(null)
 
   /**
    * Send message and stream response
@@ -28,10 +33,20 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
    * @param {Function} onChunk - Callback called for each streamed token
    * @param {Function} onComplete - Callback when streaming completes
    * @param {Function} onError - Callback for errors
+   * @param {Object} options - Optional settings
+   * @param {string} options.conversationId - Server conversation to continue
+   *   (defaults to the one returned by the previous response)
+   * @param {string} options.tier - Model tier to ask for ('fast', 'standard', 'deep');
+   *   only honoured for signed-in users entitled to it
+   * @param {boolean} options.guest - Guest-mode request (short ones go to the fast model)
+   * @param {string} options.workspaceId - Workspace the conversation belongs to
+   * @param {Function} options.onBlock - Called with (offset, kind) when a markdown
+   *   block is complete: content before `offset` will not change and can be
+   *   rendered once (see MarkdownMessage's `blockEnds`)
    * @returns {Promise<void>}
    */
   const sendMessage = useCallback(
-    async (message, onChunk, onComplete, onError) => {
+    async (message, onChunk, onComplete, onError, { conversationId, tier, guest, workspaceId, onBlock } = {}) => {
       if (!message.trim()) {
         setError('Message cannot be empty')
         return
@@ -46,26 +61,61 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
       // Create new AbortController for this request
       abortControllerRef.current = new AbortController()
 
+      // Kept across retries so a reconnect continues the same answer
+      let fullContent = ''
+      let streamId = null
+      let lastEventId = null
+
       const attemptRequest = async (retryCount = 0) => {
         try {
           const response = await fetch(`${apiUrl}/chat`, {
             method: 'POST',
             headers: {
               'Content-Type': 'application/json',
+              Accept: 'text/event-stream',
+              ...(await authHeaders()),
+              ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}),
             },
-            body: JSON.stringify({ message }),
+            body: JSON.stringify({
+              message,
+              conversation_id: conversationId ?? conversationIdRef.current ?? undefined,
+              tier,
+              guest,
+              workspace_id: workspaceId,
+            }),
             signal: abortControllerRef.current.signal,
           })
 
           if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`)
+            const httpError = new Error(`HTTP ${response.status}: ${response.statusText}`)
+            // 429 from admission control: wait as long as the server asks
+            const retryAfter = Number(response.headers.get('Retry-After'))
+            if (response.status === 429 && retryAfter > 0) {
+              httpError.retryAfterMs = retryAfter * 1000
+            }
+            throw httpError
+          }
+
+          // The backend keeps the history; only the id travels with each request
+          conversationIdRef.current =
+            response.headers.get('X-Conversation-Id') || conversationIdRef.current
+
+          // A different stream id means the server could not resume and started over
+          const responseStreamId = response.headers.get('X-Stream-Id')
+          if (responseStreamId !== streamId) {
+            fullContent = ''
+            lastEventId = null
           }
+          streamId = responseStreamId
+          streamIdRef.current = responseStreamId
 
           // Stream response
           const reader = response.body.getReader()
           const decoder = new TextDecoder()
           let buffer = ''
-          let fullContent = ''
+          // An event's id only counts once its data line has been handled
+          let pendingEventId = null
+          let pendingEventType = null
 
           try {
             while (true) {
@@ -87,9 +137,45 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
               // Process complete lines
               for (let i = 0; i < lines.length - 1; i++) {
                 const line = lines[i]
-                if (line.startsWith('data: ')) {
+                if (line.startsWith('id: ')) {
+                  pendingEventId = line.slice(4)
+                } else if (line.startsWith('event: ')) {
+                  pendingEventType = line.slice(7)
+                } else if (line.startsWith('data: ') && pendingEventType === 'error') {
+                  // The answer failed upstream; resuming the stream would replay the same error
+                  let message = 'Streaming failed'
+                  try {
+                    message = JSON.parse(line.slice(6)).message || message
+                  } catch (e) {
+                    // Keep the generic message
+                  }
+                  const serverError = new Error(message)
+                  serverError.fromServer = true
+                  throw serverError
+                } else if (line.startsWith('data: ') && pendingEventType === 'block_end') {
+                  // `rest` is the text already received after the finished block
+                  pendingEventType = null
+                  try {
+                    const { block, rest } = JSON.parse(line.slice(6))
+                    onBlock?.(fullContent.length - rest.length, block)
+                  } catch (e) {
+                    // Only a rendering hint; the text itself is unaffected
+                  }
+                  if (pendingEventId) {
+                    lastEventId = pendingEventId
+                    pendingEventId = null
+                  }
+                } else if (line.startsWith('data: ') && pendingEventType && pendingEventType !== 'delta') {
+                  // usage and done carry metadata only
+                  pendingEventType = null
+                  if (pendingEventId) {
+                    lastEventId = pendingEventId
+                    pendingEventId = null
+                  }
+                } else if (line.startsWith('data: ')) {
                   // Parse JSON to get the properly decoded text
                   const jsonStr = line.slice(6)
+                  pendingEventType = null
                   try {
                     const text = JSON.parse(jsonStr)
                     // DEBUG: Log SSE parsing details
@@ -116,6 +202,10 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
                       onChunk?.(text)
                     }
                   }
+                  if (pendingEventId) {
+                    lastEventId = pendingEventId
+                    pendingEventId = null
+                  }
                 }
               }
             }
@@ -141,6 +231,7 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
             }
 
             // Success
+            streamIdRef.current = null
             setIsLoading(false)
             onComplete?.(fullContent)
           } catch (streamError) {
@@ -163,9 +254,9 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
             return
           }
 
-          if (retryCount < maxRetries) {
-            // Exponential backoff: 1s, 2s, 4s
-            const delayMs = Math.pow(2, retryCount) * 1000
+          if (retryCount < maxRetries && !err.fromServer) {
+            // Exponential backoff: 1s, 2s, 4s (or the server's Retry-After)
+            const delayMs = err.retryAfterMs ?? Math.pow(2, retryCount) * 1000
             console.warn(
               `Streaming failed: ${err.message}. Retrying in ${delayMs}ms... (${retryCount + 1}/${maxRetries})`
             )
@@ -195,7 +286,15 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
       abortControllerRef.current.abort()
       setIsLoading(false)
     }
-  }, [])
+    // Tell the server to stop generating now rather than after its disconnect grace period
+    if (streamIdRef.current) {
+      fetch(`${apiUrl}/chat/streams/${streamIdRef.current}`, {
+        method: 'DELETE',
+        keepalive: true,
+      }).catch(() => {})
+      streamIdRef.current = null
+    }
+  }, [apiUrl])
 
   /**
    * Clear error state
@@ -204,6 +303,13 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
     setError(null)
   }, [])
 
+  /**
+   * Start a fresh server-side conversation on the next message
+   */
+  const resetConversation = useCallback(() => {
+    conversationIdRef.current = null
+  }, [])
+
   return {
     // State
     isLoading,
@@ -214,6 +320,7 @@ export function useStreamingChat(apiUrl = 'http://localhost:8001', maxRetries =
     sendMessage,
     abort,
     clearError,
+    resetConversation,
   }
 }
 
@@ -246,6 +353,8 @@ export function useSimpleStreaming(apiUrl = 'http://localhost:8001') {
         const decoder = new TextDecoder()
         let buffer = ''
         let content = ''
+        // Untyped data lines are text, as before typed events
+        let eventType = 'delta'
 
         while (true) {
           const { done, value } = await reader.read()
@@ -256,7 +365,13 @@ export function useSimpleStreaming(apiUrl = 'http://localhost:8001') {
           buffer = lines[lines.length - 1]
 
           for (let i = 0; i < lines.length - 1; i++) {
-            if (lines[i].startsWith('data: ')) {
+            if (lines[i].startsWith('event: ')) {
+              eventType = lines[i].slice(7)
+            } else if (lines[i].startsWith('data: ') && eventType === 'error') {
+              throw new Error(JSON.parse(lines[i].slice(6)).message)
+            } else if (lines[i].startsWith('data: ') && eventType !== 'delta') {
+              eventType = 'delta'
+            } else if (lines[i].startsWith('data: ')) {
               // Parse JSON to get the properly decoded text
               const jsonStr = lines[i].slice(6)
               try {
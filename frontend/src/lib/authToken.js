@@ -0,0 +1,21 @@
+/**
+ * The signed-in user's Supabase access token, from Clerk's "supabase" JWT
+ * template, or null for guests. The backend checks it before honouring a
+ * model tier or serving a workspace's data.
+ */
+export async function getAuthToken() {
+  try {
+    return (await window.Clerk?.session?.getToken({ template: 'supabase' })) ?? null
+  } catch (error) {
+    console.warn('⚠️ Could not get an access token:', error)
+    return null
+  }
+}
+
+/**
+ * `Authorization` header for backend requests, empty for guests
+ */
+export async function authHeaders() {
+  const token = await getAuthToken()
+  return token ? { Authorization: `Bearer ${token}` } : {}
+}
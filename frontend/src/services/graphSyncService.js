@@ -0,0 +1,34 @@
+import { GRAPH_BINARY_MEDIA_TYPE, decodeGraphBinary } from '../utils/graphBinary';
+import { authHeaders } from '../lib/authToken';
+
+const API_URL = import.meta.env.VITE_API_URL || (import.meta.env.PROD ? '/api' : 'http://localhost:8001');
+
+// ============================================
+// GRAPH SYNC (backend)
+// ============================================
+
+export const graphSyncService = {
+  // Nodes and edges changed since `since` (full snapshot when since is null).
+  // The backend only serves the workspace's owner, so the user's token goes along
+  async fetchChanges(workspaceId, since = null) {
+    const query = since === null || since === undefined ? '' : `?since=${since}`;
+    const response = await fetch(`${API_URL}/workspaces/${workspaceId}/graph${query}`, {
+      headers: await authHeaders(),
+    });
+    if (!response.ok) {
+      throw new Error(`Graph sync failed: ${response.status}`);
+    }
+    return response.json();
+  },
+
+  // Whole graph as GPU-ready columns (see utils/graphBinary.js)
+  async fetchBinary(workspaceId) {
+    const response = await fetch(`${API_URL}/workspaces/${workspaceId}/graph`, {
+      headers: { Accept: GRAPH_BINARY_MEDIA_TYPE, ...(await authHeaders()) },
+    });
+    if (!response.ok) {
+      throw new Error(`Graph download failed: ${response.status}`);
+    }
+    return decodeGraphBinary(await response.arrayBuffer());
+  },
+};
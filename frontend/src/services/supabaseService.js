@@ -138,11 +138,12 @@ export const messagesService = {
     return data;
   },
 
-  // Ajouter un message
-  async create(conversationId, role, content) {
+  // Ajouter un message (id optionnel, sinon généré par la base)
+  async create(conversationId, role, content, id) {
     const { data, error } = await supabase
       .from('messages')
       .insert({
+        ...(id ? { id } : {}),
         conversation_id: conversationId,
         role,
         content,
@@ -6,6 +6,8 @@ import {
   graphNodesService,
   graphEdgesService,
 } from '../services/supabaseService';
+import { graphSyncService } from '../services/graphSyncService';
+import { applyGraphDelta, loadCachedGraph, saveCachedGraph } from '../utils/graphSync';
 
 export const useStore = create((set, get) => ({
   // ============================================
@@ -229,9 +231,11 @@ export const useStore = create((set, get) => ({
     }
   },
 
-  addMessage: async (conversationId, role, content) => {
+  // `blockEnds` (block_end offsets of a streamed answer) stay local, for rendering
+  addMessage: async (conversationId, role, content, id, blockEnds) => {
     try {
-      const newMessage = await messagesService.create(conversationId, role, content);
+      const created = await messagesService.create(conversationId, role, content, id);
+      const newMessage = blockEnds ? { ...created, blockEnds } : created;
 
       // Use updater function to get current state without race conditions
       const state = get();
@@ -259,10 +263,11 @@ export const useStore = create((set, get) => ({
       // FALLBACK: Créer un message local si Supabase échoue
       console.warn('⚠️ Supabase failed, creating local fallback message...');
       const fallbackMessage = {
-        id: `local-msg-${Date.now()}`,
+        id: id || `local-msg-${Date.now()}`,
         conversation_id: conversationId,
         role: role,
         content: content,
+        blockEnds,
         created_at: new Date().toISOString(),
       };
 
@@ -292,15 +297,31 @@ export const useStore = create((set, get) => ({
   // GRAPH ACTIONS
   // ============================================
   loadGraph: async (workspaceId) => {
+    // Show the graph from the last visit right away, then fetch only what changed
+    const cached = loadCachedGraph(workspaceId);
+    if (cached) {
+      set({ graphNodes: cached.nodes, graphEdges: cached.edges });
+    }
     try {
-      const [nodes, edges] = await Promise.all([
-        graphNodesService.fetchByWorkspace(workspaceId),
-        graphEdgesService.fetchByWorkspace(workspaceId),
-      ]);
-      set({ graphNodes: nodes, graphEdges: edges });
-    } catch (error) {
-      console.error('Error loading graph:', error);
-      set({ error: error.message });
+      const delta = await graphSyncService.fetchChanges(workspaceId, cached?.version);
+      const graph = applyGraphDelta(cached, delta);
+      if (graph.changed) {
+        set({ graphNodes: graph.nodes, graphEdges: graph.edges });
+        saveCachedGraph(workspaceId, graph);
+      }
+    } catch (syncError) {
+      // Backend unreachable or refused (e.g. no session): full read from Supabase, under RLS
+      console.warn('⚠️ Graph sync unavailable, loading full graph:', syncError.message);
+      try {
+        const [nodes, edges] = await Promise.all([
+          graphNodesService.fetchByWorkspace(workspaceId),
+          graphEdgesService.fetchByWorkspace(workspaceId),
+        ]);
+        set({ graphNodes: nodes, graphEdges: edges });
+      } catch (error) {
+        console.error('Error loading graph:', error);
+        set({ error: error.message });
+      }
     }
   },
 
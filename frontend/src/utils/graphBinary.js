@@ -0,0 +1,74 @@
+/**
+ * Decoder for the columnar binary graph format (backend/graph_binary.py)
+ * Columns are typed-array views on the response buffer: they can be given
+ * to THREE.BufferAttribute as is, with no per-node parsing.
+ */
+
+export const GRAPH_BINARY_MEDIA_TYPE = 'application/vnd.zyron.graph';
+export const NODE_TYPES = ['concept', 'topic', 'question'];
+
+const MAGIC = 'ZGB1';
+const FORMAT_VERSION = 1;
+const HEADER_BYTES = 32;
+
+/**
+ * Decode a graph received as an ArrayBuffer
+ *
+ * @param {ArrayBuffer} buffer - Response body (e.g. from response.arrayBuffer())
+ * @returns {Object} Column views: positions (Float32Array, xyz), sizes, importance,
+ *   edges (Uint32Array, source/target index pairs), weights, ids (16 bytes per node),
+ *   colors (Uint8Array, rgb), types (Uint8Array, NODE_TYPES index); labels and
+ *   nodeId(i) for the index to label/UUID side table
+ */
+export function decodeGraphBinary(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== MAGIC || view.getUint32(4, true) !== FORMAT_VERSION) {
+    throw new Error('Not a ZGB1 graph');
+  }
+  const nodeCount = view.getUint32(8, true);
+  const edgeCount = view.getUint32(12, true);
+  const version = view.getFloat64(16, true);
+  const sideTableBytes = view.getUint32(24, true);
+
+  let offset = HEADER_BYTES;
+  const column = (ArrayType, length) => {
+    const array = new ArrayType(buffer, offset, length);
+    offset += array.byteLength;
+    return array;
+  };
+
+  const graph = {
+    version,
+    nodeCount,
+    edgeCount,
+    positions: column(Float32Array, nodeCount * 3),
+    sizes: column(Float32Array, nodeCount),
+    importance: column(Float32Array, nodeCount),
+    edges: column(Uint32Array, edgeCount * 2),
+    weights: column(Float32Array, edgeCount),
+    ids: column(Uint8Array, nodeCount * 16),
+    colors: column(Uint8Array, nodeCount * 3),
+    types: column(Uint8Array, nodeCount),
+  };
+
+  // Labels are only decoded when first asked for
+  const sideTable = new Uint8Array(buffer, offset, sideTableBytes);
+  let labels = null;
+  Object.defineProperty(graph, 'labels', {
+    get() {
+      if (labels === null) {
+        labels = JSON.parse(new TextDecoder().decode(sideTable)).labels;
+      }
+      return labels;
+    },
+  });
+
+  // UUID string of node i
+  graph.nodeId = (i) => {
+    const hex = Array.from(graph.ids.subarray(i * 16, i * 16 + 16), b => b.toString(16).padStart(2, '0')).join('');
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+  };
+
+  return graph;
+}
@@ -0,0 +1,52 @@
+import { decodeGraphBinary } from './graphBinary';
+
+// Two nodes linked by one edge, laid out the way backend/graph_binary.py writes them
+function encodeTwoNodes() {
+  const side = new TextEncoder().encode(JSON.stringify({ labels: ['Alpha', 'Beta'] }));
+  const buffer = new ArrayBuffer(32 + 24 + 8 + 8 + 8 + 4 + 32 + 6 + 2 + side.length);
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  bytes.set(new TextEncoder().encode('ZGB1'), 0);
+  view.setUint32(4, 1, true);
+  view.setUint32(8, 2, true);
+  view.setUint32(12, 1, true);
+  view.setFloat64(16, 7, true);
+  view.setUint32(24, side.length, true);
+
+  const floats = (offset, values) => values.forEach((v, i) => view.setFloat32(offset + 4 * i, v, true));
+  floats(32, [1, 2, 3, 4, 5, 6]);
+  floats(56, [1.5, 1]);
+  floats(64, [0.75, 0.5]);
+  view.setUint32(72, 0, true);
+  view.setUint32(76, 1, true);
+  floats(80, [2]);
+  bytes.fill(0x11, 84, 100);
+  bytes.fill(0x22, 100, 116);
+  bytes.set([255, 128, 0, 59, 130, 246], 116);
+  bytes.set([1, 0], 122);
+  bytes.set(side, 124);
+  return buffer;
+}
+
+describe('decodeGraphBinary', () => {
+  it('should expose every column as a typed-array view', () => {
+    const graph = decodeGraphBinary(encodeTwoNodes());
+    expect(graph.version).toBe(7);
+    expect(Array.from(graph.positions)).toEqual([1, 2, 3, 4, 5, 6]);
+    expect(Array.from(graph.sizes)).toEqual([1.5, 1]);
+    expect(Array.from(graph.edges)).toEqual([0, 1]);
+    expect(Array.from(graph.weights)).toEqual([2]);
+    expect(Array.from(graph.colors)).toEqual([255, 128, 0, 59, 130, 246]);
+    expect(Array.from(graph.types)).toEqual([1, 0]);
+  });
+
+  it('should decode labels and node ids from the side table', () => {
+    const graph = decodeGraphBinary(encodeTwoNodes());
+    expect(graph.labels).toEqual(['Alpha', 'Beta']);
+    expect(graph.nodeId(1)).toBe('22222222-2222-2222-2222-222222222222');
+  });
+
+  it('should refuse other data', () => {
+    expect(() => decodeGraphBinary(new ArrayBuffer(32))).toThrow('Not a ZGB1 graph');
+  });
+});
@@ -0,0 +1,71 @@
+/**
+ * Workspace graph delta sync helpers
+ * The backend answers GET /workspaces/{id}/graph?since=<version> with only the
+ * rows changed since that version; these keep a local copy up to date.
+ */
+
+const CACHE_PREFIX = 'zyron_graph_';
+
+/**
+ * Apply a graph delta to a graph held locally
+ *
+ * @param {{version: number, nodes: Array, edges: Array} | null} graph - Local graph (null if none)
+ * @param {{version: number, full: boolean, nodes: Object, edges: Object}} delta - Server answer
+ * @returns {{version: number, nodes: Array, edges: Array, changed: boolean}}
+ */
+export function applyGraphDelta(graph, delta) {
+  const merge = (rows, changes) => {
+    if (delta.full || !rows) {
+      return [...changes.inserted, ...changes.updated];
+    }
+    // Deletions first: a deleted row can come back with the same id
+    const byId = new Map(rows.map(row => [row.id, row]));
+    changes.deleted.forEach(id => byId.delete(id));
+    changes.inserted.forEach(row => byId.set(row.id, row));
+    changes.updated.forEach(row => byId.set(row.id, row));
+    return Array.from(byId.values());
+  };
+
+  const count = changes => changes.inserted.length + changes.updated.length + changes.deleted.length;
+  const changed = delta.full || !graph || count(delta.nodes) + count(delta.edges) > 0;
+  if (!changed) {
+    return { ...graph, version: delta.version, changed };
+  }
+  return {
+    version: delta.version,
+    nodes: merge(graph?.nodes, delta.nodes),
+    edges: merge(graph?.edges, delta.edges),
+    changed,
+  };
+}
+
+/**
+ * Graph saved by a previous visit, or null
+ * @param {string} workspaceId
+ */
+export function loadCachedGraph(workspaceId) {
+  try {
+    const stored = localStorage.getItem(CACHE_PREFIX + workspaceId);
+    return stored ? JSON.parse(stored) : null;
+  } catch (err) {
+    console.warn('Failed to read cached graph:', err);
+    return null;
+  }
+}
+
+/**
+ * Save a graph with its version; graphs over the storage quota are just not cached
+ * @param {string} workspaceId
+ * @param {{version: number, nodes: Array, edges: Array}} graph
+ */
+export function saveCachedGraph(workspaceId, graph) {
+  try {
+    localStorage.setItem(
+      CACHE_PREFIX + workspaceId,
+      JSON.stringify({ version: graph.version, nodes: graph.nodes, edges: graph.edges })
+    );
+  } catch (err) {
+    localStorage.removeItem(CACHE_PREFIX + workspaceId);
+    console.warn('Graph not cached:', err.message);
+  }
+}
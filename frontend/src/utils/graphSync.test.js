@@ -0,0 +1,57 @@
+import { applyGraphDelta } from './graphSync';
+
+const none = { inserted: [], updated: [], deleted: [] };
+
+describe('applyGraphDelta', () => {
+  const snapshot = {
+    version: 3,
+    full: true,
+    nodes: { ...none, inserted: [{ id: 'a' }, { id: 'b' }] },
+    edges: { ...none, inserted: [{ id: 'e1', source_node_id: 'a', target_node_id: 'b' }] },
+  };
+
+  it('should take every row of a full snapshot', () => {
+    const graph = applyGraphDelta(null, snapshot);
+    expect(graph.version).toBe(3);
+    expect(graph.nodes.map(n => n.id)).toEqual(['a', 'b']);
+    expect(graph.edges).toHaveLength(1);
+    expect(graph.changed).toBe(true);
+  });
+
+  it('should replace the local graph when the snapshot is full', () => {
+    const local = { version: 9, nodes: [{ id: 'stale' }], edges: [] };
+    const graph = applyGraphDelta(local, snapshot);
+    expect(graph.nodes.map(n => n.id)).toEqual(['a', 'b']);
+  });
+
+  it('should apply deletions, inserts and updates by id', () => {
+    const local = applyGraphDelta(null, snapshot);
+    const graph = applyGraphDelta(local, {
+      version: 5,
+      full: false,
+      nodes: { inserted: [{ id: 'c' }], updated: [{ id: 'a', position_x: 2 }], deleted: ['b'] },
+      edges: { ...none, deleted: ['e1'] },
+    });
+    expect(graph.version).toBe(5);
+    expect(graph.nodes).toEqual([{ id: 'a', position_x: 2 }, { id: 'c' }]);
+    expect(graph.edges).toEqual([]);
+  });
+
+  it('should keep a node deleted and inserted again', () => {
+    const local = applyGraphDelta(null, snapshot);
+    const graph = applyGraphDelta(local, {
+      version: 4,
+      full: false,
+      nodes: { inserted: [{ id: 'b', label: 'again' }], updated: [], deleted: ['b'] },
+      edges: none,
+    });
+    expect(graph.nodes).toContainEqual({ id: 'b', label: 'again' });
+  });
+
+  it('should report no change for an empty delta', () => {
+    const local = applyGraphDelta(null, snapshot);
+    const graph = applyGraphDelta(local, { version: 3, full: false, nodes: none, edges: none });
+    expect(graph.changed).toBe(false);
+    expect(graph.nodes).toBe(local.nodes);
+  });
+});
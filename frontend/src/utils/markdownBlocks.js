@@ -0,0 +1,68 @@
+/**
+ * Markdown block helpers for streamed answers
+ * The backend's block_end events give offsets where a top-level block of
+ * the answer is complete (see backend/markdown_blocks.py); MarkdownMessage
+ * renders each finished block once and only re-parses the open tail.
+ */
+
+// Same block-start rules as backend/markdown_blocks.py
+const LIST_ITEM = /^ {0,3}(?:[-*+]|\d{1,9}[.)])(?:[ \t]|$)/;
+const CONTINUATION = /^(?: {2,}|\t)\S/;
+const FENCE = /^ {0,3}(`{3,}|~{3,})/;
+const LINK_DEFINITION = /^ {0,3}\[[^\]]+\]:[ \t]*\S/;
+
+const withoutBlankLines = text => text.replace(/^(?:[ \t]*\n)+/, '');
+
+/**
+ * Link reference definitions ("[id]: https://...") outside code fences
+ *
+ * Definitions apply to the whole document, so a block parsed on its own
+ * needs them appended to resolve a reference defined in another block.
+ *
+ * @param {string} content - Markdown text
+ * @returns {string} The definition lines, joined by newlines
+ */
+export function linkDefinitions(content) {
+  if (!content.includes(']:')) return '';
+  const definitions = [];
+  let fence = null;
+  for (const line of content.split('\n')) {
+    const match = FENCE.exec(line);
+    if (fence) {
+      if (match && match[1][0] === fence[0] && match[1].length >= fence.length) fence = null;
+    } else if (match) {
+      fence = match[1];
+    } else if (LINK_DEFINITION.test(line)) {
+      definitions.push(line.trim());
+    }
+  }
+  return definitions.join('\n');
+}
+
+/**
+ * Split markdown at block_end offsets into separately rendered segments
+ *
+ * A boundary between a list and an item or indented line that continues
+ * it is skipped, so the list renders as one element and keeps its
+ * numbering and nesting.
+ *
+ * @param {string} content - Markdown text received so far
+ * @param {number[]} blockEnds - Ascending offsets into `content` where a block ends
+ * @returns {Array<{start: number, text: string}>}
+ */
+export function splitBlocks(content, blockEnds = []) {
+  const segments = [];
+  let start = 0;
+  for (const end of blockEnds) {
+    if (end <= start || end > content.length) continue;
+    const after = withoutBlankLines(content.slice(end));
+    const isList = LIST_ITEM.test(withoutBlankLines(content.slice(start, end)));
+    if (isList && (LIST_ITEM.test(after) || CONTINUATION.test(after))) continue;
+    segments.push({ start, text: content.slice(start, end) });
+    start = end;
+  }
+  if (start < content.length) {
+    segments.push({ start, text: content.slice(start) });
+  }
+  return segments;
+}
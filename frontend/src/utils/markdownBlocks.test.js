@@ -0,0 +1,37 @@
+import { linkDefinitions, splitBlocks } from './markdownBlocks';
+
+const texts = segments => segments.map(segment => segment.text);
+
+describe('splitBlocks', () => {
+  it('should split at each block end and keep the open tail', () => {
+    const content = '# Title\nFirst paragraph.\n\nStill open';
+    const segments = splitBlocks(content, [8, 26]);
+    expect(texts(segments)).toEqual(['# Title\n', 'First paragraph.\n\n', 'Still open']);
+    expect(segments.map(s => s.start)).toEqual([0, 8, 26]);
+  });
+
+  it('should ignore offsets out of order or past the content', () => {
+    expect(texts(splitBlocks('abc\n\ndef', [5, 2, 99]))).toEqual(['abc\n\n', 'def']);
+  });
+
+  it('should not split a list from the items that continue it', () => {
+    const content = '1. one\n\n2. two\n\n   more\n';
+    expect(texts(splitBlocks(content, [8, 16]))).toEqual([content]);
+  });
+
+  it('should split a list from the paragraph after it', () => {
+    const content = '- a\n- b\n\nAfter the list.';
+    expect(texts(splitBlocks(content, [9]))).toEqual(['- a\n- b\n\n', 'After the list.']);
+  });
+});
+
+describe('linkDefinitions', () => {
+  it('should collect reference definitions outside code fences', () => {
+    const content = 'See [docs][d].\n\n```\n[x]: not-a-link\n```\n\n[d]: https://example.com "Docs"\n';
+    expect(linkDefinitions(content)).toBe('[d]: https://example.com "Docs"');
+  });
+
+  it('should be empty without definitions', () => {
+    expect(linkDefinitions('Plain [text] here')).toBe('');
+  });
+});
@@ -2,6 +2,7 @@
 Zyron Orchestrator - Multi-service orchestration engine
 """
 
+import socket
 import time
 from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
@@ -293,7 +294,8 @@ class Orchestrator:
         if not success:
             return False, f"Failed to stop services: {msg}"
 
-        time.sleep(2)  # Wait before restarting
+        # Stopping drained in-flight requests; wait for the ports to be free again
+        self._wait_for_ports_released(service_names)
 
         # Start services
         return self.start(service_names)
@@ -366,6 +368,31 @@ class Orchestrator:
 
         return False
 
+    def _wait_for_ports_released(self, service_names: List[str], timeout: int = 30) -> bool:
+        """Wait until stopped services no longer listen on their ports"""
+
+        ports = [
+            self.services_config.get(name, {}).get('port')
+            for name in service_names
+        ]
+        ports = [int(port) for port in ports if port]
+        deadline = time.time() + timeout
+
+        while time.time() < deadline:
+            in_use = []
+            for port in ports:
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(1)
+                    if sock.connect_ex(('127.0.0.1', port)) == 0:
+                        in_use.append(port)
+            if not in_use:
+                return True
+            time.sleep(0.2)
+
+        if self.logger_dict.get('orchestrator'):
+            self.logger_dict['orchestrator'].warning(f"Ports still in use after stop: {in_use}")
+        return False
+
     def _rollback_services(self, started_services: List[str]):
         """Rollback (stop) services in reverse order"""
 
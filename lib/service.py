@@ -4,6 +4,9 @@ Zyron Service - Service abstraction for orchestration
 
 import subprocess
 import json
+import os
+import urllib.error
+import urllib.request
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Dict, Any, Optional
@@ -88,6 +91,60 @@ class Service(ABC):
         """Get startup timeout in seconds"""
         return self.config.get('startup_timeout', 30)
 
+    def _drain_request(self, url: str, method: str) -> Optional[Dict[str, Any]]:
+        """Call the drain endpoint; None once the service stopped answering"""
+        req = urllib.request.Request(url, method=method)
+        if os.getenv('DRAIN_TOKEN'):
+            req.add_header('X-Drain-Token', os.getenv('DRAIN_TOKEN'))
+        try:
+            with urllib.request.urlopen(req, timeout=5) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError:
+            raise
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            return None
+
+    def drain(self) -> bool:
+        """Let in-flight work finish before stopping, if the service supports it
+
+        Configured with `drain: {url, timeout}`. The service refuses new
+        work, fails its health check and reports state "drained" (or goes
+        away) when done. Returns False if it could not drain in time.
+        """
+        drain_config = self.config.get('drain')
+        if not drain_config or not drain_config.get('url'):
+            return True
+
+        url = drain_config['url']
+        try:
+            status = self._drain_request(url, 'POST')
+        except urllib.error.HTTPError as e:
+            if self.logger:
+                self.logger.warning(f"{self.name} cannot drain (HTTP {e.code})")
+            return False
+        if status is None:
+            return True
+
+        if self.logger:
+            self.logger.info(f"Draining {self.name}: {status.get('in_flight', 0)} requests in flight")
+        timeout = status.get('remaining_seconds') or drain_config.get('timeout', 120)
+        deadline = time.time() + timeout + drain_config.get('margin', 15)
+        while time.time() < deadline:
+            # Done once the service is gone, or drained if it stays up
+            if status is None or (status.get('state') == 'drained' and not status.get('exits')):
+                if self.logger:
+                    self.logger.info(f"{self.name} drained")
+                return True
+            time.sleep(0.5)
+            try:
+                status = self._drain_request(url, 'GET')
+            except urllib.error.HTTPError:
+                status = None
+
+        if self.logger:
+            self.logger.warning(f"{self.name} did not drain within {timeout:.0f}s")
+        return False
+
 
 class ProcessService(Service):
     """Service that runs as a local process (Python/Node)"""
@@ -147,7 +204,9 @@ class ProcessService(Service):
             if self.logger:
                 self.logger.info(f"Stopping {self.name}")
 
-            # Try graceful shutdown first
+            # Let in-flight requests finish, then shut down
+            if self.process.poll() is None:
+                self.drain()
             self.process.terminate()
             try:
                 self.process.wait(timeout=10)
@@ -272,6 +331,7 @@ class DockerService(Service):
             if self.logger:
                 self.logger.info(f"Stopping Docker service {self.name}")
 
+            self.drain()
             self.container.stop(timeout=10)
 
             if self.logger: